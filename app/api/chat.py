@@ -2,9 +2,9 @@ import httpx
 import logging
 import time
 import json as _json
-from typing import Dict, Any, List, Optional, Mapping, cast, TYPE_CHECKING
+from typing import AsyncIterator, Dict, Any, List, Optional, Mapping, Tuple, cast, TYPE_CHECKING
 if TYPE_CHECKING:  # nur für Typprüfung, zur Laufzeit nicht benötigt
-    from utils.rag import TfIdfIndex as _TfIdfIndex
+    from utils.rag import RagIndex as _RagIndex
 from fastapi import HTTPException, status
 
 from ..core.settings import settings
@@ -14,217 +14,390 @@ from ..utils.session_memory import session_memory
 from utils.context_notes import load_context_notes
 from .models import ChatRequest, ChatResponse
 from ..core.memory import compose_with_memory, get_memory_store
-from .chat_helpers import normalize_ollama_options
+from ..core.memory_summary import memory_summarizer
+from ..core.prompt_budget import apply_budget
+from ..core.prompt_layout import order_prefix_stable, prefix_tracker
+from .chat_helpers import normalize_ollama_options, normalize_chat_request
+from .chat_pipeline import PipelineStage, PromptContext, PromptPipeline
+from ..services.http_client import get_http_client
+from ..services.offload import run_blocking, run_stage
+from ..services.response_cache import get_response_cache, response_cache_key
+from ..services.single_flight import flight_key, single_flight
+from ..services import metrics as _metrics
+from ..services.trace import RequestTrace, write_trace
 
 # Logger konfigurieren
 logger = logging.getLogger(__name__)
 
-async def stream_chat_request(
-    request: ChatRequest,
-    eval_mode: bool = False,
-    unrestricted_mode: bool = False,
-    client: Optional[httpx.AsyncClient] = None,
-    request_id: Optional[str] = None,
-):
-    """
-    Startet eine Streaming-Anfrage an das Modell und liefert ein Async-Generator
-    mit SSE-Formatierten Daten (data: <chunk>\n\n). Bei Abschluss wird ein 'done'-Event gesendet.
+
+def _rag_scoring() -> Dict[str, Any]:
+    """Scorer-Auswahl (RAG_SCORER) und BM25-Parameter aus den Settings für retrieve()."""
+    from utils.rag import Bm25Params
+
+    scorer = str(getattr(settings, "RAG_SCORER", "tfidf") or "tfidf").lower()
+    if scorer != "bm25":
+        return {"scorer": "tfidf"}
+    return {
+        "scorer": "bm25",
+        "bm25": Bm25Params(
+            k1=float(getattr(settings, "RAG_BM25_K1", 1.2)),
+            b=float(getattr(settings, "RAG_BM25_B", 0.75)),
+            heading_boost=float(getattr(settings, "RAG_BM25_HEADING_BOOST", 2.0)),
+            path_boost=float(getattr(settings, "RAG_BM25_PATH_BOOST", 1.0)),
+        ),
+    }
+
+
+def _stage_timeout(name: str, default: float) -> Optional[float]:
+    try:
+        val = float(getattr(settings, name, default))
+    except Exception:
+        val = default
+    return val if val > 0 else None
+
+
+async def _inject_context_notes(messages: List[Dict[str, str]]) -> None:
+    """Kontext-Notizen (Datei-I/O im Thread-Pool) als zusätzliche System-Nachricht einfügen.
+
+    Dauert das Laden länger als CONTEXT_NOTES_TIMEOUT_SEC, wird ohne Notizen fortgefahren.
     """
-    # Nachrichten normalisieren
-    messages: List[Dict[str, str]] = []
-    for m in request.messages:
-        if isinstance(m, dict):
-            role = m.get("role", "user")
-            content = m.get("content", "")
-        else:
-            role = getattr(m, "role", "user")
-            content = getattr(m, "content", "")
-        messages.append({"role": role, "content": content})
-
-    # Systemprompt auswählen/ersetzen
-    if eval_mode:
-        logger.info(f"Eval-Modus aktiv (stream): Ersetze Systemprompt rid={request_id}")
-        messages = [msg for msg in messages if msg.get("role") != "system"]
-        sys_prompt = EVAL_SYSTEM_PROMPT
-        # Optional: Policy-Hook anwenden
-        if getattr(settings, "CONTENT_POLICY_ENABLED", False):
-            try:
-                sys_prompt = modify_prompt_for_freedom(sys_prompt)
-            except Exception:
-                pass
-        messages.insert(0, {"role": "system", "content": sys_prompt})
-    elif unrestricted_mode:
-        logger.info(f"Uneingeschränkter Modus aktiv (stream): Ersetze Systemprompt rid={request_id}")
-        messages = [msg for msg in messages if msg.get("role") != "system"]
-        sys_prompt = UNRESTRICTED_SYSTEM_PROMPT
-        if getattr(settings, "CONTENT_POLICY_ENABLED", False):
-            try:
-                sys_prompt = modify_prompt_for_freedom(sys_prompt)
-            except Exception:
-                pass
-        messages.insert(0, {"role": "system", "content": sys_prompt})
+    enabled = bool(getattr(settings, "CONTEXT_NOTES_ENABLED", False))
+    notes: Optional[str] = await run_stage(
+        "context_notes",
+        run_blocking(
+            load_context_notes,
+            getattr(settings, "CONTEXT_NOTES_PATHS", []),
+            getattr(settings, "CONTEXT_NOTES_MAX_CHARS", 4000),
+        ),
+        timeout=_stage_timeout("CONTEXT_NOTES_TIMEOUT_SEC", 1.0),
+        default=None,
+    )
+    # Füge Notizen ein, wenn aktiviert ODER Notizen vorhanden sind
+    if (enabled or notes) and notes:
+        messages.insert(1, {"role": "system", "content": f"[Kontext-Notizen]\n{notes}"})
+
+
+async def _rag_hits(messages: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+    from utils.rag import get_cached_index  # leichte, lokale Utility
+    from ..services.rag_search import retrieve_hits
+
+    # Letzte Benutzerfrage als Query nehmen
+    user_texts = [m.get("content", "") for m in messages if m.get("role") == "user"]
+    query = user_texts[-1] if user_texts else ""
+    if not query:
+        return []
+    rag_path = str(getattr(settings, "RAG_INDEX_PATH", "eval/results/rag/index.json"))
+    idx: Optional["_RagIndex"] = await run_blocking(
+        get_cached_index, rag_path, check_interval=float(getattr(settings, "RAG_INDEX_CHECK_INTERVAL_SEC", 1.0))
+    )
+    if idx is None:
+        return []
+    top_k = int(getattr(settings, "RAG_TOP_K", 3))
+    return cast(List[Dict[str, Any]], await retrieve_hits(idx, query, top_k, **_rag_scoring()))
+
+
+async def _inject_rag(messages: List[Dict[str, str]]) -> None:
+    """RAG-Snippets als System-Nachricht einfügen (fail-open, höchstens RAG_STAGE_TIMEOUT_SEC)."""
+    if not bool(getattr(settings, "RAG_ENABLED", False)):
+        return
+    hits: List[Dict[str, Any]] = await run_stage(
+        "rag", _rag_hits(messages), timeout=_stage_timeout("RAG_STAGE_TIMEOUT_SEC", 2.0), default=[]
+    )
+    if not hits:
+        return
+
+    def _clip(s: str, n: int = 400) -> str:
+        return s if len(s) <= n else (s[:n] + "…")
+
+    # Kompakte Einbettung als System-Notiz
+    snippet_text = "\n\n".join(
+        f"- {h.get('source', '?')}: {_clip(str(h.get('content', h.get('text', ''))))}" for h in hits
+    )
+    messages.insert(1, {"role": "system", "content": f"[RAG]\n{snippet_text}"})
+
+
+def _log_policy_pre(action: str, mode: str, request_id: Optional[str]) -> None:
+    if getattr(settings, "LOG_JSON", False):
+        logger.info(_json.dumps({"event": "policy_pre", "action": action, "mode": mode, "request_id": request_id}, ensure_ascii=False))
+    elif action == "block":
+        logger.info(f"Policy-Pre blockierte die Anfrage. rid={request_id}")
     else:
-        if not any(msg.get("role") == "system" for msg in messages):
-            sys_prompt = DEFAULT_SYSTEM_PROMPT
-            if getattr(settings, "CONTENT_POLICY_ENABLED", False):
-                try:
-                    sys_prompt = modify_prompt_for_freedom(sys_prompt)
-                except Exception:
-                    pass
-            messages.insert(0, {"role": "system", "content": sys_prompt})
+        logger.info(f"Policy-Pre hat Nachrichten umgeschrieben. rid={request_id}")
+
 
-    # Optionale Kontext-Notizen injizieren (als zusätzliche System-Nachricht)
+def _observe_stream_done(
+    mode: str, t_up: float, first_at: Optional[float], n_chunks: int, done_info: Mapping[str, Any]
+) -> None:
+    """Upstream-Dauer und Tokenrate eines erfolgreichen Streams erfassen.
+
+    Tokenrate bevorzugt eval_count/eval_duration (ns) aus der letzten Ollama-Zeile, sonst
+    Chunks pro Sekunde seit dem ersten Token.
+    """
+    end = time.perf_counter()
+    _metrics.UPSTREAM_DURATION.observe(end - t_up, "chat_stream", "ok")
+    rate: Optional[float] = None
     try:
-        enabled = bool(getattr(settings, "CONTEXT_NOTES_ENABLED", False))
-        from typing import Optional as _Optional
-        notes: _Optional[str] = None
+        count = int(done_info.get("eval_count") or 0)
+        dur_ns = int(done_info.get("eval_duration") or 0)
+        if count > 0 and dur_ns > 0:
+            rate = count / (dur_ns / 1e9)
+    except Exception:
+        rate = None
+    if rate is None and first_at is not None and n_chunks > 1 and end > first_at:
+        rate = (n_chunks - 1) / (end - first_at)
+    if rate is not None:
+        _metrics.STREAM_TOKENS_PER_SECOND.observe(rate, mode)
+
+
+# --- Stufen der Prompt-Pipeline (Reihenfolge siehe PROMPT_PIPELINE) ---
+
+async def _stage_system_prompt(ctx: PromptContext) -> None:
+    """Systemprompt auswählen/ersetzen (eval/unrestricted ersetzen, default nur wenn keiner existiert)."""
+    nreq = ctx.request
+    messages = ctx.messages
+    has_system = any(msg.get("role") == "system" for msg in messages)
+    if nreq.eval_mode or nreq.unrestricted_mode:
+        label = "Eval-Modus" if nreq.eval_mode else "Uneingeschränkter Modus"
+        suffix = " (stream)" if ctx.stream else ""
+        logger.info(f"{label} aktiv{suffix}: Ersetze Systemprompt rid={ctx.request_id}")
+        if has_system:
+            messages = [msg for msg in messages if msg.get("role") != "system"]
+        sys_prompt = EVAL_SYSTEM_PROMPT if nreq.eval_mode else UNRESTRICTED_SYSTEM_PROMPT
+    elif has_system:
+        return
+    else:
+        sys_prompt = DEFAULT_SYSTEM_PROMPT
+    if getattr(settings, "CONTENT_POLICY_ENABLED", False):
         try:
-            notes = load_context_notes(
-                getattr(settings, "CONTEXT_NOTES_PATHS", []),
-                getattr(settings, "CONTEXT_NOTES_MAX_CHARS", 4000),
-            )
+            sys_prompt = modify_prompt_for_freedom(sys_prompt)
         except Exception:
-            notes = None
-        # Füge Notizen ein, wenn aktiviert ODER Notizen vorhanden sind
-        if (enabled or notes) and notes:
-            messages.insert(1, {"role": "system", "content": f"[Kontext-Notizen]\n{notes}"})
-    except Exception:
-        # Fehler beim Laden der Notizen ignorieren
-        pass
+            pass
+    messages.insert(0, {"role": "system", "content": sys_prompt})
+    ctx.messages = messages
+
+
+async def _stage_context_notes(ctx: PromptContext) -> None:
+    await _inject_context_notes(ctx.messages)
+
 
-    # Optional: RAG-Snippets injizieren (leichter TF-IDF Retriever)
+async def _stage_rag(ctx: PromptContext) -> None:
+    await _inject_rag(ctx.messages)
+
+
+async def _stage_memory(ctx: PromptContext) -> None:
+    """Memory-Fenster der Session voranstellen (fail-open)."""
     try:
-        if bool(getattr(settings, "RAG_ENABLED", False)):
-            from utils.rag import load_index, retrieve  # leichte, lokale Utility
-            rag_path = str(getattr(settings, "RAG_INDEX_PATH", "eval/results/rag/index.json"))
-            try:
-                idx: Optional["_TfIdfIndex"] = load_index(rag_path)
-                # Letzte Benutzerfrage als Query nehmen
-                user_texts = [m.get("content", "") for m in messages if m.get("role") == "user"]
-                query = user_texts[-1] if user_texts else ""
-                if query and idx is not None:
-                    from typing import List as _List, Dict as _Dict, Any as _Any, cast as _cast
-                    top_k = int(getattr(settings, "RAG_TOP_K", 3))
-                    _hits_any: object = retrieve(idx, query, top_k=top_k)
-                    hits = _cast(_List[_Dict[str, _Any]], _hits_any)
-                    if hits:
-                        # Kompakte Einbettung als System-Notiz
-                        def _clip(s: str, n: int = 400) -> str:
-                            return s if len(s) <= n else (s[:n] + "…")
-                        snippet_text = "\n\n".join(
-                            f"- {h.get('source', '?')}: {_clip(str(h.get('text', '')))}" for h in hits
-                        )
-                        messages.insert(1, {"role": "system", "content": f"[RAG]\n{snippet_text}"})
-            except FileNotFoundError:
-                # Kein Index vorhanden -> stiller Fallback
-                pass
-            except Exception:
-                # RAG ist optional, daher fail-open
-                pass
+        before = len(ctx.messages)
+        ctx.messages = await compose_with_memory(cast(List[Mapping[str, str]], ctx.messages), ctx.request.session_id)
+        added = max(0, len(ctx.messages) - before)
+        ctx.memory_turns = [m for m in ctx.messages[:added] if m.get("role") != "system"]
     except Exception:
-        # Import- oder sonstige Fehler ignorieren (RAG ist best-effort)
         pass
 
-    # Session-ID normalisieren
-    session_id: Optional[str] = None
+
+async def _stage_policy_pre(ctx: PromptContext) -> None:
+    """Policy-Pre-Hook: block setzt ctx.blocked, rewrite ersetzt die Nachrichten (fail-open)."""
+    mode = ctx.request.mode
     try:
-        # top-level session_id oder options.session_id
-        sid_top = getattr(request, "session_id", None)
-        opts_any0 = getattr(request, "options", None)
-        # Unterstütze Dict, Mapping oder Pydantic-Modelle mit model_dump()
-        opts0: Dict[str, Any] = {}
-        if isinstance(opts_any0, Mapping):
-            opts0 = dict(cast(Mapping[str, Any], opts_any0))
-        elif hasattr(opts_any0, "model_dump") and callable(getattr(opts_any0, "model_dump")):
-            try:
-                opts0 = dict(getattr(opts_any0, "model_dump")())
-            except Exception:
-                opts0 = {}
-        _sid_val0 = opts0.get("session_id")
-        sid_opt = _sid_val0 if isinstance(_sid_val0, str) else None
-        sid_val = sid_top or sid_opt
-        session_id = str(sid_val) if isinstance(sid_val, str) and sid_val else None
+        pre = apply_pre(cast(List[Mapping[str, Any]], ctx.messages), mode=mode, profile_id=ctx.request.profile_id)
     except Exception:
-        session_id = None
-
-    # Memory-Fenster komponieren
+        return
+    action = getattr(pre, "action", "allow") if pre else "allow"
+    if action == "block":
+        ctx.blocked = True
+        _log_policy_pre("block", mode, ctx.request_id)
+        return
+    pre_msgs = getattr(pre, "messages", None)
+    if action == "rewrite" and pre_msgs:
+        ctx.messages = [
+            {
+                "role": str((cast(Mapping[str, Any], m)).get("role", "user")),
+                "content": str((cast(Mapping[str, Any], m)).get("content", "")),
+            }
+            for m in pre_msgs
+            if isinstance(m, Mapping)
+        ]
+        _log_policy_pre("rewrite", mode, ctx.request_id)
+
+
+async def _stage_options(ctx: PromptContext) -> None:
+    ctx.options, ctx.host = normalize_ollama_options(ctx.request.options, eval_mode=ctx.request.eval_mode)
+
+
+def _shared_tail(a: List[Dict[str, str]], b: List[Dict[str, str]]) -> int:
+    """Länge des gemeinsamen Endstücks zweier Verläufe (Rolle und Inhalt gleich)."""
+    n = 0
+    while n < min(len(a), len(b)) and a[-1 - n] == b[-1 - n]:
+        n += 1
+    return n
+
+
+def _legacy_session_id(ctx: PromptContext) -> Optional[str]:
+    val = ctx.request.options.get("session_id")
+    return val if isinstance(val, str) and val else None
+
+
+async def _stage_session_memory(ctx: PromptContext) -> None:
+    """Legacy Session-Memory (options.session_id): bisherigen Verlauf nach den System-Nachrichten einfügen."""
     try:
-        from typing import Mapping as _Mapping, List as _List
-        messages = await compose_with_memory(cast(_List[_Mapping[str, str]], messages), session_id)
+        sess_id = _legacy_session_id(ctx)
+        if not sess_id:
+            prior = None
+        elif session_memory.shared:
+            # gemeinsamer Zustand (z. B. SQLite): nicht im Event-Loop lesen
+            prior = await run_blocking(session_memory.get, sess_id)
+        else:
+            prior = session_memory.get(sess_id)
+        if prior:
+            messages = ctx.messages
+            # Systemprompt möglichst an erster Stelle behalten
+            sys_msgs = [m for m in messages if m.get("role") == "system"]
+            non_sys = [m for m in messages if m.get("role") != "system"]
+            # prior sind Mappings[str,str]; in Dict[str,str] kopieren
+            prior_cast = [{"role": str(m.get("role", "user")), "content": str(m.get("content", ""))} for m in prior]
+            # Mit MEMORY_ENABLED liegt das Memory-Fenster schon vorn: beide Stores enden mit den jüngsten
+            # Turns, der überlappende Teil würde sonst doppelt eingefügt
+            overlap = _shared_tail(prior_cast, ctx.memory_turns)
+            if overlap:
+                del prior_cast[len(prior_cast) - overlap:]
+            ctx.messages = sys_msgs + prior_cast + non_sys
     except Exception:
         pass
 
-    # Vor dem Senden: Policy-Pre-Hook (optional)
+
+async def _stage_budget(ctx: PromptContext) -> None:
+    """Globales Token-Budget über alle Quellen durchsetzen; Bericht in ctx.budget (fail-open)."""
     try:
-        mode = "unrestricted" if unrestricted_mode else ("eval" if eval_mode else "default")
-        profile_id = getattr(request, "profile_id", None)
-        pre = apply_pre(cast(List[Mapping[str, Any]], messages), mode=mode, profile_id=profile_id)
-        if pre and getattr(pre, "action", "allow") == "block":
-            # Sofortiger Abbruch der Streaming-Antwort mit Fehler-Event
-            async def _blocked_gen():
-                if getattr(settings, "LOG_JSON", False):
-                    logger.info(_json.dumps({"event": "policy_pre", "action": "block", "mode": mode, "request_id": request_id}, ensure_ascii=False))
-                else:
-                    logger.info(f"Policy-Pre blockierte die Anfrage. rid={request_id}")
-                yield f"event: error\ndata: policy_block\n\n"
-                yield "event: done\ndata: {}\n\n"
-            return _blocked_gen()
-        if pre and getattr(pre, "action", "allow") == "rewrite" and getattr(pre, "messages", None):
-            # Sichere Neuzusammenstellung der Nachrichten mit expliziter Typform
-            pre_msgs = getattr(pre, "messages", None)
-            if pre_msgs:
-                messages = [
-                    {
-                        "role": str((cast(Mapping[str, Any], m)).get("role", "user")),
-                        "content": str((cast(Mapping[str, Any], m)).get("content", "")),
-                    }
-                    for m in pre_msgs
-                    if isinstance(m, Mapping)
-                ]
-            if getattr(settings, "LOG_JSON", False):
-                logger.info(_json.dumps({"event": "policy_pre", "action": "rewrite", "mode": mode, "request_id": request_id}, ensure_ascii=False))
-            else:
-                logger.info(f"Policy-Pre hat Nachrichten umgeschrieben. rid={request_id}")
+        ctx.messages, ctx.budget = apply_budget(ctx.messages, ctx.options)
     except Exception:
-        # fail-open
-        pass
+        logger.debug("Prompt-Budget übersprungen", exc_info=True)
+        return
+    dropped: Dict[str, Dict[str, int]] = cast(Dict[str, Dict[str, int]], ctx.budget.get("dropped") or {})
+    if dropped:
+        if getattr(settings, "LOG_JSON", False):
+            logger.info(_json.dumps({"event": "prompt_budget", **ctx.budget, "request_id": ctx.request_id}, ensure_ascii=False))
+        else:
+            lost = ", ".join(f"{k}={v.get('tokens', 0)}" for k, v in dropped.items())
+            logger.info(
+                f"Prompt-Budget {ctx.budget['used']}/{ctx.budget['budget']} Tokens, verworfen: {lost} rid={ctx.request_id}"
+            )
+    if getattr(settings, "METRICS_ENABLED", True):
+        for src, entry in dropped.items():
+            if entry.get("tokens"):
+                _metrics.PROMPT_BUDGET_DROPPED.inc(src, amount=float(entry["tokens"]))
+
+
+async def _stage_layout(ctx: PromptContext) -> None:
+    """Präfix-stabile Reihenfolge (PROMPT_LAYOUT=prefix_stable) und wiederverwendeten Präfix je Session messen."""
+    ctx.messages = order_prefix_stable(ctx.messages)
+    sid = ctx.request.session_id
+    if not sid:
+        return
+    ctx.prefix = prefix_tracker.observe(f"{ctx.request.model or settings.MODEL_NAME}\x00{sid}", ctx.messages)
+    if getattr(settings, "METRICS_ENABLED", True):
+        _metrics.PROMPT_TOKENS.inc(amount=float(ctx.prefix["tokens"]))
+        _metrics.PROMPT_PREFIX_REUSED_TOKENS.inc(amount=float(ctx.prefix["reused_tokens"]))
+
+
+def _apply_keep_alive(payload: Dict[str, Any]) -> None:
+    """MODEL_KEEP_ALIVE als Ollama `keep_alive` setzen (Zahl = Sekunden, sonst Dauer wie "30m")."""
+    val = getattr(settings, "MODEL_KEEP_ALIVE", None)
+    if val is None or str(val).strip() == "":
+        return
+    text = str(val).strip()
+    try:
+        payload["keep_alive"] = int(text)
+    except ValueError:
+        payload["keep_alive"] = text
 
-    # Optionen normalisieren
-    from typing import Dict as _Dict, Any as _Any
-    req_model = getattr(request, "model", None)
-    raw_any = getattr(request, "options", None)
-    raw_opts: _Dict[str, _Any]
-    if isinstance(raw_any, Mapping):
-        raw_opts = dict(cast(Mapping[str, Any], raw_any))
-    elif hasattr(raw_any, "model_dump") and callable(getattr(raw_any, "model_dump")):
-        try:
-            raw_opts = dict(getattr(raw_any, "model_dump")())
-        except Exception:
-            raw_opts = {}
-    else:
-        raw_opts = dict(raw_any or {})
-    norm_opts, base_host = normalize_ollama_options(raw_opts, eval_mode=eval_mode)
 
-    # Session Memory: optional bestehenden Verlauf voranstellen
+async def _cache_get(key: Optional[str]) -> Optional[List[str]]:
+    """Gecachte Modell-Chunks (RESPONSE_CACHE_ENABLED) oder None; Fehler gelten als Fehlgriff."""
+    cache = get_response_cache() if key else None
+    if cache is None or key is None:
+        return None
     try:
-        if getattr(settings, "SESSION_MEMORY_ENABLED", False):
-            from typing import Optional as _Optional, Dict as _Dict, Any as _Any
-            opts_mem: _Optional[_Dict[str, _Any]] = getattr(request, "options", None)
-            sess_id: _Optional[str] = None
-            if isinstance(opts_mem, dict):
-                _val = opts_mem.get("session_id")
-                sess_id = _val if isinstance(_val, str) else None
-            if isinstance(sess_id, str) and sess_id:
-                prior = session_memory.get(sess_id)
-                if prior:
-                    # Systemprompt möglichst an erster Stelle behalten
-                    sys_msgs = [m for m in messages if m.get("role") == "system"]
-                    non_sys = [m for m in messages if m.get("role") != "system"]
-                    # prior sind Mappings[str,str]; in Dict[str,str] kopieren
-                    prior_cast = [{"role": str(m.get("role", "user")), "content": str(m.get("content", ""))} for m in prior]
-                    messages = sys_msgs + prior_cast + non_sys
-    except Exception:
-        pass
+        return await cache.get(key)
+    except Exception as e:
+        logger.warning(f"Response-Cache: Lesen fehlgeschlagen ({e})")
+        return None
+
+
+async def _cache_put(key: str, chunks: List[str]) -> None:
+    cache = get_response_cache()
+    if cache is None:
+        return
+    try:
+        await cache.put(key, chunks)
+    except Exception as e:
+        logger.warning(f"Response-Cache: Speichern fehlgeschlagen ({e})")
+
+
+PROMPT_PIPELINE = PromptPipeline([
+    PipelineStage("system_prompt", _stage_system_prompt),
+    PipelineStage("context_notes", _stage_context_notes),
+    PipelineStage("rag", _stage_rag, lambda ctx: bool(getattr(settings, "RAG_ENABLED", False))),
+    PipelineStage(
+        "memory",
+        _stage_memory,
+        lambda ctx: bool(ctx.request.session_id) and bool(getattr(settings, "MEMORY_ENABLED", True)),
+    ),
+    PipelineStage("policy_pre", _stage_policy_pre, lambda ctx: bool(getattr(settings, "POLICIES_ENABLED", False))),
+    PipelineStage("options", _stage_options),
+    PipelineStage(
+        "session_memory",
+        _stage_session_memory,
+        lambda ctx: bool(getattr(settings, "SESSION_MEMORY_ENABLED", False)) and _legacy_session_id(ctx) is not None,
+    ),
+    PipelineStage("budget", _stage_budget, lambda ctx: bool(getattr(settings, "PROMPT_BUDGET_ENABLED", False))),
+    PipelineStage(
+        "layout", _stage_layout, lambda ctx: getattr(settings, "PROMPT_LAYOUT", "legacy") == "prefix_stable"
+    ),
+])
+
+
+async def _assemble_prompt(nreq: Any, request_id: Optional[str], stream: bool, trace: RequestTrace) -> PromptContext:
+    """Prompt-Pipeline ausführen und Stufendauern in den Request-Trace übernehmen."""
+    t0 = time.perf_counter()
+    ctx = await PROMPT_PIPELINE.run(
+        PromptContext(request=nreq, messages=nreq.messages, request_id=request_id, stream=stream)
+    )
+    trace.since("prompt", t0)
+    trace.add_stages(ctx.timings)
+    return ctx
+
+
+async def stream_chat_request(
+    request: ChatRequest,
+    eval_mode: Optional[bool] = None,
+    unrestricted_mode: Optional[bool] = None,
+    client: Optional[httpx.AsyncClient] = None,
+    request_id: Optional[str] = None,
+    trace: Optional[RequestTrace] = None,
+):
+    """
+    Startet eine Streaming-Anfrage an das Modell und liefert ein Async-Generator
+    mit SSE-Formatierten Daten (data: <chunk>\n\n). Bei Abschluss wird ein 'done'-Event gesendet.
+
+    eval_mode/unrestricted_mode: None = Flags aus dem Request-Body verwenden.
+    trace: Zeitaufschlüsselung des Requests; wird vor 'done' als Meta-Event {"timing": ...} gesendet.
+    """
+    if trace is None:
+        trace = RequestTrace(request_id, route="/chat/stream")
+    # Request einmalig normalisieren und Prompt über die gemeinsame Pipeline zusammenstellen
+    nreq = normalize_chat_request(request, eval_mode=eval_mode, unrestricted_mode=unrestricted_mode)
+    eval_mode, unrestricted_mode = nreq.eval_mode, nreq.unrestricted_mode
+    session_id = nreq.session_id
+    ctx = await _assemble_prompt(nreq, request_id, True, trace)
+    if ctx.blocked:
+        # Sofortiger Abbruch der Streaming-Antwort mit Fehler-Event
+        async def _blocked_gen():
+            yield f"event: error\ndata: policy_block\n\n"
+            yield "event: done\ndata: {}\n\n"
+        return _blocked_gen()
+    messages = ctx.messages
+    req_model = nreq.model
+    norm_opts, base_host = ctx.options, ctx.host
 
     ollama_payload: Dict[str, Any] = {
         "model": req_model or settings.MODEL_NAME,
@@ -232,6 +405,9 @@ async def stream_chat_request(
         "stream": True,
         "options": norm_opts,
     }
+    _apply_keep_alive(ollama_payload)
+    cache_key = response_cache_key(session_id, ollama_payload, base_host)
+    coalesce_key = flight_key("chat_stream", session_id, ollama_payload, base_host)
 
     ollama_url = f"{base_host}/api/chat"
 
@@ -254,26 +430,33 @@ async def stream_chat_request(
             f"Sende Streaming-Anfrage an Ollama: {ollama_url} model={ollama_payload.get('model')} opts={ollama_payload.get('options', {})} rid={request_id}"
         )
 
+    metrics_on = bool(getattr(settings, "METRICS_ENABLED", True))
+
     async def _gen():
         started = time.time()
+        if metrics_on:
+            _metrics.STREAMS_IN_FLIGHT.inc()
         try:
             # Frühes Meta-Event mit Parametern/Modus senden
             try:
                 from typing import Dict as _Dict, Any as _Any
-                mode0 = "unrestricted" if unrestricted_mode else ("eval" if eval_mode else "default")
                 _opts: _Any = ollama_payload.get("options", {})
                 params: _Dict[str, _Any] = {
-                    "mode": mode0,
+                    "mode": nreq.mode,
                     "request_id": request_id,
                     "model": ollama_payload.get("model"),
                     "options": _opts,
                 }
                 yield f"event: meta\ndata: {_json.dumps({'params': params}, ensure_ascii=False)}\n\n"
+                if ctx.budget is not None:
+                    yield f"event: meta\ndata: {_json.dumps({'budget': ctx.budget}, ensure_ascii=False)}\n\n"
+                if ctx.prefix is not None:
+                    yield f"event: meta\ndata: {_json.dumps({'prefix': ctx.prefix}, ensure_ascii=False)}\n\n"
             except Exception:
                 # Fail-open: Meta-Event ist optional
                 pass
-            async def _do_stream(_client: httpx.AsyncClient):
-                final_text_parts: List[str] = []
+            async def _read_upstream(_client: httpx.AsyncClient) -> AsyncIterator[Tuple[str, Any]]:
+                # Ollama-Zeilen als Events: ("content", Text) | ("raw", Zeile) | ("done", Abschlussdaten)
                 async with _client.stream("POST", ollama_url, json=ollama_payload, headers=headers) as resp:
                     resp.raise_for_status()
                     async for line in resp.aiter_lines():
@@ -283,23 +466,82 @@ async def stream_chat_request(
                             data = _json.loads(line)
                             # Ollama sendet inkrementelle Inhalte unter message.content
                             content = data.get("message", {}).get("content")
-                            if content:
-                                # Sende Plain-SSE-Chunks ohne event-Tag (erwartet von Tests)
-                                yield f"data: {content}\n\n"
-                                final_text_parts.append(content)
-                            if data.get("done"):
-                                break
+                            done = bool(data.get("done"))
                         except Exception:
-                            # Fallback: rohe Zeile als Plain-Data weiterreichen
-                            yield f"data: {line}\n\n"
+                            yield ("raw", line)
+                            continue
+                        if content:
+                            yield ("content", content)
+                        if done:
+                            yield ("done", data)
+                            break
+
+            async def _upstream_events() -> AsyncIterator[Tuple[str, Any]]:
+                # Gepoolten App-Client bevorzugen; temporärer Client nur ohne Lifespan (z. B. Tests/Skripte)
+                shared = client if client is not None else get_http_client()
+                if shared is not None:
+                    async for ev in _read_upstream(shared):
+                        yield ev
+                else:
+                    async with httpx.AsyncClient(timeout=settings.REQUEST_TIMEOUT) as temp_client:
+                        async for ev in _read_upstream(temp_client):
+                            yield ev
+
+            async def _do_stream(cached: Optional[List[str]] = None):
+                final_text_parts: List[str] = []
+                if cached is not None:
+                    # Cache-Treffer: gespeicherte Modell-Chunks ohne Upstream-Aufruf wiedergeben
+                    yield f"event: meta\ndata: {_json.dumps({'cache': 'hit'}, ensure_ascii=False)}\n\n"
+                    for content in cached:
+                        yield f"data: {content}\n\n"
+                        final_text_parts.append(content)
+                else:
+                    raw_lines = False
+                    t_up = time.perf_counter()
+                    first_at: Optional[float] = None
+                    done_info: Dict[str, Any] = {}
+                    # Identische laufende Generierung mitlesen (Single-Flight) statt eine eigene zu starten
+                    events = single_flight.stream(coalesce_key, _upstream_events) if coalesce_key else _upstream_events()
+                    try:
+                        async for kind, value in events:
+                            if kind == "content":
+                                if first_at is None:
+                                    first_at = time.perf_counter()
+                                    if metrics_on:
+                                        _metrics.STREAM_TTFT.observe(first_at - t_up, nreq.mode)
+                                # Sende Plain-SSE-Chunks ohne event-Tag (erwartet von Tests)
+                                yield f"data: {value}\n\n"
+                                final_text_parts.append(value)
+                            elif kind == "done":
+                                done_info = value
+                            else:
+                                # Fallback: rohe Zeile als Plain-Data weiterreichen
+                                yield f"data: {value}\n\n"
+                                raw_lines = True
+                    except Exception:
+                        if metrics_on:
+                            _metrics.UPSTREAM_DURATION.observe(time.perf_counter() - t_up, "chat_stream", "error")
+                        raise
+                    t_end = time.perf_counter()
+                    if first_at is not None:
+                        trace.add("upstream_wait", (first_at - t_up) * 1000.0)
+                        trace.add("upstream_gen", (t_end - first_at) * 1000.0)
+                    else:
+                        trace.add("upstream_wait", (t_end - t_up) * 1000.0)
+                    if metrics_on:
+                        _observe_stream_done(nreq.mode, t_up, first_at, len(final_text_parts), done_info)
+                    # Nur vollständige, sauber geparste Streams cachen
+                    if cache_key and done_info and final_text_parts and not raw_lines:
+                        await _cache_put(cache_key, final_text_parts)
                 # Nach erfolgreichem Stream: Policy-Post anwenden und Memory anhängen
                 try:
                     final_text = "".join(final_text_parts)
-                    mode = "unrestricted" if unrestricted_mode else ("eval" if eval_mode else "default")
-                    profile_id = getattr(request, "profile_id", None)
+                    mode = nreq.mode
+                    profile_id = nreq.profile_id
                     # Default: allow
                     action = "allow"
                     effective_text = final_text
+                    t_post = time.perf_counter()
                     try:
                         post = apply_post(final_text, mode=mode, profile_id=profile_id)
                         action = getattr(post, "action", "allow")
@@ -345,6 +587,7 @@ async def stream_chat_request(
                     except Exception:
                         action = "allow"
                         effective_text = final_text
+                    trace.since("policy_post", t_post)
 
                     # Meta-Event senden
                     try:
@@ -375,11 +618,12 @@ async def stream_chat_request(
                     # Memory speichern (user + final assistant Text)
                     try:
                         if session_id and getattr(settings, "MEMORY_ENABLED", True):
+                            t_mem = time.perf_counter()
                             store = get_memory_store()
-                            user_inputs = [m for m in messages if m.get("role") == "user"]
-                            last_user = user_inputs[-1]["content"] if user_inputs else ""
-                            await store.append(session_id, "user", last_user)
+                            await store.append(session_id, "user", nreq.last_user(messages))
                             await store.append(session_id, "assistant", effective_text)
+                            trace.since("mem_write", t_mem)
+                            memory_summarizer.schedule(session_id)
                     except Exception as mem_err:
                         # Warnen, aber Stream nicht abbrechen
                         logger.warning(f"Memory-Append fehlgeschlagen (stream): {mem_err}")
@@ -387,13 +631,9 @@ async def stream_chat_request(
                     # Fail-open: keinerlei Meta/Delta zusätzl., keine Memory-Speicherung hier
                     pass
 
-            if client is not None:
-                async for chunk in _do_stream(client):
-                    yield chunk
-            else:
-                async with httpx.AsyncClient(timeout=settings.REQUEST_TIMEOUT) as temp_client:
-                    async for chunk in _do_stream(temp_client):
-                        yield chunk
+            cached = await _cache_get(cache_key)
+            async for chunk in _do_stream(cached):
+                yield chunk
 
         except Exception as e:
             if getattr(settings, "LOG_JSON", False):
@@ -406,17 +646,25 @@ async def stream_chat_request(
             try:
                 if session_id and getattr(settings, "MEMORY_ENABLED", True):
                     store = get_memory_store()
-                    user_inputs = [m for m in messages if m.get("role") == "user"]
-                    last_user = user_inputs[-1]["content"] if user_inputs else ""
-                    await store.append(session_id, "user", f"{last_user}\n<!-- aborted=true -->")
+                    await store.append(session_id, "user", f"{nreq.last_user(messages)}\n<!-- aborted=true -->")
             except Exception as mem_err2:
                 logger.warning(f"Memory-Append (aborted) fehlgeschlagen: {mem_err2}")
         finally:
+            if metrics_on:
+                _metrics.STREAMS_IN_FLIGHT.dec()
             duration_ms = int((time.time() - started) * 1000)
             if getattr(settings, "LOG_JSON", False):
                 logger.info(_json.dumps({"event": "model_stream_done", "duration_ms": duration_ms, "request_id": request_id}, ensure_ascii=False))
             else:
                 logger.info(f"Streaming abgeschlossen in {duration_ms} ms rid={request_id}")
+            trace.finish()
+            try:
+                write_trace(trace, mode=nreq.mode, stream=True)
+            except Exception:
+                pass
+            # Zeitaufschlüsselung (Server-Timing-Äquivalent) als letztes Meta-Event
+            if getattr(settings, "SERVER_TIMING_ENABLED", True):
+                yield f"event: meta\ndata: {_json.dumps({'timing': trace.as_dict()}, ensure_ascii=False)}\n\n"
             # Done-Event signalisieren
             yield "event: done\ndata: {}\n\n"
 
@@ -424,201 +672,39 @@ async def stream_chat_request(
 
 async def process_chat_request(
     request: ChatRequest,
-    eval_mode: bool = False,
-    unrestricted_mode: bool = False,
+    eval_mode: Optional[bool] = None,
+    unrestricted_mode: Optional[bool] = None,
     client: Optional[httpx.AsyncClient] = None,
     request_id: Optional[str] = None,
+    trace: Optional[RequestTrace] = None,
 ) -> ChatResponse:
     """
     Verarbeitet eine Chat-Anfrage und gibt eine Antwort zurück.
     
     Args:
         request: Die Chat-Anfrage
-        eval_mode: Wenn True, wird der RPG-Modus deaktiviert
-        unrestricted_mode: Wenn True, werden keine Inhaltsfilter angewendet
+        eval_mode: Wenn True, wird der RPG-Modus deaktiviert (None = request.eval_mode)
+        unrestricted_mode: Wenn True, werden keine Inhaltsfilter angewendet (None = request.unrestricted_mode)
+        trace: Optionaler Request-Trace; erhält die Dauern der einzelnen Phasen (Server-Timing)
         
     Returns:
         Die Chat-Antwort
     """
+    # Request einmalig normalisieren (Nachrichten, Options, Session, Modus); None = Flags aus dem Body
+    nreq = normalize_chat_request(request, eval_mode=eval_mode, unrestricted_mode=unrestricted_mode)
+    eval_mode, unrestricted_mode = nreq.eval_mode, nreq.unrestricted_mode
+    if trace is None:
+        trace = RequestTrace(request_id, route="/chat")
     try:
-        # Nachrichten normalisieren
-        messages: List[Dict[str, str]] = []
-        for m in request.messages:
-            if isinstance(m, dict):
-                role = m.get("role", "user")
-                content = m.get("content", "")
-            else:
-                role = getattr(m, "role", "user")
-                content = getattr(m, "content", "")
-            messages.append({"role": role, "content": content})
-
-        # Systemprompt auswählen/ersetzen
-        if eval_mode:
-            logger.info(f"Eval-Modus aktiv: Ersetze Systemprompt rid={request_id}")
-            messages = [msg for msg in messages if msg.get("role") != "system"]
-            sys_prompt = EVAL_SYSTEM_PROMPT
-            if getattr(settings, "CONTENT_POLICY_ENABLED", False):
-                try:
-                    sys_prompt = modify_prompt_for_freedom(sys_prompt)
-                except Exception:
-                    pass
-            messages.insert(0, {"role": "system", "content": sys_prompt})
-        elif unrestricted_mode:
-            logger.info(f"Uneingeschränkter Modus aktiv: Ersetze Systemprompt rid={request_id}")
-            messages = [msg for msg in messages if msg.get("role") != "system"]
-            sys_prompt = UNRESTRICTED_SYSTEM_PROMPT
-            if getattr(settings, "CONTENT_POLICY_ENABLED", False):
-                try:
-                    sys_prompt = modify_prompt_for_freedom(sys_prompt)
-                except Exception:
-                    pass
-            messages.insert(0, {"role": "system", "content": sys_prompt})
-        else:
-            if not any(msg.get("role") == "system" for msg in messages):
-                sys_prompt = DEFAULT_SYSTEM_PROMPT
-                if getattr(settings, "CONTENT_POLICY_ENABLED", False):
-                    try:
-                        sys_prompt = modify_prompt_for_freedom(sys_prompt)
-                    except Exception:
-                        pass
-                messages.insert(0, {"role": "system", "content": sys_prompt})
-
-        # Optionale Kontext-Notizen injizieren (als zusätzliche System-Nachricht)
-        try:
-            enabled = bool(getattr(settings, "CONTEXT_NOTES_ENABLED", False))
-            from typing import Optional as _Optional
-            notes: _Optional[str] = None
-            try:
-                notes = load_context_notes(
-                    getattr(settings, "CONTEXT_NOTES_PATHS", []),
-                    getattr(settings, "CONTEXT_NOTES_MAX_CHARS", 4000),
-                )
-            except Exception:
-                notes = None
-            if (enabled or notes) and notes:
-                messages.insert(1, {"role": "system", "content": f"[Kontext-Notizen]\n{notes}"})
-        except Exception:
-            pass
-
-        # Optional: RAG-Snippets injizieren (leichter TF-IDF Retriever)
-        try:
-            if bool(getattr(settings, "RAG_ENABLED", False)):
-                from utils.rag import load_index, retrieve
-                rag_path = str(getattr(settings, "RAG_INDEX_PATH", "eval/results/rag/index.json"))
-                try:
-                    idx: Optional["_TfIdfIndex"] = load_index(rag_path)
-                    user_texts2 = [m.get("content", "") for m in messages if m.get("role") == "user"]
-                    query2 = user_texts2[-1] if user_texts2 else ""
-                    if query2 and idx is not None:
-                        from typing import List as _List, Dict as _Dict, Any as _Any, cast as _cast
-                        top_k2 = int(getattr(settings, "RAG_TOP_K", 3))
-                        _hits2_any: object = retrieve(idx, query2, top_k=top_k2)
-                        hits2 = _cast(_List[_Dict[str, _Any]], _hits2_any)
-                        if hits2:
-                            def _clip2(s: str, n: int = 400) -> str:
-                                return s if len(s) <= n else (s[:n] + "…")
-                            snippet_text2 = "\n\n".join(
-                                f"- {h.get('source', '?')}: {_clip2(str(h.get('text', '')))}" for h in hits2
-                            )
-                            messages.insert(1, {"role": "system", "content": f"[RAG]\n{snippet_text2}"})
-                except FileNotFoundError:
-                    pass
-                except Exception:
-                    pass
-        except Exception:
-            pass
-
-        # Session-ID normalisieren
-        session_id: Optional[str] = None
-        try:
-            sid_top = getattr(request, "session_id", None)
-            from typing import Dict as _Dict, Any as _Any
-            opts_any = getattr(request, "options", None)
-            opts0: _Dict[str, _Any] = {}
-            # Sichere Übernahme, Mapping oder Pydantic-Modelle
-            if isinstance(opts_any, Mapping):
-                try:
-                    opts0 = dict(cast(Mapping[str, _Any], opts_any))
-                except Exception:
-                    opts0 = {}
-            elif hasattr(opts_any, "model_dump") and callable(getattr(opts_any, "model_dump")):
-                try:
-                    opts0 = dict(getattr(opts_any, "model_dump")())
-                except Exception:
-                    opts0 = {}
-            sid_opt = opts0.get("session_id")
-            sid_val = sid_top or sid_opt
-            session_id = str(sid_val) if isinstance(sid_val, str) and sid_val else None
-        except Exception:
-            session_id = None
-
-        # Memory-Fenster komponieren
-        try:
-            from typing import Mapping as _Mapping, List as _List
-            messages = await compose_with_memory(cast(_List[_Mapping[str, str]], messages), session_id)
-        except Exception:
-            pass
-
-        # Vor dem Senden: Policy-Pre-Hook (optional)
-        try:
-            mode = "unrestricted" if unrestricted_mode else ("eval" if eval_mode else "default")
-            profile_id = getattr(request, "profile_id", None)
-            pre = apply_pre(cast(List[Mapping[str, Any]], messages), mode=mode, profile_id=profile_id)
-            if pre and getattr(pre, "action", "allow") == "block":
-                # 400 mit Policy-Block-Detail
-                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="policy_block")
-            if pre and getattr(pre, "action", "allow") == "rewrite" and getattr(pre, "messages", None):
-                pre_msgs = getattr(pre, "messages", None)
-                if pre_msgs:
-                    messages = [
-                        {
-                            "role": str((cast(Mapping[str, Any], m)).get("role", "user")),
-                            "content": str((cast(Mapping[str, Any], m)).get("content", "")),
-                        }
-                        for m in pre_msgs
-                        if isinstance(m, Mapping)
-                    ]
-                if getattr(settings, "LOG_JSON", False):
-                    logger.info(_json.dumps({"event": "policy_pre", "action": "rewrite", "mode": mode, "request_id": request_id}, ensure_ascii=False))
-                else:
-                    logger.info(f"Policy-Pre hat Nachrichten umgeschrieben. rid={request_id}")
-        except Exception:
-            pass
-
-        # Options/Overrides
-        from typing import Dict as _Dict, Any as _Any
-        req_model = getattr(request, "model", None)
-        raw_any2 = getattr(request, "options", None)
-        raw_opts2: _Dict[str, _Any]
-        if isinstance(raw_any2, Mapping):
-            raw_opts2 = dict(cast(Mapping[str, Any], raw_any2))
-        elif hasattr(raw_any2, "model_dump") and callable(getattr(raw_any2, "model_dump")):
-            try:
-                raw_opts2 = dict(getattr(raw_any2, "model_dump")())
-            except Exception:
-                raw_opts2 = {}
-        else:
-            raw_opts2 = dict(raw_any2 or {})
-        norm_opts2, base_host = normalize_ollama_options(raw_opts2, eval_mode=eval_mode)
-
-        # Session Memory (optional): bisherigen Verlauf voranstellen
-        try:
-            if getattr(settings, "SESSION_MEMORY_ENABLED", False):
-                from typing import Optional as _Optional, Dict as _Dict, Any as _Any
-                opts2: _Optional[_Dict[str, _Any]] = getattr(request, "options", None)
-                sess_id2: _Optional[str] = None
-                if isinstance(opts2, dict):
-                    _val2 = opts2.get("session_id")
-                    sess_id2 = _val2 if isinstance(_val2, str) else None
-                if isinstance(sess_id2, str) and sess_id2:
-                    prior2 = session_memory.get(sess_id2)
-                    if prior2:
-                        sys_msgs2 = [m for m in messages if m.get("role") == "system"]
-                        non_sys2 = [m for m in messages if m.get("role") != "system"]
-                        prior2_cast = [{"role": str(m.get("role", "user")), "content": str(m.get("content", ""))} for m in prior2]
-                        messages = sys_msgs2 + prior2_cast + non_sys2
-        except Exception:
-            pass
+        session_id = nreq.session_id
+        # Prompt über die gemeinsame Pipeline zusammenstellen
+        ctx = await _assemble_prompt(nreq, request_id, False, trace)
+        if ctx.blocked:
+            # 400 mit Policy-Block-Detail
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="policy_block")
+        messages = ctx.messages
+        req_model = nreq.model
+        norm_opts2, base_host = ctx.options, ctx.host
 
         ollama_payload: Dict[str, Any] = {
             "model": req_model or settings.MODEL_NAME,
@@ -626,6 +712,7 @@ async def process_chat_request(
             "stream": False,
             "options": norm_opts2,
         }
+        _apply_keep_alive(ollama_payload)
 
         ollama_url = f"{base_host}/api/chat"
 
@@ -657,43 +744,81 @@ async def process_chat_request(
             setattr(resp, "_started", started)
             return resp
 
-        if client is not None:
-            response = await _post_with(client)
+        cache_key = response_cache_key(session_id, ollama_payload, base_host)
+        cached = await _cache_get(cache_key)
+        if cached is not None:
+            # Cache-Treffer: kein Upstream-Aufruf, Post-Policy läuft wie gewohnt
+            generated_content = "".join(cached)
+            logger.info(f"Antwort aus dem Response-Cache. rid={request_id}")
         else:
-            async with httpx.AsyncClient(timeout=settings.REQUEST_TIMEOUT) as temp_client:
-                response = await _post_with(temp_client)
-
-        response.raise_for_status()
-        result = response.json()
-        generated_content = result.get("message", {}).get("content", "")
-
-        max_len = max(0, int(getattr(settings, "LOG_TRUNCATE_CHARS", 200)))
-        preview = generated_content if len(generated_content) <= max_len else (generated_content[:max_len] + "...")
-        # Dauer falls vorhanden
-        started = getattr(response, "_started", None)
-        duration_ms = int((time.time() - started) * 1000) if isinstance(started, float) else None
-        if getattr(settings, "LOG_JSON", False):
-            logger.info(
-                _json.dumps({
-                    "event": "model_response",
-                    "model": ollama_payload.get("model"),
-                    "status": int(response.status_code),
-                    "duration_ms": duration_ms,
-                    "preview": preview,
-                    "request_id": request_id,
-                }, ensure_ascii=False)
-            )
-        else:
-            if duration_ms is not None:
-                logger.info(f"Antwort von Ollama erhalten. {duration_ms} ms rid={request_id} Inhalt: {preview}")
+            async def _upstream() -> httpx.Response:
+                # Gepoolten App-Client bevorzugen; temporärer Client nur ohne Lifespan (z. B. Tests/Skripte)
+                shared = client if client is not None else get_http_client()
+                if shared is not None:
+                    resp = await _post_with(shared)
+                else:
+                    async with httpx.AsyncClient(timeout=settings.REQUEST_TIMEOUT) as temp_client:
+                        resp = await _post_with(temp_client)
+                resp.raise_for_status()
+                return resp
+
+            metrics_on = bool(getattr(settings, "METRICS_ENABLED", True))
+            t_up = time.perf_counter()
+            try:
+                # Identischen laufenden Aufruf mitnutzen (Single-Flight) statt einen eigenen zu starten
+                coalesce_key = flight_key("chat", session_id, ollama_payload, base_host)
+                if coalesce_key:
+                    response = await single_flight.call(coalesce_key, _upstream)
+                else:
+                    response = await _upstream()
+            except Exception:
+                if metrics_on:
+                    _metrics.UPSTREAM_DURATION.observe(time.perf_counter() - t_up, "chat", "error")
+                raise
+            up_ms = (time.perf_counter() - t_up) * 1000.0
+            if metrics_on:
+                _metrics.UPSTREAM_DURATION.observe(up_ms / 1000.0, "chat", "ok")
+            result = response.json()
+            generated_content = result.get("message", {}).get("content", "")
+            # Ohne Streaming: Generierungszeit aus eval_duration (ns) von Ollama, Rest = Warten
+            gen_ms = 0.0
+            try:
+                gen_ms = min(up_ms, float(result.get("eval_duration") or 0) / 1e6)
+            except Exception:
+                gen_ms = 0.0
+            trace.add("upstream_wait", up_ms - gen_ms)
+            if gen_ms > 0:
+                trace.add("upstream_gen", gen_ms)
+
+            max_len = max(0, int(getattr(settings, "LOG_TRUNCATE_CHARS", 200)))
+            preview = generated_content if len(generated_content) <= max_len else (generated_content[:max_len] + "...")
+            # Dauer falls vorhanden
+            started = getattr(response, "_started", None)
+            duration_ms = int((time.time() - started) * 1000) if isinstance(started, float) else None
+            if getattr(settings, "LOG_JSON", False):
+                logger.info(
+                    _json.dumps({
+                        "event": "model_response",
+                        "model": ollama_payload.get("model"),
+                        "status": int(response.status_code),
+                        "duration_ms": duration_ms,
+                        "preview": preview,
+                        "request_id": request_id,
+                    }, ensure_ascii=False)
+                )
             else:
-                logger.info(f"Antwort von Ollama erhalten. rid={request_id} Inhalt: {preview}")
+                if duration_ms is not None:
+                    logger.info(f"Antwort von Ollama erhalten. {duration_ms} ms rid={request_id} Inhalt: {preview}")
+                else:
+                    logger.info(f"Antwort von Ollama erhalten. rid={request_id} Inhalt: {preview}")
+            if cache_key and generated_content and result.get("done", True):
+                await _cache_put(cache_key, [generated_content])
 
         # Post-Policy: ggf. Output filtern/umschreiben
+        t_post = time.perf_counter()
         try:
-            mode = "unrestricted" if unrestricted_mode else ("eval" if eval_mode else "default")
-            profile_id = getattr(request, "profile_id", None)
-            post = apply_post(generated_content, mode=mode, profile_id=profile_id)
+            mode = nreq.mode
+            post = apply_post(generated_content, mode=mode, profile_id=nreq.profile_id)
             act = getattr(post, "action", "allow")
             if act == "block":
                 raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="policy_block")
@@ -707,16 +832,19 @@ async def process_chat_request(
             raise
         except Exception:
             pass
+        finally:
+            trace.since("policy_post", t_post)
 
         # Session Memory (optional): neuen Nutzer-Input und Modell-Antwort ablegen
         try:
             if session_id and getattr(settings, "MEMORY_ENABLED", True):
+                t_mem = time.perf_counter()
                 store = get_memory_store()
                 # Benutzerturn aus der letzten user-Nachricht des aktuellen Requests
-                user_inputs = [m for m in messages if m.get("role") == "user"]
-                last_user = user_inputs[-1]["content"] if user_inputs else ""
-                await store.append(session_id, "user", last_user)
+                await store.append(session_id, "user", nreq.last_user(messages))
                 await store.append(session_id, "assistant", generated_content)
+                trace.since("mem_write", t_mem)
+                memory_summarizer.schedule(session_id)
         except Exception as mem_err3:
             logger.warning(f"Memory-Append fehlgeschlagen: {mem_err3}")
 
@@ -727,33 +855,12 @@ async def process_chat_request(
     except Exception as e:
         # Bei Fehlern: Benutzerturn als abgebrochen vermerken
         try:
-            sid_top = getattr(request, "session_id", None)
-            from typing import Dict as _Dict, Any as _Any
-            opts_any = getattr(request, "options", None)
-            opts_err: _Dict[str, _Any] = {}
-            if isinstance(opts_any, Mapping):
-                try:
-                    opts_err = dict(cast(Mapping[str, _Any], opts_any))
-                except Exception:
-                    opts_err = {}
-            sid_opt = opts_err.get("session_id")
-            sid_val = sid_top or sid_opt
-            session_id = str(sid_val) if isinstance(sid_val, str) and sid_val else None
+            session_id = nreq.session_id
             if session_id and getattr(settings, "MEMORY_ENABLED", True):
                 store = get_memory_store()
-                # Best-effort: letzte user-Nachricht aus den Rohdaten
-                raw_msgs: List[Dict[str, str]] = []
-                for m in request.messages:
-                    if isinstance(m, dict):
-                        role = m.get("role", "user")
-                        content = m.get("content", "")
-                    else:
-                        role = getattr(m, "role", "user")
-                        content = getattr(m, "content", "")
-                    raw_msgs.append({"role": role, "content": content})
-                user_inputs = [m for m in raw_msgs if m.get("role") == "user"]
-                last_user = user_inputs[-1]["content"] if user_inputs else ""
-                await store.append(session_id, "user", f"{last_user}\n<!-- aborted=true -->")
+                # Best-effort: letzte user-Nachricht des Requests (nreq.messages erhält nur
+                # zusätzliche System-Nachrichten; Memory/Policy arbeiten auf neuen Listen)
+                await store.append(session_id, "user", f"{nreq.last_user()}\n<!-- aborted=true -->")
         except Exception as mem_err4:
             logger.warning(f"Memory-Append (error path) fehlgeschlagen: {mem_err4}")
         if getattr(settings, "LOG_JSON", False):
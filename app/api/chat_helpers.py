@@ -3,9 +3,10 @@ Hilfsfunktionen für den Chat-Endpunkt.
 """
 
 import functools
-from typing import Any, Dict, List, Optional, Tuple, cast
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Optional, Tuple, cast
 
-from .models import ChatMessage
+from .models import ChatMessage, ChatRequest
 from app.core.prompts import DEFAULT_SYSTEM_PROMPT
 from app.core.settings import settings
 
@@ -203,8 +204,90 @@ def normalize_ollama_options(
     return out, host
 
 
+def _options_as_dict(raw: Any) -> Dict[str, Any]:
+    """Options als Dict: Mapping direkt, Pydantic-Modelle via model_dump(), sonst leer."""
+    if raw is None:
+        return {}
+    if isinstance(raw, Mapping):
+        return dict(cast(Mapping[str, Any], raw))
+    dump = getattr(raw, "model_dump", None)
+    if callable(dump):
+        try:
+            return dict(cast(Mapping[str, Any], dump()))
+        except Exception:
+            return {}
+    return {}
+
+
+@dataclass
+class NormalizedChatRequest:
+    """Einmalig normalisierte Sicht auf einen ChatRequest, die alle Stufen teilen.
+
+    - messages: frische Liste von {role, content}-Dicts (darf von den Stufen verändert werden)
+    - options: Options als Dict (unabhängig davon, ob Dict oder ChatOptions übergeben wurde)
+    - session_id: top-level session_id oder options.session_id
+    """
+    messages: List[Dict[str, str]]
+    options: Dict[str, Any]
+    model: Optional[str]
+    session_id: Optional[str]
+    profile_id: Optional[str]
+    eval_mode: bool = False
+    unrestricted_mode: bool = False
+
+    @property
+    def mode(self) -> str:
+        return "unrestricted" if self.unrestricted_mode else ("eval" if self.eval_mode else "default")
+
+    def last_user(self, messages: Optional[List[Dict[str, str]]] = None) -> str:
+        for m in reversed(self.messages if messages is None else messages):
+            if m.get("role") == "user":
+                return m.get("content", "")
+        return ""
+
+
+def normalize_chat_request(
+    request: ChatRequest,
+    *,
+    eval_mode: Optional[bool] = None,
+    unrestricted_mode: Optional[bool] = None,
+) -> NormalizedChatRequest:
+    """Normalisiert Nachrichten, Options, Session und Modus-Flags in einem Durchgang.
+
+    Explizit übergebene Flags haben Vorrang vor den Feldern im Request-Body.
+    """
+    messages: List[Dict[str, str]] = []
+    for m in request.messages:
+        if isinstance(m, dict):
+            messages.append({"role": m.get("role", "user"), "content": m.get("content", "")})
+        else:
+            messages.append({"role": getattr(m, "role", "user"), "content": getattr(m, "content", "")})
+
+    options = _options_as_dict(getattr(request, "options", None))
+    sid_top = getattr(request, "session_id", None)
+    sid_opt = options.get("session_id")
+    sid_val = sid_top or (sid_opt if isinstance(sid_opt, str) else None)
+    session_id = str(sid_val) if isinstance(sid_val, str) and sid_val else None
+
+    if eval_mode is None:
+        eval_mode = bool(getattr(request, "eval_mode", False))
+    if unrestricted_mode is None:
+        unrestricted_mode = bool(getattr(request, "unrestricted_mode", False))
+    return NormalizedChatRequest(
+        messages=messages,
+        options=options,
+        model=getattr(request, "model", None),
+        session_id=session_id,
+        profile_id=getattr(request, "profile_id", None),
+        eval_mode=bool(eval_mode),
+        unrestricted_mode=bool(unrestricted_mode),
+    )
+
+
 __all__ = [
     "get_system_prompt",
     "ensure_system_message",
     "normalize_ollama_options",
+    "NormalizedChatRequest",
+    "normalize_chat_request",
 ]
\ No newline at end of file
@@ -0,0 +1,100 @@
+"""
+Gestufte Prompt-Zusammenstellung für /chat und /chat/stream.
+
+- PromptContext: Zustand einer Anfrage (normalisierter Request, aktuelle Nachrichtenliste,
+  Ollama-Options/Host, Block-Flag, Dauer je Stufe in ms, Berichte zu Token-Budget und Präfix,
+  vom Memory eingefügte Turns)
+- PipelineStage: Name, async Funktion und optionales Prädikat; trifft das Prädikat nicht zu,
+  wird die Stufe ohne Zeitmessung/Allokation übersprungen
+- PromptPipeline: führt die Stufen der Reihe nach aus, bricht nach einem Block ab und
+  meldet jede Dauer zusätzlich an app.services.offload (Stufe "prompt.<name>")
+
+Die konkreten Stufen liegen in app/api/chat.py (dort werden Settings/Hooks zur Laufzeit
+aufgelöst, damit sie in Tests austauschbar bleiben).
+"""
+from __future__ import annotations
+
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from ..services.offload import record_stage
+from .chat_helpers import NormalizedChatRequest
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PromptContext:
+    request: NormalizedChatRequest
+    messages: List[Dict[str, str]]
+    request_id: Optional[str] = None
+    stream: bool = False
+    options: Dict[str, Any] = field(default_factory=dict[str, Any])
+    host: str = ""
+    blocked: bool = False
+    timings: Dict[str, float] = field(default_factory=dict[str, float])
+    budget: Optional[Dict[str, Any]] = None
+    prefix: Optional[Dict[str, Any]] = None
+    # Turns, die die Memory-Stufe vor die Nachrichten gestellt hat (Abgleich mit dem Legacy-Session-Memory)
+    memory_turns: List[Dict[str, str]] = field(default_factory=list[Dict[str, str]])
+
+
+StageFn = Callable[[PromptContext], Awaitable[None]]
+StagePredicate = Callable[[PromptContext], bool]
+
+
+@dataclass(frozen=True)
+class PipelineStage:
+    name: str
+    run: StageFn
+    applies: Optional[StagePredicate] = None
+
+
+class PromptPipeline:
+    """Geordnete, austauschbare Folge von PipelineStage-Objekten."""
+
+    def __init__(self, stages: Iterable[PipelineStage]) -> None:
+        self.stages: Tuple[PipelineStage, ...] = tuple(stages)
+
+    @property
+    def names(self) -> List[str]:
+        return [st.name for st in self.stages]
+
+    def with_stage(self, stage: PipelineStage, *, after: Optional[str] = None) -> "PromptPipeline":
+        """Neue Pipeline mit zusätzlicher Stufe (ans Ende oder hinter `after`);
+        gleichnamige Stufen werden ersetzt."""
+        stages = [st for st in self.stages if st.name != stage.name]
+        if after is None:
+            stages.append(stage)
+        else:
+            pos = next((i for i, st in enumerate(stages) if st.name == after), None)
+            if pos is None:
+                raise KeyError(after)
+            stages.insert(pos + 1, stage)
+        return PromptPipeline(stages)
+
+    def without(self, name: str) -> "PromptPipeline":
+        return PromptPipeline(st for st in self.stages if st.name != name)
+
+    async def run(self, ctx: PromptContext) -> PromptContext:
+        for st in self.stages:
+            if ctx.blocked:
+                break
+            if st.applies is not None and not st.applies(ctx):
+                continue
+            t0 = time.perf_counter()
+            try:
+                await st.run(ctx)
+            finally:
+                ms = (time.perf_counter() - t0) * 1000.0
+                ctx.timings[st.name] = ms
+                record_stage(f"prompt.{st.name}", ms)
+        if logger.isEnabledFor(logging.DEBUG):
+            parts = " ".join(f"{k}={v:.2f}ms" for k, v in ctx.timings.items())
+            logger.debug(f"Prompt-Pipeline rid={ctx.request_id} blocked={ctx.blocked} {parts}")
+        return ctx
+
+
+__all__ = ["PromptContext", "PipelineStage", "PromptPipeline"]
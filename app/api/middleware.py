@@ -0,0 +1,256 @@
+"""
+Reine ASGI-Middlewares für Request-Kontext und Rate-Limit.
+
+Ersetzen die früheren `@app.middleware("http")`-/BaseHTTPMiddleware-Varianten: kein
+Request-/Response-Objekt je Aufruf, keine zusätzliche Task/Queue für den Body. Header werden
+direkt beim `http.response.start`-Event ergänzt; die Konfiguration (Header-Namen, Pfad-/IP-Mengen,
+Limits) wird einmal beim Anlegen der Middleware berechnet.
+
+- RequestContextMiddleware: Request-ID (aus Header oder `req-<ms>`), `scope["state"]`
+  (request_id, t_start), Log-Zeile, HTTP-Metriken; wandelt durchgereichte HTTPException in
+  JSON-Antworten um (Exception-Header + Request-ID)
+- RateLimitMiddleware: Token-Bucket pro Client-IP (app.services.rate_limit, optional im
+  gemeinsamen Zustand aller Worker – app.services.shared_state); 429 mit
+  Retry-After/X-RateLimit-*, sonst X-RateLimit-Limit/-Remaining/-Window an der Antwort
+"""
+from __future__ import annotations
+
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Mapping, MutableMapping, Optional, Tuple
+
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+
+from ..services import metrics as _metrics
+from ..services.offload import run_blocking
+from ..services.rate_limit import SharedTokenBucket, TokenBucketLimiter, retry_after_header
+from ..services.shared_state import SharedState
+
+# Logger-Name wie zuvor (Request-Logs kamen aus app.main)
+logger = logging.getLogger("app.main")
+
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+ASGIApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+RouteLabel = Callable[[str], str]
+
+RATE_LIMIT_DETAIL = "Rate limit exceeded. Bitte später erneut versuchen."
+
+
+def _header(scope: Scope, *names: bytes) -> Optional[str]:
+    """Ersten vorhandenen Header-Wert (Namen in Kleinbuchstaben, Reihenfolge = Priorität)."""
+    found: Dict[bytes, bytes] = {}
+    for key, value in scope.get("headers") or ():
+        if key in names and key not in found:
+            found[key] = value
+    for name in names:
+        value = found.get(name)
+        if value:
+            return value.decode("latin-1")
+    return None
+
+
+def _set_header(headers: List[Tuple[bytes, bytes]], name: bytes, value: bytes) -> None:
+    """Header ersetzen bzw. anhängen (`name` in Kleinbuchstaben)."""
+    headers[:] = [(k, v) for (k, v) in headers if k.lower() != name]
+    headers.append((name, value))
+
+
+class RequestContextMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        *,
+        header_name: str = "X-Request-ID",
+        log_json: bool = False,
+        metrics_enabled: bool = True,
+        route_label: Optional[RouteLabel] = None,
+    ) -> None:
+        self.app = app
+        self.header_name = header_name
+        self._header_key = header_name.lower().encode("latin-1")
+        # Lookup: konfigurierter Header, danach die übliche Schreibweise X-Request-Id
+        self._lookup = tuple(dict.fromkeys((self._header_key, b"x-request-id")))
+        self.log_json = bool(log_json)
+        self.metrics_enabled = bool(metrics_enabled)
+        self.route_label: RouteLabel = route_label or (lambda path: path)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        rid = _header(scope, *self._lookup) or f"req-{int(time.time()*1000)}"
+        rid_raw = rid.encode("latin-1", "replace")
+        path: str = scope.get("path", "")
+        method: str = scope.get("method", "GET")
+        start = time.time()
+        # request.state teilt sich dieses Dict (Handler setzen dort z. B. chat_mode)
+        state = scope.setdefault("state", {})
+        state["request_id"] = rid
+        # Startzeitpunkt für Server-Timing (Phase "parse" = bis zum Handler)
+        state["t_start"] = time.perf_counter()
+
+        route = self.route_label(path) if self.metrics_enabled else ""
+        if self.metrics_enabled:
+            _metrics.HTTP_IN_FLIGHT.inc(route)
+        started = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+                status_code = int(message["status"])
+                headers = list(message.get("headers") or [])
+                _set_header(headers, self._header_key, rid_raw)
+                message["headers"] = headers
+                self._finish(state, route, method, path, status_code, start, rid)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as exc:
+            elapsed = time.time() - start
+            duration_ms = int(elapsed * 1000)
+            status_code = exc.status_code if isinstance(exc, HTTPException) else 500
+            if self.metrics_enabled and not started:
+                self._observe(state, route, method, status_code, elapsed)
+            if self.log_json:
+                logger.exception(json.dumps({"event": "error", "path": path, "request_id": rid, "duration_ms": duration_ms, "error": str(exc)}, ensure_ascii=False))
+            else:
+                logger.exception(f"Fehler bei {path} rid={rid}: {exc}")
+            # HTTPException in eine reguläre Antwort umwandeln (Exception-Header + Request-ID)
+            if isinstance(exc, HTTPException) and not started:
+                headers: Dict[str, str] = {self.header_name: rid}
+                exc_headers: Mapping[str, str] = exc.headers or {}
+                for key, value in exc_headers.items():
+                    headers[key] = value
+                response = JSONResponse(status_code=exc.status_code, content={"detail": exc.detail}, headers=headers)
+                await response(scope, receive, send)
+                return
+            raise
+        finally:
+            if self.metrics_enabled:
+                _metrics.HTTP_IN_FLIGHT.dec(route)
+
+    def _observe(self, state: MutableMapping[str, Any], route: str, method: str, status_code: int, seconds: float) -> None:
+        _metrics.HTTP_REQUESTS.inc(route, method, str(status_code))
+        _metrics.HTTP_DURATION.observe(seconds, route, str(state.get("chat_mode", "none")))
+
+    def _finish(self, state: MutableMapping[str, Any], route: str, method: str, path: str, status_code: int, start: float, rid: str) -> None:
+        elapsed = time.time() - start
+        duration_ms = int(elapsed * 1000)
+        if self.metrics_enabled:
+            self._observe(state, route, method, status_code, elapsed)
+        if self.log_json:
+            logger.info(
+                json.dumps({
+                    "event": "request",
+                    "path": path,
+                    "method": method,
+                    "status": status_code,
+                    "duration_ms": duration_ms,
+                    "request_id": rid,
+                }, ensure_ascii=False)
+            )
+        else:
+            logger.info(f"{method} {path} -> {status_code} [{duration_ms} ms] rid={rid}")
+
+
+class RateLimitMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        *,
+        requests_per_window: int,
+        burst: int = 0,
+        window_sec: float = 60.0,
+        trusted_ips: Iterable[str] = (),
+        exempt_paths: Iterable[str] = (),
+        max_keys: int = 10000,
+        idle_ttl: Optional[float] = None,
+        shared_state: Optional[SharedState] = None,
+        metrics_enabled: bool = False,
+        route_label: Optional[RouteLabel] = None,
+    ) -> None:
+        self.app = app
+        self.window = max(1e-3, float(window_sec))
+        self.capacity = max(1, int(requests_per_window))
+        self.burst = max(0, int(burst))
+        self.limit = self.capacity + self.burst
+        self.trusted_ips = frozenset(trusted_ips)
+        self.exempt_paths = frozenset(exempt_paths)
+        self.metrics_enabled = bool(metrics_enabled)
+        self.route_label: RouteLabel = route_label or (lambda path: path)
+        # Bucket-Größe = Limit, Auffüllung = requests_per_window je Fenster
+        self.limiter = TokenBucketLimiter(
+            self.limit,
+            self.capacity / self.window,
+            max_keys=max_keys,
+            idle_ttl=idle_ttl,
+            on_evict=self._on_evict if self.metrics_enabled else None,
+        )
+        # Gemeinsamer Zustand (mehrere Worker): gleiche Rechnung, Bucket in SHARED_STATE_BACKEND
+        self.shared: Optional[SharedTokenBucket] = None
+        if shared_state is not None:
+            self.shared = SharedTokenBucket(shared_state, self.limit, self.capacity / self.window, idle_ttl=idle_ttl)
+        # Konstante Header-Werte einmalig kodieren
+        self._limit_raw = str(self.limit).encode("latin-1")
+        self._window_raw = str(int(self.window)).encode("latin-1")
+        self._reject_headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Window": str(int(self.window)),
+        }
+
+    @staticmethod
+    def _on_evict(reason: str) -> None:
+        _metrics.RATE_LIMIT_EVICTIONS.inc(reason)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope.get("path", "") in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+        client = scope.get("client")
+        client_host = client[0] if client else "unknown"
+        if client_host in self.trusted_ips:
+            await self.app(scope, receive, send)
+            return
+
+        if self.shared is not None:
+            decision = await run_blocking(self.shared.acquire, client_host)
+        else:
+            decision = self.limiter.acquire(client_host)
+        if self.metrics_enabled and self.shared is None:
+            _metrics.RATE_LIMIT_KEYS.set(len(self.limiter))
+
+        if not decision.allowed:
+            if self.metrics_enabled:
+                _metrics.RATE_LIMIT_REJECTIONS.inc(self.route_label(scope.get("path", "")))
+            headers = {"Retry-After": retry_after_header(decision.retry_after), **self._reject_headers}
+            response = JSONResponse(
+                status_code=429,
+                content={"detail": RATE_LIMIT_DETAIL},
+                headers=headers,
+            )
+            await response(scope, receive, send)
+            return
+
+        remaining_raw = str(decision.remaining).encode("latin-1")
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers") or [])
+                _set_header(headers, b"x-ratelimit-limit", self._limit_raw)
+                _set_header(headers, b"x-ratelimit-remaining", remaining_raw)
+                _set_header(headers, b"x-ratelimit-window", self._window_raw)
+                message["headers"] = headers
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+__all__ = ["RequestContextMiddleware", "RateLimitMiddleware", "RATE_LIMIT_DETAIL"]
@@ -57,6 +57,9 @@ class ChatRequest(BaseModel):
     profile_id: Optional[str] = None
     # Optional: Session-ID für die Sitzungs-Memory
     session_id: Optional[str] = None
+    # Modus-Flags (vorher separat aus dem Roh-JSON gelesen)
+    eval_mode: bool = False
+    unrestricted_mode: bool = False
 
     @field_validator("messages", mode="before")
     @classmethod
@@ -81,9 +84,13 @@ class ChatRequest(BaseModel):
                 out.append(m)
             elif isinstance(m, dict):
                 mm = cast(Dict[Any, Any], m)
-                role = str(mm.get("role", "user"))
-                content = str(mm.get("content", ""))
-                out.append({"role": role, "content": content})
+                role = mm.get("role", "user")
+                content = mm.get("content", "")
+                if len(mm) == 2 and type(role) is str and type(content) is str:
+                    # Häufigster Fall (frisch geparstes JSON): ohne Kopie übernehmen
+                    out.append(cast(Dict[str, str], mm))
+                else:
+                    out.append({"role": str(role), "content": str(content)})
             else:
                 role = str(getattr(m, "role", "user"))
                 content = str(getattr(m, "content", ""))
@@ -2,13 +2,21 @@ from __future__ import annotations
 
 import asyncio
 import json
-from collections import deque
+import os
+import struct
+import time
+from collections import OrderedDict, deque
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Deque, Dict, Iterable, List, Mapping, Optional
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, List, Mapping, Optional, Sequence, Tuple, TypeVar, cast
 
 from .settings import settings
 
+if TYPE_CHECKING:  # pragma: no cover
+    from ..services.shared_state import SharedState
+
+T = TypeVar("T")
+
 
 @dataclass
 class _Turn:
@@ -19,6 +27,26 @@ class _Turn:
         return {"role": self.role, "content": self.content}
 
 
+def tail_start(items: Sequence[T], max_chars: int, size: Callable[[T], int]) -> int:
+    """Start-Index des längsten Suffixes mit Gesamtgröße <= max_chars (0 = alles passt).
+
+    Entspricht "von links entfernen, bis das Budget passt", läuft aber in einem Durchgang von
+    rechts mit laufender Summe (O(n) statt wiederholtem Aufsummieren und pop(0)).
+    """
+    if max_chars <= 0:
+        return 0
+    total = 0
+    for i in range(len(items) - 1, -1, -1):
+        total += size(items[i])
+        if total > max_chars:
+            return i + 1
+    return 0
+
+
+def _turn_chars(t: _Turn) -> int:
+    return len(t.content)
+
+
 class MemoryStore:
     async def append(self, session_id: str, role: str, content: str) -> None:  # pragma: no cover - interface
         raise NotImplementedError
@@ -29,87 +57,352 @@ class MemoryStore:
     async def clear(self, session_id: str) -> None:  # pragma: no cover - interface
         raise NotImplementedError
 
+    def session_count(self) -> Optional[int]:
+        """Anzahl gespeicherter Sessions (None = unbekannt); für /metrics."""
+        return None
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Abgelaufene Sessions entfernen (Idle-TTL); liefert die Anzahl. Standard: nichts zu tun."""
+        return 0
+
+    def stats(self) -> Optional[Dict[str, float]]:
+        """Belegung (sessions/turns/chars/bytes/evicted_*) für /metrics; None = nicht erfasst."""
+        return None
+
+    async def get_summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Laufende Zusammenfassung der Session (app.core.memory_summary); None = keine/nicht unterstützt."""
+        return None
+
+    async def set_summary(self, session_id: str, data: Dict[str, Any]) -> None:
+        """Zusammenfassung speichern; Standard: nicht persistiert."""
+        return None
+
+    async def aclose(self) -> None:
+        """Hintergrund-Ressourcen freigeben (Shutdown); Standard: nichts zu tun."""
+        return None
+
+
+class _Session:
+    __slots__ = ("turns", "chars", "nbytes", "last_used", "summary")
+
+    def __init__(self, now: float) -> None:
+        self.turns: Deque[_Turn] = deque()
+        self.chars = 0
+        self.nbytes = 0
+        self.last_used = now
+        self.summary: Optional[Dict[str, Any]] = None
+
+
+def _turn_bytes(t: _Turn) -> int:
+    return len(t.content.encode("utf-8")) + len(t.role)
+
 
 class InMemoryStore(MemoryStore):
-    def __init__(self) -> None:
-        self._by_id: Dict[str, Deque[_Turn]] = {}
-        self._locks: Dict[str, asyncio.Lock] = {}
-        self._global_lock = asyncio.Lock()
+    """Prozesslokaler Store mit Budgets.
 
-    def _get_lock(self, session_id: str) -> asyncio.Lock:
-        # Double-checked pattern with a global lock to create per-session locks
-        if session_id in self._locks:
-            return self._locks[session_id]
-        # Slow path
-        async def _ensure() -> asyncio.Lock:
-            async with self._global_lock:
-                if session_id not in self._locks:
-                    self._locks[session_id] = asyncio.Lock()
-                return self._locks[session_id]
-        # We cannot await here; ensure upfront caller uses _ensure_lock
-        # Fallback: return a global lock for early use (rare)
-        return self._global_lock
+    - Sessions in LRU-Reihenfolge; über MEMORY_MAX_SESSIONS bzw. MEMORY_MAX_TOTAL_CHARS werden die
+      am längsten ungenutzten Sessions verdrängt (nie die gerade geschriebene)
+    - sweep(): entfernt Sessions, die länger als MEMORY_IDLE_TTL_SEC unbenutzt sind
+      (periodisch über MemorySweeper)
+    - Zeichen/Bytes je Session werden mitgezählt (Budget + Gauges), kein Aufsummieren je Request
 
-    async def _ensure_lock(self, session_id: str) -> asyncio.Lock:
-        async with self._global_lock:
-            lock = self._locks.get(session_id)
-            if lock is None:
-                lock = asyncio.Lock()
-                self._locks[session_id] = lock
-            return lock
+    Alle Zugriffe laufen ohne `await` zwischen Lesen und Schreiben im Event-Loop, daher ohne
+    Locks je Session (die früheren asyncio.Locks blieben auch nach clear() bestehen).
+    """
 
-    async def append(self, session_id: str, role: str, content: str) -> None:
-        lock = await self._ensure_lock(session_id)
-        async with lock:
-            existing = self._by_id.get(session_id)
-            if existing is None:
-                q: Deque[_Turn] = deque()
-                self._by_id[session_id] = q
+    def __init__(
+        self,
+        *,
+        max_sessions: Optional[int] = None,
+        max_total_chars: Optional[int] = None,
+        idle_ttl: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._by_id: "OrderedDict[str, _Session]" = OrderedDict()
+        self._max_sessions = max_sessions
+        self._max_total_chars = max_total_chars
+        self._idle_ttl = idle_ttl
+        self._clock = clock
+        self._total_chars = 0
+        self._total_bytes = 0
+        self._total_turns = 0
+        self.evictions: Dict[str, int] = {"sessions": 0, "chars": 0, "idle": 0}
+
+    # Budgets: explizite Werte (Tests) oder aktuelle Settings
+    @property
+    def max_sessions(self) -> int:
+        val = self._max_sessions if self._max_sessions is not None else getattr(settings, "MEMORY_MAX_SESSIONS", 10000)
+        return max(0, int(val))
+
+    @property
+    def max_total_chars(self) -> int:
+        val = self._max_total_chars if self._max_total_chars is not None else getattr(settings, "MEMORY_MAX_TOTAL_CHARS", 0)
+        return max(0, int(val))
+
+    @property
+    def idle_ttl(self) -> float:
+        val = self._idle_ttl if self._idle_ttl is not None else getattr(settings, "MEMORY_IDLE_TTL_SEC", 0.0)
+        return max(0.0, float(val))
+
+    def _drop_turn(self, sess: _Session) -> None:
+        t = sess.turns.popleft()
+        n, nb = len(t.content), _turn_bytes(t)
+        sess.chars -= n
+        sess.nbytes -= nb
+        self._total_chars -= n
+        self._total_bytes -= nb
+        self._total_turns -= 1
+
+    def _drop_session(self, session_id: str, reason: Optional[str] = None) -> None:
+        sess = self._by_id.pop(session_id, None)
+        if sess is None:
+            return
+        self._total_chars -= sess.chars
+        self._total_bytes -= sess.nbytes
+        self._total_turns -= len(sess.turns)
+        if reason is not None:
+            self.evictions[reason] += 1
+
+    def _enforce_budgets(self, keep: str) -> None:
+        max_sessions, max_chars = self.max_sessions, self.max_total_chars
+        while self._by_id:
+            if max_sessions > 0 and len(self._by_id) > max_sessions:
+                reason = "sessions"
+            elif max_chars > 0 and self._total_chars > max_chars:
+                reason = "chars"
             else:
-                q = existing
-            q.append(_Turn(role=role, content=content))
-            # Trim to max turns (hard cap)
-            max_turns = max(0, int(getattr(settings, "MEMORY_MAX_TURNS", 20)))
-            if max_turns > 0:
-                while len(q) > max_turns:
-                    q.popleft()
-            # Trim by chars (soft cap): drop from left until under budget
-            max_chars = max(0, int(getattr(settings, "MEMORY_MAX_CHARS", 8000)))
-            if max_chars > 0:
-                def _sum_chars(it: Iterable[_Turn]) -> int:
-                    return sum(len(t.content) for t in it)
-                while q and _sum_chars(q) > max_chars:
-                    q.popleft()
+                break
+            oldest = next(iter(self._by_id))
+            if oldest == keep:
+                # nur noch die aktuelle Session übrig bzw. vorne: nicht verdrängen
+                if len(self._by_id) == 1:
+                    break
+                self._by_id.move_to_end(keep)
+                continue
+            self._drop_session(oldest, reason)
+
+    async def append(self, session_id: str, role: str, content: str) -> None:
+        now = self._clock()
+        sess = self._by_id.get(session_id)
+        if sess is None:
+            sess = _Session(now)
+            self._by_id[session_id] = sess
+        else:
+            self._by_id.move_to_end(session_id)
+            sess.last_used = now
+        turn = _Turn(role=role, content=content)
+        nb = _turn_bytes(turn)
+        sess.turns.append(turn)
+        sess.chars += len(content)
+        sess.nbytes += nb
+        self._total_chars += len(content)
+        self._total_bytes += nb
+        self._total_turns += 1
+        # Trim to max turns (hard cap)
+        max_turns = max(0, int(getattr(settings, "MEMORY_MAX_TURNS", 20)))
+        if max_turns > 0:
+            while len(sess.turns) > max_turns:
+                self._drop_turn(sess)
+        # Trim by chars (soft cap): drop from left until under budget
+        max_chars = max(0, int(getattr(settings, "MEMORY_MAX_CHARS", 8000)))
+        if max_chars > 0:
+            while sess.turns and sess.chars > max_chars:
+                self._drop_turn(sess)
+        self._enforce_budgets(keep=session_id)
 
     async def get_window(self, session_id: str, max_chars: int, max_turns: int) -> List[Dict[str, str]]:
-        lock = await self._ensure_lock(session_id)
-        async with lock:
-            q: Optional[Deque[_Turn]] = self._by_id.get(session_id)
-            if not q:
-                return []
-            # Work on a copy to compute window
-            items: List[_Turn] = list(q)
-        # Compute window outside lock
+        sess = self._by_id.get(session_id)
+        if sess is None or not sess.turns:
+            return []
+        self._by_id.move_to_end(session_id)
+        sess.last_used = self._clock()
+        # Work on a copy to compute window
+        items: List[_Turn] = list(sess.turns)
         items = items[-max_turns:] if max_turns > 0 else items
         # Trim from left by chars
-        def _sum_chars_list(lst: List[_Turn]) -> int:
-            return sum(len(t.content) for t in lst)
-        while items and max_chars > 0 and _sum_chars_list(items) > max_chars:
-            items.pop(0)
-        return [t.to_message() for t in items]
+        start = tail_start(items, max_chars, _turn_chars)
+        return [t.to_message() for t in items[start:]]
 
     async def clear(self, session_id: str) -> None:
-        lock = await self._ensure_lock(session_id)
-        async with lock:
-            self._by_id.pop(session_id, None)
+        self._drop_session(session_id)
+
+    async def get_summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        sess = self._by_id.get(session_id)
+        return dict(sess.summary) if sess is not None and sess.summary else None
+
+    async def set_summary(self, session_id: str, data: Dict[str, Any]) -> None:
+        # Zusammenfassung lebt und stirbt mit der Session (LRU/Idle-Verdrängung)
+        sess = self._by_id.get(session_id)
+        if sess is not None:
+            sess.summary = dict(data)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Sessions entfernen, die länger als die Idle-TTL unbenutzt sind; liefert die Anzahl."""
+        ttl = self.idle_ttl
+        if ttl <= 0:
+            return 0
+        cutoff = (self._clock() if now is None else now) - ttl
+        removed = 0
+        # LRU-Reihenfolge: abgelaufene Sessions liegen vorne
+        while self._by_id:
+            sid, sess = next(iter(self._by_id.items()))
+            if sess.last_used > cutoff:
+                break
+            self._drop_session(sid, "idle")
+            removed += 1
+        return removed
+
+    def session_count(self) -> Optional[int]:
+        return len(self._by_id)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "sessions": float(len(self._by_id)),
+            "turns": float(self._total_turns),
+            "chars": float(self._total_chars),
+            "bytes": float(self._total_bytes),
+            **{f"evicted_{k}": float(v) for k, v in self.evictions.items()},
+        }
+
+
+class MemorySweeper:
+    """Hintergrund-Task: ruft periodisch `sweep()` des aktiven Stores auf (Idle-TTL)."""
+
+    def __init__(self, interval: float = 60.0) -> None:
+        self.interval = max(0.05, float(interval))
+        self.runs = 0
+        self.removed = 0
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def run_once(self) -> int:
+        store = _STORE
+        removed = store.sweep() if store is not None else 0
+        self.runs += 1
+        self.removed += removed
+        return removed
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.run_once()
+            except Exception:
+                pass
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+
+class SharedMemoryStore(MemoryStore):
+    """Memory im gemeinsamen Zustand (SHARED_STATE_BACKEND); ein Schlüssel `mem:<id>` je Session.
+
+    Jedes append ist ein atomares Read-Modify-Write inkl. Trim, läuft im Thread-Pool; so sehen
+    alle Worker-Prozesse denselben Verlauf.
+    """
+
+    def __init__(self, state: "SharedState") -> None:
+        self.state = state
+
+    @staticmethod
+    def _key(session_id: str) -> str:
+        return f"mem:{session_id}"
+
+    @staticmethod
+    def _summary_key(session_id: str) -> str:
+        return f"msum:{session_id}"
+
+    def _append_sync(self, session_id: str, role: str, content: str) -> None:
+        max_turns = max(0, int(getattr(settings, "MEMORY_MAX_TURNS", 20)))
+        max_chars = max(0, int(getattr(settings, "MEMORY_MAX_CHARS", 8000)))
+
+        def _step(cur: Any) -> Tuple[List[List[str]], None]:
+            turns: List[List[str]] = list(cur or [])
+            turns.append([role, content])
+            if max_turns > 0 and len(turns) > max_turns:
+                turns = turns[-max_turns:]
+            start = tail_start(turns, max_chars, lambda t: len(t[1]))
+            return turns[start:], None
+
+        self.state.update(self._key(session_id), _step)
+
+    async def append(self, session_id: str, role: str, content: str) -> None:
+        from ..services.offload import run_blocking
+
+        await run_blocking(self._append_sync, session_id, role, content)
+
+    async def get_window(self, session_id: str, max_chars: int, max_turns: int) -> List[Dict[str, str]]:
+        from ..services.offload import run_blocking
+
+        rows: List[Sequence[str]] = await run_blocking(self.state.get, self._key(session_id)) or []
+        items = [_Turn(role=str(r), content=str(c)) for r, c in rows]
+        items = items[-max_turns:] if max_turns > 0 else items
+        start = tail_start(items, max_chars, _turn_chars)
+        return [t.to_message() for t in items[start:]]
+
+    async def clear(self, session_id: str) -> None:
+        from ..services.offload import run_blocking
+
+        await run_blocking(self.state.delete, self._key(session_id), self._summary_key(session_id))
+
+    async def get_summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        from ..services.offload import run_blocking
+
+        raw = await run_blocking(self.state.get, self._summary_key(session_id))
+        return dict(cast(Dict[str, Any], raw)) if isinstance(raw, dict) else None
+
+    async def set_summary(self, session_id: str, data: Dict[str, Any]) -> None:
+        from ..services.offload import run_blocking
+
+        await run_blocking(self.state.set, self._summary_key(session_id), dict(data))
+
+
+_IDX_ENTRY = struct.Struct("<Q")
+
+
+def _idx_path(p: Path) -> Path:
+    return p.with_suffix(".idx")
+
+
+def _summary_path(p: Path) -> Path:
+    return p.with_suffix(".summary.json")
+
+
+def _replace_atomic(path: Path, data: bytes) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
 
 
 class JsonlStore(MemoryStore):
+    """Eine JSONL-Datei je Session plus Offset-Index (`session_<id>.idx`, uint64 je Zeile).
+
+    - get_window liest nur die letzten `max_turns` Zeilen: Offsets aus dem Index-Ende, dann ab dem
+      ersten benötigten Offset bis Dateiende (Laufzeit unabhängig von der Kampagnenlänge)
+    - Fehlt der Index oder passt er nicht zur Datei (Altbestand, externe Änderung), wird er einmal
+      per Scan neu aufgebaut
+    - Kompaktierung: übersteigt die Zeilenzahl MEMORY_MAX_TURNS × MEMORY_JSONL_COMPACT_FACTOR, werden
+      Turns außerhalb jedes möglichen Fensters verworfen (atomar per Ersetzen; amortisiert O(1) je append)
+    - Alle Dateizugriffe laufen im Thread-Pool (app.services.offload), serialisiert je Session
+    """
+
     def __init__(self, base_dir: Path) -> None:
         self.base_dir = base_dir
         self.base_dir.mkdir(parents=True, exist_ok=True)
         self._locks: Dict[str, asyncio.Lock] = {}
         self._global_lock = asyncio.Lock()
+        self.compactions = 0
+        self.index_rebuilds = 0
 
     async def _ensure_lock(self, session_id: str) -> asyncio.Lock:
         async with self._global_lock:
@@ -123,30 +416,143 @@ class JsonlStore(MemoryStore):
         safe = "".join(ch for ch in session_id if ch.isalnum() or ch in ("-", "_"))
         return self.base_dir / f"session_{safe}.jsonl"
 
+    # --- synchron (Thread-Pool) ---
+
+    def _rebuild_index(self, p: Path) -> int:
+        offsets = bytearray()
+        count = 0
+        with p.open("rb") as f:
+            pos = 0
+            for line in f:
+                if line.strip():
+                    offsets += _IDX_ENTRY.pack(pos)
+                    count += 1
+                pos += len(line)
+        _replace_atomic(_idx_path(p), bytes(offsets))
+        self.index_rebuilds += 1
+        return count
+
+    @staticmethod
+    def _index_count(p: Path) -> int:
+        try:
+            return _idx_path(p).stat().st_size // _IDX_ENTRY.size
+        except FileNotFoundError:
+            return -1
+
+    @staticmethod
+    def _tail_offset(p: Path, n: int, count: int) -> int:
+        """Offset der `n`-letzten Zeile laut Index (n <= 0: erste Zeile)."""
+        pos = 0 if n <= 0 or n >= count else count - n
+        with _idx_path(p).open("rb") as f:
+            f.seek(pos * _IDX_ENTRY.size)
+            return int(_IDX_ENTRY.unpack(f.read(_IDX_ENTRY.size))[0])
+
+    def _offset_valid(self, f: Any, offset: int, size: int) -> bool:
+        if offset >= size:
+            return False
+        if offset == 0:
+            return True
+        f.seek(offset - 1)
+        return f.read(1) == b"\n"
+
+    def _append_sync(self, p: Path, line: bytes) -> None:
+        count = self._index_count(p)
+        if count < 0 and p.exists():
+            count = self._rebuild_index(p)
+        with p.open("ab") as f:
+            f.seek(0, os.SEEK_END)
+            offset = f.tell()
+            f.write(line)
+        with _idx_path(p).open("ab") as fi:
+            fi.write(_IDX_ENTRY.pack(offset))
+        keep = max(0, int(getattr(settings, "MEMORY_MAX_TURNS", 20)))
+        factor = float(getattr(settings, "MEMORY_JSONL_COMPACT_FACTOR", 4.0))
+        if keep > 0 and factor > 1.0 and max(count, 0) + 1 > keep * factor:
+            self._compact_sync(p, keep)
+
+    def _compact_sync(self, p: Path, keep: int) -> None:
+        count = self._index_count(p)
+        if count <= keep:
+            return
+        start = self._tail_offset(p, keep, count)
+        with p.open("rb") as f:
+            if not self._offset_valid(f, start, p.stat().st_size):
+                self._rebuild_index(p)
+                return
+            f.seek(start)
+            data = f.read()
+        with _idx_path(p).open("rb") as fi:
+            fi.seek((count - keep) * _IDX_ENTRY.size)
+            raw = fi.read()
+        offsets = bytearray()
+        for (off,) in _IDX_ENTRY.iter_unpack(raw):
+            offsets += _IDX_ENTRY.pack(off - start)
+        # erst Daten, dann Index ersetzen; ein Abbruch dazwischen fällt bei der Prüfung auf
+        _replace_atomic(p, data)
+        _replace_atomic(_idx_path(p), bytes(offsets))
+        self.compactions += 1
+
+    def _tail_sync(self, p: Path, max_turns: int) -> List[bytes]:
+        if not p.exists():
+            return []
+        count = self._index_count(p)
+        if count < 0:
+            count = self._rebuild_index(p)
+        for attempt in range(2):
+            if count <= 0:
+                return []
+            offset = self._tail_offset(p, max_turns, count)
+            with p.open("rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if self._offset_valid(f, offset, size):
+                    f.seek(offset)
+                    lines = [ln for ln in f.read().split(b"\n") if ln.strip()]
+                    # mehr Zeilen als erwartet (z. B. ohne Index angehängt): nur die letzten nehmen
+                    return lines[-max_turns:] if max_turns > 0 else lines
+            if attempt == 0:
+                count = self._rebuild_index(p)
+        return []
+
+    def _read_summary_sync(self, p: Path) -> Optional[Dict[str, Any]]:
+        try:
+            data = json.loads(_summary_path(p).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        return cast(Dict[str, Any], data) if isinstance(data, dict) else None
+
+    def _write_summary_sync(self, p: Path, data: Dict[str, Any]) -> None:
+        _replace_atomic(_summary_path(p), json.dumps(data, ensure_ascii=False).encode("utf-8"))
+
+    def _clear_sync(self, p: Path) -> None:
+        for path in (p, _idx_path(p), _summary_path(p)):
+            try:
+                if path.exists():
+                    path.unlink()
+            except Exception:
+                pass
+
+    # --- async Schnittstelle ---
+
     async def append(self, session_id: str, role: str, content: str) -> None:
+        from ..services.offload import run_blocking
+
         lock = await self._ensure_lock(session_id)
         async with lock:
-            p = self._path(session_id)
-            line = json.dumps({"role": role, "content": content}, ensure_ascii=False)
-            with p.open("a", encoding="utf-8") as f:
-                f.write(line + "\n")
+            line = json.dumps({"role": role, "content": content}, ensure_ascii=False) + "\n"
+            await run_blocking(self._append_sync, self._path(session_id), line.encode("utf-8"))
 
     async def get_window(self, session_id: str, max_chars: int, max_turns: int) -> List[Dict[str, str]]:
+        from ..services.offload import run_blocking
+
         lock = await self._ensure_lock(session_id)
         async with lock:
-            p = self._path(session_id)
-            if not p.exists():
-                return []
-            # Read last N lines efficiently
-            # Simple approach: read all and slice (sufficient for small budgets); can optimize later.
             try:
-                with p.open("r", encoding="utf-8") as f:
-                    lines = f.readlines()
+                lines = await run_blocking(self._tail_sync, self._path(session_id), max_turns)
             except Exception:
                 return []
         # Outside lock: compute window
         turns: List[_Turn] = []
-        for line in lines[-max_turns:]:
+        for line in lines:
             try:
                 obj = json.loads(line)
                 role = str(obj.get("role", "user"))
@@ -155,25 +561,39 @@ class JsonlStore(MemoryStore):
             except Exception:
                 continue
         # Trim by chars
-        def _sum_chars_list(lst: List[_Turn]) -> int:
-            return sum(len(t.content) for t in lst)
-        while turns and max_chars > 0 and _sum_chars_list(turns) > max_chars:
-            turns.pop(0)
-        return [t.to_message() for t in turns]
+        start = tail_start(turns, max_chars, _turn_chars)
+        return [t.to_message() for t in turns[start:]]
 
     async def clear(self, session_id: str) -> None:
+        from ..services.offload import run_blocking
+
         lock = await self._ensure_lock(session_id)
         async with lock:
-            p = self._path(session_id)
-            try:
-                if p.exists():
-                    p.unlink()
-            except Exception:
-                pass
+            await run_blocking(self._clear_sync, self._path(session_id))
+
+    async def get_summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        from ..services.offload import run_blocking
+
+        return await run_blocking(self._read_summary_sync, self._path(session_id))
+
+    async def set_summary(self, session_id: str, data: Dict[str, Any]) -> None:
+        from ..services.offload import run_blocking
+
+        lock = await self._ensure_lock(session_id)
+        async with lock:
+            await run_blocking(self._write_summary_sync, self._path(session_id), dict(data))
+
+    def session_count(self) -> Optional[int]:
+        try:
+            return sum(1 for _ in self.base_dir.glob("session_*.jsonl"))
+        except Exception:
+            return None
 
 
 _STORE: Optional[MemoryStore] = None
 
+memory_sweeper = MemorySweeper(interval=float(getattr(settings, "MEMORY_SWEEP_INTERVAL_SEC", 60.0)))
+
 
 def get_memory_store() -> MemoryStore:
     global _STORE
@@ -186,14 +606,31 @@ def get_memory_store() -> MemoryStore:
         store_kind = getattr(settings, "MEMORY_STORE", "inmemory")
         if store_kind == "jsonl":
             _STORE = JsonlStore(base_dir=getattr(settings, "MEMORY_DIR", Path(".data/memory")))
+        elif store_kind == "sqlite":
+            from .memory_sqlite import SqliteStore
+
+            path = getattr(settings, "MEMORY_SQLITE_PATH", None)
+            if path is None:
+                path = Path(getattr(settings, "MEMORY_DIR", Path(".data/memory"))) / "memory.sqlite3"
+            _STORE = SqliteStore(Path(path))
         else:
-            _STORE = InMemoryStore()
+            from ..services.shared_state import get_shared_state
+
+            # Mit gemeinsamem Zustand (mehrere Worker) ersetzt dieser den prozesslokalen Store
+            shared = get_shared_state()
+            _STORE = SharedMemoryStore(shared) if shared is not None else InMemoryStore()
         return _STORE
     except Exception:
         _STORE = InMemoryStore()
         return _STORE
 
 
+async def close_memory_store() -> None:
+    """Aktiven Store beim Shutdown schließen (z. B. ausstehende SQLite-Batches schreiben)."""
+    if _STORE is not None:
+        await _STORE.aclose()
+
+
 async def compose_with_memory(
     messages: List[Mapping[str, str]],
     session_id: Optional[str],
@@ -204,6 +641,9 @@ async def compose_with_memory(
     """
     Lädt ein Fenster aus der Memory und komponiert es vor die neuen Nachrichten.
     Budgetiert anschließend von links anhand der Zeichenzahl.
+
+    Mit MEMORY_SUMMARY_ENABLED steht die laufende Zusammenfassung als eine System-Nachricht
+    vorne; bereits gefaltete Turns entfallen (app.core.memory_summary).
     """
     if not session_id or not getattr(settings, "MEMORY_ENABLED", True):
         return [dict(m) for m in messages]
@@ -211,14 +651,26 @@ async def compose_with_memory(
         store = get_memory_store()
         mc = max_chars if isinstance(max_chars, int) else int(getattr(settings, "MEMORY_MAX_CHARS", 8000))
         mt = max_turns if isinstance(max_turns, int) else int(getattr(settings, "MEMORY_MAX_TURNS", 20))
-        window = await store.get_window(session_id, max_chars=mc, max_turns=mt)
+        summary_msg: Optional[Dict[str, str]] = None
+        if getattr(settings, "MEMORY_SUMMARY_ENABLED", False):
+            from .memory_summary import summary_message, unsummarised_start
+
+            # ungekürzt laden, damit die Marke der gefalteten Turns im Fenster liegt
+            window = await store.get_window(session_id, max_chars=0, max_turns=mt)
+            state = await store.get_summary(session_id)
+            if state:
+                window = window[unsummarised_start(window, state):]
+                summary_msg = summary_message(state)
+        else:
+            window = await store.get_window(session_id, max_chars=mc, max_turns=mt)
         composed: List[Dict[str, str]] = list(window) + [dict(m) for m in messages]
         # Truncation by chars, left side first
-        def sum_chars(msgs: List[Mapping[str, str]]) -> int:
-            return sum(len(str(m.get("content", ""))) for m in msgs)
-        from typing import cast as _cast, Mapping as _Mapping
-        while composed and mc > 0 and sum_chars(_cast(List[_Mapping[str, str]], composed)) > mc:
-            composed.pop(0)
+        if mc > 0:
+            start = tail_start(composed, mc, lambda m: len(str(m.get("content", ""))))
+            if start:
+                del composed[:start]
+        if summary_msg is not None:
+            composed.insert(0, summary_msg)
         return composed
     except Exception:
         return [dict(m) for m in messages]
@@ -227,7 +679,12 @@ async def compose_with_memory(
 __all__ = [
     "MemoryStore",
     "InMemoryStore",
+    "SharedMemoryStore",
+    "MemorySweeper",
+    "memory_sweeper",
+    "close_memory_store",
     "JsonlStore",
     "get_memory_store",
     "compose_with_memory",
+    "tail_start",
 ]
@@ -0,0 +1,264 @@
+"""
+SQLite-basierter MemoryStore (MEMORY_STORE=sqlite).
+
+- Tabelle `turns(seq INTEGER PRIMARY KEY, session_id, role, content, created)` mit Index
+  `(session_id, seq)`; WAL-Modus, synchronous=NORMAL
+- Ein Writer-Task je Event-Loop sammelt append/delete vieler Requests aus einer Queue und schreibt
+  sie gebündelt in einer Transaktion (bis MEMORY_SQLITE_BATCH_MAX Operationen); append wartet, bis
+  die eigene Zeile committet ist (read-after-write)
+- get_window: eine indizierte Abfrage `ORDER BY seq DESC LIMIT n` im Thread-Pool, Lesen über
+  eigene Verbindungen je Thread (parallel zum Writer dank WAL)
+- Turns außerhalb des Fensters (älter als die letzten MEMORY_MAX_TURNS einer Session) löscht der Writer in
+  derselben Transaktion (MEMORY_SQLITE_PRUNE; false = vollständiger Verlauf bleibt erhalten)
+- delete_session (DSGVO, inkl. Zusammenfassung) und list_sessions
+- session_count (Metriken) liest einen Zähler, den der Writer pflegt; Startwert einmalig aus der Datei. Schreiben
+  mehrere Prozesse in dieselbe Datei, sieht jeder nur die eigenen Änderungen seit dem Start
+- Laufende Zusammenfassung (app.core.memory_summary) in Tabelle `summaries`, ebenfalls über den Writer
+
+Genutzt wird das sqlite3-Modul der Standardbibliothek (wie app.services.shared_state); das
+ORM aus requirements.txt bringt für eine Tabelle mit zwei Abfragen keinen Mehrwert.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, cast
+
+from .memory import MemoryStore, _Turn, _turn_chars, tail_start
+from .settings import settings
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS turns ("
+    " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+    " session_id TEXT NOT NULL,"
+    " role TEXT NOT NULL,"
+    " content TEXT NOT NULL,"
+    " created REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS turns_session_seq ON turns(session_id, seq)",
+    "CREATE TABLE IF NOT EXISTS summaries (session_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL)",
+)
+
+# (op, session_id, role, content, created); op = "append" | "summary" (content = JSON) | "delete" | "flush" (nur Marker)
+_Op = Tuple[str, str, str, str, float]
+
+
+class SqliteStore(MemoryStore):
+    def __init__(self, path: Path, *, batch_max: Optional[int] = None) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.batch_max = max(1, int(batch_max if batch_max is not None else getattr(settings, "MEMORY_SQLITE_BATCH_MAX", 256)))
+        self._write_conn = self._connect()
+        for stmt in _SCHEMA:
+            self._write_conn.execute(stmt)
+        self._write_lock = threading.Lock()
+        self._local = threading.local()
+        self._queue: Optional["asyncio.Queue[Tuple[_Op, asyncio.Future[Any]]]"] = None
+        self._writer: Optional["asyncio.Task[None]"] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.batches = 0
+        self.batched_ops = 0
+        self.pruned = 0
+        self._sessions = int(self._write_conn.execute("SELECT COUNT(DISTINCT session_id) FROM turns").fetchone()[0])
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.path), timeout=5.0, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    # --- synchron (Thread-Pool) ---
+
+    def _write_batch(self, ops: List[_Op]) -> List[Any]:
+        out: List[Any] = []
+        keep = max(0, int(getattr(settings, "MEMORY_MAX_TURNS", 20)))
+        if not bool(getattr(settings, "MEMORY_SQLITE_PRUNE", True)):
+            keep = 0
+        # Sessions dieser Transaktion: vorhanden ja/nein (für den Session-Zähler)
+        present: Dict[str, bool] = {}
+        appended: List[str] = []
+        pruned = 0
+        with self._write_lock:
+            conn = self._write_conn
+            before = self._sessions
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for op, sid, role, content, created in ops:
+                    if op == "append":
+                        if sid not in present:
+                            row = conn.execute("SELECT 1 FROM turns WHERE session_id = ? LIMIT 1", (sid,)).fetchone()
+                            present[sid] = row is not None
+                        if not present[sid]:
+                            present[sid] = True
+                            self._sessions += 1
+                        conn.execute(
+                            "INSERT INTO turns(session_id, role, content, created) VALUES (?, ?, ?, ?)",
+                            (sid, role, content, created),
+                        )
+                        if sid not in appended:
+                            appended.append(sid)
+                        out.append(None)
+                    elif op == "summary":
+                        conn.execute(
+                            "INSERT OR REPLACE INTO summaries(session_id, data, updated) VALUES (?, ?, ?)",
+                            (sid, content, created),
+                        )
+                        out.append(None)
+                    elif op == "flush":
+                        out.append(None)
+                    else:
+                        conn.execute("DELETE FROM summaries WHERE session_id = ?", (sid,))
+                        deleted = conn.execute("DELETE FROM turns WHERE session_id = ?", (sid,)).rowcount
+                        if deleted > 0:
+                            self._sessions -= 1
+                        present[sid] = False
+                        out.append(deleted)
+                if keep > 0:
+                    for sid in appended:
+                        pruned += conn.execute(
+                            "DELETE FROM turns WHERE session_id = ? AND seq <= "
+                            "(SELECT seq FROM turns WHERE session_id = ? ORDER BY seq DESC LIMIT 1 OFFSET ?)",
+                            (sid, sid, keep),
+                        ).rowcount
+                conn.execute("COMMIT")
+            except BaseException:
+                self._sessions = before
+                conn.execute("ROLLBACK")
+                raise
+        self.pruned += pruned
+        self.batches += 1
+        self.batched_ops += sum(1 for op in ops if op[0] != "flush")
+        return out
+
+    def _window_sync(self, session_id: str, max_turns: int) -> List[Tuple[str, str]]:
+        rows = self._reader().execute(
+            "SELECT role, content FROM turns WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+            (session_id, max_turns if max_turns > 0 else -1),
+        ).fetchall()
+        rows.reverse()
+        return rows
+
+    def _summary_sync(self, session_id: str) -> Optional[Dict[str, Any]]:
+        row = self._reader().execute("SELECT data FROM summaries WHERE session_id = ?", (session_id,)).fetchone()
+        if row is None:
+            return None
+        try:
+            data = json.loads(row[0])
+        except ValueError:
+            return None
+        return cast(Dict[str, Any], data) if isinstance(data, dict) else None
+
+    def _list_sync(self, limit: int, offset: int) -> List[Dict[str, Any]]:
+        rows = self._reader().execute(
+            "SELECT session_id, COUNT(*), MIN(created), MAX(created) FROM turns "
+            "GROUP BY session_id ORDER BY MAX(seq) DESC LIMIT ? OFFSET ?",
+            (limit if limit > 0 else -1, max(0, offset)),
+        ).fetchall()
+        return [
+            {"session_id": sid, "turns": int(n), "first_ts": float(first), "last_ts": float(last)}
+            for sid, n, first, last in rows
+        ]
+
+    # --- Writer-Task ---
+
+    def _ensure_writer(self) -> "asyncio.Queue[Tuple[_Op, asyncio.Future[Any]]]":
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._loop is not loop or self._writer is None or self._writer.done():
+            # neuer Loop (z. B. Tests mit asyncio.run) oder Writer beendet: neu aufsetzen
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._writer = loop.create_task(self._run_writer(self._queue))
+        return self._queue
+
+    async def _run_writer(self, queue: "asyncio.Queue[Tuple[_Op, asyncio.Future[Any]]]") -> None:
+        from ..services.offload import run_blocking
+
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < self.batch_max and not queue.empty():
+                batch.append(queue.get_nowait())
+            try:
+                results = await run_blocking(self._write_batch, [op for op, _ in batch])
+            except Exception as exc:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(exc)
+                continue
+            for (_, fut), res in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(res)
+
+    async def _submit(self, op: _Op) -> Any:
+        queue = self._ensure_writer()
+        fut: "asyncio.Future[Any]" = asyncio.get_running_loop().create_future()
+        queue.put_nowait((op, fut))
+        return await fut
+
+    # --- MemoryStore ---
+
+    async def append(self, session_id: str, role: str, content: str) -> None:
+        await self._submit(("append", session_id, role, content, time.time()))
+
+    async def get_window(self, session_id: str, max_chars: int, max_turns: int) -> List[Dict[str, str]]:
+        from ..services.offload import run_blocking
+
+        rows = await run_blocking(self._window_sync, session_id, max_turns)
+        turns = [_Turn(role=str(r), content=str(c)) for r, c in rows]
+        start = tail_start(turns, max_chars, _turn_chars)
+        return [t.to_message() for t in turns[start:]]
+
+    async def delete_session(self, session_id: str) -> int:
+        """Alle Turns einer Session löschen (DSGVO); liefert die Anzahl gelöschter Zeilen."""
+        return int(await self._submit(("delete", session_id, "", "", 0.0)) or 0)
+
+    async def clear(self, session_id: str) -> None:
+        await self.delete_session(session_id)
+
+    async def get_summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        from ..services.offload import run_blocking
+
+        return await run_blocking(self._summary_sync, session_id)
+
+    async def set_summary(self, session_id: str, data: Dict[str, Any]) -> None:
+        await self._submit(("summary", session_id, "", json.dumps(data, ensure_ascii=False), time.time()))
+
+    async def list_sessions(self, limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
+        """Sessions (zuletzt aktive zuerst) mit Anzahl Turns und erstem/letztem Zeitstempel."""
+        from ..services.offload import run_blocking
+
+        return await run_blocking(self._list_sync, limit, offset)
+
+    def session_count(self) -> Optional[int]:
+        # vom Writer gepflegt: keine Abfrage im Event-Loop (wird bei jedem /metrics-Scrape gelesen)
+        return self._sessions
+
+    async def aclose(self) -> None:
+        """Ausstehende Schreibvorgänge abwarten, Writer beenden."""
+        queue, writer = self._queue, self._writer
+        if queue is not None and writer is not None and not writer.done():
+            try:
+                if self._loop is asyncio.get_running_loop():
+                    fut: "asyncio.Future[Any]" = asyncio.get_running_loop().create_future()
+                    # Marker: ist er verarbeitet, ist alles davor committet
+                    queue.put_nowait((("flush", "", "", "", 0.0), fut))
+                    await fut
+            finally:
+                writer.cancel()
+                try:
+                    await writer
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._queue = self._writer = None
+
+
+__all__ = ["SqliteStore"]
@@ -0,0 +1,223 @@
+"""
+Rollierende Zusammenfassung des Session-Verlaufs (MEMORY_SUMMARY_ENABLED).
+
+- Nach jedem Turn prüft ein Hintergrund-Task (außerhalb des Request-Pfads), ob der noch nicht
+  zusammengefasste Teil des Verlaufs mehr als MEMORY_SUMMARY_TRIGGER_TURNS Turns bzw.
+  MEMORY_SUMMARY_TRIGGER_CHARS Zeichen hat; dann werden alle bis auf die letzten
+  MEMORY_SUMMARY_KEEP_TURNS Turns in die Zusammenfassung gefaltet
+- Falten heuristisch (app.utils.summarize.extract_key_points je Turn) oder per LLM-Aufruf mit kleinem
+  num_predict (MEMORY_SUMMARY_MODE=llm; bei Fehler/leerer Antwort Heuristik); die Zusammenfassung
+  bleibt höchstens MEMORY_SUMMARY_MAX_CHARS lang (älteste Zeilen fallen zuerst)
+- Gespeichert wird sie im Memory-Store (get_summary/set_summary) zusammen mit einer Marke (Hash der
+  zuletzt gefalteten Turns); compose_with_memory stellt sie als eine System-Nachricht vor das Fenster
+  und lässt die bereits gefalteten Turns weg
+- Die Trigger-Schwellen liegen unter MEMORY_MAX_TURNS/MEMORY_MAX_CHARS, damit gefaltet wird, bevor
+  der Store Turns verwirft
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Any, Dict, Mapping, Optional, Sequence, Set
+
+from .memory import MemoryStore, get_memory_store, tail_start
+from .prompt_budget import SUMMARY_PREFIX
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+_ROLE_LABELS = {"user": "Nutzer", "assistant": "Assistent"}
+# Anzahl Turns in der Marke (mehr als einer, damit kurze Wiederholungen wie "ok" nicht verwechselt werden)
+_MARKER_TURNS = 2
+
+
+def _msg_chars(m: Mapping[str, str]) -> int:
+    return len(str(m.get("content", "")))
+
+
+def turns_fingerprint(turns: Sequence[Mapping[str, str]]) -> str:
+    h = hashlib.sha1()
+    for m in turns:
+        h.update(str(m.get("role", "")).encode("utf-8"))
+        h.update(b"\x00")
+        h.update(str(m.get("content", "")).encode("utf-8"))
+        h.update(b"\x01")
+    return h.hexdigest()
+
+
+def unsummarised_start(window: Sequence[Mapping[str, str]], state: Optional[Mapping[str, Any]]) -> int:
+    """Index des ersten noch nicht gefalteten Turns im Fenster (0 = Marke nicht gefunden)."""
+    if not state or not state.get("marker"):
+        return 0
+    n = max(1, int(state.get("marker_len") or 1))
+    marker = state["marker"]
+    # jüngstes Vorkommen gewinnt
+    for end in range(len(window), n - 1, -1):
+        if turns_fingerprint(window[end - n:end]) == marker:
+            return end
+    return 0
+
+
+def summary_message(state: Optional[Mapping[str, Any]]) -> Optional[Dict[str, str]]:
+    text = str((state or {}).get("summary") or "").strip()
+    if not text:
+        return None
+    return {"role": "system", "content": SUMMARY_PREFIX + text}
+
+
+def _clip_lines(text: str, max_chars: int) -> str:
+    """Auf max_chars begrenzen, älteste Zeilen zuerst verwerfen."""
+    if max_chars <= 0 or len(text) <= max_chars:
+        return text
+    lines = text.splitlines()
+    start = tail_start(lines, max_chars, lambda s: len(s) + 1)
+    kept = lines[start:] or [lines[-1][-max_chars:]]
+    return "\n".join(kept)
+
+
+def fold_heuristic(summary: str, turns: Sequence[Mapping[str, str]], max_chars: int) -> str:
+    """Je Turn die wichtigsten Sätze (extract_key_points) als Zeile anhängen."""
+    from ..utils.summarize import extract_key_points
+
+    lines = [ln for ln in summary.splitlines() if ln.strip()]
+    for m in turns:
+        content = str(m.get("content", "")).strip()
+        if not content:
+            continue
+        points = extract_key_points(content, max_points=2)
+        if not points:
+            continue
+        label = _ROLE_LABELS.get(str(m.get("role", "")), str(m.get("role", "")))
+        lines.append(f"- {label}: {' '.join(points)}")
+    return _clip_lines("\n".join(lines), max_chars)
+
+
+async def fold_llm(summary: str, turns: Sequence[Mapping[str, str]], max_chars: int) -> str:
+    """Zusammenfassung per LLM fortschreiben (kleines num_predict); leer bei Fehler."""
+    from ..services.llm import generate_completion
+
+    dialog = "\n".join(
+        f"{_ROLE_LABELS.get(str(m.get('role', '')), str(m.get('role', '')))}: {m.get('content', '')}" for m in turns
+    )
+    prompt = (
+        "Schreibe die Zusammenfassung eines laufenden Gesprächs fort. Behalte Namen, Orte, Fakten, "
+        "Entscheidungen und offene Fäden; keine Einleitung, höchstens "
+        f"{max_chars} Zeichen, Stichpunkte.\n\n"
+        f"Bisherige Zusammenfassung:\n{summary or '(leer)'}\n\nNeue Turns:\n{dialog}\n\nNeue Zusammenfassung:"
+    )
+    text = await generate_completion(
+        prompt,
+        {
+            "options": {
+                "num_predict": int(getattr(settings, "MEMORY_SUMMARY_NUM_PREDICT", 160)),
+                "temperature": 0.2,
+            }
+        },
+    )
+    return _clip_lines(str(text or "").strip(), max_chars)
+
+
+class MemorySummarizer:
+    """Plant Faltungen je Session im Hintergrund (höchstens ein Task je Session, Nachlauf bei neuen Turns)."""
+
+    def __init__(self) -> None:
+        self._tasks: Dict[str, "asyncio.Task[None]"] = {}
+        self._dirty: Set[str] = set()
+        self.folds = 0
+        self.folded_turns = 0
+
+    def schedule(self, session_id: Optional[str]) -> None:
+        if not session_id or not bool(getattr(settings, "MEMORY_SUMMARY_ENABLED", False)):
+            return
+        task = self._tasks.get(session_id)
+        if task is not None and not task.done():
+            self._dirty.add(session_id)
+            return
+        self._tasks[session_id] = asyncio.get_running_loop().create_task(self._run(session_id))
+
+    async def _run(self, session_id: str) -> None:
+        try:
+            while True:
+                self._dirty.discard(session_id)
+                try:
+                    await self.run_once(session_id)
+                except Exception:
+                    logger.debug("Memory-Zusammenfassung fehlgeschlagen sid=%s", session_id, exc_info=True)
+                if session_id not in self._dirty:
+                    break
+        finally:
+            self._tasks.pop(session_id, None)
+
+    async def run_once(self, session_id: str, store: Optional[MemoryStore] = None) -> int:
+        """Überlauf falten; liefert die Anzahl neu gefalteter Turns."""
+        store = store or get_memory_store()
+        max_turns = max(0, int(getattr(settings, "MEMORY_MAX_TURNS", 20)))
+        window = await store.get_window(session_id, max_chars=0, max_turns=max_turns)
+        state = await store.get_summary(session_id) or {}
+        start = unsummarised_start(window, state)
+        pending = window[start:]
+
+        keep = max(0, int(getattr(settings, "MEMORY_SUMMARY_KEEP_TURNS", 6)))
+        trigger_turns = max(keep, int(getattr(settings, "MEMORY_SUMMARY_TRIGGER_TURNS", 12)))
+        trigger_chars = max(0, int(getattr(settings, "MEMORY_SUMMARY_TRIGGER_CHARS", 4000)))
+        total_chars = sum(_msg_chars(m) for m in pending)
+        if len(pending) <= trigger_turns and (trigger_chars <= 0 or total_chars <= trigger_chars):
+            return 0
+        n_fold = max(len(pending) - keep, tail_start(pending, trigger_chars // 2, _msg_chars))
+        n_fold = min(len(pending), max(1, n_fold))
+        folded = pending[:n_fold]
+
+        max_chars = max(0, int(getattr(settings, "MEMORY_SUMMARY_MAX_CHARS", 1200)))
+        prev = str(state.get("summary") or "")
+        text = ""
+        if str(getattr(settings, "MEMORY_SUMMARY_MODE", "heuristic")) == "llm":
+            try:
+                text = await fold_llm(prev, folded, max_chars)
+            except Exception:
+                text = ""
+        if not text:
+            text = fold_heuristic(prev, folded, max_chars)
+
+        end = start + n_fold
+        marker_turns = window[max(0, end - _MARKER_TURNS):end]
+        await store.set_summary(
+            session_id,
+            {
+                "summary": text,
+                "marker": turns_fingerprint(marker_turns),
+                "marker_len": len(marker_turns),
+                "turns": int(state.get("turns") or 0) + n_fold,
+                "updated": time.time(),
+            },
+        )
+        self.folds += 1
+        self.folded_turns += n_fold
+        return n_fold
+
+    async def stop(self) -> None:
+        tasks = list(self._tasks.values())
+        for t in tasks:
+            t.cancel()
+        for t in tasks:
+            try:
+                await t
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._tasks.clear()
+        self._dirty.clear()
+
+
+memory_summarizer = MemorySummarizer()
+
+
+__all__ = [
+    "SUMMARY_PREFIX",
+    "MemorySummarizer",
+    "memory_summarizer",
+    "summary_message",
+    "unsummarised_start",
+    "fold_heuristic",
+    "fold_llm",
+]
@@ -2,7 +2,10 @@ from __future__ import annotations
 
 import threading
 import time
-from typing import Any, Dict, List, Optional, Tuple, Literal
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Literal
+
+if TYPE_CHECKING:  # pragma: no cover
+    from app.services.shared_state import SharedState
 
 Mode = Literal["rpg", "general"]
 
@@ -24,17 +27,25 @@ def detect_requested_mode_from_messages(messages: List[Dict[str, Any]]) -> Optio
 
 
 class SessionModeStore:
-    """Prozesslokaler, einfacher Session→Mode Speicher mit TTL und Kapazitätslimit."""
+    """Session→Mode Speicher mit TTL und Kapazitätslimit.
+
+    Prozesslokal; mit `state` (gemeinsamer Zustand, SHARED_STATE_BACKEND) liegen die Einträge
+    dort unter `mode:<sid>` mit gleicher TTL, damit alle Worker denselben Modus sehen.
+    """
 
-    def __init__(self, ttl_minutes: int, max_entries: int):
+    def __init__(self, ttl_minutes: int, max_entries: int, state: Optional["SharedState"] = None):
         self._ttl = max(1, int(ttl_minutes)) * 60
         self._max = max(100, int(max_entries))
         self._store: Dict[str, Tuple[Mode, float]] = {}
         self._lock = threading.Lock()
+        self._state = state
 
     def get(self, sid: Optional[str]) -> Optional[Mode]:
         if not sid:
             return None
+        if self._state is not None:
+            val = self._state.get(f"mode:{sid}")
+            return val if val in ("rpg", "general") else None
         now = time.time()
         with self._lock:
             ent = self._store.get(sid)
@@ -49,6 +60,9 @@ class SessionModeStore:
     def set(self, sid: Optional[str], mode: Mode) -> None:
         if not sid:
             return
+        if self._state is not None:
+            self._state.set(f"mode:{sid}", mode, ttl=self._ttl)
+            return
         now = time.time()
         with self._lock:
             if len(self._store) >= self._max:
@@ -61,12 +75,14 @@ class SessionModeStore:
 # Singleton-Store Konfiguration aus Settings ableiten (fail‑open Defaults)
 try:
     from app.core.settings import settings as _settings
+    from app.services.shared_state import get_shared_state as _get_shared_state
     _ttl = getattr(_settings, "AUTO_MODE_MEMORY_TTL_MIN", 120)
     _max = getattr(_settings, "AUTO_MODE_MEMORY_MAX", 1000)
+    _state = _get_shared_state()
 except Exception:
-    _ttl, _max = 120, 1000
+    _ttl, _max, _state = 120, 1000, None
 
-SESSION_MODES = SessionModeStore(ttl_minutes=_ttl, max_entries=_max)
+SESSION_MODES = SessionModeStore(ttl_minutes=_ttl, max_entries=_max, state=_state)
 
 
 def resolve_mode(
@@ -0,0 +1,221 @@
+"""
+Token-Budget für den gesamten Prompt (Systemprompt, Kontext-Notizen, RAG, Verlauf).
+
+- Token-Schätzung über einen austauschbaren Zähler aus utils.tokens: tiktoken `cl100k_base`, falls
+  installiert, sonst Heuristik ~4 Zeichen/Token (wie scripts/estimate_tokens.py); `set_token_counter()` ersetzt ihn
+- Gesamtbudget = num_ctx − für die Antwort reservierte Tokens (num_predict, höchstens die Hälfte
+  von num_ctx)
+- Systemprompt, Verlaufs-Zusammenfassung und aktuelle Benutzernachricht sind fest; die übrigen
+  Quellen (notes, rag, history) erhalten das Restbudget in der Reihenfolge PROMPT_BUDGET_PRIORITY:
+  Blöcke (Notizen/RAG) werden absatzweise von hinten gekürzt, der Verlauf verliert die ältesten Turns
+- Der Bericht (Budget, Verbrauch je Quelle, Verworfenes) geht als Meta-Event an den Client
+"""
+from __future__ import annotations
+
+import functools
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from utils.tokens import TokenCounter, heuristic_tokens, load_cl100k
+
+from .settings import settings
+
+NOTES_PREFIX = "[Kontext-Notizen]\n"
+RAG_PREFIX = "[RAG]\n"
+# Kopfzeile der Verlaufs-Zusammenfassung (app.core.memory_summary)
+SUMMARY_PREFIX = "[Bisheriger Verlauf (Zusammenfassung)]\n"
+FIXED_SOURCES = ("system", "summary", "current")
+# Rolle, Trenner usw. je Nachricht im Chat-Template (grobe Pauschale)
+MESSAGE_OVERHEAD = 4
+BUDGET_SOURCES = ("notes", "rag", "history")
+
+
+_COUNTER: Optional[TokenCounter] = None
+_COUNTER_NAME = "heuristic"
+
+
+def set_token_counter(fn: Optional[TokenCounter], name: str = "custom") -> None:
+    """Zähler ersetzen (None = neu aus PROMPT_BUDGET_TOKENIZER bestimmen)."""
+    global _COUNTER, _COUNTER_NAME
+    if fn is None:
+        _COUNTER, _COUNTER_NAME = None, "heuristic"
+        return
+    # System-/Notiztexte wiederholen sich je Request: Zählung memoisieren
+    _COUNTER, _COUNTER_NAME = functools.lru_cache(maxsize=2048)(fn), name
+
+
+def get_token_counter() -> Tuple[TokenCounter, str]:
+    if _COUNTER is None:
+        kind = str(getattr(settings, "PROMPT_BUDGET_TOKENIZER", "auto") or "auto").lower()
+        cl100k = load_cl100k() if kind in ("auto", "cl100k") else None
+        if cl100k is not None:
+            set_token_counter(cl100k, "cl100k")
+        else:
+            set_token_counter(heuristic_tokens, "heuristic")
+    assert _COUNTER is not None
+    return _COUNTER, _COUNTER_NAME
+
+
+def count_tokens(text: str) -> int:
+    counter, _ = get_token_counter()
+    try:
+        return int(counter(text))
+    except Exception:
+        return heuristic_tokens(text)
+
+
+def message_tokens(msg: Mapping[str, Any]) -> int:
+    return count_tokens(str(msg.get("content", ""))) + MESSAGE_OVERHEAD
+
+
+def total_budget(options: Mapping[str, Any]) -> Tuple[int, int, int]:
+    """(num_ctx, für die Antwort reserviert, Prompt-Budget) aus den Ollama-Options."""
+    num_ctx = max(1, int(options.get("num_ctx") or settings.PROMPT_BUDGET_DEFAULT_NUM_CTX))
+    reserve = min(max(0, int(options.get("num_predict") or 0)), num_ctx // 2)
+    return num_ctx, reserve, num_ctx - reserve
+
+
+def _source(msg: Mapping[str, Any], idx: int, current: int) -> str:
+    content = str(msg.get("content", ""))
+    if msg.get("role") == "system":
+        if content.startswith(NOTES_PREFIX):
+            return "notes"
+        if content.startswith(RAG_PREFIX):
+            return "rag"
+        if content.startswith(SUMMARY_PREFIX):
+            return "summary"
+        return "system"
+    return "current" if idx == current else "history"
+
+
+def classify_messages(messages: Sequence[Mapping[str, Any]]) -> List[str]:
+    """Quelle je Nachricht: system | notes | summary | history | rag | current (letzte Benutzernachricht)."""
+    current = max((i for i, m in enumerate(messages) if m.get("role") == "user"), default=-1)
+    return [_source(m, i, current) for i, m in enumerate(messages)]
+
+
+def _fit_block(content: str, limit: int) -> Tuple[Optional[str], int]:
+    """Block (Kopfzeile + Absätze) auf `limit` Tokens kürzen; liefert (Text|None, verworfene Absätze)."""
+    head, sep, body = content.partition("\n")
+    parts = body.split("\n\n") if sep else []
+    # Absatzweise summieren statt den wachsenden Text neu zu zählen (Tokens sind nahezu additiv)
+    avail = limit - MESSAGE_OVERHEAD - count_tokens(head) - 1
+    kept: List[str] = []
+    for part in parts:
+        cost = count_tokens(part) + 1
+        if cost > avail:
+            break
+        kept.append(part)
+        avail -= cost
+    if not kept and parts and avail > 0:
+        # erster Absatz allein zu groß: zeichenweise kürzen
+        part = parts[0]
+        cut = part[: int(len(part) * avail / max(1, count_tokens(part)))]
+        while cut and count_tokens(cut + "…") > avail:
+            cut = cut[: int(len(cut) * 0.9)]
+        if cut:
+            return head + "\n" + cut + "…", len(parts) - 1
+    if not kept:
+        return None, len(parts)
+    return head + "\n" + "\n\n".join(kept), len(parts) - len(kept)
+
+
+def _priority() -> List[str]:
+    raw = getattr(settings, "PROMPT_BUDGET_PRIORITY", None) or list(BUDGET_SOURCES)
+    order = [s for s in raw if s in BUDGET_SOURCES]
+    # nicht genannte Quellen zuletzt, damit nichts unbudgetiert bleibt
+    return order + [s for s in BUDGET_SOURCES if s not in order]
+
+
+def apply_budget(
+    messages: Sequence[Mapping[str, Any]],
+    options: Mapping[str, Any],
+    *,
+    priority: Optional[Sequence[str]] = None,
+) -> Tuple[List[Dict[str, str]], Dict[str, Any]]:
+    """Nachrichten auf das Token-Budget bringen; Reihenfolge der verbleibenden bleibt erhalten."""
+    msgs = [{"role": str(m.get("role", "user")), "content": str(m.get("content", ""))} for m in messages]
+    sources = classify_messages(msgs)
+    num_ctx, reserve, budget = total_budget(options)
+    dropped: Dict[str, Dict[str, int]] = {}
+
+    def _drop(src: str, tokens: int, **counts: int) -> None:
+        entry = dropped.setdefault(src, {"tokens": 0})
+        entry["tokens"] += tokens
+        for k, v in counts.items():
+            entry[k] = entry.get(k, 0) + v
+
+    keep = [True] * len(msgs)
+
+    # 1) Feste Anteile
+    tokens = [message_tokens(m) for m in msgs]
+    fixed = sum(t for i, t in enumerate(tokens) if sources[i] in FIXED_SOURCES)
+    remaining = budget - fixed
+    used: Dict[str, int] = {"system": 0, "summary": 0, "current": 0, "notes": 0, "rag": 0, "history": 0}
+    for i, src in enumerate(sources):
+        if src in FIXED_SOURCES:
+            used[src] += tokens[i]
+
+    # 2) Restbudget nach Priorität verteilen
+    for src in (list(priority) if priority is not None else _priority()):
+        if src == "history":
+            for i in range(len(msgs) - 1, -1, -1):
+                if not keep[i] or sources[i] != "history":
+                    continue
+                if tokens[i] <= remaining:
+                    remaining -= tokens[i]
+                    used["history"] += tokens[i]
+                    continue
+                # ältere Turns hinter einer Lücke ergeben keinen zusammenhängenden Verlauf
+                for j in range(i, -1, -1):
+                    if keep[j] and sources[j] == "history":
+                        keep[j] = False
+                        _drop("history", tokens[j], messages=1)
+                break
+            continue
+        for i, m in enumerate(msgs):
+            if not keep[i] or sources[i] != src:
+                continue
+            if tokens[i] <= remaining:
+                remaining -= tokens[i]
+                used[src] += tokens[i]
+                continue
+            text, n_parts = _fit_block(m["content"], max(0, remaining))
+            if text is None:
+                keep[i] = False
+                _drop(src, tokens[i], messages=1, parts=n_parts)
+                continue
+            m["content"] = text
+            new_tokens = message_tokens(m)
+            _drop(src, tokens[i] - new_tokens, parts=n_parts)
+            tokens[i] = new_tokens
+            remaining -= new_tokens
+            used[src] += new_tokens
+
+    out = [m for i, m in enumerate(msgs) if keep[i]]
+    total = sum(used.values())
+    report: Dict[str, Any] = {
+        "num_ctx": num_ctx,
+        "reserved_output": reserve,
+        "budget": budget,
+        "used": total,
+        "tokenizer": get_token_counter()[1],
+        "sources": {k: v for k, v in used.items() if v},
+        "dropped": dropped,
+    }
+    if total > budget:
+        # nur möglich, wenn Systemprompt + aktuelle Nachricht allein schon zu groß sind
+        report["over_budget"] = True
+    return out, report
+
+
+__all__ = [
+    "BUDGET_SOURCES",
+    "apply_budget",
+    "classify_messages",
+    "count_tokens",
+    "get_token_counter",
+    "heuristic_tokens",
+    "message_tokens",
+    "set_token_counter",
+    "total_budget",
+]
@@ -0,0 +1,75 @@
+"""
+Präfix-stabile Prompt-Reihenfolge für Ollamas KV-Cache (PROMPT_LAYOUT=prefix_stable).
+
+- Ordnet die Nachrichten von stabil nach veränderlich: Systemprompt(s), angeheftete Kontext-Notizen,
+  Verlaufs-Zusammenfassung, Verlauf (wächst nur hinten), dann RAG und zuletzt die aktuelle
+  Benutzernachricht; innerhalb einer Gruppe bleibt die Reihenfolge erhalten
+- So bleibt zwischen zwei Turns einer Session der Anfang bis einschließlich des bisherigen Verlaufs
+  gleich und Ollama muss nur den neuen Teil vorfüllen (Prefill)
+- PrefixTracker merkt sich je Session und Modell den letzten Prompt (Hash und geschätzte Tokens je
+  Nachricht, LRU-begrenzt) und meldet die Länge des wiederverwendbaren Präfixes
+"""
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from .prompt_budget import classify_messages, message_tokens
+from .settings import settings
+
+# Gruppen in Ausgabe-Reihenfolge
+LAYOUT_ORDER = ("system", "notes", "summary", "history", "rag", "current")
+
+
+def order_prefix_stable(messages: Sequence[Mapping[str, Any]]) -> List[Dict[str, str]]:
+    msgs = [{"role": str(m.get("role", "user")), "content": str(m.get("content", ""))} for m in messages]
+    groups: Dict[str, List[Dict[str, str]]] = {name: [] for name in LAYOUT_ORDER}
+    for m, src in zip(msgs, classify_messages(msgs)):
+        groups[src].append(m)
+    return [m for name in LAYOUT_ORDER for m in groups[name]]
+
+
+class PrefixTracker:
+    """Letzter Prompt je Schlüssel (Session + Modell); liefert den gemeinsamen Präfix zum Vorgänger."""
+
+    def __init__(self, max_keys: Optional[int] = None) -> None:
+        self._max_keys = max_keys
+        # key -> (Hash je Nachricht, Tokens je Nachricht); zuletzt genutzt hinten
+        self._last: "OrderedDict[str, Tuple[List[int], List[int]]]" = OrderedDict()
+
+    @property
+    def max_keys(self) -> int:
+        val = self._max_keys if self._max_keys is not None else getattr(settings, "PROMPT_PREFIX_TRACK_MAX_SESSIONS", 10000)
+        return max(1, int(val))
+
+    def __len__(self) -> int:
+        return len(self._last)
+
+    def observe(self, key: str, messages: Sequence[Mapping[str, Any]]) -> Dict[str, Any]:
+        hashes = [hash((str(m.get("role", "")), str(m.get("content", "")))) for m in messages]
+        tokens = [message_tokens(m) for m in messages]
+        prev = self._last.pop(key, None)
+        reused = 0
+        if prev is not None:
+            for a, b in zip(prev[0], hashes):
+                if a != b:
+                    break
+                reused += 1
+        self._last[key] = (hashes, tokens)
+        while len(self._last) > self.max_keys:
+            self._last.popitem(last=False)
+        total = sum(tokens)
+        reused_tokens = sum(tokens[:reused])
+        return {
+            "messages": len(messages),
+            "reused_messages": reused,
+            "tokens": total,
+            "reused_tokens": reused_tokens,
+            "ratio": round(reused_tokens / total, 4) if total else 0.0,
+        }
+
+
+prefix_tracker = PrefixTracker()
+
+
+__all__ = ["LAYOUT_ORDER", "order_prefix_stable", "PrefixTracker", "prefix_tracker"]
@@ -42,7 +42,19 @@ class Settings(BaseSettings):
     REPEAT_PENALTY: float = 1.1
     REPEAT_LAST_N: int = 64
     NUM_CTX_DEFAULT: Optional[int] = None  # Wenn gesetzt, als Default an Modell übergeben
-    
+    # Ollama `keep_alive` je Request (z. B. "30m", "-1" = dauerhaft): Modell samt KV-Cache bleibt geladen; None = Ollama-Default
+    MODEL_KEEP_ALIVE: Optional[str] = None
+
+    # Upstream-HTTP-Pool (ein langlebiger httpx.AsyncClient, Lifespan-verwaltet)
+    # Der Pool hält Verbindungen pro Host (Origin) getrennt vor.
+    OLLAMA_POOL_MAX_CONNECTIONS: int = 100
+    OLLAMA_POOL_MAX_KEEPALIVE: int = 20
+    OLLAMA_KEEPALIVE_EXPIRY: float = 30.0
+    OLLAMA_CONNECT_TIMEOUT: float = 5.0
+    # None -> REQUEST_TIMEOUT verwenden
+    OLLAMA_READ_TIMEOUT: Optional[float] = None
+    OLLAMA_POOL_TIMEOUT: float = 5.0
+
     # Evaluierungseinstellungen
     EVAL_DIRECTORY: str = "eval"
     # Unterordner für bessere Übersicht
@@ -66,13 +78,37 @@ class Settings(BaseSettings):
     RATE_LIMIT_BURST: int = 30
     RATE_LIMIT_WINDOW_SEC: float = 60.0
     RATE_LIMIT_TRUSTED_IPS: List[str] = ["127.0.0.1", "::1"]
-    RATE_LIMIT_EXEMPT_PATHS: List[str] = ["/health", "/docs", "/openapi.json"]
+    RATE_LIMIT_EXEMPT_PATHS: List[str] = ["/health", "/docs", "/openapi.json", "/metrics"]
+    # Token-Bucket-Speicher: max. verfolgte Clients (LRU-Verdrängung) und Idle-TTL (0 = Zeit bis Bucket voll)
+    RATE_LIMIT_MAX_KEYS: int = 10000
+    RATE_LIMIT_IDLE_TTL_SEC: float = 0.0
+
+    # Gemeinsamer Zustand für mehrere Worker (Rate-Limits, Sitzungsmodi, Session-Memory):
+    # "none" = prozesslokal (Default), "local" = In-Process-Stand-in, "sqlite" = WAL-Datei unter SHARED_STATE_PATH
+    SHARED_STATE_BACKEND: Literal["none", "local", "sqlite"] = "none"
+    SHARED_STATE_PATH: Path = Path(".data/shared_state.sqlite3")
+
+    # Prometheus-kompatibler /metrics-Endpunkt (Text-Format, ohne Zusatzabhängigkeit)
+    METRICS_ENABLED: bool = True
+    # Server-Timing-Header (/chat) bzw. Meta-Event "timing" (/chat/stream) mit Dauer je Phase
+    SERVER_TIMING_ENABLED: bool = True
+    # Optionales JSONL-Trace-Log (leer = aus); Anteil gesampelter Requests und Schwelle für langsame Requests
+    TRACE_LOG_PATH: Optional[str] = None
+    TRACE_SAMPLE_RATE: float = 0.0
+    TRACE_SLOW_MS: float = 0.0
 
     # Logging / Observability
     LOG_JSON: bool = False
     LOG_TRUNCATE_CHARS: int = 200
     REQUEST_ID_HEADER: str = "X-Request-ID"
 
+    # Blockierende Stufen (Notizen, RAG) laufen in einem begrenzten Thread-Pool
+    BLOCKING_POOL_WORKERS: int = 4
+    # Event-Loop-Lag messen (Stalls >= Schwelle werden gezählt)
+    EVENT_LOOP_LAG_MONITOR_ENABLED: bool = True
+    EVENT_LOOP_LAG_INTERVAL_SEC: float = 0.25
+    EVENT_LOOP_STALL_THRESHOLD_MS: float = 50.0
+
     # Kontext-Notizen (lokal, optional)
     CONTEXT_NOTES_ENABLED: bool = False
     # Standardpfade (Priorität: lokale Dateien zuerst, dann angeheftete Referenzen)
@@ -85,6 +121,10 @@ class Settings(BaseSettings):
         os.path.join("data", "context.local.md"),
     ]
     CONTEXT_NOTES_MAX_CHARS: int = 12000
+    # Laden der Notizen läuft im Thread-Pool; nach N Sekunden ohne Notizen fortfahren (0 = ohne Limit)
+    CONTEXT_NOTES_TIMEOUT_SEC: float = 1.0
+    # Zusammengeführte Notizen werden gecacht; Prüfintervall (stat von mtime/size) in Sekunden (0 = jedes Mal)
+    CONTEXT_NOTES_CHECK_INTERVAL_SEC: float = 1.0
 
     # Inhalts-Policy/Regeln (optional)
     # Wenn aktiviert, werden optionale Hooks aus content_management verwendet (z.B. für "unrestricted mode").
@@ -119,10 +159,56 @@ class Settings(BaseSettings):
 
     # Neue, konfigurierbare Session Memory (Store + Budgets)
     MEMORY_ENABLED: bool = True
-    MEMORY_STORE: Literal["inmemory", "jsonl"] = "inmemory"
+    MEMORY_STORE: Literal["inmemory", "jsonl", "sqlite"] = "inmemory"
     MEMORY_MAX_TURNS: int = 20
     MEMORY_MAX_CHARS: int = 8000
     MEMORY_DIR: Path = Path(".data/memory")
+    # Budgets des inmemory-Stores: max. Sessions und Zeichen insgesamt (LRU-Verdrängung, 0 = aus),
+    # Idle-TTL je Session (0 = aus) und Intervall des Hintergrund-Sweepers
+    MEMORY_MAX_SESSIONS: int = 10000
+    MEMORY_MAX_TOTAL_CHARS: int = 20_000_000
+    MEMORY_IDLE_TTL_SEC: float = 6 * 3600.0
+    MEMORY_SWEEP_INTERVAL_SEC: float = 60.0
+    # jsonl-Store: Kompaktierung, sobald eine Session mehr als MEMORY_MAX_TURNS × Faktor Zeilen hat (0 = aus)
+    MEMORY_JSONL_COMPACT_FACTOR: float = 4.0
+    # sqlite-Store: Datei (Standard: MEMORY_DIR/memory.sqlite3) und max. Operationen je Schreib-Transaktion
+    MEMORY_SQLITE_PATH: Optional[Path] = None
+    MEMORY_SQLITE_BATCH_MAX: int = 256
+    # sqlite-Store: Turns älter als die letzten MEMORY_MAX_TURNS je Session beim Schreiben löschen (false = Verlauf behalten)
+    MEMORY_SQLITE_PRUNE: bool = True
+    # Rollierende Zusammenfassung: ab TRIGGER_TURNS/TRIGGER_CHARS noch nicht gefalteter Turns werden alle bis auf
+    # die letzten KEEP_TURNS im Hintergrund zusammengefasst (heuristic | llm mit kleinem num_predict) und als eine
+    # System-Nachricht (max. MAX_CHARS) vor das Fenster gestellt; Schwellen unter MEMORY_MAX_TURNS/-CHARS halten
+    MEMORY_SUMMARY_ENABLED: bool = False
+    MEMORY_SUMMARY_MODE: Literal["heuristic", "llm"] = "heuristic"
+    MEMORY_SUMMARY_KEEP_TURNS: int = 6
+    MEMORY_SUMMARY_TRIGGER_TURNS: int = 12
+    MEMORY_SUMMARY_TRIGGER_CHARS: int = 4000
+    MEMORY_SUMMARY_MAX_CHARS: int = 1200
+    MEMORY_SUMMARY_NUM_PREDICT: int = 160
+
+    # Globales Token-Budget für den Prompt (Systemprompt, Notizen, RAG, Verlauf); Budget = num_ctx
+    # (Default unten, falls weder Request noch NUM_CTX_DEFAULT ihn setzen) minus num_predict (max. die Hälfte)
+    PROMPT_BUDGET_ENABLED: bool = False
+    PROMPT_BUDGET_DEFAULT_NUM_CTX: int = 4096
+    # Token-Schätzung: auto (cl100k via tiktoken, sonst Heuristik) | cl100k | heuristic
+    PROMPT_BUDGET_TOKENIZER: Literal["auto", "cl100k", "heuristic"] = "auto"
+    # Verteilung des Restbudgets (nach Systemprompt und aktueller Nachricht) in dieser Reihenfolge
+    PROMPT_BUDGET_PRIORITY: List[str] = ["notes", "history", "rag"]
+    # Prompt-Reihenfolge: legacy (bisher) | prefix_stable (System, Notizen, Zusammenfassung, Verlauf, RAG, aktuelle
+    # Nachricht; maximiert den wiederverwendbaren KV-Cache-Präfix); Präfix-Tracking je Session (LRU-begrenzt)
+    PROMPT_LAYOUT: Literal["legacy", "prefix_stable"] = "legacy"
+    PROMPT_PREFIX_TRACK_MAX_SESSIONS: int = 10000
+    # Antwort-Cache für deterministische Requests (temperature 0 oder seed, ohne session_id); LRU im Speicher
+    # mit Byte-Budget und TTL (0 = ohne Ablauf), optional zusätzlich als Dateien unter RESPONSE_CACHE_DIR
+    RESPONSE_CACHE_ENABLED: bool = False
+    RESPONSE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    RESPONSE_CACHE_TTL_SEC: float = 3600.0
+    RESPONSE_CACHE_DIR: Optional[Path] = None
+    # Single-Flight: identische gleichzeitige Requests (ohne session_id) teilen sich eine Upstream-Generierung;
+    # standardmäßig nur deterministische (temperature 0 oder seed), sonst bekämen alle dieselbe Stichprobe
+    SINGLE_FLIGHT_ENABLED: bool = False
+    SINGLE_FLIGHT_DETERMINISTIC_ONLY: bool = True
 
     # Tool-Use (Basis, optional)
     TOOLS_ENABLED: bool = False
@@ -132,6 +218,26 @@ class Settings(BaseSettings):
     RAG_ENABLED: bool = False
     RAG_INDEX_PATH: str = str(Path("eval/results/rag/index.json"))
     RAG_TOP_K: int = 3
+    # Index wird prozessweit gecacht; mtime/size-Prüfung höchstens alle N Sekunden (0 = bei jedem Request)
+    RAG_INDEX_CHECK_INTERVAL_SEC: float = 1.0
+    # Gesamtbudget für Index laden + Retrieval; danach ohne RAG fortfahren (0 = ohne Limit)
+    RAG_STAGE_TIMEOUT_SEC: float = 2.0
+    # Ranking: "tfidf" (Cosine) oder "bm25" (mit Boosts für Treffer in Überschrift/Dateipfad)
+    RAG_SCORER: Literal["tfidf", "bm25"] = "tfidf"
+    RAG_BM25_K1: float = 1.2
+    RAG_BM25_B: float = 0.75
+    RAG_BM25_HEADING_BOOST: float = 2.0
+    RAG_BM25_PATH_BOOST: float = 1.0
+    # Dichter Retriever (optional, benötigt NumPy): sparse | dense | hybrid (RRF aus Sparse + Dense)
+    RAG_MODE: Literal["sparse", "dense", "hybrid"] = "sparse"
+    # Vektordatei (.npy); None -> <RAG_INDEX_PATH>.dense.npy
+    RAG_DENSE_PATH: Optional[str] = None
+    RAG_EMBED_MODEL: str = "nomic-embed-text"
+    RAG_EMBED_TIMEOUT: float = 10.0
+    RAG_RRF_K: int = 60
+    # Kandidaten je Rangliste für die Fusion im Hybrid-Modus
+    RAG_HYBRID_CANDIDATES: int = 20
+    RAG_QUERY_EMBED_CACHE_SIZE: int = 512
 
     @staticmethod
     def _to_nonempty_str(obj: Any) -> Optional[str]:
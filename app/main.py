@@ -1,16 +1,24 @@
 from fastapi import FastAPI, HTTPException, Request, Response, status
-from fastapi.responses import JSONResponse
-from typing import cast as _cast
-import json as _json
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 import time
-from typing import Dict, Any
+from typing import Dict, Any, FrozenSet, Optional
 
 from .core.settings import settings
 from .api.models import ChatRequest, ChatResponse, ChatMessage
 from typing import Mapping as _Mapping, Union as _Union
 from .api.chat import process_chat_request, stream_chat_request
+from .api.middleware import RateLimitMiddleware, RequestContextMiddleware
+from .services.http_client import start_http_client, close_http_client, get_http_client
+from .services.offload import loop_lag_monitor, shutdown_executor
+from .services import metrics as _metrics
+from .services.trace import RequestTrace, write_trace
+from .services.shared_state import get_shared_state
+from .core.memory import close_memory_store, memory_sweeper
+from .core.memory_summary import memory_summarizer
+from utils.context_notes import set_default_check_interval as _set_notes_check_interval
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 import os as _os
 import platform as _platform
 import fastapi as _fastapi
@@ -19,80 +27,73 @@ import fastapi as _fastapi
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    """Startet den gepoolten Upstream-Client (Loop-Lag-Monitor, Memory-Sweeper) und räumt beim Beenden auf."""
+    await start_http_client()
+    _set_notes_check_interval(float(getattr(settings, "CONTEXT_NOTES_CHECK_INTERVAL_SEC", 1.0)))
+    if settings.EVENT_LOOP_LAG_MONITOR_ENABLED:
+        loop_lag_monitor.start()
+    if float(getattr(settings, "MEMORY_IDLE_TTL_SEC", 0.0)) > 0:
+        memory_sweeper.start()
+    try:
+        yield
+    finally:
+        await memory_sweeper.stop()
+        await memory_summarizer.stop()
+        await close_memory_store()
+        await loop_lag_monitor.stop()
+        await close_http_client()
+        shutdown_executor()
+
+
 # FastAPI-App erstellen
 app = FastAPI(
     title=settings.PROJECT_NAME,
     description=settings.PROJECT_DESCRIPTION,
     version=settings.PROJECT_VERSION,
+    lifespan=lifespan,
 )
 
-# Optional: Einfache In-Memory Rate-Limit Middleware (pro IP)
+_KNOWN_ROUTES: Optional[FrozenSet[str]] = None
+
+
+def _route_label(path: str) -> str:
+    """Routen-Label für Metriken (nur registrierte Pfade, sonst "other")."""
+    global _KNOWN_ROUTES
+    if _KNOWN_ROUTES is None:
+        _KNOWN_ROUTES = frozenset(str(getattr(r, "path", "")) for r in app.routes)
+    return _metrics.route_label(path, _KNOWN_ROUTES)
+
+
+# Optional: Einfache In-Memory Rate-Limit Middleware (pro IP), reines ASGI
 if settings.RATE_LIMIT_ENABLED:
-    from starlette.middleware.base import BaseHTTPMiddleware
-    from collections import defaultdict, deque
-    import threading
-
-    class _RateLimiter(BaseHTTPMiddleware):
-        def __init__(self, app: Any):
-            super().__init__(app)
-            self.lock = threading.Lock()
-            self.window = float(settings.RATE_LIMIT_WINDOW_SEC)
-            self.capacity = max(1, int(settings.RATE_LIMIT_REQUESTS_PER_MINUTE))
-            self.burst = max(0, int(settings.RATE_LIMIT_BURST))
-            from typing import Deque
-            self.buckets: Dict[str, Deque[float]] = defaultdict(deque)
-
-        async def dispatch(self, request: Request, call_next):
-            # Exempt Pfade (z. B. Health)
-            if request.url.path in set(settings.RATE_LIMIT_EXEMPT_PATHS):
-                return await call_next(request)
-
-            # Bestimme den Client-Key
-            client_host = request.client.host if request.client else "unknown"
-            if client_host in set(settings.RATE_LIMIT_TRUSTED_IPS):
-                return await call_next(request)
-            now = time.time()
-            allow = True
-
-            with self.lock:
-                from typing import Deque
-                q: Deque[float] = self.buckets[client_host]
-                # Fenster bereinigen
-                cutoff = now - self.window
-                while q and q[0] < cutoff:
-                    q.popleft()
-                # Limit prüfen: capacity + burst
-                limit = self.capacity + self.burst
-                if len(q) >= limit:
-                    allow = False
-                else:
-                    q.append(now)
-
-            if not allow:
-                headers = {
-                    "Retry-After": str(int(self.window)),
-                    "X-RateLimit-Limit": str(self.capacity + self.burst),
-                    "X-RateLimit-Window": str(int(self.window)),
-                }
-                raise HTTPException(
-                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                    detail="Rate limit exceeded. Bitte später erneut versuchen.",
-                    headers=headers,
-                )
-            response = await call_next(request)
-            try:
-                # Informative Header setzen
-                from typing import Deque
-                q2: Deque[float] = self.buckets[client_host]
-                remaining = max(0, (self.capacity + self.burst) - len(q2))
-                response.headers["X-RateLimit-Limit"] = str(self.capacity + self.burst)
-                response.headers["X-RateLimit-Remaining"] = str(remaining)
-                response.headers["X-RateLimit-Window"] = str(int(self.window))
-            except Exception:
-                pass
-            return response
-
-    app.add_middleware(_RateLimiter)
+    app.add_middleware(
+        RateLimitMiddleware,
+        requests_per_window=settings.RATE_LIMIT_REQUESTS_PER_MINUTE,
+        burst=settings.RATE_LIMIT_BURST,
+        window_sec=settings.RATE_LIMIT_WINDOW_SEC,
+        trusted_ips=settings.RATE_LIMIT_TRUSTED_IPS,
+        exempt_paths=settings.RATE_LIMIT_EXEMPT_PATHS,
+        max_keys=settings.RATE_LIMIT_MAX_KEYS,
+        idle_ttl=settings.RATE_LIMIT_IDLE_TTL_SEC,
+        shared_state=get_shared_state(),
+        metrics_enabled=settings.METRICS_ENABLED,
+        route_label=_route_label,
+    )
+
+
+def _chat_mode(request: ChatRequest) -> str:
+    return "unrestricted" if request.unrestricted_mode else ("eval" if request.eval_mode else "default")
+
+
+def _start_trace(req: Request, route: str) -> RequestTrace:
+    """Request-Trace ab Middleware-Beginn; die Zeit bis zum Handler zählt als "parse"."""
+    rid = getattr(req.state, "request_id", None)
+    trace = RequestTrace(rid, route=route, started=getattr(req.state, "t_start", None))
+    trace.add("parse", (time.perf_counter() - trace.started) * 1000.0)
+    return trace
+
 
 # CORS-Middleware hinzufügen
 if settings.BACKEND_CORS_ORIGINS:
@@ -110,6 +111,14 @@ async def health_check() -> Dict[str, Any]:
     return {"status": "ok", "time": time.time()}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    """Prometheus-Text-Format (Latenzen, Upstream, Stufen, Caches, Loop-Lag, Memory)."""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    return Response(content=_metrics.REGISTRY.render(), media_type=_metrics.CONTENT_TYPE)
+
+
 @app.get("/version", status_code=status.HTTP_200_OK)
 async def version_info() -> Dict[str, Any]:
     """Gibt Version und Laufzeitinformationen der Anwendung zurück."""
@@ -123,64 +132,14 @@ async def version_info() -> Dict[str, Any]:
     }
 
 
-# Einfache Middleware für Request-ID und JSON-Logs
-@app.middleware("http")
-async def request_context_mw(request: Request, call_next):
-    rid = request.headers.get(settings.REQUEST_ID_HEADER) or request.headers.get("X-Request-Id")
-    if not rid:
-        # einfache, lokale ID (Zeit-basiert)
-        rid = f"req-{int(time.time()*1000)}"
-    start = time.time()
-    try:
-        # request-id in state für spätere Nutzung (z. B. im Handler)
-        try:
-            setattr(request.state, "request_id", rid)
-        except Exception:
-            pass
-        response = _cast(Response, await call_next(request))
-        duration_ms = int((time.time() - start) * 1000)
-        if settings.LOG_JSON:
-            logger.info(
-                _json.dumps({
-                    "event": "request",
-                    "path": request.url.path,
-                    "method": request.method,
-                    "status": int(response.status_code),
-                    "duration_ms": duration_ms,
-                    "request_id": rid,
-                }, ensure_ascii=False)
-            )
-        else:
-            logger.info(f"{request.method} {request.url.path} -> {int(response.status_code)} [{duration_ms} ms] rid={rid}")
-        response.headers[settings.REQUEST_ID_HEADER] = rid
-        return response
-    except Exception as exc:
-        duration_ms = int((time.time() - start) * 1000)
-        if settings.LOG_JSON:
-            logger.exception(_json.dumps({"event": "error", "path": request.url.path, "request_id": rid, "duration_ms": duration_ms, "error": str(exc)}, ensure_ascii=False))
-        else:
-            logger.exception(f"Fehler bei {request.url.path} rid={rid}: {exc}")
-        # HTTPException in eine reguläre Antwort umwandeln, damit TestClient/Clients eine Response erhalten
-        if isinstance(exc, HTTPException):
-            # Merge evtl. vorhandene Exception-Header mit unserer Request-ID
-            from typing import Any as _Any, Mapping as _Mapping, cast as _typing_cast
-            raw_headers: _Any = getattr(exc, "headers", None)
-            headers: Dict[str, str] = {settings.REQUEST_ID_HEADER: str(rid)}
-            try:
-                if isinstance(raw_headers, dict):
-                    m: _Mapping[object, object] = _typing_cast(_Mapping[object, object], raw_headers)
-                    for key_obj, val_obj in m.items():
-                        k: str = str(key_obj)
-                        v: str = str(val_obj)
-                        headers[k] = v
-            except Exception:
-                pass
-            return JSONResponse(
-                status_code=exc.status_code,
-                content={"detail": exc.detail},
-                headers=headers,
-            )
-        raise
+# Request-ID, Logs und HTTP-Metriken (reines ASGI, äußerste App-Middleware)
+app.add_middleware(
+    RequestContextMiddleware,
+    header_name=settings.REQUEST_ID_HEADER,
+    log_json=settings.LOG_JSON,
+    metrics_enabled=settings.METRICS_ENABLED,
+    route_label=_route_label,
+)
 
 def _get_content_from_message(m: _Union[ChatMessage, _Mapping[str, str]]) -> str:
     """Extrahiert den Content unabhängig davon, ob die Message ein ChatMessage oder ein Dict ist."""
@@ -193,24 +152,24 @@ def _get_content_from_message(m: _Union[ChatMessage, _Mapping[str, str]]) -> str
 
 
 @app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest, req: Request):
+async def chat(request: ChatRequest, req: Request, response: Response):
     """
     Chat-Endpunkt, der Anfragen an das Sprachmodell weiterleitet und Antworten zurückgibt.
     
     Args:
         request: Die Chat-Anfrage mit Nachrichten
         req: Die FastAPI-Request (wird automatisch injiziert)
+        response: Antwort-Objekt für zusätzliche Header (Server-Timing)
         
     Returns:
         Die Chat-Antwort mit der generierten Nachricht
     """
     try:
-        # Extrahiere Parameter aus den Rohdaten (typisiert)
-        _raw = await req.json()
-        from typing import Dict as _Dict, Any as _Any, cast as _typing_cast
-        request_data: _Dict[str, _Any] = _typing_cast(_Dict[str, _Any], _raw if isinstance(_raw, dict) else {})
-        eval_mode = bool(request_data.get("eval_mode", False))
-        unrestricted_mode = bool(request_data.get("unrestricted_mode", False))
+        # Modus-Flags sind Teil des ChatRequest-Schemas (kein zweites JSON-Decode)
+        eval_mode = request.eval_mode
+        unrestricted_mode = request.unrestricted_mode
+        req.state.chat_mode = _chat_mode(request)
+        trace = _start_trace(req, "/chat")
 
         # Eingabelängenprüfung (robust gegen gemischte Typen in messages)
         total_chars = 0
@@ -228,14 +187,19 @@ async def chat(request: ChatRequest, req: Request):
         )
 
         # Verarbeite die Anfrage
-        response = await process_chat_request(
+        result = await process_chat_request(
             request,
             eval_mode=eval_mode,
             unrestricted_mode=unrestricted_mode,
-            client=None,
+            client=get_http_client(),
             request_id=rid,
+            trace=trace,
         )
-        return response
+        trace.finish()
+        if settings.SERVER_TIMING_ENABLED:
+            response.headers["Server-Timing"] = trace.server_timing()
+        write_trace(trace, mode=req.state.chat_mode, stream=False)
+        return result
 
     except HTTPException:
         # Bekannte HTTP-Fehler (z. B. 400 bei zu langem Input) unverändert durchreichen
@@ -253,18 +217,22 @@ from fastapi.responses import StreamingResponse
 async def chat_stream(request: ChatRequest, req: Request):
     """Streaming-Variante des Chat-Endpunkts (SSE-ähnliches Format)."""
     try:
-        request_data = await req.json()
-        eval_mode = request_data.get("eval_mode", False)
-        unrestricted_mode = request_data.get("unrestricted_mode", False)
+        eval_mode = request.eval_mode
+        unrestricted_mode = request.unrestricted_mode
+        req.state.chat_mode = _chat_mode(request)
         rid = getattr(req.state, "request_id", None)
+        trace = _start_trace(req, "/chat/stream")
         gen = await stream_chat_request(
             request,
             eval_mode=eval_mode,
             unrestricted_mode=unrestricted_mode,
-            client=None,
+            client=get_http_client(),
             request_id=rid,
+            trace=trace,
         )
-        return StreamingResponse(gen, media_type="text/event-stream")
+        # Header enthält nur die Phasen bis zum Stream-Start; der Rest folgt als Meta-Event "timing"
+        headers = {"Server-Timing": trace.server_timing()} if settings.SERVER_TIMING_ENABLED else None
+        return StreamingResponse(gen, media_type="text/event-stream", headers=headers)
     except HTTPException:
         # HTTP-Exceptions (falls sie auftreten) direkt durchreichen
         raise
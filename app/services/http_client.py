@@ -0,0 +1,76 @@
+"""
+Prozessweiter, gepoolter HTTP-Client für Upstream-Aufrufe (Ollama).
+
+Zweck:
+- Ein langlebiger httpx.AsyncClient statt eines neuen Clients pro Anfrage
+  (Keep-Alive, keine TCP-Handshakes je Request, keine Ephemeral-Port-Erschöpfung)
+- Start/Stop über den FastAPI-Lifespan (app.main)
+
+Hinweis:
+- httpx hält Verbindungen intern pro Origin getrennt; ein Client genügt daher
+  auch dann, wenn Requests per options.host auf andere Ollama-Hosts zeigen.
+- Ist kein Client gestartet (z. B. in Tests ohne Lifespan), liefert
+  get_http_client() None und die Aufrufer fallen auf einen temporären Client zurück.
+"""
+from __future__ import annotations
+
+from typing import Optional
+
+import httpx
+
+from ..core.settings import settings
+
+_CLIENT: Optional[httpx.AsyncClient] = None
+
+
+def build_limits() -> httpx.Limits:
+    """Pool-Limits aus den Settings ableiten."""
+    return httpx.Limits(
+        max_connections=max(1, int(settings.OLLAMA_POOL_MAX_CONNECTIONS)),
+        max_keepalive_connections=max(0, int(settings.OLLAMA_POOL_MAX_KEEPALIVE)),
+        keepalive_expiry=max(0.0, float(settings.OLLAMA_KEEPALIVE_EXPIRY)),
+    )
+
+
+def build_timeout() -> httpx.Timeout:
+    """Timeouts (connect/read/write/pool) aus den Settings ableiten."""
+    read = settings.OLLAMA_READ_TIMEOUT
+    read_timeout = float(read) if read is not None else float(settings.REQUEST_TIMEOUT)
+    return httpx.Timeout(
+        connect=float(settings.OLLAMA_CONNECT_TIMEOUT),
+        read=read_timeout,
+        write=float(settings.REQUEST_TIMEOUT),
+        pool=float(settings.OLLAMA_POOL_TIMEOUT),
+    )
+
+
+async def start_http_client() -> httpx.AsyncClient:
+    """Erzeugt den gemeinsamen Client (idempotent)."""
+    global _CLIENT
+    if _CLIENT is None or _CLIENT.is_closed:
+        _CLIENT = httpx.AsyncClient(limits=build_limits(), timeout=build_timeout())
+    return _CLIENT
+
+
+async def close_http_client() -> None:
+    """Schließt den gemeinsamen Client und gibt den Pool frei."""
+    global _CLIENT
+    client, _CLIENT = _CLIENT, None
+    if client is not None and not client.is_closed:
+        await client.aclose()
+
+
+def get_http_client() -> Optional[httpx.AsyncClient]:
+    """Liefert den gestarteten Client oder None (dann temporärer Client beim Aufrufer)."""
+    if _CLIENT is None or _CLIENT.is_closed:
+        return None
+    return _CLIENT
+
+
+__all__ = [
+    "build_limits",
+    "build_timeout",
+    "start_http_client",
+    "close_http_client",
+    "get_http_client",
+]
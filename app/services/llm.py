@@ -5,6 +5,7 @@ import os
 
 from ..core.settings import settings
 from ..api.models import ChatMessage, ChatResponse
+from .http_client import get_http_client
 
 async def generate_reply(messages: List[ChatMessage]) -> ChatResponse:
     """
@@ -30,18 +31,23 @@ async def generate_reply(messages: List[ChatMessage]) -> ChatResponse:
     headers: Dict[str, str] = {"Content-Type": "application/json"}
     
     try:
-        async with httpx.AsyncClient(timeout=httpx.Timeout(30.0)) as client:
-            response = await client.post(url, json=payload, headers=headers)
-            response.raise_for_status()
-            
-            # Extrahiere den Modell-Text aus der Antwort
-            try:
-                content = response.json()["message"]["content"]
-            except (KeyError, ValueError):
-                # Fallback, falls die Struktur anders ist
-                content = response.text
-                
-            return ChatResponse(content=content)
+        # Gepoolten App-Client bevorzugen; sonst temporärer Client
+        shared = get_http_client()
+        if shared is not None:
+            response = await shared.post(url, json=payload, headers=headers)
+        else:
+            async with httpx.AsyncClient(timeout=httpx.Timeout(30.0)) as client:
+                response = await client.post(url, json=payload, headers=headers)
+        response.raise_for_status()
+
+        # Extrahiere den Modell-Text aus der Antwort
+        try:
+            content = response.json()["message"]["content"]
+        except (KeyError, ValueError):
+            # Fallback, falls die Struktur anders ist
+            content = response.text
+
+        return ChatResponse(content=content)
             
     except httpx.HTTPStatusError as e:
         error_msg = f"LLM HTTP-Fehler {e.response.status_code}: Bitte Ollama prüfen."
@@ -114,13 +120,17 @@ async def generate_completion(prompt: str, options: Optional[Dict[str, Any]] = N
         payload.update(options)
     
     try:
-        async with httpx.AsyncClient() as client:
-            headers: Dict[str, str] = {"Content-Type": "application/json"}
-            response = await client.post(url, json=payload, headers=headers)
-            response.raise_for_status()
-            
-            data = response.json()
-            return data.get("response", "")
+        headers: Dict[str, str] = {"Content-Type": "application/json"}
+        shared = get_http_client()
+        if shared is not None:
+            response = await shared.post(url, json=payload, headers=headers)
+        else:
+            async with httpx.AsyncClient() as client:
+                response = await client.post(url, json=payload, headers=headers)
+        response.raise_for_status()
+
+        data = response.json()
+        return data.get("response", "")
     except Exception as e:
         print(f"Fehler bei der Generierung: {str(e)}")
         return ""
\ No newline at end of file
@@ -0,0 +1,379 @@
+"""
+Prometheus-kompatible Metriken ohne Zusatzabhängigkeit (Text-Format 0.0.4).
+
+- Counter/Gauge/Histogram mit festen Label-Namen; je Label-Kombination wird beim ersten
+  Zugriff genau ein Serienobjekt angelegt, danach kostet ein Update nur den Dict-Lookup
+- Keine Locks im Hot-Path: Updates passieren im Event-Loop (bzw. unter dem GIL aus dem
+  Thread-Pool); seltene verlorene Inkremente bei echter Thread-Konkurrenz werden in Kauf
+  genommen
+- Histogramme zählen nicht-kumulativ je Bucket und kumulieren erst beim Scrape
+- Collector-Funktionen liefern beim Scrape zusätzliche Zeilen (Cache-/Loop-/Memory-Stats),
+  d. h. diese Werte kosten pro Request nichts
+"""
+from __future__ import annotations
+
+import math
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latenz-Buckets in Sekunden (Requests/Upstream: bis 2 Minuten für lange Generierungen)
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+STAGE_BUCKETS: Tuple[float, ...] = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+RATE_BUCKETS: Tuple[float, ...] = (1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0, 160.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _label_str(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames: Tuple[str, ...] = tuple(labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:  # pragma: no cover - Interface
+        raise NotImplementedError
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._series: Dict[Tuple[str, ...], _Value] = {}
+
+    def labels(self, *values: str) -> _Value:
+        s = self._series.get(values)
+        if s is None:
+            s = self._series.setdefault(values, _Value())
+        return s
+
+    def inc(self, *values: str, amount: float = 1.0) -> None:
+        self.labels(*values).value += amount
+
+    def get(self, *values: str) -> float:
+        s = self._series.get(values)
+        return s.value if s is not None else 0.0
+
+    def render(self) -> List[str]:
+        out = self.header()
+        for values, s in self._series.items():
+            out.append(f"{self.name}{_label_str(self.labelnames, values)} {_fmt(s.value)}")
+        return out
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *values: str, amount: float = 1.0) -> None:
+        self.labels(*values).value -= amount
+
+    def set(self, value: float, *values: str) -> None:
+        self.labels(*values).value = float(value)
+
+
+class _HistSeries:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, n: int) -> None:
+        self.counts = [0] * n
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets: Tuple[float, ...] = tuple(sorted(float(b) for b in buckets))
+        self._series: Dict[Tuple[str, ...], _HistSeries] = {}
+
+    def labels(self, *values: str) -> _HistSeries:
+        s = self._series.get(values)
+        if s is None:
+            # +1: Überlauf-Bucket (+Inf)
+            s = self._series.setdefault(values, _HistSeries(len(self.buckets) + 1))
+        return s
+
+    def observe(self, value: float, *values: str) -> None:
+        s = self.labels(*values)
+        s.counts[bisect_left(self.buckets, value)] += 1
+        s.sum += value
+        s.count += 1
+
+    def snapshot(self, *values: str) -> Optional[Dict[str, float]]:
+        s = self._series.get(values)
+        if s is None:
+            return None
+        return {"count": s.count, "sum": s.sum}
+
+    def render(self) -> List[str]:
+        out = self.header()
+        for values, s in self._series.items():
+            acc = 0
+            for bound, c in zip(self.buckets, s.counts):
+                acc += c
+                le = 'le="' + _fmt(bound) + '"'
+                out.append(f"{self.name}_bucket{_label_str(self.labelnames, values, le)} {acc}")
+            acc += s.counts[-1]
+            le_inf = 'le="+Inf"'
+            out.append(f"{self.name}_bucket{_label_str(self.labelnames, values, le_inf)} {acc}")
+            out.append(f"{self.name}_sum{_label_str(self.labelnames, values)} {_fmt(s.sum)}")
+            out.append(f"{self.name}_count{_label_str(self.labelnames, values)} {s.count}")
+        return out
+
+
+# Collector: liefert (Name, Typ, Hilfe, [(Labels, Wert), ...]) beim Scrape
+Sample = Tuple[Dict[str, str], float]
+CollectorResult = Iterable[Tuple[str, str, str, List[Sample]]]
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], CollectorResult]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))  # type: ignore[return-value]
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))  # type: ignore[return-value]
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))  # type: ignore[return-value]
+
+    def add_collector(self, fn: Callable[[], CollectorResult]) -> None:
+        self._collectors.append(fn)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        for fn in list(self._collectors):
+            try:
+                families = list(fn())
+            except Exception:
+                # Scrape darf nie an einer einzelnen Quelle scheitern
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    names = tuple(labels.keys())
+                    lines.append(f"{name}{_label_str(names, tuple(labels[n] for n in names))} {_fmt(float(value))}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# --- HTTP ---
+HTTP_REQUESTS = REGISTRY.counter(
+    "cvn_http_requests_total", "HTTP-Requests nach Route, Methode und Status.", ("route", "method", "status")
+)
+HTTP_DURATION = REGISTRY.histogram(
+    "cvn_http_request_duration_seconds",
+    "Dauer bis zum Response-Start je Route und Modus (Streaming: bis zu den Headern).",
+    ("route", "mode"),
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge("cvn_http_requests_in_flight", "Laufende HTTP-Requests je Route.", ("route",))
+RATE_LIMIT_REJECTIONS = REGISTRY.counter(
+    "cvn_rate_limit_rejections_total", "Vom Rate-Limiter abgewiesene Requests (429).", ("route",)
+)
+RATE_LIMIT_KEYS = REGISTRY.gauge("cvn_rate_limit_tracked_keys", "Vom Rate-Limiter verfolgte Clients (Buckets).")
+RATE_LIMIT_EVICTIONS = REGISTRY.counter(
+    "cvn_rate_limit_evictions_total", "Entfernte Rate-Limit-Buckets je Grund (idle|capacity).", ("reason",)
+)
+
+# --- Upstream (Ollama) ---
+UPSTREAM_DURATION = REGISTRY.histogram(
+    "cvn_upstream_request_duration_seconds",
+    "Dauer der Upstream-Aufrufe (chat: bis zur Antwort, chat_stream: gesamter Stream).",
+    ("kind", "outcome"),
+)
+STREAM_TTFT = REGISTRY.histogram(
+    "cvn_stream_time_to_first_token_seconds", "Zeit bis zum ersten Token bei /chat/stream.", ("mode",)
+)
+STREAM_TOKENS_PER_SECOND = REGISTRY.histogram(
+    "cvn_stream_tokens_per_second", "Generierungsrate je Stream (eval_count/eval_duration von Ollama).", ("mode",),
+    buckets=RATE_BUCKETS,
+)
+STREAMS_IN_FLIGHT = REGISTRY.gauge("cvn_chat_streams_in_flight", "Laufende /chat/stream-Generatoren.")
+UPSTREAM_COALESCED = REGISTRY.counter(
+    "cvn_upstream_coalesced_total", "Requests, die an eine laufende identische Generierung angehängt wurden.", ("kind",)
+)
+UPSTREAM_FLIGHTS_IN_FLIGHT = REGISTRY.gauge(
+    "cvn_upstream_flights_in_flight", "Laufende gemeinsame Upstream-Generierungen (Single-Flight)."
+)
+
+# --- Stufen (app.services.offload / Prompt-Pipeline) ---
+STAGE_DURATION = REGISTRY.histogram(
+    "cvn_stage_duration_seconds", "Dauer je Stufe (context_notes, rag, prompt.*).", ("stage",), buckets=STAGE_BUCKETS
+)
+STAGE_FAILURES = REGISTRY.counter(
+    "cvn_stage_failures_total", "Abgebrochene Stufen je Grund (timeout|error).", ("stage", "reason")
+)
+PROMPT_BUDGET_DROPPED = REGISTRY.counter(
+    "cvn_prompt_budget_dropped_tokens_total",
+    "Vom Prompt-Budget verworfene Tokens je Quelle (notes|rag|history).",
+    ("source",),
+)
+PROMPT_TOKENS = REGISTRY.counter("cvn_prompt_tokens_total", "Geschätzte Prompt-Tokens (Layout-Stufe).")
+PROMPT_PREFIX_REUSED_TOKENS = REGISTRY.counter(
+    "cvn_prompt_prefix_reused_tokens_total", "Geschätzte Prompt-Tokens im gemeinsamen Präfix zum vorigen Turn der Session."
+)
+
+
+def _collect_runtime() -> CollectorResult:
+    """Scrape-Zeit: Event-Loop-Lag, Cache-Trefferquoten, Memory-Sessions."""
+    from .offload import loop_lag_monitor
+
+    lag = loop_lag_monitor.stats()
+    yield ("cvn_event_loop_lag_seconds", "gauge", "Letzte gemessene Event-Loop-Verspätung.",
+           [({}, lag["last_lag_ms"] / 1000.0)])
+    yield ("cvn_event_loop_lag_max_seconds", "gauge", "Maximale Event-Loop-Verspätung seit Start.",
+           [({}, lag["max_lag_ms"] / 1000.0)])
+    yield ("cvn_event_loop_stalls_total", "counter", "Loop-Verspätungen über EVENT_LOOP_STALL_THRESHOLD_MS.",
+           [({}, lag["stalls"])])
+
+    caches: List[Tuple[str, float, float]] = []
+    try:
+        from utils.context_notes import context_notes_cache_stats
+
+        cn = context_notes_cache_stats()
+        caches.append(("context_notes", cn["hits"], cn["misses"]))
+    except Exception:
+        pass
+    try:
+        from . import rag_search
+
+        qc = rag_search._QUERY_CACHE
+        if qc is not None:
+            st = qc.stats()
+            caches.append(("query_embedding", st["hits"], st["misses"]))
+    except Exception:
+        pass
+    try:
+        from . import response_cache
+
+        rc = response_cache._CACHE
+        if rc is not None:
+            st = rc.stats()
+            caches.append(("response", st["hits"], st["misses"]))
+    except Exception:
+        pass
+    if caches:
+        yield ("cvn_cache_hits_total", "counter", "Cache-Treffer je Cache.", [({"cache": n}, h) for n, h, _ in caches])
+        yield ("cvn_cache_misses_total", "counter", "Cache-Fehlgriffe je Cache.", [({"cache": n}, m) for n, _, m in caches])
+        yield ("cvn_cache_hit_ratio", "gauge", "Trefferquote je Cache (hits / (hits + misses)).",
+               [({"cache": n}, (h / (h + m)) if (h + m) else 0.0) for n, h, m in caches])
+
+    try:
+        from utils.rag import cached_index_stats
+
+        idx = cached_index_stats()
+    except Exception:
+        idx = []
+    if idx:
+        yield ("cvn_rag_index_reloads_total", "counter", "(Neu-)Ladevorgänge je gecachtem Index.",
+               [({"path": str(st["path"])}, float(st["reloads"])) for st in idx])  # type: ignore[arg-type]
+
+    store = None
+    try:
+        from ..core import memory as _memory
+
+        store = _memory._STORE
+        count = store.session_count() if store is not None else None
+    except Exception:
+        count = None
+    if count is not None:
+        yield ("cvn_memory_sessions", "gauge", "Sessions im Memory-Store.",
+               [({"store": type(store).__name__}, float(count))])
+    try:
+        mem = store.stats() if store is not None else None
+    except Exception:
+        mem = None
+    if mem:
+        labels = {"store": type(store).__name__}
+        yield ("cvn_memory_turns", "gauge", "Gespeicherte Turns im Memory-Store.", [(labels, mem["turns"])])
+        yield ("cvn_memory_bytes", "gauge", "Belegte Inhalts-Bytes (UTF-8) im Memory-Store.", [(labels, mem["bytes"])])
+        yield ("cvn_memory_evictions_total", "counter", "Entfernte Sessions je Grund (sessions|chars|idle).",
+               [({**labels, "reason": k[len("evicted_"):]}, v) for k, v in mem.items() if k.startswith("evicted_")])
+
+
+REGISTRY.add_collector(_collect_runtime)
+
+
+def route_label(path: str, known: Iterable[str]) -> str:
+    """Begrenzt die Kardinalität: nur bekannte Routen, sonst "other"."""
+    return path if path in known else "other"
+
+
+__all__ = [
+    "CONTENT_TYPE",
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "Registry",
+    "REGISTRY",
+    "HTTP_REQUESTS",
+    "HTTP_DURATION",
+    "HTTP_IN_FLIGHT",
+    "RATE_LIMIT_REJECTIONS",
+    "UPSTREAM_DURATION",
+    "STREAM_TTFT",
+    "STREAM_TOKENS_PER_SECOND",
+    "STREAMS_IN_FLIGHT",
+    "UPSTREAM_COALESCED",
+    "UPSTREAM_FLIGHTS_IN_FLIGHT",
+    "STAGE_DURATION",
+    "STAGE_FAILURES",
+    "PROMPT_BUDGET_DROPPED",
+    "PROMPT_TOKENS",
+    "PROMPT_PREFIX_REUSED_TOKENS",
+    "route_label",
+]
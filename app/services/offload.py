@@ -0,0 +1,210 @@
+"""
+Blockierende Arbeit (Datei-I/O, CPU) aus dem Event-Loop auslagern.
+
+- Ein begrenzter ThreadPoolExecutor (BLOCKING_POOL_WORKERS) für synchrone Stufen
+  wie Kontext-Notizen laden, RAG-Index laden und Retrieval
+- run_stage(): misst Dauer je Stufe, bricht nach einem Timeout ab und liefert dann einen
+  Default (z. B. "keine Notizen"/"kein RAG"), statt die Antwort zu verzögern
+- LoopLagMonitor: misst, wie stark der Event-Loop verspätet aufwacht (Stalls), und zählt
+  Überschreitungen von EVENT_LOOP_STALL_THRESHOLD_MS
+
+Hinweis: Nach einem Timeout läuft der Worker-Thread weiter, bis die Funktion zurückkehrt;
+der Pool ist begrenzt, d. h. hängende Stufen führen zu weiteren Timeouts statt zu Stalls.
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from ..core.settings import settings
+from .metrics import STAGE_DURATION, STAGE_FAILURES
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Gemeinsamer, begrenzter Thread-Pool (lazy erzeugt)."""
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        with _EXECUTOR_LOCK:
+            if _EXECUTOR is None:
+                _EXECUTOR = ThreadPoolExecutor(
+                    max_workers=max(1, int(getattr(settings, "BLOCKING_POOL_WORKERS", 4))),
+                    thread_name_prefix="cvn-blocking",
+                )
+    return _EXECUTOR
+
+
+def shutdown_executor() -> None:
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        ex, _EXECUTOR = _EXECUTOR, None
+    if ex is not None:
+        ex.shutdown(wait=False, cancel_futures=True)
+
+
+async def run_blocking(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Führt `fn` im Thread-Pool aus und wartet asynchron auf das Ergebnis."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(fn, *args, **kwargs))
+
+
+class StageStats:
+    __slots__ = ("calls", "timeouts", "errors", "total_ms", "max_ms", "last_ms")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_ms = 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "total_ms": round(self.total_ms, 3),
+            "max_ms": round(self.max_ms, 3),
+            "last_ms": round(self.last_ms, 3),
+        }
+
+
+_STAGES: Dict[str, StageStats] = {}
+_STAGES_LOCK = threading.Lock()
+
+
+def _record(stage: str, ms: float, timeout: bool = False, error: bool = False) -> None:
+    with _STAGES_LOCK:
+        st = _STAGES.get(stage)
+        if st is None:
+            st = _STAGES[stage] = StageStats()
+        st.calls += 1
+        st.total_ms += ms
+        st.last_ms = ms
+        if ms > st.max_ms:
+            st.max_ms = ms
+        if timeout:
+            st.timeouts += 1
+        if error:
+            st.errors += 1
+    STAGE_DURATION.observe(ms / 1000.0, stage)
+    if timeout:
+        STAGE_FAILURES.inc(stage, "timeout")
+    elif error:
+        STAGE_FAILURES.inc(stage, "error")
+
+
+def record_stage(stage: str, ms: float) -> None:
+    """Dauer einer (synchron gemessenen) Stufe in stage_stats() aufnehmen."""
+    _record(stage, ms)
+
+
+async def run_stage(stage: str, work: Awaitable[T], timeout: Optional[float], default: T) -> T:
+    """Wartet auf `work` (höchstens `timeout` Sekunden; None/<=0 = ohne Limit).
+
+    Bei Timeout oder Fehler wird `default` geliefert; Dauer/Timeouts/Fehler landen in stage_stats().
+    """
+    t0 = time.perf_counter()
+    try:
+        if timeout is not None and timeout > 0:
+            result = await asyncio.wait_for(work, timeout)
+        else:
+            result = await work
+    except asyncio.TimeoutError:
+        ms = (time.perf_counter() - t0) * 1000.0
+        _record(stage, ms, timeout=True)
+        logger.warning(f"Stufe '{stage}' nach {ms:.0f} ms abgebrochen (Timeout {timeout}s) – ohne Ergebnis fortgesetzt")
+        return default
+    except Exception as e:
+        _record(stage, (time.perf_counter() - t0) * 1000.0, error=True)
+        logger.debug(f"Stufe '{stage}' fehlgeschlagen: {e}")
+        return default
+    _record(stage, (time.perf_counter() - t0) * 1000.0)
+    return result
+
+
+def stage_stats() -> Dict[str, Dict[str, float]]:
+    with _STAGES_LOCK:
+        return {name: st.as_dict() for name, st in _STAGES.items()}
+
+
+class LoopLagMonitor:
+    """Misst die Verspätung des Event-Loops (Soll- vs. Ist-Aufwachzeit eines Sleeps)."""
+
+    def __init__(self, interval: float = 0.25, stall_threshold_ms: float = 50.0) -> None:
+        self.interval = max(0.01, float(interval))
+        self.stall_threshold_ms = max(0.0, float(stall_threshold_ms))
+        self.samples = 0
+        self.stalls = 0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self.total_stall_ms = 0.0
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def observe(self, lag_ms: float) -> None:
+        lag_ms = max(0.0, lag_ms)
+        self.samples += 1
+        self.last_lag_ms = lag_ms
+        if lag_ms > self.max_lag_ms:
+            self.max_lag_ms = lag_ms
+        if lag_ms >= self.stall_threshold_ms:
+            self.stalls += 1
+            self.total_stall_ms += lag_ms
+
+    async def _run(self) -> None:
+        while True:
+            t0 = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.observe((time.perf_counter() - t0 - self.interval) * 1000.0)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "samples": self.samples,
+            "stalls": self.stalls,
+            "last_lag_ms": round(self.last_lag_ms, 3),
+            "max_lag_ms": round(self.max_lag_ms, 3),
+            "total_stall_ms": round(self.total_stall_ms, 3),
+        }
+
+
+loop_lag_monitor = LoopLagMonitor(
+    interval=float(getattr(settings, "EVENT_LOOP_LAG_INTERVAL_SEC", 0.25)),
+    stall_threshold_ms=float(getattr(settings, "EVENT_LOOP_STALL_THRESHOLD_MS", 50.0)),
+)
+
+
+__all__ = [
+    "get_executor",
+    "shutdown_executor",
+    "run_blocking",
+    "run_stage",
+    "record_stage",
+    "stage_stats",
+    "LoopLagMonitor",
+    "loop_lag_monitor",
+]
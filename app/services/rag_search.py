@@ -0,0 +1,140 @@
+"""
+RAG-Suche für den Chat-Pfad: Sparse (TF-IDF/BM25), Dense (Embeddings) oder Hybrid (RRF).
+
+- RAG_MODE=sparse: wie bisher utils.rag.retrieve
+- RAG_MODE=dense|hybrid: Vektordatei (RAG_DENSE_PATH bzw. <RAG_INDEX_PATH>.dense.npy) wird
+  prozessweit gecacht (Hot-Reload wie der Sparse-Index); die Query wird über Ollama
+  eingebettet (gepoolter Client, Cache per Text-Hash)
+- Suche/Index-Laden laufen im Thread-Pool (app.services.offload), nicht im Event-Loop
+- Fehlt NumPy, die Vektordatei, passt sie nicht zum Sparse-Index (Modell, Zeilenzahl oder
+  Inhalts-Signatur der Chunks) oder schlägt das Embedding fehl, wird auf Sparse zurückgefallen (fail-open)
+"""
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..core.settings import settings
+from .http_client import get_http_client
+from .offload import run_blocking
+
+logger = logging.getLogger(__name__)
+
+_QUERY_CACHE: Optional[Any] = None
+
+
+def _query_cache() -> Any:
+    global _QUERY_CACHE
+    if _QUERY_CACHE is None:
+        from utils.rag_dense import QueryEmbeddingCache
+
+        _QUERY_CACHE = QueryEmbeddingCache(int(getattr(settings, "RAG_QUERY_EMBED_CACHE_SIZE", 512)))
+    return _QUERY_CACHE
+
+
+def dense_path() -> str:
+    explicit = getattr(settings, "RAG_DENSE_PATH", None)
+    if explicit:
+        return str(explicit)
+    from utils.rag_dense import dense_path_for
+
+    return dense_path_for(str(getattr(settings, "RAG_INDEX_PATH", "eval/results/rag/index.json")))
+
+
+async def embed_query(query: str) -> Optional[List[float]]:
+    """Query-Embedding (gecacht); None bei Fehlern."""
+    from utils.rag_dense import OllamaEmbedder
+
+    model = str(getattr(settings, "RAG_EMBED_MODEL", "nomic-embed-text"))
+    cache = _query_cache()
+    vec = cache.get(model, query)
+    if vec is not None:
+        return vec
+    embedder = OllamaEmbedder(
+        settings.OLLAMA_HOST, model, timeout=float(getattr(settings, "RAG_EMBED_TIMEOUT", 10.0))
+    )
+    try:
+        got = await embedder.aembed([query], client=get_http_client())
+    except Exception as e:
+        logger.warning(f"RAG: Query-Embedding fehlgeschlagen ({e}); Fallback auf Sparse")
+        return None
+    if not got:
+        return None
+    cache.put(model, query, got[0])
+    return got[0]
+
+
+_SPARSE_SIGNATURE: Optional[Tuple[Any, str]] = None
+
+
+def _sparse_signature(index: Any) -> str:
+    """Inhalts-Signatur des Sparse-Index, einmal je Index-Objekt berechnet (Hot-Reload liefert ein neues)."""
+    global _SPARSE_SIGNATURE
+    cached = _SPARSE_SIGNATURE
+    if cached is not None and cached[0] is index:
+        return cached[1]
+    from utils.rag_dense import index_signature
+
+    sig = index_signature(index)
+    _SPARSE_SIGNATURE = (index, sig)
+    return sig
+
+
+def _n_chunks(index: Any) -> int:
+    n = getattr(index, "n_chunks", None)
+    if n is not None:
+        return int(n)
+    return len(getattr(index, "chunks", []))
+
+
+async def retrieve_hits(
+    index: Any,
+    query: str,
+    top_k: int,
+    scorer: str = "tfidf",
+    bm25: Optional[Any] = None,
+) -> List[Dict[str, str]]:
+    """Top-K Treffer {source, content, score} gemäß RAG_MODE."""
+    from utils.rag import get_cached_index, hits_for, retrieve
+
+    mode = str(getattr(settings, "RAG_MODE", "sparse") or "sparse").lower()
+    if mode not in ("dense", "hybrid"):
+        return await run_blocking(retrieve, index, query, top_k=top_k, scorer=scorer, bm25=bm25)
+
+    try:
+        from utils.rag_dense import DenseIndex, rrf_fuse
+    except Exception:
+        # NumPy nicht installiert
+        return await run_blocking(retrieve, index, query, top_k=top_k, scorer=scorer, bm25=bm25)
+
+    dense = await run_blocking(
+        get_cached_index,
+        dense_path(),
+        check_interval=float(getattr(settings, "RAG_INDEX_CHECK_INTERVAL_SEC", 1.0)),
+        loader=DenseIndex.open,
+    )
+    model = str(getattr(settings, "RAG_EMBED_MODEL", "nomic-embed-text"))
+    if dense is None or dense.n_rows != _n_chunks(index) or dense.model != model:
+        return await run_blocking(retrieve, index, query, top_k=top_k, scorer=scorer, bm25=bm25)
+    # Gleiche Zeilenzahl reicht nicht: nach einem Re-Index gehörten die Vektoren sonst zu anderen Texten
+    if dense.signature != await run_blocking(_sparse_signature, index):
+        logger.warning("RAG: Vektordatei passt nicht zum Sparse-Index (veraltet); Fallback auf Sparse")
+        return await run_blocking(retrieve, index, query, top_k=top_k, scorer=scorer, bm25=bm25)
+    qvec = await embed_query(query)
+    if qvec is None:
+        return await run_blocking(retrieve, index, query, top_k=top_k, scorer=scorer, bm25=bm25)
+
+    if mode == "dense":
+        return await run_blocking(lambda: hits_for(index, dense.search(qvec, top_k)))
+    n_cand = max(int(top_k), int(getattr(settings, "RAG_HYBRID_CANDIDATES", 20)))
+    rrf_k = int(getattr(settings, "RAG_RRF_K", 60))
+
+    def _hybrid() -> List[Dict[str, str]]:
+        sparse_ranked = [pos for _, pos in index.search(query, n_cand, scorer=scorer, bm25=bm25)]
+        dense_ranked = [pos for _, pos in dense.search(qvec, n_cand)]
+        return hits_for(index, rrf_fuse([sparse_ranked, dense_ranked], top_k, k=rrf_k))
+
+    return await run_blocking(_hybrid)
+
+
+__all__ = ["retrieve_hits", "embed_query", "dense_path"]
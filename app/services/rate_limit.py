@@ -0,0 +1,150 @@
+"""
+Token-Bucket-Rate-Limiter mit begrenztem Speicher.
+
+- Pro Schlüssel (Client-IP) nur zwei Floats: verbleibende Tokens und Zeitpunkt der letzten
+  Auffüllung; jede Prüfung ist O(1) (keine Zeitstempel-Listen je Request)
+- Bucket-Größe = Limit (Requests pro Fenster + Burst), Auffüllrate = Requests pro Fenster / Fenster
+- Schlüssel liegen in LRU-Reihenfolge: inaktive Buckets fallen nach `idle_ttl` weg (Standard: Zeit
+  bis zur vollständigen Auffüllung – ein voller Bucket entspricht einem neuen, das Entfernen ist
+  also verlustfrei); über `max_keys` wird der am längsten ungenutzte Schlüssel verdrängt
+- Kein Lock: Aufrufe erfolgen aus dem Event-Loop ohne `await` zwischen Lesen und Schreiben
+- SharedTokenBucket: gleiche Rechnung auf app.services.shared_state (ein atomares `update` je
+  Prüfung, TTL = Idle-TTL), damit mehrere Worker-Prozesse ein gemeinsames Limit durchsetzen
+"""
+from __future__ import annotations
+
+import math
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .shared_state import SharedState
+
+EvictHook = Callable[[str], None]
+
+
+class Decision(NamedTuple):
+    allowed: bool
+    remaining: int
+    retry_after: float
+
+
+def _take(tokens: float, last: float, now: float, limit: int, rate: float) -> Tuple[float, Decision]:
+    """Bucket auf `now` auffüllen und ein Token entnehmen; liefert neuen Stand und Entscheidung."""
+    tokens = min(float(limit), tokens + max(0.0, now - last) * rate)
+    if tokens >= 1.0:
+        tokens -= 1.0
+        return tokens, Decision(True, int(tokens), 0.0)
+    return tokens, Decision(False, 0, (1.0 - tokens) / rate)
+
+
+class TokenBucketLimiter:
+    def __init__(
+        self,
+        limit: int,
+        rate_per_sec: float,
+        *,
+        max_keys: int = 10000,
+        idle_ttl: Optional[float] = None,
+        on_evict: Optional[EvictHook] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.limit = max(1, int(limit))
+        self.rate = max(1e-9, float(rate_per_sec))
+        self.max_keys = max(1, int(max_keys))
+        full_refill = self.limit / self.rate
+        self.idle_ttl = float(idle_ttl) if idle_ttl and idle_ttl > 0 else full_refill
+        self.on_evict = on_evict
+        self.clock = clock
+        # key -> [tokens, last]; älteste Nutzung vorne
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+        self.evicted_idle = 0
+        self.evicted_capacity = 0
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._buckets
+
+    def _evict(self, now: float) -> None:
+        buckets = self._buckets
+        cutoff = now - self.idle_ttl
+        # LRU-Reihenfolge: nur der Anfang kann abgelaufen sein (amortisiert O(1))
+        while buckets:
+            key, state = next(iter(buckets.items()))
+            if state[1] > cutoff:
+                break
+            del buckets[key]
+            self.evicted_idle += 1
+            if self.on_evict is not None:
+                self.on_evict("idle")
+        while len(buckets) >= self.max_keys:
+            buckets.popitem(last=False)
+            self.evicted_capacity += 1
+            if self.on_evict is not None:
+                self.on_evict("capacity")
+
+    def acquire(self, key: str, now: Optional[float] = None) -> Decision:
+        """Ein Token für `key` entnehmen; liefert Erlaubnis, Rest-Tokens und Wartezeit in Sekunden."""
+        now = self.clock() if now is None else now
+        state = self._buckets.get(key)
+        if state is None:
+            self._evict(now)
+            state = [float(self.limit), now]
+            self._buckets[key] = state
+        else:
+            self._buckets.move_to_end(key)
+        state[0], decision = _take(state[0], state[1], now, self.limit, self.rate)
+        state[1] = now
+        return decision
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "keys": float(len(self._buckets)),
+            "max_keys": float(self.max_keys),
+            "evicted_idle": float(self.evicted_idle),
+            "evicted_capacity": float(self.evicted_capacity),
+        }
+
+
+class SharedTokenBucket:
+    """Token-Bucket im gemeinsamen Zustand (Schlüssel `<prefix><client>`, Wert `[tokens, last]`)."""
+
+    def __init__(
+        self,
+        state: "SharedState",
+        limit: int,
+        rate_per_sec: float,
+        *,
+        idle_ttl: Optional[float] = None,
+        prefix: str = "rl:",
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.state = state
+        self.limit = max(1, int(limit))
+        self.rate = max(1e-9, float(rate_per_sec))
+        full_refill = self.limit / self.rate
+        self.idle_ttl = float(idle_ttl) if idle_ttl and idle_ttl > 0 else full_refill
+        self.prefix = prefix
+        # Wanduhr statt monotonic: der Zeitstempel wird zwischen Prozessen geteilt
+        self.clock = clock
+
+    def acquire(self, key: str, now: Optional[float] = None) -> Decision:
+        ts = self.clock() if now is None else now
+
+        def _step(cur: Any) -> Tuple[List[float], Decision]:
+            tokens, last = (float(cur[0]), float(cur[1])) if cur else (float(self.limit), ts)
+            tokens, decision = _take(tokens, last, ts, self.limit, self.rate)
+            return [tokens, ts], decision
+
+        return self.state.update(self.prefix + key, _step, ttl=self.idle_ttl)
+
+
+def retry_after_header(seconds: float) -> str:
+    """Retry-After in ganzen Sekunden (aufgerundet, mindestens 1)."""
+    return str(max(1, int(math.ceil(seconds))))
+
+
+__all__ = ["Decision", "TokenBucketLimiter", "SharedTokenBucket", "retry_after_header"]
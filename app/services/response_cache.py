@@ -0,0 +1,234 @@
+"""
+Antwort-Cache für deterministische Chat-Requests (RESPONSE_CACHE_ENABLED).
+
+- Schlüssel: SHA-256 über kanonisches JSON (wie utils.eval_cache.make_key) aus Upstream-Host, Modell,
+  fertig zusammengestellten Nachrichten (nach Pipeline, Budget, Layout) und normalisierten Options
+  (normalize_ollama_options); der Host kommt aus options.host, verschiedene Ollama-Instanzen teilen also
+  keine Einträge. /chat und /chat/stream teilen sich die Einträge
+- Nur deterministische Options sind zulässig: temperature == 0 oder fester seed
+- Requests mit session_id werden nie gecacht (Memory-Seiteneffekte, Verlauf im Prompt)
+- Gespeichert werden die rohen Modell-Chunks vor der Post-Policy; Policy, Meta-Events usw.
+  laufen bei einem Treffer wie gewohnt, /chat/stream spielt die Chunks als SSE wieder ab
+- Speicher-Tier: LRU mit Byte-Budget (RESPONSE_CACHE_MAX_BYTES) und TTL (RESPONSE_CACHE_TTL_SEC);
+  optional ein Datei-Tier (RESPONSE_CACHE_DIR, eine JSON-Datei je Schlüssel, Datei-I/O im Thread-Pool)
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple, cast
+
+from ..core.settings import settings
+from .offload import run_blocking
+
+logger = logging.getLogger(__name__)
+
+# Version im Schlüssel: bei Formatänderungen werden alte Datei-Einträge einfach nicht mehr getroffen
+_KEY_VERSION = 2
+
+
+def is_deterministic(options: Mapping[str, Any]) -> bool:
+    """True bei temperature == 0 oder gesetztem seed (normalisierte Options)."""
+    if options.get("seed") is not None:
+        return True
+    try:
+        return float(options.get("temperature", 1.0)) <= 0.0
+    except (TypeError, ValueError):
+        return False
+
+
+def cache_key(model: str, messages: Sequence[Mapping[str, Any]], options: Mapping[str, Any], host: str = "") -> str:
+    payload: Dict[str, Any] = {
+        "v": _KEY_VERSION,
+        "host": host,
+        "model": model,
+        "messages": [{"role": str(m.get("role", "")), "content": str(m.get("content", ""))} for m in messages],
+        "options": dict(options),
+    }
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _nbytes(chunks: Sequence[str]) -> int:
+    return sum(len(c.encode("utf-8")) for c in chunks)
+
+
+class ResponseCache:
+    """LRU (Byte-Budget + TTL) im Speicher, optional mit Datei-Tier."""
+
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl_sec: float,
+        disk_dir: Optional[Path] = None,
+        *,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.max_bytes = max(0, int(max_bytes))
+        self.ttl_sec = max(0.0, float(ttl_sec))
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self._clock = clock
+        # key -> (läuft ab um, Chunks, Bytes); zuletzt genutzt hinten
+        self._data: "OrderedDict[str, Tuple[float, Tuple[str, ...], int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _expires(self) -> float:
+        return self._clock() + self.ttl_sec if self.ttl_sec > 0 else float("inf")
+
+    # --- Speicher-Tier ---------------------------------------------------------
+
+    def _mem_get(self, key: str) -> Optional[List[str]]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            if item[0] <= self._clock():
+                del self._data[key]
+                self._bytes -= item[2]
+                return None
+            self._data.move_to_end(key)
+            return list(item[1])
+
+    def _mem_put(self, key: str, chunks: Sequence[str], expires: float) -> None:
+        size = _nbytes(chunks)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._data[key] = (expires, tuple(chunks), size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._data:
+                _, (_, _, dropped) = self._data.popitem(last=False)
+                self._bytes -= dropped
+                self.evictions += 1
+
+    # --- Datei-Tier ------------------------------------------------------------
+
+    def _path(self, key: str) -> Path:
+        assert self.disk_dir is not None
+        return self.disk_dir / key[:2] / f"{key}.json"
+
+    def _disk_get(self, key: str) -> Optional[Tuple[float, List[str]]]:
+        path = self._path(key)
+        try:
+            with path.open("r", encoding="utf-8") as f:
+                data = cast(Dict[str, Any], json.load(f))
+            expires = float(data.get("expires") or 0) or float("inf")
+            raw_chunks: List[Any] = data.get("chunks") or []
+            chunks = [str(c) for c in raw_chunks]
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logger.debug("Response-Cache: Datei unlesbar %s", path, exc_info=True)
+            return None
+        if expires <= self._clock():
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            return None
+        return expires, chunks
+
+    def _disk_put(self, key: str, chunks: Sequence[str], expires: float) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        data: Dict[str, Any] = {"expires": expires if expires != float("inf") else 0, "chunks": list(chunks)}
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    # --- API -------------------------------------------------------------------
+
+    async def get(self, key: str) -> Optional[List[str]]:
+        chunks = self._mem_get(key)
+        if chunks is not None:
+            self.hits += 1
+            return chunks
+        if self.disk_dir is not None:
+            found = await run_blocking(self._disk_get, key)
+            if found is not None:
+                expires, chunks = found
+                self._mem_put(key, chunks, expires)
+                self.hits += 1
+                self.disk_hits += 1
+                return chunks
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, chunks: Sequence[str]) -> None:
+        if not chunks:
+            return
+        expires = self._expires()
+        self._mem_put(key, chunks, expires)
+        if self.disk_dir is not None:
+            try:
+                await run_blocking(self._disk_put, key, list(chunks), expires)
+            except Exception as e:
+                logger.warning(f"Response-Cache: Schreiben fehlgeschlagen ({e})")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+_CACHE: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Prozessweiter Cache; None, wenn RESPONSE_CACHE_ENABLED aus ist."""
+    global _CACHE
+    if not bool(getattr(settings, "RESPONSE_CACHE_ENABLED", False)):
+        return None
+    if _CACHE is None:
+        _CACHE = ResponseCache(
+            int(getattr(settings, "RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+            float(getattr(settings, "RESPONSE_CACHE_TTL_SEC", 3600.0)),
+            getattr(settings, "RESPONSE_CACHE_DIR", None),
+        )
+    return _CACHE
+
+
+def response_cache_key(session_id: Optional[str], payload: Mapping[str, Any], host: str = "") -> Optional[str]:
+    """Schlüssel für einen Upstream-Payload an `host` oder None, wenn der Request nicht cachebar ist."""
+    if session_id or get_response_cache() is None:
+        return None
+    options: Dict[str, Any] = payload.get("options") or {}
+    if not is_deterministic(options):
+        return None
+    messages: List[Mapping[str, Any]] = payload.get("messages") or []
+    return cache_key(str(payload.get("model") or ""), messages, options, host)
+
+
+__all__ = [
+    "ResponseCache",
+    "cache_key",
+    "get_response_cache",
+    "is_deterministic",
+    "response_cache_key",
+]
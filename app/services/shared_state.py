@@ -0,0 +1,296 @@
+"""
+Gemeinsamer Zustand über Worker-Prozesse hinweg (Rate-Limits, Sitzungsmodi, Session-Memory).
+
+Schnittstelle an Redis angelehnt (Schlüssel/Wert mit TTL, Werte JSON-serialisierbar):
+
+- get / mget, set / mset (ein Aufruf = eine Transaktion), delete
+- update(key, fn, ttl): atomares Read-Modify-Write; `fn(alt) -> (neu, ergebnis)`, `neu=None` löscht
+  (entspricht WATCH/MULTI bzw. einem Lua-Skript bei Redis)
+- pipeline(): sammelt set/delete/update und führt sie in einer Transaktion aus
+
+Backends (SHARED_STATE_BACKEND):
+- "none" (Default): kein gemeinsamer Zustand – Komponenten nutzen ihre prozesslokalen Strukturen
+- "local": LocalState, prozesslokaler Stand-in mit identischer Semantik (Tests/Entwicklung)
+- "sqlite": SqliteState, eine Datei im WAL-Modus (SHARED_STATE_PATH); mehrere uvicorn-Worker auf
+  einem Host teilen sich so Limits und Sitzungszustand. Schreibende Transaktionen mit
+  `BEGIN IMMEDIATE`, abgelaufene Schlüssel werden beim Schreiben gelegentlich entfernt.
+
+Aufrufe sind synchron und kurz; async Aufrufer mit potentiell vielen Zugriffen nutzen
+app.services.offload.run_blocking.
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+from abc import ABC, abstractmethod
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from ..core.settings import settings
+
+UpdateFn = Callable[[Any], Tuple[Any, Any]]
+
+# Schreibvorgänge zwischen zwei Aufräumläufen für abgelaufene Schlüssel (SqliteState)
+_PURGE_EVERY = 256
+
+
+def _expires(ttl: Optional[float], now: float) -> Optional[float]:
+    return now + float(ttl) if ttl is not None and ttl > 0 else None
+
+
+class SharedState(ABC):
+    """Abstrakte Schnittstelle; `pipeline()` baut auf `_apply` der Backends auf."""
+
+    backend = "none"
+
+    @abstractmethod
+    def get(self, key: str) -> Any:  # pragma: no cover - interface
+        ...
+
+    @abstractmethod
+    def mget(self, keys: Sequence[str]) -> List[Any]:  # pragma: no cover - interface
+        ...
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self.mset({key: value}, ttl=ttl)
+
+    def mset(self, items: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        self._apply([("set", key, value, ttl) for key, value in items.items()])
+
+    def delete(self, *keys: str) -> None:
+        self._apply([("delete", key, None, None) for key in keys])
+
+    def update(self, key: str, fn: UpdateFn, ttl: Optional[float] = None) -> Any:
+        return self._apply([("update", key, fn, ttl)])[0]
+
+    def pipeline(self) -> "Pipeline":
+        return Pipeline(self)
+
+    @abstractmethod
+    def _apply(self, ops: List[Tuple[str, str, Any, Optional[float]]]) -> List[Any]:  # pragma: no cover - interface
+        """Operationen atomar in einer Transaktion ausführen; liefert je Operation ein Ergebnis."""
+
+    def close(self) -> None:
+        return None
+
+
+class Pipeline:
+    """Gepufferte Operationen, die `execute()` in einer Transaktion anwendet."""
+
+    def __init__(self, state: SharedState) -> None:
+        self._state = state
+        self._ops: List[Tuple[str, str, Any, Optional[float]]] = []
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> "Pipeline":
+        self._ops.append(("set", key, value, ttl))
+        return self
+
+    def delete(self, key: str) -> "Pipeline":
+        self._ops.append(("delete", key, None, None))
+        return self
+
+    def update(self, key: str, fn: UpdateFn, ttl: Optional[float] = None) -> "Pipeline":
+        self._ops.append(("update", key, fn, ttl))
+        return self
+
+    def execute(self) -> List[Any]:
+        ops, self._ops = self._ops, []
+        return self._state._apply(ops) if ops else []
+
+    def __enter__(self) -> "Pipeline":
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        if exc_type is None:
+            self.execute()
+
+
+class LocalState(SharedState):
+    """Prozesslokaler Stand-in; Werte werden wie bei SQLite als JSON abgelegt (keine Aliasing-Effekte)."""
+
+    backend = "local"
+
+    def __init__(self) -> None:
+        self._data: Dict[str, Tuple[str, Optional[float]]] = {}
+        self._lock = threading.Lock()
+
+    def _load(self, key: str, now: float) -> Any:
+        ent = self._data.get(key)
+        if ent is None:
+            return None
+        raw, exp = ent
+        if exp is not None and exp <= now:
+            del self._data[key]
+            return None
+        return json.loads(raw)
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            return self._load(key, time.time())
+
+    def mget(self, keys: Sequence[str]) -> List[Any]:
+        now = time.time()
+        with self._lock:
+            return [self._load(k, now) for k in keys]
+
+    def _apply(self, ops: List[Tuple[str, str, Any, Optional[float]]]) -> List[Any]:
+        now = time.time()
+        out: List[Any] = []
+        with self._lock:
+            # Erst vollständig berechnen, dann schreiben: schlägt ein fn fehl, bleibt alles unverändert
+            staged: Dict[str, Optional[Tuple[str, Optional[float]]]] = {}
+
+            def current(key: str) -> Any:
+                if key in staged:
+                    ent = staged[key]
+                    return json.loads(ent[0]) if ent is not None else None
+                return self._load(key, now)
+
+            for op, key, arg, ttl in ops:
+                if op == "set":
+                    staged[key] = (json.dumps(arg), _expires(ttl, now))
+                    out.append(None)
+                elif op == "delete":
+                    staged[key] = None
+                    out.append(None)
+                else:
+                    new, result = arg(current(key))
+                    staged[key] = None if new is None else (json.dumps(new), _expires(ttl, now))
+                    out.append(result)
+            for key, ent in staged.items():
+                if ent is None:
+                    self._data.pop(key, None)
+                else:
+                    self._data[key] = ent
+        return out
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SqliteState(SharedState):
+    """SQLite-Datei im WAL-Modus; eine Verbindung pro Prozess, serialisiert über einen Lock."""
+
+    backend = "sqlite"
+
+    def __init__(self, path: Path, *, busy_timeout_ms: int = 5000) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._writes = 0
+        conn = sqlite3.connect(str(self.path), timeout=busy_timeout_ms / 1000.0, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS kv_expires ON kv(expires) WHERE expires IS NOT NULL")
+        self._conn = conn
+
+    @staticmethod
+    def _row_value(row: Optional[Tuple[str, Optional[float]]], now: float) -> Any:
+        if row is None:
+            return None
+        raw, exp = row
+        if exp is not None and exp <= now:
+            return None
+        return json.loads(raw)
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires FROM kv WHERE key = ?", (key,)).fetchone()
+        return self._row_value(row, time.time())
+
+    def mget(self, keys: Sequence[str]) -> List[Any]:
+        if not keys:
+            return []
+        marks = ",".join("?" for _ in keys)
+        with self._lock:
+            rows = self._conn.execute(f"SELECT key, value, expires FROM kv WHERE key IN ({marks})", tuple(keys)).fetchall()
+        now = time.time()
+        found = {k: (v, e) for k, v, e in rows}
+        return [self._row_value(found.get(k), now) for k in keys]
+
+    def _apply(self, ops: List[Tuple[str, str, Any, Optional[float]]]) -> List[Any]:
+        out: List[Any] = []
+        with self._lock:
+            conn = self._conn
+            now = time.time()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for op, key, arg, ttl in ops:
+                    if op == "set":
+                        self._upsert(key, arg, _expires(ttl, now))
+                        out.append(None)
+                    elif op == "delete":
+                        conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+                        out.append(None)
+                    else:
+                        row = conn.execute("SELECT value, expires FROM kv WHERE key = ?", (key,)).fetchone()
+                        new, result = arg(self._row_value(row, now))
+                        if new is None:
+                            conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+                        else:
+                            self._upsert(key, new, _expires(ttl, now))
+                        out.append(result)
+                self._writes += 1
+                if self._writes % _PURGE_EVERY == 0:
+                    conn.execute("DELETE FROM kv WHERE expires IS NOT NULL AND expires <= ?", (now,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return out
+
+    def _upsert(self, key: str, value: Any, expires: Optional[float]) -> None:
+        self._conn.execute(
+            "INSERT INTO kv(key, value, expires) VALUES(?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires = excluded.expires",
+            (key, json.dumps(value), expires),
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+
+
+_STATE: Optional[SharedState] = None
+_STATE_LOCK = threading.Lock()
+
+
+def get_shared_state() -> Optional[SharedState]:
+    """Konfiguriertes Backend (Singleton je Prozess); None bei SHARED_STATE_BACKEND="none"."""
+    global _STATE
+    kind = str(getattr(settings, "SHARED_STATE_BACKEND", "none") or "none").lower()
+    if kind == "none":
+        return None
+    with _STATE_LOCK:
+        if _STATE is None or _STATE.backend != kind:
+            if kind == "sqlite":
+                _STATE = SqliteState(Path(getattr(settings, "SHARED_STATE_PATH", Path(".data/shared_state.sqlite3"))))
+            else:
+                _STATE = LocalState()
+        return _STATE
+
+
+def reset_shared_state(state: Optional[SharedState] = None) -> None:
+    """Singleton ersetzen (Tests) bzw. schließen und verwerfen."""
+    global _STATE
+    with _STATE_LOCK:
+        if _STATE is not None and _STATE is not state:
+            _STATE.close()
+        _STATE = state
+
+
+__all__ = [
+    "SharedState",
+    "Pipeline",
+    "LocalState",
+    "SqliteState",
+    "get_shared_state",
+    "reset_shared_state",
+]
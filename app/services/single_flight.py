@@ -0,0 +1,163 @@
+"""
+Single-Flight: identische gleichzeitige Upstream-Requests teilen sich eine Generierung (SINGLE_FLIGHT_ENABLED).
+
+- Schlüssel: Route (chat | chat_stream) + kanonischer Hash aus Upstream-Host und Payload wie beim Antwort-Cache
+  (app.services.response_cache.cache_key); Requests mit session_id laufen nie gemeinsam (Memory-Seiteneffekte),
+  mit SINGLE_FLIGHT_DETERMINISTIC_ONLY nur temperature 0 bzw. fester seed
+- Der erste Request startet die Generierung als eigenen Task (Flight); alle Elemente (Stream-Events bzw. die
+  Antwort) landen in einem gemeinsamen Puffer, jeder Teilnehmer liest ihn ab Index 0 – spät Hinzukommende
+  erhalten also erst die bisherigen Elemente (Replay) und dann live die weiteren
+- Fehler der Generierung gehen an alle Teilnehmer
+- Abbruch mit Referenzzählung: verlässt der letzte Teilnehmer den Flight vor dessen Ende (Client-Abbruch),
+  wird der Upstream-Task abgebrochen; solange noch jemand liest, läuft er weiter
+- Abgeschlossene Flights werden sofort entfernt; Wiederholungen danach trifft ggf. der Antwort-Cache
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Generic, List, Mapping, Optional, TypeVar
+
+from ..core.settings import settings
+from .metrics import UPSTREAM_COALESCED, UPSTREAM_FLIGHTS_IN_FLIGHT
+from .response_cache import cache_key, is_deterministic
+
+T = TypeVar("T")
+
+
+class _Flight(Generic[T]):
+    __slots__ = ("items", "done", "error", "refs", "task", "_changed")
+
+    def __init__(self) -> None:
+        self.items: List[T] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.refs = 0
+        self.task: Optional["asyncio.Task[None]"] = None
+        self._changed = asyncio.Event()
+
+    def _wake(self) -> None:
+        # Wartende wecken; neue Wartende warten auf ein frisches Event
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def push(self, item: T) -> None:
+        self.items.append(item)
+        self._wake()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.done = True
+        self.error = error
+        self._wake()
+
+    async def iterate(self) -> AsyncIterator[T]:
+        i = 0
+        while True:
+            while i < len(self.items):
+                yield self.items[i]
+                i += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+class SingleFlight:
+    """Registry laufender Flights je Schlüssel."""
+
+    def __init__(self) -> None:
+        self._flights: Dict[str, _Flight[Any]] = {}
+        self.leaders = 0
+        self.joined = 0
+        self.cancelled = 0
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def _join(self, key: str, kind: str, factory: Callable[[], AsyncIterator[Any]]) -> _Flight[Any]:
+        flight: Optional[_Flight[Any]] = self._flights.get(key)
+        if flight is None:
+            flight = _Flight[Any]()
+            self._flights[key] = flight
+            flight.task = asyncio.get_running_loop().create_task(self._produce(key, flight, factory))
+            self.leaders += 1
+        else:
+            self.joined += 1
+            if bool(getattr(settings, "METRICS_ENABLED", True)):
+                UPSTREAM_COALESCED.inc(kind)
+        flight.refs += 1
+        return flight
+
+    def _leave(self, key: str, flight: _Flight[Any]) -> None:
+        flight.refs -= 1
+        if flight.refs > 0 or flight.done:
+            return
+        # letzter Teilnehmer weg: Generierung abbrechen
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if flight.task is not None and not flight.task.done():
+            flight.task.cancel()
+            self.cancelled += 1
+
+    async def _produce(self, key: str, flight: _Flight[Any], factory: Callable[[], AsyncIterator[Any]]) -> None:
+        metrics_on = bool(getattr(settings, "METRICS_ENABLED", True))
+        if metrics_on:
+            UPSTREAM_FLIGHTS_IN_FLIGHT.inc()
+        try:
+            async for item in factory():
+                flight.push(item)
+            flight.finish()
+        except asyncio.CancelledError:
+            # Teilnehmer (falls noch welche lesen, z. B. beim Shutdown) erhalten einen normalen Fehler
+            flight.finish(RuntimeError("single_flight: Generierung abgebrochen"))
+            raise
+        except Exception as e:
+            flight.finish(e)
+        finally:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            if metrics_on:
+                UPSTREAM_FLIGHTS_IN_FLIGHT.dec()
+
+    async def stream(self, key: str, factory: Callable[[], AsyncIterator[T]], kind: str = "chat_stream") -> AsyncIterator[T]:
+        """Elemente der (ggf. schon laufenden) Generierung `factory()` für `key` liefern."""
+        flight = self._join(key, kind, factory)
+        try:
+            async for item in flight.iterate():
+                yield item
+        finally:
+            self._leave(key, flight)
+
+    async def call(self, key: str, fn: Callable[[], Awaitable[T]], kind: str = "chat") -> T:
+        """Ergebnis von `fn()` für `key`; gleichzeitige Aufrufe teilen sich einen Aufruf."""
+
+        async def _one() -> AsyncIterator[T]:
+            yield await fn()
+
+        flight = self._join(key, kind, _one)
+        try:
+            async for item in flight.iterate():
+                return item
+            raise RuntimeError("single_flight: Generierung ohne Ergebnis")
+        finally:
+            self._leave(key, flight)
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": len(self._flights), "leaders": self.leaders, "joined": self.joined, "cancelled": self.cancelled}
+
+
+def flight_key(kind: str, session_id: Optional[str], payload: Mapping[str, Any], host: str = "") -> Optional[str]:
+    """Schlüssel für einen Upstream-Payload an `host` oder None, wenn der Request allein laufen muss."""
+    if session_id or not bool(getattr(settings, "SINGLE_FLIGHT_ENABLED", False)):
+        return None
+    options: Dict[str, Any] = payload.get("options") or {}
+    if bool(getattr(settings, "SINGLE_FLIGHT_DETERMINISTIC_ONLY", True)) and not is_deterministic(options):
+        return None
+    messages: List[Mapping[str, Any]] = payload.get("messages") or []
+    return f"{kind}:{cache_key(str(payload.get('model') or ''), messages, options, host)}"
+
+
+single_flight = SingleFlight()
+
+
+__all__ = ["SingleFlight", "flight_key", "single_flight"]
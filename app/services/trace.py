@@ -0,0 +1,125 @@
+"""
+Zeitaufschlüsselung je Request (Server-Timing) und optionales, gesampeltes JSONL-Trace-Log.
+
+- RequestTrace sammelt Dauern (ms) je Phase: parse, prompt, notes, rag, mem_read, policy_pre,
+  upstream_wait, upstream_gen, policy_post, mem_write (+ total)
+- server_timing() liefert den Header-Wert (`name;dur=1.23, ...`), as_dict() die Payload für
+  das Streaming-Meta-Event
+- write_trace(): schreibt bei Sampling-Treffer (TRACE_SAMPLE_RATE) oder langsamen Requests
+  (TRACE_SLOW_MS) eine JSONL-Zeile nach TRACE_LOG_PATH – im Thread-Pool, nicht im Event-Loop
+"""
+from __future__ import annotations
+
+import json
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional
+
+from ..core.settings import settings
+
+# Pipeline-Stufe -> Server-Timing-Name (nicht aufgeführte Stufen gehen nur in "prompt" ein)
+STAGE_NAMES: Dict[str, str] = {
+    "context_notes": "notes",
+    "rag": "rag",
+    "memory": "mem_read",
+    "policy_pre": "policy_pre",
+}
+
+PHASES = (
+    "parse", "prompt", "notes", "rag", "mem_read", "policy_pre",
+    "upstream_wait", "upstream_gen", "policy_post", "mem_write",
+)
+
+
+class RequestTrace:
+    __slots__ = ("request_id", "route", "started", "phases", "finished_ms")
+
+    def __init__(self, request_id: Optional[str] = None, route: str = "", started: Optional[float] = None) -> None:
+        self.request_id = request_id
+        self.route = route
+        # perf_counter()-Zeitpunkt des Request-Beginns (Middleware), sonst jetzt
+        self.started = started if started is not None else time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.finished_ms: Optional[float] = None
+
+    def add(self, phase: str, ms: float) -> None:
+        self.phases[phase] = self.phases.get(phase, 0.0) + max(0.0, ms)
+
+    def since(self, phase: str, t0: float) -> float:
+        """Dauer seit `t0` (perf_counter) als Phase verbuchen; liefert den aktuellen Zeitpunkt."""
+        now = time.perf_counter()
+        self.add(phase, (now - t0) * 1000.0)
+        return now
+
+    def add_stages(self, timings: Mapping[str, float]) -> None:
+        for stage, ms in timings.items():
+            name = STAGE_NAMES.get(stage)
+            if name is not None:
+                self.add(name, ms)
+
+    def finish(self) -> float:
+        if self.finished_ms is None:
+            self.finished_ms = (time.perf_counter() - self.started) * 1000.0
+        return self.finished_ms
+
+    def total_ms(self) -> float:
+        return self.finished_ms if self.finished_ms is not None else (time.perf_counter() - self.started) * 1000.0
+
+    def server_timing(self) -> str:
+        parts = [f"{name};dur={self.phases[name]:.2f}" for name in PHASES if name in self.phases]
+        parts.append(f"total;dur={self.total_ms():.2f}")
+        return ", ".join(parts)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "request_id": self.request_id,
+            "route": self.route,
+            "phases_ms": {name: round(self.phases[name], 3) for name in PHASES if name in self.phases},
+            "total_ms": round(self.total_ms(), 3),
+        }
+
+
+_WRITE_LOCK = threading.Lock()
+
+
+def _append_line(path: str, line: str) -> None:
+    with _WRITE_LOCK:
+        p = Path(path)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        with p.open("a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def should_sample(total_ms: float) -> bool:
+    if not getattr(settings, "TRACE_LOG_PATH", None):
+        return False
+    slow_ms = float(getattr(settings, "TRACE_SLOW_MS", 0.0) or 0.0)
+    if slow_ms > 0 and total_ms >= slow_ms:
+        return True
+    rate = float(getattr(settings, "TRACE_SAMPLE_RATE", 0.0) or 0.0)
+    return rate > 0 and (rate >= 1.0 or random.random() < rate)
+
+
+def write_trace(trace: RequestTrace, **extra: Any) -> bool:
+    """Trace (gesampelt) als JSONL-Zeile anhängen; True, wenn geschrieben wird."""
+    total = trace.finish()
+    if not should_sample(total):
+        return False
+    rec = trace.as_dict()
+    rec["ts"] = time.time()
+    rec.update(extra)
+    line = json.dumps(rec, ensure_ascii=False)
+    path = str(getattr(settings, "TRACE_LOG_PATH"))
+    try:
+        from .offload import get_executor
+
+        get_executor().submit(_append_line, path, line)
+    except RuntimeError:
+        # Pool bereits heruntergefahren: synchron schreiben
+        _append_line(path, line)
+    return True
+
+
+__all__ = ["RequestTrace", "PHASES", "STAGE_NAMES", "should_sample", "write_trace"]
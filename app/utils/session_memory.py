@@ -6,20 +6,45 @@ Zweck:
 - Begrenzen nach Anzahl Nachrichten und Gesamtlänge
 
 Hinweis:
-- Nicht persistent; für Production ggf. Redis o.ä. nutzen.
+- Nicht persistent; standardmäßig prozesslokal. Mit SHARED_STATE_BACKEND (z. B. "sqlite") liegt
+  der Verlauf im gemeinsamen Zustand (`smem:<id>`) und ist für alle Worker sichtbar.
 """
 from __future__ import annotations
 
-from typing import Dict, List, Mapping
+from typing import TYPE_CHECKING, Any, Dict, List, Mapping, Optional, Tuple
 from threading import RLock
 
+from app.core.memory import tail_start
+
+if TYPE_CHECKING:  # pragma: no cover
+    from app.services.shared_state import SharedState
+
+
+def _trim(cur: List[Mapping[str, str]], max_messages: int, max_chars: int) -> List[Mapping[str, str]]:
+    # Trim nach Anzahl
+    if max_messages > 0 and len(cur) > max_messages:
+        cur = cur[-max_messages:]
+    # Trim nach Zeichen (ein Durchgang von rechts, laufende Summe)
+    if max_chars > 0:
+        start = tail_start(cur, max_chars, lambda m: len(str(m.get("content", ""))))
+        if start:
+            cur = cur[start:]
+    return cur
+
 
 class SessionMemory:
-    def __init__(self) -> None:
+    def __init__(self, state: Optional["SharedState"] = None) -> None:
         self._by_id: Dict[str, List[Mapping[str, str]]] = {}
         self._lock = RLock()
+        self._state = state
+
+    @property
+    def shared(self) -> bool:
+        return self._state is not None
 
     def get(self, session_id: str) -> List[Mapping[str, str]]:
+        if self._state is not None:
+            return list(self._state.get(f"smem:{session_id}") or [])
         with self._lock:
             return list(self._by_id.get(session_id, []))
 
@@ -34,23 +59,32 @@ class SessionMemory:
         Fügt Nachrichten an und trimmt nach Anzahl und Zeichen.
         Gibt den aktuellen, getrimmten Verlauf zurück.
         """
+        if self._state is not None:
+            new = [{"role": str(m.get("role", "user")), "content": str(m.get("content", ""))} for m in messages]
+
+            def _step(cur: Any) -> Tuple[List[Mapping[str, str]], List[Mapping[str, str]]]:
+                trimmed = _trim(list(cur or []) + new, max_messages, max_chars)
+                return trimmed, list(trimmed)
+
+            return self._state.update(f"smem:{session_id}", _step)
         with self._lock:
             cur = self._by_id.get(session_id, [])
             cur.extend(messages)
-            # Trim nach Anzahl
-            if max_messages > 0 and len(cur) > max_messages:
-                cur = cur[-max_messages:]
-            # Trim nach Zeichen
-            if max_chars > 0:
-                def total_chars(seq: List[Mapping[str, str]]) -> int:
-                    return sum(len(str(m.get("content", ""))) for m in seq)
-                while cur and total_chars(cur) > max_chars:
-                    cur.pop(0)
+            cur = _trim(cur, max_messages, max_chars)
             self._by_id[session_id] = cur
             return list(cur)
 
 
+def _shared_state() -> Optional["SharedState"]:
+    try:
+        from app.services.shared_state import get_shared_state
+
+        return get_shared_state()
+    except Exception:
+        return None
+
+
 # Singleton-ähnliche, einfache Instanz
-session_memory = SessionMemory()
+session_memory = SessionMemory(state=_shared_state())
 
 __all__ = ["SessionMemory", "session_memory"]
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Mikro-Benchmark für das Zeichen-Trimming der Memory-Fenster.
+
+- Vergleicht die frühere Schleife (`while sum(len(...)) > max: pop(0)`) mit app.core.memory.tail_start
+  (ein Durchgang von rechts mit laufender Summe)
+- Je Verlaufslänge (Default 1k/10k Turns); dieselbe Trim-Logik nutzen get_window, compose_with_memory
+  und SessionMemory.put_and_trim
+- Budget so gewählt, dass etwa die Hälfte der Turns entfernt wird (ungünstiger Fall für die alte Schleife)
+
+Beispiel:
+  python scripts/bench_memory_trim.py --turns 1000 10000 --repeat 3
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from app.core.memory import tail_start  # noqa: E402
+
+
+def make_history(n: int, seed: int) -> List[Dict[str, str]]:
+    rng = random.Random(seed)
+    # viele kurze Turns (typisch für Chat-/RPG-Sitzungen)
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": "x" * rng.randint(5, 60)} for i in range(n)]
+
+
+def trim_legacy(msgs: List[Dict[str, str]], max_chars: int) -> List[Dict[str, str]]:
+    """Referenz: frühere Implementierung."""
+    cur = list(msgs)
+    while cur and max_chars > 0 and sum(len(str(m.get("content", ""))) for m in cur) > max_chars:
+        cur.pop(0)
+    return cur
+
+
+def trim_linear(msgs: List[Dict[str, str]], max_chars: int) -> List[Dict[str, str]]:
+    return msgs[tail_start(msgs, max_chars, lambda m: len(str(m.get("content", "")))):]
+
+
+def _time(fn: Callable[[], object], repeat: int) -> float:
+    samples = []
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    return statistics.median(samples)
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--turns", type=int, nargs="+", default=[1000, 10000])
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--skip-legacy-above", type=int, default=20000, help="alte Schleife nur bis zu dieser Länge messen")
+    args = ap.parse_args(argv)
+
+    print(f"{'turns':>7s} {'legacy_ms':>11s} {'linear_ms':>10s} {'speedup':>9s}")
+    for n in args.turns:
+        hist = make_history(n, args.seed)
+        budget = sum(len(m["content"]) for m in hist) // 2
+        if n <= 2000:
+            assert trim_linear(hist, budget) == trim_legacy(hist, budget)
+        lin = _time(lambda: trim_linear(hist, budget), args.repeat)
+        if n <= args.skip_legacy_above:
+            leg = _time(lambda: trim_legacy(hist, budget), args.repeat)
+            print(f"{n:7d} {leg:11.2f} {lin:10.3f} {leg / max(lin, 1e-9):8.0f}x")
+        else:
+            print(f"{n:7d} {'-':>11s} {lin:10.3f} {'-':>9s}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
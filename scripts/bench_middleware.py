@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+"""
+Mikro-Benchmark für den Middleware-Overhead pro Request.
+
+- Vergleicht den früheren Stack (BaseHTTPMiddleware-Rate-Limiter + `@app.middleware("http")`
+  für Request-ID/Logs/Metriken) mit den reinen ASGI-Middlewares aus app.api.middleware
+- Ruft die ASGI-Apps direkt auf (kein Netzwerk, kein TestClient), Endpunkt liefert "ok"
+- Ausgabe: µs/Request (Median über mehrere Runden) je Stack und Antworttyp, plus Baseline ohne
+  Middleware; Logging wird für die Messung gedämpft
+
+Beispiel:
+  python scripts/bench_middleware.py --requests 5000 --rounds 5
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+from collections import defaultdict, deque
+from typing import Any, Callable, Deque, Dict, List
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from fastapi import FastAPI, HTTPException  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse  # noqa: E402
+from starlette.routing import Route  # noqa: E402
+
+from app.api.middleware import RateLimitMiddleware, RequestContextMiddleware  # noqa: E402
+from app.services import metrics as _metrics  # noqa: E402
+
+HEADER = "X-Request-ID"
+EXEMPT = ["/health", "/docs", "/openapi.json", "/metrics"]
+TRUSTED: List[str] = []
+log = logging.getLogger("bench.middleware")
+
+
+async def _plain(request: Request) -> PlainTextResponse:
+    return PlainTextResponse("ok")
+
+
+async def _stream(request: Request) -> StreamingResponse:
+    async def gen():
+        for _ in range(4):
+            yield b"data: x\n\n"
+    return StreamingResponse(gen(), media_type="text/event-stream")
+
+
+def _routes() -> List[Route]:
+    return [Route("/", _plain), Route("/stream", _stream)]
+
+
+def build_legacy(limit: int) -> FastAPI:
+    """Referenz: frühere Implementierung (Konfiguration je Request, BaseHTTPMiddleware)."""
+    app = FastAPI(routes=_routes())
+
+    class _RateLimiter(BaseHTTPMiddleware):
+        def __init__(self, app: Any):
+            super().__init__(app)
+            self.window = 60.0
+            self.capacity = limit
+            self.burst = 0
+            self.buckets: Dict[str, Deque[float]] = defaultdict(deque)
+
+        async def dispatch(self, request: Request, call_next):
+            if request.url.path in set(EXEMPT):
+                return await call_next(request)
+            client_host = request.client.host if request.client else "unknown"
+            if client_host in set(TRUSTED):
+                return await call_next(request)
+            now = time.time()
+            q = self.buckets[client_host]
+            cutoff = now - self.window
+            while q and q[0] < cutoff:
+                q.popleft()
+            if len(q) >= self.capacity + self.burst:
+                raise HTTPException(status_code=429, detail="Rate limit exceeded.")
+            q.append(now)
+            response = await call_next(request)
+            remaining = max(0, (self.capacity + self.burst) - len(q))
+            response.headers["X-RateLimit-Limit"] = str(self.capacity + self.burst)
+            response.headers["X-RateLimit-Remaining"] = str(remaining)
+            response.headers["X-RateLimit-Window"] = str(int(self.window))
+            return response
+
+    app.add_middleware(_RateLimiter)
+
+    @app.middleware("http")
+    async def request_context_mw(request: Request, call_next):
+        rid = request.headers.get(HEADER) or request.headers.get("X-Request-Id") or f"req-{int(time.time()*1000)}"
+        start = time.time()
+        route = _metrics.route_label(request.url.path, frozenset(("/", "/stream")))
+        _metrics.HTTP_IN_FLIGHT.inc(route)
+        try:
+            request.state.request_id = rid
+            request.state.t_start = time.perf_counter()
+            response = await call_next(request)
+            elapsed = time.time() - start
+            _metrics.HTTP_REQUESTS.inc(route, request.method, str(response.status_code))
+            _metrics.HTTP_DURATION.observe(elapsed, route, str(getattr(request.state, "chat_mode", "none")))
+            log.info(f"{request.method} {request.url.path} -> {response.status_code} [{int(elapsed*1000)} ms] rid={rid}")
+            response.headers[HEADER] = rid
+            return response
+        except HTTPException as exc:
+            return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail}, headers={HEADER: rid})
+        finally:
+            _metrics.HTTP_IN_FLIGHT.dec(route)
+
+    return app
+
+
+def build_asgi(limit: int) -> FastAPI:
+    app = FastAPI(routes=_routes())
+    known = frozenset(("/", "/stream"))
+    label: Callable[[str], str] = lambda path: _metrics.route_label(path, known)
+    app.add_middleware(
+        RateLimitMiddleware, requests_per_window=limit, window_sec=60.0,
+        trusted_ips=TRUSTED, exempt_paths=EXEMPT, metrics_enabled=True, route_label=label,
+    )
+    app.add_middleware(RequestContextMiddleware, header_name=HEADER, metrics_enabled=True, route_label=label)
+    return app
+
+
+def _scope(path: str, i: int) -> Dict[str, Any]:
+    return {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": b"", "root_path": "", "server": ("bench", 80),
+        # eigene IP je Request: das Limit greift nicht, gemessen wird nur der Overhead
+        "client": (f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}", 1000),
+        "headers": [(b"host", b"bench"), (b"x-request-id", f"bench-{i}".encode())],
+    }
+
+
+async def _run(app: Any, path: str, n: int) -> float:
+    async def send(message: Any) -> None:
+        return None
+
+    t0 = time.perf_counter()
+    for i in range(n):
+        done = asyncio.Event()
+
+        async def receive() -> Dict[str, Any]:
+            if done.is_set():
+                await asyncio.Event().wait()
+            done.set()
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        await app(_scope(path, i), receive, send)
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--requests", type=int, default=3000)
+    ap.add_argument("--rounds", type=int, default=5)
+    args = ap.parse_args(argv)
+
+    logging.getLogger("app.main").setLevel(logging.WARNING)
+    log.setLevel(logging.WARNING)
+
+    stacks = {
+        "none": FastAPI(routes=_routes()),
+        "legacy": build_legacy(limit=10),
+        "asgi": build_asgi(limit=10),
+    }
+    print(f"requests={args.requests} rounds={args.rounds}")
+    for path in ("/", "/stream"):
+        base = 0.0
+        for name, app in stacks.items():
+            asyncio.run(_run(app, path, min(200, args.requests)))  # Warm-up
+            samples = [asyncio.run(_run(app, path, args.requests)) for _ in range(args.rounds)]
+            med = statistics.median(samples)
+            if name == "none":
+                base = med
+                print(f"{path:8s} {name:7s} {med:8.1f} µs/req")
+            else:
+                print(f"{path:8s} {name:7s} {med:8.1f} µs/req  (Overhead {med - base:7.1f} µs)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
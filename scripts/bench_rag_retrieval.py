@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+"""
+Mikro-Benchmark für utils.rag.retrieve auf synthetischen Korpora.
+
+- Erzeugt Chunks mit Zipf-verteiltem Vokabular (deterministisch per --seed)
+- Misst die Query-Latenz der invertierten Suche für mehrere Korpusgrößen
+- Optional: Vergleich mit der früheren Brute-Force-Bewertung (alle Chunks, IDF je Query)
+- --scorer bm25: BM25 mit und ohne MaxScore-Frühterminierung
+
+Beispiel:
+  python scripts/bench_rag_retrieval.py --sizes 5000 50000 --queries 200
+  python scripts/bench_rag_retrieval.py --sizes 50000 --scorer tfidf bm25
+"""
+from __future__ import annotations
+
+import argparse
+import math
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Dict, List, Tuple
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from utils.rag import Chunk, TfIdfIndex, retrieve, tokenize  # noqa: E402
+
+
+def make_corpus(n_docs: int, vocab_size: int, doc_len: int, seed: int) -> Tuple[TfIdfIndex, List[str]]:
+    rng = random.Random(seed)
+    vocab = [f"w{i}" for i in range(vocab_size)]
+    # Zipf-Gewichte: häufige Terme vorne
+    cum: List[float] = []
+    acc = 0.0
+    for i in range(vocab_size):
+        acc += 1.0 / (i + 1)
+        cum.append(acc)
+    chunks: List[Chunk] = []
+    df: Dict[str, int] = {}
+    for i in range(n_docs):
+        words = rng.choices(vocab, cum_weights=cum, k=doc_len)
+        tf: Dict[str, int] = {}
+        for w in words:
+            tf[w] = tf.get(w, 0) + 1
+        for w in tf:
+            df[w] = df.get(w, 0) + 1
+        chunks.append(Chunk(id=i, source=f"doc{i}.md", content="", tf=tf))
+    return TfIdfIndex(chunks=chunks, df=df, n_docs=n_docs), vocab
+
+
+def make_queries(vocab: List[str], n: int, seed: int) -> List[str]:
+    rng = random.Random(seed + 1)
+    # typische kurze Queries: 2-4 Terme aus dem mittleren/seltenen Bereich
+    lo = min(len(vocab) - 1, 50)
+    return [" ".join(rng.choice(vocab[lo:]) for _ in range(rng.randint(2, 4))) for _ in range(n)]
+
+
+def retrieve_bruteforce(index: TfIdfIndex, query: str, top_k: int) -> List[Tuple[float, int]]:
+    """Referenz: frühere Implementierung (IDF pro Query, Cosine über alle Chunks)."""
+    qtf: Dict[str, int] = {}
+    for t in tokenize(query):
+        qtf[t] = qtf.get(t, 0) + 1
+    n = max(1, index.n_docs)
+    idf = {t: math.log(1.0 + (n / float(d + 1))) for t, d in index.df.items()}
+    qw = {t: float(tf) * idf.get(t, 0.0) for t, tf in qtf.items()}
+    qn = math.sqrt(sum(v * v for v in qw.values()))
+    scored: List[Tuple[float, int]] = []
+    for pos, ch in enumerate(index.chunks):
+        dw = {t: float(tf) * idf.get(t, 0.0) for t, tf in ch.tf.items()}
+        dn = math.sqrt(sum(v * v for v in dw.values()))
+        dot = sum(v * dw[k] for k, v in qw.items() if k in dw)
+        if qn and dn and dot > 0:
+            scored.append((dot / (qn * dn), pos))
+    scored.sort(key=lambda x: x[0], reverse=True)
+    return scored[: max(1, top_k)]
+
+
+def _time_ms(fn, queries: List[str]) -> List[float]:
+    out: List[float] = []
+    for q in queries:
+        t0 = time.perf_counter()
+        fn(q)
+        out.append((time.perf_counter() - t0) * 1000.0)
+    return out
+
+
+def _fmt(samples: List[float]) -> str:
+    samples = sorted(samples)
+    p50 = statistics.median(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    return f"p50={p50:8.3f} ms  p95={p95:8.3f} ms"
+
+
+def main(argv: List[str] | None = None) -> int:
+    p = argparse.ArgumentParser(description="Benchmark: RAG-Retrieval (invertierter Index) auf synthetischen Korpora")
+    p.add_argument("--sizes", nargs="+", type=int, default=[5000, 50000], help="Korpusgrößen (Anzahl Chunks)")
+    p.add_argument("--queries", type=int, default=200, help="Anzahl Queries pro Größe")
+    p.add_argument("--vocab", type=int, default=30000, help="Vokabulargröße")
+    p.add_argument("--doc-len", type=int, default=120, help="Tokens pro Chunk")
+    p.add_argument("--top-k", type=int, default=3)
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--baseline", action="store_true", help="Zusätzlich Brute-Force-Referenz messen (langsam)")
+    p.add_argument("--scorer", nargs="+", choices=["tfidf", "bm25"], default=["tfidf"], help="Zu messende Scorer")
+    args = p.parse_args(argv)
+
+    for n in args.sizes:
+        t0 = time.perf_counter()
+        idx, vocab = make_corpus(n, args.vocab, args.doc_len, args.seed)
+        t_build = (time.perf_counter() - t0) * 1000.0
+        t0 = time.perf_counter()
+        idx.inverted()
+        t_inv = (time.perf_counter() - t0) * 1000.0
+        queries = make_queries(vocab, args.queries, args.seed)
+        print(f"n={n:>7}  corpus={t_build:9.1f} ms  postings={t_inv:8.1f} ms")
+        inv = idx.inverted()
+        for scorer in args.scorer:
+            if scorer == "bm25":
+                # Erster Lauf füllt den Impact-Cache; gemessen wird der warme Zustand
+                for q in queries:
+                    inv.search(q, args.top_k, scorer="bm25")
+                pruned = _time_ms(lambda q: inv.search(q, args.top_k, scorer="bm25"), queries)
+                full = _time_ms(lambda q: inv.search(q, args.top_k, scorer="bm25", prune=False), queries)
+                print(f"{'':>9}  bm25 (MaxScore):   {_fmt(pruned)}")
+                print(f"{'':>9}  bm25 (erschöpfend): {_fmt(full)}")
+            else:
+                fast = _time_ms(lambda q: retrieve(idx, q, top_k=args.top_k), queries)
+                print(f"{'':>9}  tfidf retrieve:    {_fmt(fast)}")
+        if args.baseline:
+            # Brute-Force nur auf einer Stichprobe (sonst Minuten)
+            sample = queries[: max(1, min(10, len(queries)))]
+            slow = _time_ms(lambda q: retrieve_bruteforce(idx, q, args.top_k), sample)
+            print(f"{'':>9}  bruteforce ({len(sample)} Queries): {_fmt(slow)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,19 +1,14 @@
 #!/usr/bin/env python
 import os, sys, json
-from typing import Dict, Set, Protocol
+from typing import Dict, Set
 
-class _EncoderLike(Protocol):
-    def encode(self, text: str) -> list[int]: ...
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
 
-TRY_TIKTOKEN = True
-enc: _EncoderLike | None = None
-if TRY_TIKTOKEN:
-    try:
-        import importlib
-        tiktoken = importlib.import_module("tiktoken")  # dynamic import
-        enc = tiktoken.get_encoding("cl100k_base")
-    except Exception:
-        enc = None
+# Gleicher Zähler wie das Prompt-Budget der App (cl100k via tiktoken, sonst ~4 Zeichen/Token),
+# ohne app/Settings/pydantic zu importieren
+from utils.tokens import default_counter, count_tokens  # noqa: E402
 
 EXCLUDE_DIRS: Set[str] = {".git", ".venv", "venv", "__pycache__", ".pytest_cache", "eval/results"}
 TEXT_EXTS: Set[str] = {".py", ".md", ".json", ".jsonl", ".txt", ".gitignore", ".cfg", ".ini", ".yml", ".yaml"}
@@ -22,20 +17,12 @@ def is_text_file(path: str) -> bool:
     _, ext = os.path.splitext(path)
     return ext.lower() in TEXT_EXTS
 
-def count_tokens(text: str) -> int:
-    if enc is not None:
-        try:
-            return len(enc.encode(text))
-        except Exception:
-            pass
-    # Fallback-Heuristik
-    return max(1, int(len(text) / 4))
-
 def main() -> int:
     root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     total_tokens = 0
     per_dir: Dict[str, int] = {}
     files_counted = 0
+    counter = default_counter()
 
     for dirpath, dirnames, filenames in os.walk(root):
         # ausschließen
@@ -51,7 +38,7 @@ def main() -> int:
             try:
                 with open(fp, "r", encoding="utf-8", errors="ignore") as f:
                     text = f.read()
-                tok = count_tokens(text)
+                tok = count_tokens(text, counter)
                 total_tokens += tok
                 top = relfp.split("/")[0]
                 per_dir[top] = per_dir.get(top, 0) + tok
@@ -1,25 +1,98 @@
 from __future__ import annotations
 
 import argparse
+import os
 from pathlib import Path
 from typing import List
 
-from utils.rag import build_index, save_index
+from utils.rag import save_index
+from utils.rag_build import (
+    load_manifest,
+    load_previous_index,
+    manifest_path_for,
+    save_manifest,
+    update_index,
+)
 
 
 def main(argv: List[str] | None = None) -> int:
     p = argparse.ArgumentParser(description="Baue einen einfachen TF-IDF RAG-Index über .md/.txt Dateien")
     p.add_argument("--input", nargs="+", help="Dateien oder Verzeichnisse (.md/.txt)")
-    p.add_argument("--out", default=str(Path("eval/results/rag/index.json")), help="Pfad zur Indexdatei (JSON)")
+    p.add_argument("--out", default=str(Path("eval/results/rag/index.json")), help="Pfad zur Indexdatei (JSON oder .bin)")
+    p.add_argument(
+        "--format",
+        choices=["auto", "json", "binary"],
+        default="auto",
+        help="Indexformat; auto = binary bei Endung .bin, sonst JSON",
+    )
+    p.add_argument("--chunk-chars", type=int, default=1200, help="Max. Zeichen pro Chunk (Überschriften/Absätze)")
+    p.add_argument("--overlap", type=int, default=150, help="Überlappung zwischen Chunks (Zeichen)")
+    p.add_argument("--no-recursive", action="store_true", help="Verzeichnisse nicht rekursiv durchsuchen")
+    p.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Prozesse für das Tokenisieren geänderter Dateien")
+    p.add_argument("--manifest", default=None, help="Pfad zum Manifest (Default: <out>.manifest.json)")
+    p.add_argument("--full", action="store_true", help="Manifest ignorieren und vollständig neu aufbauen")
+    p.add_argument("--dense-model", default=None, help="Zusätzlich Embeddings via Ollama erzeugen (z. B. nomic-embed-text; benötigt NumPy)")
+    p.add_argument("--dense-out", default=None, help="Vektordatei (.npy); Default: <out>.dense.npy")
+    p.add_argument("--dense-dtype", choices=["float32", "float16"], default="float32", help="float16 halbiert Platte/RAM, sucht aber langsamer (kein BLAS)")
+    p.add_argument("--embed-host", default=None, help="Ollama-Host für Embeddings (Default: OLLAMA_HOST aus den Settings)")
+    p.add_argument("--embed-batch", type=int, default=32, help="Chunks pro Embeddings-Request")
     args = p.parse_args(argv)
 
     if not args.input:
         print("Keine Eingabe angegeben. Beispiel: --input docs eval/config")
         return 2
 
-    idx = build_index(args.input)
-    save_index(idx, args.out)
-    print(f"Index erstellt: {args.out} (Dokumente: {idx.n_docs}, Vokabeln: {len(idx.df)})")
+    fmt = args.format
+    if fmt == "auto":
+        fmt = "binary" if str(args.out).lower().endswith(".bin") else "json"
+
+    manifest_path = args.manifest or manifest_path_for(args.out)
+    manifest = {} if args.full else load_manifest(manifest_path)
+    previous = load_previous_index(args.out) if manifest else None
+
+    idx, new_manifest, stats = update_index(
+        args.input,
+        previous,
+        manifest,
+        chunk_chars=max(1, int(args.chunk_chars)),
+        overlap=max(0, int(args.overlap)),
+        recursive=not args.no_recursive,
+        jobs=max(1, int(args.jobs)),
+    )
+    save_index(idx, args.out, fmt=fmt)
+    save_manifest(new_manifest, manifest_path)
+    mode = "voll" if stats.full_rebuild else "inkrementell"
+    print(
+        f"Index erstellt: {args.out} [{fmt}, {mode}] (Dateien: {stats.files_total}, geändert: {stats.files_changed}, "
+        f"entfernt: {stats.files_removed}, Chunks: {stats.chunks_total} (+{stats.chunks_added}/-{stats.chunks_removed}), "
+        f"Vokabeln: {len(idx.df)})"
+    )
+
+    if args.dense_model:
+        try:
+            from utils.rag_dense import OllamaEmbedder, build_dense, dense_path_for
+        except ImportError as e:
+            print(f"Dichter Index übersprungen: {e} (pip install numpy)")
+            return 1
+        host = args.embed_host
+        if not host:
+            from app.core.settings import settings
+
+            host = settings.OLLAMA_HOST
+        dense_out = args.dense_out or dense_path_for(args.out)
+        embedder = OllamaEmbedder(host, args.dense_model)
+        dstats = build_dense(
+            idx,
+            embedder,
+            dense_out,
+            model=args.dense_model,
+            dtype=args.dense_dtype,
+            batch_size=max(1, int(args.embed_batch)),
+        )
+        print(
+            f"Vektoren erstellt: {dense_out} [{args.dense_dtype}] (Zeilen: {dstats['rows']}, "
+            f"eingebettet: {dstats['embedded']}, übernommen: {dstats['reused']})"
+        )
     return 0
 
 
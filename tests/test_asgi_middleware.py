@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Dict, List, MutableMapping, Tuple
+
+import pytest
+from fastapi import HTTPException
+from starlette.responses import PlainTextResponse, StreamingResponse
+
+from app.api.middleware import RateLimitMiddleware, RequestContextMiddleware
+
+
+def _scope(path: str = "/", headers: List[Tuple[bytes, bytes]] | None = None, client: Tuple[str, int] | None = ("10.0.0.1", 1234)) -> Dict[str, Any]:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": headers or [],
+        "client": client,
+        "server": ("test", 80),
+    }
+
+
+def _call(app: Any, scope: Dict[str, Any]) -> Tuple[int, Dict[str, str], bytes]:
+    sent: List[MutableMapping[str, Any]] = []
+    received: List[bool] = []
+
+    async def receive() -> Dict[str, Any]:
+        if received:
+            # kein Disconnect: blockieren, bis die Antwort fertig ist (Task wird abgebrochen)
+            await asyncio.Event().wait()
+        received.append(True)
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: MutableMapping[str, Any]) -> None:
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start = next(m for m in sent if m["type"] == "http.response.start")
+    headers = {k.decode().lower(): v.decode() for k, v in start.get("headers", [])}
+    body = b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body")
+    return int(start["status"]), headers, body
+
+
+async def _ok(scope: Any, receive: Any, send: Any) -> None:
+    await PlainTextResponse("ok")(scope, receive, send)
+
+
+@pytest.mark.unit
+def test_request_context_sets_request_id_and_state() -> None:
+    seen: Dict[str, Any] = {}
+
+    async def inner(scope: Any, receive: Any, send: Any) -> None:
+        seen.update(scope["state"])
+        await _ok(scope, receive, send)
+
+    mw = RequestContextMiddleware(inner, metrics_enabled=False)
+    status, headers, _ = _call(mw, _scope(headers=[(b"x-request-id", b"abc-1")]))
+    assert status == 200
+    assert headers["x-request-id"] == "abc-1"
+    assert seen["request_id"] == "abc-1"
+    assert isinstance(seen["t_start"], float)
+
+    # ohne Header: generierte ID
+    _, headers2, _ = _call(mw, _scope())
+    assert headers2["x-request-id"].startswith("req-")
+
+
+@pytest.mark.unit
+def test_request_context_converts_http_exception_with_headers() -> None:
+    async def inner(scope: Any, receive: Any, send: Any) -> None:
+        raise HTTPException(status_code=418, detail="teapot", headers={"X-Extra": "1"})
+
+    mw = RequestContextMiddleware(inner, header_name="X-Trace-ID", metrics_enabled=False)
+    status, headers, body = _call(mw, _scope(headers=[(b"x-trace-id", b"t-9")]))
+    assert status == 418
+    assert headers["x-trace-id"] == "t-9"
+    assert headers["x-extra"] == "1"
+    assert b"teapot" in body
+
+
+@pytest.mark.unit
+def test_rate_limit_headers_and_429() -> None:
+    mw = RateLimitMiddleware(_ok, requests_per_window=2, burst=0, window_sec=30)
+    s1, h1, _ = _call(mw, _scope())
+    s2, h2, _ = _call(mw, _scope())
+    assert (s1, s2) == (200, 200)
+    assert h1["x-ratelimit-limit"] == "2" and h1["x-ratelimit-window"] == "30"
+    assert (h1["x-ratelimit-remaining"], h2["x-ratelimit-remaining"]) == ("1", "0")
+
+    s3, h3, body = _call(mw, _scope())
+    assert s3 == 429
+    # Token-Bucket: nächstes Token nach window / requests_per_window Sekunden
+    assert h3["retry-after"] == "15"
+    assert h3["x-ratelimit-limit"] == "2"
+    assert b"Rate limit exceeded" in body
+
+    # andere IP hat einen eigenen Bucket
+    s4, _, _ = _call(mw, _scope(client=("10.0.0.2", 1)))
+    assert s4 == 200
+
+
+@pytest.mark.unit
+def test_rate_limit_exempt_and_trusted_skip_accounting() -> None:
+    mw = RateLimitMiddleware(
+        _ok, requests_per_window=1, window_sec=60,
+        trusted_ips=["10.0.0.9"], exempt_paths=["/health"],
+    )
+    for _ in range(3):
+        status, headers, _ = _call(mw, _scope("/health"))
+        assert status == 200 and "x-ratelimit-limit" not in headers
+        status, _, _ = _call(mw, _scope(client=("10.0.0.9", 1)))
+        assert status == 200
+    assert len(mw.limiter) == 0
+
+
+@pytest.mark.unit
+def test_headers_on_streaming_response() -> None:
+    async def gen():
+        yield b"a"
+        yield b"b"
+
+    async def inner(scope: Any, receive: Any, send: Any) -> None:
+        await StreamingResponse(gen(), media_type="text/event-stream")(scope, receive, send)
+
+    app = RequestContextMiddleware(RateLimitMiddleware(inner, requests_per_window=5), metrics_enabled=False)
+    status, headers, body = _call(app, _scope(headers=[(b"x-request-id", b"s-1")]))
+    assert status == 200 and body == b"ab"
+    assert headers["x-request-id"] == "s-1"
+    assert headers["x-ratelimit-remaining"] == "4"
+
+
+@pytest.mark.unit
+def test_rate_limit_shared_state_across_instances() -> None:
+    from app.services.shared_state import LocalState
+
+    st = LocalState()
+    # zwei Worker-Instanzen mit gemeinsamem Zustand teilen sich das Limit
+    w1 = RateLimitMiddleware(_ok, requests_per_window=2, window_sec=60, shared_state=st)
+    w2 = RateLimitMiddleware(_ok, requests_per_window=2, window_sec=60, shared_state=st)
+    assert _call(w1, _scope())[0] == 200
+    status, headers, _ = _call(w2, _scope())
+    assert status == 200 and headers["x-ratelimit-remaining"] == "0"
+    assert _call(w1, _scope())[0] == 429
+    assert len(w1.limiter) == 0
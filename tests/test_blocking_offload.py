@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, cast
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import app.api.chat as chat_module
+from app.main import app
+from app.services import offload
+from utils.rag import build_index, save_index
+
+RealAsyncClient = httpx.AsyncClient
+
+
+def _capture_factory(payload_box: Dict[str, Any]):
+    async def _handler(request: httpx.Request) -> httpx.Response:
+        payload_box["last"] = json.loads(request.content.decode("utf-8"))
+        return httpx.Response(200, json={"message": {"role": "assistant", "content": "ok"}})
+
+    def _factory(*args: Any, **kwargs: Any) -> httpx.AsyncClient:
+        return RealAsyncClient(transport=httpx.MockTransport(_handler))
+
+    return _factory
+
+
+@pytest.mark.unit
+def test_run_stage_keeps_loop_responsive_and_degrades_on_timeout() -> None:
+    release = threading.Event()
+
+    def _slow() -> str:
+        release.wait(2.0)
+        return "spät"
+
+    async def _main() -> tuple:
+        ticks = 0
+
+        async def _ticker() -> None:
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.005)
+                ticks += 1
+
+        t = asyncio.create_task(_ticker())
+        res = await offload.run_stage("test_slow", offload.run_blocking(_slow), timeout=0.1, default="default")
+        t.cancel()
+        release.set()
+        return res, ticks
+
+    res, ticks = asyncio.run(_main())
+    assert res == "default"
+    # Der Event-Loop lief während der blockierenden Arbeit weiter
+    assert ticks >= 5
+    st = offload.stage_stats()["test_slow"]
+    assert st["timeouts"] >= 1 and st["max_ms"] >= 90
+
+
+@pytest.mark.unit
+def test_run_stage_records_errors_and_success() -> None:
+    def _boom() -> None:
+        raise RuntimeError("x")
+
+    assert asyncio.run(offload.run_stage("test_err", offload.run_blocking(_boom), timeout=1.0, default=[])) == []
+    assert asyncio.run(offload.run_stage("test_ok", offload.run_blocking(lambda: 42), timeout=None, default=0)) == 42
+    stats = offload.stage_stats()
+    assert stats["test_err"]["errors"] == 1 and stats["test_ok"]["calls"] >= 1
+
+
+@pytest.mark.unit
+def test_loop_lag_monitor_counts_stalls() -> None:
+    mon = offload.LoopLagMonitor(interval=0.01, stall_threshold_ms=30.0)
+
+    async def _main() -> None:
+        mon.start()
+        await asyncio.sleep(0.05)
+        time.sleep(0.08)  # absichtlicher Stall im Loop
+        await asyncio.sleep(0.05)
+        await mon.stop()
+
+    asyncio.run(_main())
+    s = mon.stats()
+    assert s["samples"] >= 2 and s["stalls"] >= 1 and s["max_lag_ms"] >= 30.0
+
+
+@pytest.mark.api
+def test_chat_skips_slow_context_notes(monkeypatch: pytest.MonkeyPatch) -> None:
+    payload_box: Dict[str, Any] = {}
+    monkeypatch.setattr(chat_module.httpx, "AsyncClient", _capture_factory(payload_box))
+    monkeypatch.setattr(chat_module.settings, "CONTEXT_NOTES_ENABLED", True, raising=False)
+    monkeypatch.setattr(chat_module.settings, "CONTEXT_NOTES_TIMEOUT_SEC", 0.05, raising=False)
+
+    def _slow_notes(paths: Iterable[str], max_chars: int = 4000) -> str:
+        time.sleep(0.5)
+        return "ZU-SPÄT"
+
+    monkeypatch.setattr(chat_module, "load_context_notes", _slow_notes)
+    t0 = time.perf_counter()
+    resp = TestClient(app).post("/chat", json={"messages": [{"role": "user", "content": "frage"}]})
+    assert resp.status_code == 200
+    assert time.perf_counter() - t0 < 0.45
+    msgs = cast(List[Dict[str, str]], payload_box["last"]["messages"])
+    assert not any("ZU-SPÄT" in m["content"] for m in msgs)
+
+
+@pytest.mark.api
+def test_chat_injects_rag_snippet_content(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "deploy.md").write_text("Deployment läuft über docker compose", encoding="utf-8")
+    index_path = tmp_path / "index.json"
+    save_index(build_index([str(docs)]), str(index_path))
+
+    payload_box: Dict[str, Any] = {}
+    monkeypatch.setattr(chat_module.httpx, "AsyncClient", _capture_factory(payload_box))
+    s = chat_module.settings
+    monkeypatch.setattr(s, "RAG_ENABLED", True, raising=False)
+    monkeypatch.setattr(s, "RAG_INDEX_PATH", str(index_path), raising=False)
+    monkeypatch.setattr(chat_module, "load_context_notes", lambda paths, max_chars=4000: None)
+
+    resp = TestClient(app).post("/chat", json={"messages": [{"role": "user", "content": "wie läuft das deployment"}]})
+    assert resp.status_code == 200
+    msgs = cast(List[Dict[str, str]], payload_box["last"]["messages"])
+    rag = [m for m in msgs if m["content"].startswith("[RAG]")]
+    # Snippet enthält den Chunk-Text (retrieve liefert "content")
+    assert rag and "docker compose" in rag[0]["content"]
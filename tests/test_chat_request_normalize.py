@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import pytest
+
+from app.api.chat_helpers import normalize_chat_request
+from app.api.models import ChatOptions, ChatRequest
+
+
+@pytest.mark.unit
+def test_mode_flags_are_part_of_schema():
+    req = ChatRequest.model_validate(
+        {"messages": [{"role": "user", "content": "x"}], "eval_mode": True, "unrestricted_mode": "false"}
+    )
+    assert req.eval_mode is True
+    assert req.unrestricted_mode is False
+    assert ChatRequest(messages=[]).eval_mode is False
+
+
+@pytest.mark.unit
+def test_normalize_once_with_chat_options_and_session():
+    req = ChatRequest(
+        messages=[{"role": "system", "content": "s"}, {"role": "user", "content": "frage"}],
+        options=ChatOptions(temperature=0.3, session_id="sess-1"),
+        profile_id="p1",
+        unrestricted_mode=True,
+    )
+    n = normalize_chat_request(req)
+    assert n.messages == [{"role": "system", "content": "s"}, {"role": "user", "content": "frage"}]
+    assert n.options["temperature"] == 0.3
+    assert n.session_id == "sess-1"
+    assert n.profile_id == "p1"
+    assert n.mode == "unrestricted"
+    assert n.last_user() == "frage"
+    # Stufen dürfen die Liste verändern, ohne den Request anzufassen
+    n.messages.insert(0, {"role": "system", "content": "neu"})
+    assert len(req.messages) == 2
+
+
+@pytest.mark.unit
+def test_explicit_flags_override_body_and_top_level_session_wins():
+    req = ChatRequest(
+        messages=[{"role": "user", "content": "a"}],
+        options={"session_id": "from-opts"},
+        session_id="top",
+        eval_mode=True,
+    )
+    n = normalize_chat_request(req, eval_mode=False)
+    assert n.eval_mode is False and n.mode == "default"
+    assert n.session_id == "top"
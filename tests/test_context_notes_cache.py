@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import os
+
+import pytest
+
+from utils import context_notes as cn
+
+
+def write(p: str, txt: str, bump: int = 0) -> None:
+    with open(p, "w", encoding="utf-8") as f:
+        f.write(txt)
+    if bump:
+        # mtime explizit verschieben (grobe Zeitstempel-Auflösung mancher Dateisysteme)
+        st = os.stat(p)
+        os.utime(p, ns=(st.st_atime_ns, st.st_mtime_ns + bump * 1_000_000_000))
+
+
+@pytest.fixture(autouse=True)
+def _revalidate_every_call():
+    # App-Lifespan setzt ein Prüfintervall; hier jede Änderung sofort sehen
+    cn.set_default_check_interval(0.0)
+    yield
+
+
+def _stats_delta(before: dict) -> dict:
+    now = cn.context_notes_cache_stats()
+    return {k: now[k] - before[k] for k in ("hits", "misses")}
+
+
+@pytest.mark.unit
+def test_second_call_is_cache_hit(tmp_path):
+    f = tmp_path / "a.md"
+    write(str(f), "Alpha")
+    before = cn.context_notes_cache_stats()
+    assert cn.load_context_notes([str(f)]) == "Alpha"
+    assert cn.load_context_notes([str(f)]) == "Alpha"
+    assert _stats_delta(before) == {"hits": 1, "misses": 1}
+
+
+@pytest.mark.unit
+def test_file_change_invalidates(tmp_path):
+    f = tmp_path / "a.md"
+    write(str(f), "Alpha")
+    assert cn.load_context_notes([str(f)]) == "Alpha"
+    write(str(f), "Beta", bump=5)
+    assert cn.load_context_notes([str(f)]) == "Beta"
+
+
+@pytest.mark.unit
+def test_change_during_read_is_reloaded(tmp_path, monkeypatch):
+    f = tmp_path / "a.md"
+    write(str(f), "Alpha")
+    real_read = cn._read_text
+    calls = []
+
+    def _read_then_modify(path: str) -> str:
+        txt = real_read(path)
+        if not calls:
+            # Datei ändert sich, nachdem sie gelesen wurde, aber vor dem Cache-Eintrag
+            write(path, "Beta", bump=5)
+        calls.append(path)
+        return txt
+
+    monkeypatch.setattr(cn, "_read_text", _read_then_modify)
+    assert cn.load_context_notes([str(f)]) == "Alpha"
+    assert cn.load_context_notes([str(f)]) == "Beta"
+
+
+@pytest.mark.unit
+def test_order_file_and_new_file_invalidate(tmp_path):
+    d = tmp_path / "notes"
+    d.mkdir()
+    write(str(d / "a.txt"), "A")
+    write(str(d / "b.txt"), "B")
+    assert cn.load_context_notes([str(d)]) == "A\n\nB"
+
+    write(str(d / "ORDER.txt"), "b.txt\n")
+    assert cn.load_context_notes([str(d)]) == "B\n\nA"
+
+    write(str(d / "c.txt"), "C")
+    os.utime(str(d), ns=(0, os.stat(str(d)).st_mtime_ns + 5_000_000_000))
+    assert cn.load_context_notes([str(d)]) == "B\n\nA\n\nC"
+
+
+@pytest.mark.unit
+def test_ref_target_change_invalidates(tmp_path):
+    target = tmp_path / "target.md"
+    write(str(target), "Ziel 1")
+    d = tmp_path / "notes"
+    d.mkdir()
+    write(str(d / "pin.ref"), str(target) + "\n")
+    assert cn.load_context_notes([str(d)]) == "Ziel 1"
+
+    write(str(target), "Ziel 2", bump=5)
+    assert cn.load_context_notes([str(d)]) == "Ziel 2"
+
+    # Ziel verschwindet -> keine Notizen mehr
+    target.unlink()
+    assert cn.load_context_notes([str(d)]) is None
+
+
+@pytest.mark.unit
+def test_missing_path_created_later(tmp_path):
+    f = tmp_path / "later.md"
+    assert cn.load_context_notes([str(f)]) is None
+    write(str(f), "Jetzt da")
+    assert cn.load_context_notes([str(f)]) == "Jetzt da"
+
+
+@pytest.mark.unit
+def test_check_interval_skips_stat(tmp_path):
+    f = tmp_path / "a.md"
+    write(str(f), "Alpha")
+    assert cn.load_context_notes([str(f)], check_interval=3600) == "Alpha"
+    write(str(f), "Beta", bump=5)
+    # innerhalb des Intervalls: gecachter Stand
+    assert cn.load_context_notes([str(f)], check_interval=3600) == "Alpha"
+    # Intervall 0: Revalidierung per stat()
+    assert cn.load_context_notes([str(f)], check_interval=0) == "Beta"
+
+
+@pytest.mark.unit
+def test_normalize_text_collapses_blank_lines():
+    assert cn._normalize_text("\r\n a\r\n\r\n\r\n\nb \n\n\n") == "a\n\nb"
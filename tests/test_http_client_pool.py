@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import app.api.chat as chat_module
+import app.services.http_client as http_client_mod
+from app.api.models import ChatRequest
+from app.core.settings import settings
+
+
+@pytest.mark.unit
+def test_lifespan_starts_and_closes_shared_client(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "OLLAMA_POOL_MAX_CONNECTIONS", 7)
+    monkeypatch.setattr(settings, "OLLAMA_CONNECT_TIMEOUT", 1.5)
+    from app.main import app
+
+    assert http_client_mod.get_http_client() is None
+    with TestClient(app) as client:
+        shared = http_client_mod.get_http_client()
+        assert shared is not None
+        assert shared.timeout.connect == 1.5
+        assert client.get("/health").status_code == 200
+        # gleicher Client über mehrere Requests hinweg
+        assert http_client_mod.get_http_client() is shared
+    assert http_client_mod.get_http_client() is None
+
+    limits = http_client_mod.build_limits()
+    assert limits.max_connections == 7
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_process_chat_request_uses_shared_client(monkeypatch: pytest.MonkeyPatch) -> None:
+    seen: List[str] = []
+
+    async def _handler(request: httpx.Request) -> httpx.Response:
+        seen.append(str(request.url))
+        return httpx.Response(200, json={"message": {"content": "pooled"}})
+
+    shared = httpx.AsyncClient(transport=httpx.MockTransport(_handler))
+    monkeypatch.setattr(http_client_mod, "_CLIENT", shared)
+
+    # Ein temporärer Client darf nicht mehr gebaut werden
+    def _no_temp(*a: Any, **k: Any) -> Dict[str, Any]:
+        raise AssertionError("temporärer AsyncClient sollte nicht erzeugt werden")
+
+    monkeypatch.setattr(chat_module.httpx, "AsyncClient", _no_temp)
+
+    req = ChatRequest(messages=[{"role": "user", "content": "hi"}])
+    resp = await chat_module.process_chat_request(req)
+    assert resp.content == "pooled"
+    assert seen and seen[0].endswith("/api/chat")
+    await shared.aclose()
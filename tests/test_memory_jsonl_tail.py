@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+
+from app.core import memory as memory_module
+from app.core.memory import JsonlStore
+
+
+def _contents(win: List[Dict[str, str]]) -> List[str]:
+    return [m["content"] for m in win]
+
+
+@pytest.fixture()
+def no_compaction(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(memory_module.settings, "MEMORY_JSONL_COMPACT_FACTOR", 0.0, raising=False)
+
+
+@pytest.mark.unit
+def test_tail_window_uses_index(tmp_path: Path, no_compaction: None) -> None:
+    store = JsonlStore(base_dir=tmp_path)
+
+    async def _run() -> List[Dict[str, str]]:
+        for i in range(50):
+            await store.append("s", "user", f"t{i}")
+        return await store.get_window("s", max_chars=0, max_turns=5)
+
+    assert _contents(asyncio.run(_run())) == [f"t{i}" for i in range(45, 50)]
+    assert (tmp_path / "session_s.idx").stat().st_size == 50 * 8
+    assert store.index_rebuilds == 0
+
+
+@pytest.mark.unit
+def test_legacy_and_stale_index_are_repaired(tmp_path: Path, no_compaction: None) -> None:
+    p = tmp_path / "session_alt.jsonl"
+    p.write_text("".join(json.dumps({"role": "user", "content": f"a{i}"}) + "\n" for i in range(10)), encoding="utf-8")
+    store = JsonlStore(base_dir=tmp_path)
+
+    win = asyncio.run(store.get_window("alt", max_chars=0, max_turns=3))
+    assert _contents(win) == ["a7", "a8", "a9"] and store.index_rebuilds == 1
+
+    # ohne Index angehängte Zeilen (Fremdschreiber): trotzdem die letzten Turns
+    with p.open("a", encoding="utf-8") as f:
+        f.write(json.dumps({"role": "assistant", "content": "extra"}) + "\n")
+    assert _contents(asyncio.run(store.get_window("alt", max_chars=0, max_turns=2))) == ["a9", "extra"]
+
+    # kaputter Index (Offset mitten in einer Zeile) -> Neuaufbau
+    (tmp_path / "session_alt.idx").write_bytes((5).to_bytes(8, "little") * 11)
+    assert _contents(asyncio.run(store.get_window("alt", max_chars=0, max_turns=2))) == ["a9", "extra"]
+    assert store.index_rebuilds == 2
+
+
+@pytest.mark.unit
+def test_compaction_drops_turns_outside_window(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(memory_module.settings, "MEMORY_MAX_TURNS", 5, raising=False)
+    monkeypatch.setattr(memory_module.settings, "MEMORY_JSONL_COMPACT_FACTOR", 2.0, raising=False)
+    store = JsonlStore(base_dir=tmp_path)
+
+    async def _run() -> List[Dict[str, str]]:
+        for i in range(37):
+            await store.append("k", "user", f"c{i}")
+        return await store.get_window("k", max_chars=0, max_turns=5)
+
+    assert _contents(asyncio.run(_run())) == [f"c{i}" for i in range(32, 37)]
+    lines = (tmp_path / "session_k.jsonl").read_text(encoding="utf-8").splitlines()
+    assert 5 <= len(lines) <= 10
+    assert (tmp_path / "session_k.idx").stat().st_size == len(lines) * 8
+    assert store.compactions >= 3
+
+    asyncio.run(store.clear("k"))
+    assert not (tmp_path / "session_k.jsonl").exists() and not (tmp_path / "session_k.idx").exists()
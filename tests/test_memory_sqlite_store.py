@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+from app.core import memory as memory_module
+from app.core.memory_sqlite import SqliteStore
+
+
+@pytest.mark.unit
+def test_append_window_and_delete(tmp_path: Path) -> None:
+    store = SqliteStore(tmp_path / "m.sqlite3")
+
+    async def _run() -> Dict[str, Any]:
+        for i in range(6):
+            await store.append("s1", "user" if i % 2 == 0 else "assistant", f"m{i}")
+        await store.append("s2", "user", "andere")
+        out = {
+            "turns": await store.get_window("s1", max_chars=0, max_turns=3),
+            "chars": await store.get_window("s1", max_chars=4, max_turns=10),
+            "deleted": await store.delete_session("s1"),
+            "after": await store.get_window("s1", max_chars=100, max_turns=10),
+            "other": await store.get_window("s2", max_chars=100, max_turns=10),
+        }
+        await store.aclose()
+        return out
+
+    out = asyncio.run(_run())
+    assert [m["content"] for m in out["turns"]] == ["m3", "m4", "m5"]
+    assert [m["content"] for m in out["chars"]] == ["m4", "m5"]
+    assert out["deleted"] == 6 and out["after"] == []
+    assert out["other"] == [{"role": "user", "content": "andere"}]
+
+
+@pytest.mark.unit
+def test_concurrent_appends_are_batched(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(memory_module.settings, "MEMORY_SQLITE_PRUNE", False, raising=False)
+    store = SqliteStore(tmp_path / "m.sqlite3", batch_max=64)
+
+    async def _run() -> List[Dict[str, str]]:
+        await asyncio.gather(*(store.append(f"s{i % 4}", "user", f"x{i}") for i in range(200)))
+        win = await store.get_window("s0", max_chars=0, max_turns=100)
+        await store.aclose()
+        return win
+
+    win = asyncio.run(_run())
+    assert [m["content"] for m in win] == [f"x{i}" for i in range(0, 200, 4)]
+    assert store.batched_ops == 200
+    # viele Requests teilen sich wenige Transaktionen
+    assert store.batches <= 200 // 64 + 2
+
+
+@pytest.mark.unit
+def test_writer_prunes_to_max_turns_and_counts_sessions(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(memory_module.settings, "MEMORY_MAX_TURNS", 3, raising=False)
+    monkeypatch.setattr(memory_module.settings, "MEMORY_SQLITE_PRUNE", True, raising=False)
+    path = tmp_path / "m.sqlite3"
+    store = SqliteStore(path)
+
+    async def _run() -> List[int]:
+        counts = []
+        for i in range(5):
+            await store.append("s1", "user", f"m{i}")
+        await asyncio.gather(*(store.append(f"p{i}", "user", "x") for i in range(3)))
+        counts.append(store.session_count() or 0)
+        await store.delete_session("p0")
+        await store.delete_session("fehlt")
+        counts.append(store.session_count() or 0)
+        await store.aclose()
+        return counts
+
+    assert asyncio.run(_run()) == [4, 3]
+    conn = sqlite3.connect(str(path))
+    try:
+        rows = conn.execute("SELECT content FROM turns WHERE session_id = 's1' ORDER BY seq").fetchall()
+    finally:
+        conn.close()
+    assert [r[0] for r in rows] == ["m2", "m3", "m4"] and store.pruned == 2
+    # Startwert des Zählers kommt aus der Datei
+    assert SqliteStore(path).session_count() == 3
+
+
+@pytest.mark.unit
+def test_list_sessions_and_schema(tmp_path: Path) -> None:
+    path = tmp_path / "m.sqlite3"
+    store = SqliteStore(path)
+
+    async def _run() -> List[Dict[str, Any]]:
+        await store.append("alt", "user", "a")
+        await store.append("neu", "user", "b")
+        await store.append("neu", "assistant", "c")
+        await store.aclose()
+        return await store.list_sessions()
+
+    sessions = asyncio.run(_run())
+    assert [(s["session_id"], s["turns"]) for s in sessions] == [("neu", 2), ("alt", 1)]
+    assert store.session_count() == 2
+
+    conn = sqlite3.connect(str(path))
+    try:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        plan = " ".join(str(r) for r in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT role, content FROM turns WHERE session_id = ? ORDER BY seq DESC LIMIT 5", ("neu",)
+        ))
+        assert "turns_session_seq" in plan
+    finally:
+        conn.close()
+
+
+@pytest.mark.unit
+def test_get_memory_store_sqlite(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    monkeypatch.setattr(memory_module, "_STORE", None)
+    monkeypatch.setattr(memory_module.settings, "MEMORY_ENABLED", True, raising=False)
+    monkeypatch.setattr(memory_module.settings, "MEMORY_STORE", "sqlite", raising=False)
+    monkeypatch.setattr(memory_module.settings, "MEMORY_DIR", tmp_path, raising=False)
+    monkeypatch.setattr(memory_module.settings, "MEMORY_SQLITE_PATH", None, raising=False)
+    store = memory_module.get_memory_store()
+    assert isinstance(store, SqliteStore)
+    assert store.path == tmp_path / "memory.sqlite3"
+
+    async def _run() -> List[Dict[str, str]]:
+        await store.append("s", "user", "hallo")
+        msgs = await memory_module.compose_with_memory([{"role": "user", "content": "neu"}], "s")
+        await memory_module.close_memory_store()
+        return msgs
+
+    msgs = asyncio.run(_run())
+    assert [m["content"] for m in msgs][-2:] == ["hallo", "neu"]
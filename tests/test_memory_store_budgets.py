@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import asyncio
+from typing import List
+
+import pytest
+
+from app.core import memory as memory_module
+from app.core.memory import InMemoryStore, MemorySweeper
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.mark.unit
+def test_lru_eviction_by_session_count_keeps_recent() -> None:
+    store = InMemoryStore(max_sessions=3, max_total_chars=0, idle_ttl=0)
+
+    async def _run() -> List[str]:
+        for sid in ("a", "b", "c"):
+            await store.append(sid, "user", "x")
+        await store.get_window("a", max_chars=100, max_turns=5)  # "a" wieder frisch
+        await store.append("d", "user", "y")
+        return list(store._by_id)
+
+    order = asyncio.run(_run())
+    assert order == ["c", "a", "d"]
+    assert store.evictions["sessions"] == 1
+    assert store.stats()["sessions"] == 3.0
+
+
+@pytest.mark.unit
+def test_total_char_budget_and_accounting() -> None:
+    store = InMemoryStore(max_sessions=0, max_total_chars=25, idle_ttl=0)
+
+    async def _run() -> None:
+        await store.append("a", "user", "a" * 10)
+        await store.append("b", "user", "b" * 10)
+        # neue Session sprengt das Budget -> älteste ("a") fällt weg, aktuelle bleibt
+        await store.append("c", "user", "ü" * 10)
+        # eine einzelne, zu große Session wird nicht gegen sich selbst verdrängt
+        await store.append("c", "assistant", "z" * 30)
+
+    asyncio.run(_run())
+    st = store.stats()
+    assert list(store._by_id) == ["c"]
+    assert store.evictions["chars"] == 2
+    assert st["turns"] == 2.0 and st["chars"] == 40.0
+    # UTF-8: "ü" belegt 2 Bytes; Rollen zählen mit
+    assert st["bytes"] == 20 + len("user") + 30 + len("assistant")
+
+
+@pytest.mark.unit
+def test_clear_and_trim_keep_counters_consistent(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(memory_module.settings, "MEMORY_MAX_TURNS", 3, raising=False)
+    monkeypatch.setattr(memory_module.settings, "MEMORY_MAX_CHARS", 0, raising=False)
+    store = InMemoryStore(max_sessions=0, max_total_chars=0, idle_ttl=0)
+
+    async def _run() -> None:
+        for i in range(10):
+            await store.append("s", "user", f"m{i}")
+        assert store.stats()["turns"] == 3.0
+        await store.clear("s")
+
+    asyncio.run(_run())
+    st = store.stats()
+    assert (st["sessions"], st["turns"], st["chars"], st["bytes"]) == (0.0, 0.0, 0.0, 0.0)
+
+
+@pytest.mark.unit
+def test_idle_sweep_and_sweeper(monkeypatch: pytest.MonkeyPatch) -> None:
+    clock = _Clock()
+    store = InMemoryStore(max_sessions=0, max_total_chars=0, idle_ttl=60, clock=clock)
+
+    async def _fill() -> None:
+        await store.append("alt", "user", "x")
+        clock.now = 50.0
+        await store.append("neu", "user", "y")
+
+    asyncio.run(_fill())
+    clock.now = 100.0
+    assert store.sweep() == 1
+    assert list(store._by_id) == ["neu"] and store.evictions["idle"] == 1
+
+    # Sweeper arbeitet auf dem aktiven Store
+    monkeypatch.setattr(memory_module, "_STORE", store)
+    clock.now = 200.0
+
+    async def _sweeper() -> int:
+        sw = MemorySweeper(interval=0.05)
+        sw.start()
+        await asyncio.sleep(0.15)
+        await sw.stop()
+        return sw.removed
+
+    assert asyncio.run(_sweeper()) == 1
+    assert store.session_count() == 0
+
+
+@pytest.mark.unit
+def test_memory_gauges_in_metrics(monkeypatch: pytest.MonkeyPatch) -> None:
+    from app.services import metrics
+
+    store = InMemoryStore(max_sessions=0, max_total_chars=0, idle_ttl=0)
+    asyncio.run(store.append("s", "user", "hallo"))
+    monkeypatch.setattr(memory_module, "_STORE", store)
+    text = metrics.REGISTRY.render()
+    assert 'cvn_memory_sessions{store="InMemoryStore"} 1' in text
+    assert 'cvn_memory_turns{store="InMemoryStore"} 1' in text
+    assert 'cvn_memory_bytes{store="InMemoryStore"} 9' in text
+    assert 'cvn_memory_evictions_total{store="InMemoryStore",reason="idle"} 0' in text
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import asyncio
+import random
+from typing import List
+
+import pytest
+
+from app.core import memory as memory_module
+from app.core.memory import InMemoryStore, tail_start
+from app.utils.session_memory import SessionMemory
+
+
+def _reference_trim(lengths: List[int], max_chars: int) -> List[int]:
+    """Frühere Logik: von links entfernen, solange die Summe über dem Budget liegt."""
+    cur = list(lengths)
+    while cur and max_chars > 0 and sum(cur) > max_chars:
+        cur.pop(0)
+    return cur
+
+
+@pytest.mark.unit
+def test_tail_start_matches_reference_trim() -> None:
+    rng = random.Random(7)
+    for _ in range(500):
+        lengths = [rng.randint(0, 30) for _ in range(rng.randint(0, 25))]
+        budget = rng.choice([0, 1, 10, 50, 200, 10_000])
+        start = tail_start(lengths, budget, lambda n: n)
+        assert lengths[start:] == _reference_trim(lengths, budget)
+
+
+@pytest.mark.unit
+def test_windows_and_session_memory_trim(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(memory_module.settings, "MEMORY_MAX_TURNS", 0, raising=False)
+    monkeypatch.setattr(memory_module.settings, "MEMORY_MAX_CHARS", 0, raising=False)
+    store = InMemoryStore(max_sessions=0, max_total_chars=0, idle_ttl=0)
+
+    async def _run() -> List[str]:
+        for i in range(2000):
+            await store.append("s", "user", f"{i:04d}")
+        win = await store.get_window("s", max_chars=10, max_turns=0)
+        return [m["content"] for m in win]
+
+    assert asyncio.run(_run()) == ["1998", "1999"]
+
+    sm = SessionMemory()
+    sm.put_and_trim("x", [{"role": "user", "content": "a" * 5}] * 3, max_messages=10, max_chars=11)
+    hist = sm.put_and_trim("x", [{"role": "assistant", "content": "b" * 6}], max_messages=10, max_chars=11)
+    assert [m["content"] for m in hist] == ["a" * 5, "b" * 6]
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.api.chat as chat_module
+from app.api.models import ChatRequest
+from app.main import app
+from app.services import metrics
+
+
+@pytest.mark.unit
+def test_registry_renders_prometheus_text():
+    reg = metrics.Registry()
+    c = reg.counter("t_requests_total", "Requests.", ("route",))
+    h = reg.histogram("t_latency_seconds", "Latenz.", ("route",), buckets=(0.1, 1.0))
+    c.inc("/a")
+    c.inc("/a", amount=2)
+    h.observe(0.05, "/a")
+    h.observe(0.5, "/a")
+    h.observe(5.0, "/a")
+    text = reg.render()
+    assert "# TYPE t_requests_total counter" in text
+    assert 't_requests_total{route="/a"} 3' in text
+    assert 't_latency_seconds_bucket{route="/a",le="0.1"} 1' in text
+    assert 't_latency_seconds_bucket{route="/a",le="1"} 2' in text
+    assert 't_latency_seconds_bucket{route="/a",le="+Inf"} 3' in text
+    assert 't_latency_seconds_count{route="/a"} 3' in text
+
+
+@pytest.mark.api
+def test_metrics_endpoint_exposes_request_and_runtime_metrics():
+    client = TestClient(app)
+    assert client.get("/health").status_code == 200
+    client.get("/does-not-exist")
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    body = resp.text
+    assert 'cvn_http_requests_total{route="/health",method="GET",status="200"}' in body
+    assert 'route="other"' in body
+    assert 'cvn_http_request_duration_seconds_count{route="/health",mode="none"}' in body
+    assert "cvn_event_loop_stalls_total" in body
+    assert 'cvn_cache_hits_total{cache="context_notes"}' in body
+
+
+class _Resp:
+    status_code = 200
+
+    def raise_for_status(self) -> None:
+        return
+
+    async def aiter_lines(self):
+        yield json.dumps({"message": {"content": "a"}})
+        yield json.dumps({"message": {"content": "b"}})
+        yield json.dumps({"done": True, "eval_count": 20, "eval_duration": 1_000_000_000})
+
+
+class _CM:
+    async def __aenter__(self):
+        return _Resp()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+class _Client:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+    def stream(self, *args: Any, **kwargs: Any):
+        return _CM()
+
+
+@pytest.mark.streaming
+@pytest.mark.api
+def test_stream_records_ttft_and_token_rate(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(chat_module.httpx, "AsyncClient", lambda *a, **k: _Client())
+    before_ttft = (metrics.STREAM_TTFT.snapshot("eval") or {"count": 0})["count"]
+    before_rate = metrics.STREAM_TOKENS_PER_SECOND.snapshot("eval") or {"count": 0, "sum": 0.0}
+
+    async def _run() -> None:
+        agen = await chat_module.stream_chat_request(
+            ChatRequest(messages=[{"role": "user", "content": "hi"}]), eval_mode=True
+        )
+        async for _ in agen:
+            pass
+
+    asyncio.run(_run())
+    assert metrics.STREAM_TTFT.snapshot("eval")["count"] == before_ttft + 1
+    rate = metrics.STREAM_TOKENS_PER_SECOND.snapshot("eval")
+    assert rate["count"] == before_rate["count"] + 1
+    assert rate["sum"] - before_rate["sum"] == pytest.approx(20.0)
+    assert metrics.STREAMS_IN_FLIGHT.get() == 0
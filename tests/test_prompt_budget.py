@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any, Dict, Iterator, List
+
+import pytest
+
+import app.api.chat as chat_module
+from app.core import prompt_budget as pb
+from app.api.models import ChatRequest
+
+
+@pytest.fixture(autouse=True)
+def _word_counter() -> Iterator[None]:
+    # deterministischer Zähler: 1 Token je Wort
+    pb.set_token_counter(lambda text: len(text.split()), "words")
+    yield
+    pb.set_token_counter(None)
+
+
+def _words(n: int, tag: str) -> str:
+    return " ".join(f"{tag}{i}" for i in range(n))
+
+
+@pytest.mark.unit
+def test_budget_from_num_ctx_and_num_predict(monkeypatch: pytest.MonkeyPatch) -> None:
+    assert pb.total_budget({"num_ctx": 2048, "num_predict": 256}) == (2048, 256, 1792)
+    # Antwort-Reserve höchstens die Hälfte des Kontexts
+    assert pb.total_budget({"num_ctx": 100, "num_predict": 512}) == (100, 50, 50)
+    monkeypatch.setattr(pb.settings, "PROMPT_BUDGET_DEFAULT_NUM_CTX", 1000, raising=False)
+    assert pb.total_budget({}) == (1000, 0, 1000)
+
+
+@pytest.mark.unit
+def test_priority_allocation_trims_blocks_and_oldest_history() -> None:
+    msgs = [
+        {"role": "system", "content": _words(10, "s")},
+        {"role": "system", "content": "[RAG]\n" + _words(5, "r") + "\n\n" + _words(6, "q")},
+        {"role": "system", "content": "[Kontext-Notizen]\n" + _words(15, "n")},
+        {"role": "user", "content": _words(20, "alt")},
+        {"role": "assistant", "content": _words(10, "mitte")},
+        {"role": "user", "content": _words(10, "neu")},
+        {"role": "assistant", "content": _words(10, "antwort")},
+        {"role": "user", "content": _words(5, "frage")},
+    ]
+    # Budget 100: fest 14 + 9, Notizen 20 -> Rest 57; Verlauf 3 x 14 -> Rest 15, ältester Turn (24) passt nicht
+    out, report = pb.apply_budget(msgs, {"num_ctx": 100}, priority=["notes", "history", "rag"])
+    contents = [m["content"] for m in out]
+    assert contents[0] == msgs[0]["content"] and contents[-1] == msgs[-1]["content"]
+    assert msgs[2]["content"] in contents
+    # ältester Turn fällt, neuere bleiben zusammenhängend
+    assert msgs[3]["content"] not in contents
+    assert all(msgs[i]["content"] in contents for i in (4, 5, 6))
+    # RAG bekommt den Rest: nur der erste Absatz passt
+    rag = next(c for c in contents if c.startswith("[RAG]"))
+    assert rag == "[RAG]\n" + _words(5, "r")
+    assert report["dropped"]["history"] == {"tokens": 24, "messages": 1}
+    assert report["dropped"]["rag"]["parts"] == 1
+    assert report["used"] <= report["budget"] == 100
+    assert report["tokenizer"] == "words"
+
+
+@pytest.mark.unit
+def test_repeated_turns_in_history_survive() -> None:
+    msgs = [
+        {"role": "system", "content": "sys"},
+        {"role": "user", "content": "ja"},
+        {"role": "assistant", "content": "Kapitel eins"},
+        {"role": "user", "content": "ja"},
+        {"role": "assistant", "content": "Kapitel zwei"},
+        {"role": "user", "content": "weiter"},
+    ]
+    out, report = pb.apply_budget(msgs, {"num_ctx": 10_000})
+    assert out == msgs and report["dropped"] == {}
+
+
+@pytest.mark.unit
+def test_oversized_single_paragraph_is_cut_and_pinned_over_budget() -> None:
+    msgs = [
+        {"role": "system", "content": "[Kontext-Notizen]\n" + _words(200, "n")},
+        {"role": "user", "content": "frage"},
+    ]
+    out, report = pb.apply_budget(msgs, {"num_ctx": 60})
+    assert out[0]["content"].startswith("[Kontext-Notizen]\nn0 ") and out[0]["content"].endswith("…")
+    assert report["used"] <= 60 and report["dropped"]["notes"]["tokens"] > 0
+
+    huge = [{"role": "system", "content": _words(100, "s")}, {"role": "user", "content": "x"}]
+    out, report = pb.apply_budget(huge, {"num_ctx": 50})
+    assert out == huge and report["over_budget"] is True
+
+
+@pytest.mark.unit
+def test_heuristic_counter_when_tiktoken_missing(monkeypatch: pytest.MonkeyPatch) -> None:
+    pb.set_token_counter(None)
+    monkeypatch.setattr(pb.settings, "PROMPT_BUDGET_TOKENIZER", "heuristic", raising=False)
+    assert pb.count_tokens("x" * 40) == 10
+    assert pb.get_token_counter()[1] == "heuristic"
+
+
+class _Resp:
+    status_code = 200
+
+    def raise_for_status(self) -> None:
+        return
+
+    async def aiter_lines(self):
+        yield json.dumps({"done": True})
+
+
+class _CM:
+    async def __aenter__(self):
+        return _Resp()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+class _Client:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+    def stream(self, *args: Any, **kwargs: Any):
+        return _CM()
+
+
+@pytest.mark.streaming
+@pytest.mark.api
+def test_stream_meta_reports_budget(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(chat_module.settings, "PROMPT_BUDGET_ENABLED", True, raising=False)
+    monkeypatch.setattr(chat_module.settings, "SESSION_MEMORY_ENABLED", False, raising=False)
+    monkeypatch.setattr(chat_module.httpx, "AsyncClient", lambda *a, **k: _Client())
+    monkeypatch.setattr(chat_module, "load_context_notes", lambda paths, max_chars=4000: None)
+
+    history = [{"role": "user", "content": _words(50, "h")}, {"role": "assistant", "content": "ok"}]
+    req = ChatRequest(
+        messages=history + [{"role": "user", "content": "und jetzt?"}],
+        options={"num_ctx": 200, "num_predict": 100},
+    )
+
+    async def _run() -> List[str]:
+        agen = await chat_module.stream_chat_request(req, eval_mode=False, unrestricted_mode=False, client=_Client())
+        return [ev async for ev in agen]
+
+    events = asyncio.run(_run())
+    metas: List[Dict[str, Any]] = [
+        json.loads(ev.split("data: ", 1)[1]) for ev in events if ev.startswith("event: meta")
+    ]
+    budget = next(m["budget"] for m in metas if "budget" in m)
+    assert budget["num_ctx"] == 200 and budget["budget"] == 100
+    assert "history" in budget["dropped"]
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any, Dict, List
+
+import pytest
+
+import app.api.chat as chat_module
+from app.api.chat_helpers import normalize_chat_request
+from app.api.chat_pipeline import PromptContext
+from app.api.models import ChatRequest
+from app.core.prompt_layout import PrefixTracker, order_prefix_stable
+
+
+@pytest.mark.unit
+def test_order_most_to_least_stable() -> None:
+    msgs = [
+        {"role": "user", "content": "alt"},
+        {"role": "system", "content": "[RAG]\n- a: b"},
+        {"role": "system", "content": "[Kontext-Notizen]\nWelt"},
+        {"role": "system", "content": "sys"},
+        {"role": "assistant", "content": "antwort"},
+        {"role": "system", "content": "[Bisheriger Verlauf (Zusammenfassung)]\n- x"},
+        {"role": "user", "content": "neu"},
+    ]
+    out = order_prefix_stable(msgs)
+    assert [m["content"].split("\n")[0] for m in out] == [
+        "sys", "[Kontext-Notizen]", "[Bisheriger Verlauf (Zusammenfassung)]", "alt", "antwort", "[RAG]", "neu",
+    ]
+
+
+@pytest.mark.unit
+def test_prefix_tracker_reports_reused_prefix_and_is_bounded() -> None:
+    tr = PrefixTracker(max_keys=2)
+    turn1 = [{"role": "system", "content": "sys"}, {"role": "user", "content": "eins"}]
+    first = tr.observe("s", turn1)
+    assert first["reused_messages"] == 0 and first["reused_tokens"] == 0 and first["tokens"] > 0
+
+    turn2 = turn1 + [{"role": "assistant", "content": "a"}, {"role": "system", "content": "[RAG]\nx"}, {"role": "user", "content": "zwei"}]
+    second = tr.observe("s", turn2)
+    assert second["reused_messages"] == 2
+    assert 0 < second["ratio"] < 1
+
+    tr.observe("t", turn1)
+    tr.observe("u", turn1)
+    assert len(tr) == 2
+    # "s" wurde verdrängt: kein Präfix mehr bekannt
+    assert tr.observe("s", turn2)["reused_messages"] == 0
+
+
+@pytest.mark.unit
+def test_layout_stage_keeps_history_prefix_across_turns(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(chat_module.settings, "PROMPT_LAYOUT", "prefix_stable", raising=False)
+    monkeypatch.setattr(chat_module.settings, "RAG_ENABLED", True, raising=False)
+    monkeypatch.setattr(chat_module.settings, "MEMORY_ENABLED", False, raising=False)
+    monkeypatch.setattr(chat_module.settings, "POLICIES_ENABLED", False, raising=False)
+    monkeypatch.setattr(chat_module, "load_context_notes", lambda paths, max_chars=4000: "Notiz")
+    monkeypatch.setattr(chat_module, "prefix_tracker", PrefixTracker())
+
+    async def _hits(messages: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+        return [{"source": "doc", "content": f"zu {messages[-1]['content']}"}]
+
+    monkeypatch.setattr(chat_module, "_rag_hits", _hits)
+
+    def _run(msgs: List[Dict[str, str]]) -> PromptContext:
+        n = normalize_chat_request(ChatRequest(messages=msgs, session_id="s1"))
+        return asyncio.run(chat_module.PROMPT_PIPELINE.run(PromptContext(request=n, messages=n.messages)))
+
+    hist = [{"role": "user", "content": "frage 1"}]
+    ctx1 = _run(hist)
+    assert [m["content"].split("\n")[0] for m in ctx1.messages][1:] == ["[Kontext-Notizen]", "[RAG]", "frage 1"]
+    ctx2 = _run(hist + [{"role": "assistant", "content": "antwort 1"}, {"role": "user", "content": "frage 2"}])
+    # System + Notizen bleiben gleich; RAG wandert hinter den Verlauf
+    assert ctx2.messages[-2]["content"].startswith("[RAG]")
+    assert ctx2.prefix is not None and ctx2.prefix["reused_messages"] == 2
+
+
+class _Resp:
+    status_code = 200
+
+    def raise_for_status(self) -> None:
+        return
+
+    async def aiter_lines(self):
+        yield json.dumps({"done": True})
+
+
+class _CM:
+    async def __aenter__(self):
+        return _Resp()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+class _Client:
+    def __init__(self) -> None:
+        self.payloads: List[Dict[str, Any]] = []
+
+    def stream(self, method: str, url: str, json: Dict[str, Any], **kwargs: Any):
+        self.payloads.append(json)
+        return _CM()
+
+
+@pytest.mark.streaming
+@pytest.mark.api
+def test_keep_alive_and_prefix_meta(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(chat_module.settings, "PROMPT_LAYOUT", "prefix_stable", raising=False)
+    monkeypatch.setattr(chat_module.settings, "MODEL_KEEP_ALIVE", "30m", raising=False)
+    monkeypatch.setattr(chat_module.settings, "MEMORY_ENABLED", False, raising=False)
+    monkeypatch.setattr(chat_module, "load_context_notes", lambda paths, max_chars=4000: None)
+    client = _Client()
+    req = ChatRequest(messages=[{"role": "user", "content": "hi"}], session_id="s-ka")
+
+    async def _run() -> List[str]:
+        agen = await chat_module.stream_chat_request(req, eval_mode=False, unrestricted_mode=False, client=client)
+        return [ev async for ev in agen]
+
+    events = asyncio.run(_run())
+    assert client.payloads[0]["keep_alive"] == "30m"
+    metas = [json.loads(ev.split("data: ", 1)[1]) for ev in events if ev.startswith("event: meta")]
+    assert any("prefix" in m for m in metas)
+
+    monkeypatch.setattr(chat_module.settings, "MODEL_KEEP_ALIVE", "-1", raising=False)
+    payload: Dict[str, Any] = {}
+    chat_module._apply_keep_alive(payload)
+    assert payload == {"keep_alive": -1}
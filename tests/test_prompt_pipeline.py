@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import asyncio
+from typing import List
+
+import pytest
+
+import app.api.chat as chat_module
+from app.api.chat_helpers import normalize_chat_request
+from app.api.chat_pipeline import PipelineStage, PromptContext, PromptPipeline
+from app.api.models import ChatRequest
+from app.services import offload
+
+
+def _ctx(**req_kwargs) -> PromptContext:
+    req = ChatRequest(messages=[{"role": "user", "content": "hallo"}], **req_kwargs)
+    n = normalize_chat_request(req)
+    return PromptContext(request=n, messages=n.messages, request_id="rid-1")
+
+
+@pytest.mark.unit
+def test_pipeline_skips_stages_and_records_timings():
+    calls: List[str] = []
+
+    async def _a(ctx: PromptContext) -> None:
+        calls.append("a")
+
+    async def _b(ctx: PromptContext) -> None:
+        calls.append("b")
+
+    pipe = PromptPipeline([PipelineStage("a", _a), PipelineStage("b", _b, lambda ctx: False)])
+    ctx = asyncio.run(pipe.run(_ctx()))
+    assert calls == ["a"]
+    assert list(ctx.timings) == ["a"]
+    assert offload.stage_stats()["prompt.a"]["calls"] >= 1
+
+
+@pytest.mark.unit
+def test_pipeline_with_stage_and_block_stops():
+    calls: List[str] = []
+
+    async def _block(ctx: PromptContext) -> None:
+        ctx.blocked = True
+
+    async def _after(ctx: PromptContext) -> None:
+        calls.append("after")
+
+    pipe = PromptPipeline([PipelineStage("block", _block), PipelineStage("after", _after)])
+    ctx = asyncio.run(pipe.run(_ctx()))
+    assert ctx.blocked and calls == []
+
+    inserted = PromptPipeline([PipelineStage("a", _after), PipelineStage("c", _after)]).with_stage(
+        PipelineStage("b", _after), after="a"
+    )
+    assert inserted.names == ["a", "b", "c"]
+    assert inserted.without("b").names == ["a", "c"]
+
+
+@pytest.mark.unit
+def test_chat_pipeline_default_stages(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(chat_module.settings, "RAG_ENABLED", False, raising=False)
+    monkeypatch.setattr(chat_module.settings, "POLICIES_ENABLED", False, raising=False)
+    monkeypatch.setattr(chat_module, "load_context_notes", lambda paths, max_chars=4000: None)
+    ctx = asyncio.run(chat_module.PROMPT_PIPELINE.run(_ctx(options={"temperature": 0.1})))
+    # Nicht zutreffende Stufen (rag, memory ohne Session, policy_pre, session_memory) laufen nicht
+    assert set(ctx.timings) == {"system_prompt", "context_notes", "options"}
+    assert ctx.messages[0]["role"] == "system"
+    assert ctx.options["temperature"] == 0.1 and ctx.host
+
+
+@pytest.mark.unit
+def test_overlapping_memory_and_session_memory_are_inserted_once(monkeypatch: pytest.MonkeyPatch):
+    from app.core import memory as memory_module
+    from app.utils.session_memory import SessionMemory
+
+    turns = [
+        {"role": "user", "content": "ja"},
+        {"role": "assistant", "content": "Kapitel eins"},
+        {"role": "user", "content": "ja"},
+        {"role": "assistant", "content": "Kapitel zwei"},
+    ]
+    store = memory_module.InMemoryStore()
+    legacy = SessionMemory()
+    # Legacy-Verlauf reicht weiter zurück, beide enden mit denselben Turns
+    legacy.put_and_trim("s1", [{"role": "user", "content": "start"}, {"role": "assistant", "content": "ok"}] + turns, 50, 10_000)
+    monkeypatch.setattr(memory_module, "_STORE", store)
+    monkeypatch.setattr(chat_module, "session_memory", legacy)
+    monkeypatch.setattr(chat_module.settings, "MEMORY_ENABLED", True, raising=False)
+    monkeypatch.setattr(chat_module.settings, "MEMORY_SUMMARY_ENABLED", False, raising=False)
+    monkeypatch.setattr(chat_module.settings, "SESSION_MEMORY_ENABLED", True, raising=False)
+    monkeypatch.setattr(chat_module.settings, "RAG_ENABLED", False, raising=False)
+    monkeypatch.setattr(chat_module.settings, "POLICIES_ENABLED", False, raising=False)
+    monkeypatch.setattr(chat_module, "load_context_notes", lambda paths, max_chars=4000: None)
+
+    async def _run() -> PromptContext:
+        for t in turns:
+            await store.append("s1", t["role"], t["content"])
+        return await chat_module.PROMPT_PIPELINE.run(_ctx(options={"session_id": "s1"}))
+
+    ctx = asyncio.run(_run())
+    history = [m["content"] for m in ctx.messages if m["role"] != "system"]
+    assert history == ["start", "ok", "ja", "Kapitel eins", "ja", "Kapitel zwei", "hallo"]
+
+
+@pytest.mark.unit
+def test_policy_pre_block_returns_400(monkeypatch: pytest.MonkeyPatch):
+    from fastapi import HTTPException
+
+    class _Pre:
+        action = "block"
+
+    monkeypatch.setattr(chat_module.settings, "POLICIES_ENABLED", True, raising=False)
+    monkeypatch.setattr(chat_module, "apply_pre", lambda *a, **k: _Pre())
+    monkeypatch.setattr(chat_module, "load_context_notes", lambda paths, max_chars=4000: None)
+    req = ChatRequest(messages=[{"role": "user", "content": "verboten"}])
+    with pytest.raises(HTTPException) as ei:
+        asyncio.run(chat_module.process_chat_request(req))
+    assert ei.value.status_code == 400 and ei.value.detail == "policy_block"
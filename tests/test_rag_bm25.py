@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import math
+from pathlib import Path
+
+import pytest
+
+from scripts.bench_rag_retrieval import make_corpus, make_queries
+from utils.rag import Bm25Params, Chunk, TfIdfIndex, load_index, make_chunk_tf, retrieve, save_index
+from utils.rag_mmap import MmapIndex
+
+
+def _index(docs: list) -> TfIdfIndex:
+    df: dict = {}
+    chunks = [
+        Chunk(id=i, source=src, content=text, tf=make_chunk_tf(text, df), heading=heading)
+        for i, (src, heading, text) in enumerate(docs)
+    ]
+    return TfIdfIndex(chunks=chunks, df=df, n_docs=len(chunks))
+
+
+@pytest.mark.unit
+def test_bm25_matches_reference_formula() -> None:
+    idx = _index([
+        ("a.md", "", "apfel birne birne"),
+        ("b.md", "", "apfel kirsche kirsche kirsche pflaume"),
+        ("c.md", "", "pflaume"),
+    ])
+    p = Bm25Params(k1=1.5, b=0.5, heading_boost=0.0, path_boost=0.0)
+    got = dict((pos, s) for s, pos in idx.search("apfel kirsche", 3, scorer="bm25", bm25=p))
+    avgdl = (3 + 5 + 1) / 3.0
+
+    def ref(pos: int) -> float:
+        ch = idx.chunks[pos]
+        dl = sum(ch.tf.values())
+        out = 0.0
+        for t in ("apfel", "kirsche"):
+            tf = ch.tf.get(t, 0)
+            if not tf:
+                continue
+            df = idx.df[t]
+            idf = math.log(1.0 + (3 - df + 0.5) / (df + 0.5))
+            out += idf * tf * (p.k1 + 1) / (tf + p.k1 * (1 - p.b + p.b * dl / avgdl))
+        return out
+
+    assert set(got) == {0, 1}
+    for pos, s in got.items():
+        assert s == pytest.approx(ref(pos))
+
+
+@pytest.mark.unit
+def test_maxscore_pruning_is_exact() -> None:
+    idx, vocab = make_corpus(n_docs=400, vocab_size=300, doc_len=40, seed=3)
+    inv = idx.inverted()
+    queries = make_queries(vocab, 40, seed=3) + ["w0 w1 w2 w250", "w0 w0 w299"]
+    for q in queries:
+        for k in (1, 3, 10):
+            a = inv.search(q, k, scorer="bm25", prune=True)
+            b = inv.search(q, k, scorer="bm25", prune=False)
+            assert [pos for _, pos in a] == [pos for _, pos in b]
+            assert [s for s, _ in a] == pytest.approx([s for s, _ in b])
+
+
+@pytest.mark.unit
+def test_heading_and_path_boosts() -> None:
+    idx = _index([
+        ("notes/misc.md", "", "kubernetes deployment notizen"),
+        ("notes/misc2.md", "Kubernetes", "deployment notizen kubernetes"),
+        ("ops/kubernetes.md", "", "deployment notizen kubernetes"),
+    ])
+    plain = Bm25Params(heading_boost=0.0, path_boost=0.0)
+    hits = idx.search("kubernetes", 3, scorer="bm25", bm25=plain)
+    assert len({round(s, 9) for s, _ in hits}) == 1  # ohne Boosts gleichwertig
+
+    boosted = idx.search("kubernetes", 3, scorer="bm25", bm25=Bm25Params(heading_boost=2.0, path_boost=1.0))
+    assert [pos for _, pos in boosted] == [1, 2, 0]
+    # Boosts sind pro Parametersatz gecacht, der TF-IDF-Pfad bleibt unverändert
+    assert [h["source"] for h in retrieve(idx, "kubernetes", top_k=1)] == [idx.chunks[0].source]
+
+
+@pytest.mark.unit
+def test_bm25_binary_matches_in_memory(tmp_path: Path) -> None:
+    idx = _index([
+        ("docs/setup.md", "Installation", "python venv installieren pip"),
+        ("docs/setup.md", "Start", "uvicorn starten port python"),
+        ("docs/rag.md", "", "index bauen rag python retrieve"),
+    ])
+    out = tmp_path / "index.bin"
+    save_index(idx, str(out), fmt="binary")
+    mm = load_index(str(out))
+    assert isinstance(mm, MmapIndex) and mm.header["version"] == 3
+    assert list(mm.chunk_len()) == [4, 4, 5]
+    p = Bm25Params()
+    for q in ["python", "rag index", "installation pip", "start port"]:
+        a = idx.search(q, 3, scorer="bm25", bm25=p)
+        b = mm.search(q, 3, scorer="bm25", bm25=p)
+        assert [pos for _, pos in a] == [pos for _, pos in b]
+        assert [s for s, _ in a] == pytest.approx([s for s, _ in b])
+
+
+@pytest.mark.unit
+def test_chat_rag_scoring_from_settings(monkeypatch: pytest.MonkeyPatch) -> None:
+    from app.api import chat as chat_module
+
+    monkeypatch.setattr(chat_module.settings, "RAG_SCORER", "tfidf", raising=False)
+    assert chat_module._rag_scoring() == {"scorer": "tfidf"}
+    monkeypatch.setattr(chat_module.settings, "RAG_SCORER", "bm25", raising=False)
+    monkeypatch.setattr(chat_module.settings, "RAG_BM25_K1", 0.9, raising=False)
+    got = chat_module._rag_scoring()
+    assert got["scorer"] == "bm25" and got["bm25"].k1 == 0.9
+
+
+@pytest.mark.scripts
+def test_bench_rag_retrieval_bm25_smoke(capsys: pytest.CaptureFixture[str]) -> None:
+    from scripts import bench_rag_retrieval as bench
+
+    rc = bench.main(["--sizes", "50", "--queries", "5", "--vocab", "100", "--doc-len", "10", "--scorer", "tfidf", "bm25"])
+    assert rc == 0
+    out = capsys.readouterr().out
+    assert "bm25 (MaxScore)" in out and "tfidf retrieve" in out
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from utils.rag import CachedIndex, build_index, save_index
+
+
+@pytest.mark.unit
+def test_cached_index_loads_once_and_reloads_on_change(tmp_path: Path) -> None:
+    doc = tmp_path / "doc1.txt"
+    doc.write_text("alpha beta", encoding="utf-8")
+    out = tmp_path / "index.json"
+    save_index(build_index([str(doc)]), str(out))
+
+    holder = CachedIndex(str(out), check_interval=0.0)
+    idx1 = holder.get()
+    assert idx1 is not None and idx1.n_docs == 1
+    # Unveränderte Datei -> gleiches Objekt, kein Reload
+    assert holder.get() is idx1
+    assert holder.reloads == 1
+    assert isinstance(holder.stats()["last_load_ms"], float)
+
+    # Index neu schreiben (andere Größe) -> Hot-Reload
+    doc2 = tmp_path / "doc2.txt"
+    doc2.write_text("gamma delta epsilon", encoding="utf-8")
+    save_index(build_index([str(doc), str(doc2)]), str(out))
+    idx2 = holder.get()
+    assert idx2 is not None and idx2 is not idx1
+    assert idx2.n_docs == 2
+    assert holder.reloads == 2
+
+
+@pytest.mark.unit
+def test_cached_index_missing_file_and_interval(tmp_path: Path) -> None:
+    out = tmp_path / "missing.json"
+    holder = CachedIndex(str(out), check_interval=3600.0)
+    assert holder.get() is None
+    assert holder.stats()["loaded"] is False
+
+    doc = tmp_path / "doc.txt"
+    doc.write_text("alpha", encoding="utf-8")
+    save_index(build_index([str(doc)]), str(out))
+    # Ohne geladenen Index wird trotz Intervall geprüft
+    idx = holder.get()
+    assert idx is not None
+    # Innerhalb des Intervalls kein erneuter stat()/Reload
+    out.unlink()
+    assert holder.get() is idx
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+from pathlib import Path
+from typing import List
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from utils.rag import Chunk, TfIdfIndex, make_chunk_tf, save_index, tokenize  # noqa: E402
+from utils.rag_dense import DenseIndex, QueryEmbeddingCache, build_dense, dense_path_for, rrf_fuse  # noqa: E402
+
+DIM = 32
+
+
+def fake_embed(texts: List[str]) -> List[List[float]]:
+    """Deterministische Hash-Embeddings (Bag-of-Words) als Ollama-Ersatz."""
+    out: List[List[float]] = []
+    for t in texts:
+        v = [0.0] * DIM
+        for tok in tokenize(t):
+            h = int(hashlib.md5(tok.encode("utf-8")).hexdigest(), 16)
+            v[h % DIM] += 1.0 if (h >> 8) & 1 else -1.0
+        out.append(v)
+    return out
+
+
+def _index(texts: List[str]) -> TfIdfIndex:
+    df: dict = {}
+    chunks = [Chunk(id=i, source=f"d{i}.md", content=t, tf=make_chunk_tf(t, df)) for i, t in enumerate(texts)]
+    return TfIdfIndex(chunks=chunks, df=df, n_docs=len(chunks))
+
+
+TEXTS = [
+    "apfel birne kirsche",
+    "server port uvicorn starten",
+    "rag index bauen retrieve",
+    "apfel kuchen rezept",
+    "docker compose port mapping",
+]
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_dense_search_matches_bruteforce(tmp_path: Path, dtype: str) -> None:
+    idx = _index(TEXTS)
+    out = tmp_path / "index.json.dense.npy"
+    stats = build_dense(idx, fake_embed, str(out), model="fake", dtype=dtype, batch_size=2)
+    assert stats == {"rows": 5, "embedded": 5, "reused": 0}
+    dense = DenseIndex.open(str(out))
+    assert dense is not None and dense.n_rows == 5 and str(dense.matrix.dtype) == dtype
+
+    q = fake_embed(["port starten"])[0]
+    mat = np.asarray(fake_embed(TEXTS), dtype=np.float32)
+    mat /= np.linalg.norm(mat, axis=1, keepdims=True)
+    ref = mat @ (np.asarray(q, dtype=np.float32) / np.linalg.norm(q))
+    got = dense.search(q, 3)
+    assert [pos for _, pos in got] == list(np.argsort(-ref, kind="stable")[:3])
+    assert [s for s, _ in got] == pytest.approx(sorted(ref, reverse=True)[:3], abs=1e-2)
+    assert dense.search([1.0, 2.0], 3) == []  # falsche Dimension
+
+
+@pytest.mark.unit
+def test_build_dense_reuses_unchanged_rows(tmp_path: Path) -> None:
+    out = tmp_path / "v.npy"
+    build_dense(_index(TEXTS), fake_embed, str(out), model="fake")
+    calls: List[int] = []
+
+    def counting(texts: List[str]) -> List[List[float]]:
+        calls.append(len(texts))
+        return fake_embed(texts)
+
+    changed = TEXTS[:4] + ["ganz neuer inhalt"]
+    stats = build_dense(_index(changed), counting, str(out), model="fake")
+    assert stats["embedded"] == 1 and stats["reused"] == 4 and calls == [1]
+    # Anderes Modell -> alles neu
+    stats = build_dense(_index(changed), counting, str(out), model="anderes")
+    assert stats["embedded"] == 5
+
+
+@pytest.mark.unit
+def test_rrf_and_query_cache() -> None:
+    fused = rrf_fuse([[1, 2, 3], [3, 1, 4]], top_k=3, k=60)
+    assert [pos for _, pos in fused] == [1, 3, 2]
+    cache = QueryEmbeddingCache(max_items=2)
+    cache.put("m", "a", [1.0])
+    cache.put("m", "b", [2.0])
+    assert cache.get("m", "a") == [1.0]
+    cache.put("m", "c", [3.0])  # verdrängt "b" (LRU)
+    assert cache.get("m", "b") is None
+    assert cache.get("x", "a") is None  # Modell ist Teil des Schlüssels
+    assert cache.stats()["hits"] == 1
+
+
+@pytest.mark.unit
+def test_retrieve_hits_hybrid_and_fallback(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    from app.services import rag_search
+    from utils.rag_dense import OllamaEmbedder
+
+    idx = _index(TEXTS)
+    index_path = tmp_path / "index.json"
+    save_index(idx, str(index_path))
+    build_dense(idx, fake_embed, dense_path_for(str(index_path)), model="fake")
+
+    embeds: List[str] = []
+
+    async def _aembed(self, texts, client=None):  # type: ignore[no-untyped-def]
+        embeds.extend(texts)
+        return fake_embed(texts)
+
+    monkeypatch.setattr(OllamaEmbedder, "aembed", _aembed)
+    monkeypatch.setattr(rag_search, "_QUERY_CACHE", None)
+    s = rag_search.settings
+    monkeypatch.setattr(s, "RAG_INDEX_PATH", str(index_path), raising=False)
+    monkeypatch.setattr(s, "RAG_DENSE_PATH", None, raising=False)
+    monkeypatch.setattr(s, "RAG_EMBED_MODEL", "fake", raising=False)
+    monkeypatch.setattr(s, "RAG_INDEX_CHECK_INTERVAL_SEC", 0.0, raising=False)
+
+    monkeypatch.setattr(s, "RAG_MODE", "hybrid", raising=False)
+    hits = asyncio.run(rag_search.retrieve_hits(idx, "apfel port", 2))
+    assert len(hits) == 2 and all(h["content"] for h in hits)
+    asyncio.run(rag_search.retrieve_hits(idx, "apfel port", 2))
+    assert embeds == ["apfel port"]  # zweiter Aufruf aus dem Query-Cache
+
+    monkeypatch.setattr(s, "RAG_MODE", "dense", raising=False)
+    dense_hits = asyncio.run(rag_search.retrieve_hits(idx, "uvicorn starten", 1))
+    assert dense_hits[0]["source"] == "d1.md"
+
+    # Modell passt nicht zur Vektordatei -> Sparse-Fallback
+    monkeypatch.setattr(s, "RAG_EMBED_MODEL", "anderes", raising=False)
+    sparse = asyncio.run(rag_search.retrieve_hits(idx, "kuchen", 1))
+    assert sparse[0]["source"] == "d3.md"
+
+
+@pytest.mark.unit
+def test_stale_dense_matrix_with_same_row_count_falls_back(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    from app.services import rag_search
+    from utils.rag_dense import OllamaEmbedder
+
+    index_path = tmp_path / "index.json"
+    build_dense(_index(TEXTS), fake_embed, dense_path_for(str(index_path)), model="fake")
+    # Re-Index mit gleich vielen Chunks, aber anderer Reihenfolge: Vektoren gehören zu anderen Texten
+    reindexed = _index(list(reversed(TEXTS)))
+    save_index(reindexed, str(index_path))
+
+    async def _aembed(self, texts, client=None):  # type: ignore[no-untyped-def]
+        return fake_embed(texts)
+
+    monkeypatch.setattr(OllamaEmbedder, "aembed", _aembed)
+    monkeypatch.setattr(rag_search, "_QUERY_CACHE", None)
+    s = rag_search.settings
+    monkeypatch.setattr(s, "RAG_INDEX_PATH", str(index_path), raising=False)
+    monkeypatch.setattr(s, "RAG_DENSE_PATH", None, raising=False)
+    monkeypatch.setattr(s, "RAG_EMBED_MODEL", "fake", raising=False)
+    monkeypatch.setattr(s, "RAG_INDEX_CHECK_INTERVAL_SEC", 0.0, raising=False)
+    monkeypatch.setattr(s, "RAG_MODE", "dense", raising=False)
+
+    hits = asyncio.run(rag_search.retrieve_hits(reindexed, "uvicorn starten", 1))
+    # Sparse-Treffer auf den neuen Positionen statt des falschen Texts aus der alten Matrix
+    assert hits[0]["content"] == TEXTS[1]
+
+
+@pytest.mark.scripts
+def test_rag_indexer_builds_dense(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    from scripts import rag_indexer
+    from utils.rag_dense import OllamaEmbedder
+
+    monkeypatch.setattr(OllamaEmbedder, "__call__", lambda self, texts: fake_embed(texts))
+    d = tmp_path / "docs"
+    d.mkdir()
+    (d / "a.md").write_text("# Titel\n\nalpha beta", encoding="utf-8")
+    (d / "b.md").write_text("gamma delta", encoding="utf-8")
+    out = tmp_path / "index.bin"
+    rc = rag_indexer.main(["--input", str(d), "--out", str(out), "--jobs", "1", "--dense-model", "fake", "--embed-host", "http://stub"])
+    assert rc == 0
+    dense = DenseIndex.open(dense_path_for(str(out)))
+    assert dense is not None and dense.n_rows == 2 and dense.model == "fake"
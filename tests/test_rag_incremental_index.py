@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+import pytest
+
+from utils.rag import chunk_text, load_index, retrieve, save_index
+from utils.rag_build import chunk_file, update_index
+from utils.rag_mmap import MmapIndex
+
+
+def _tree(tmp_path: Path) -> Path:
+    d = tmp_path / "docs"
+    (d / "sub").mkdir(parents=True)
+    (d / "a.md").write_text("# Alpha\n\nalpha beta\n\n# Gamma\n\ngamma delta", encoding="utf-8")
+    (d / "sub" / "b.md").write_text("beta epsilon", encoding="utf-8")
+    (d / "c.txt").write_text("zeta eta", encoding="utf-8")
+    return d
+
+
+def _df_from_scratch(index) -> dict:
+    df: dict = {}
+    for ch in index.chunks:
+        for t in ch.tf:
+            df[t] = df.get(t, 0) + 1
+    return df
+
+
+@pytest.mark.unit
+def test_chunk_text_splits_headings_and_overlaps() -> None:
+    text = "# Eins\n\nerster absatz\n\n## Zwei\n\n" + " ".join(f"wort{i}" for i in range(60))
+    parts = chunk_text(text, max_chars=120, overlap=30)
+    assert parts[0] == ("Eins", "# Eins\n\nerster absatz")
+    zwei = [c for h, c in parts if h == "Zwei"]
+    assert len(zwei) >= 2
+    # Überlappung: Anfang des Folgechunks stammt aus dem Ende des vorherigen
+    first_word = zwei[1].split()[0]
+    assert first_word in zwei[0]
+
+
+@pytest.mark.unit
+def test_incremental_update_only_retokenizes_changed(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    d = _tree(tmp_path)
+    idx, manifest, stats = update_index([str(d)], None, {}, chunk_chars=200, overlap=0)
+    assert stats.full_rebuild and stats.files_total == 3
+    assert {Path(c.source).name for c in idx.chunks} == {"a.md", "b.md", "c.txt"}
+    assert {c.heading for c in idx.chunks if c.source.endswith("a.md")} == {"Alpha", "Gamma"}
+
+    # Unverändert: nichts wird neu tokenisiert
+    import utils.rag_build as rb
+
+    seen: list = []
+    orig = rb.chunk_file
+
+    def _spy(path: str, chunk_chars: int, overlap: int):
+        seen.append(Path(path).name)
+        return orig(path, chunk_chars, overlap)
+
+    monkeypatch.setattr(rb, "chunk_file", _spy)
+    idx2, manifest2, stats2 = update_index([str(d)], idx, manifest, chunk_chars=200, overlap=0)
+    assert seen == [] and stats2.files_changed == 0 and not stats2.full_rebuild
+
+    # Eine Datei ändern, eine entfernen
+    b = d / "sub" / "b.md"
+    b.write_text("omega omega beta", encoding="utf-8")
+    st = b.stat()
+    os.utime(b, ns=(st.st_atime_ns, st.st_mtime_ns + 10_000_000))
+    (d / "c.txt").unlink()
+    idx3, _, stats3 = update_index([str(d)], idx2, manifest2, chunk_chars=200, overlap=0)
+    assert seen == ["b.md"]
+    assert stats3.files_changed == 1 and stats3.files_removed == 1
+    assert idx3.df == _df_from_scratch(idx3)
+    assert "zeta" not in idx3.df and "epsilon" not in idx3.df
+    assert idx3.n_docs == len(idx3.chunks)
+    assert [c.id for c in idx3.chunks] == list(range(len(idx3.chunks)))
+    assert retrieve(idx3, "omega", top_k=1)[0]["source"].endswith("b.md")
+
+
+@pytest.mark.unit
+def test_changed_params_force_full_rebuild(tmp_path: Path) -> None:
+    d = _tree(tmp_path)
+    idx, manifest, _ = update_index([str(d)], None, {}, chunk_chars=200, overlap=0)
+    _, _, stats = update_index([str(d)], idx, manifest, chunk_chars=100, overlap=0)
+    assert stats.full_rebuild and stats.files_changed == 3
+
+
+@pytest.mark.unit
+def test_process_pool_matches_serial(tmp_path: Path) -> None:
+    d = _tree(tmp_path)
+    serial, _, _ = update_index([str(d)], None, {}, chunk_chars=200, overlap=0, jobs=1)
+    pooled, _, _ = update_index([str(d)], None, {}, chunk_chars=200, overlap=0, jobs=2)
+    assert [(c.source, c.heading, c.tf) for c in serial.chunks] == [(c.source, c.heading, c.tf) for c in pooled.chunks]
+    assert chunk_file(str(d / "missing.md"), 200, 0)[1] == []
+
+
+@pytest.mark.unit
+def test_binary_v2_keeps_headings_and_converts_back(tmp_path: Path) -> None:
+    d = _tree(tmp_path)
+    idx, _, _ = update_index([str(d)], None, {}, chunk_chars=200, overlap=0)
+    out = tmp_path / "index.bin"
+    save_index(idx, str(out), fmt="binary")
+    mm = load_index(str(out))
+    assert isinstance(mm, MmapIndex)
+    assert [mm.heading(i) for i in range(len(idx.chunks))] == [c.heading for c in idx.chunks]
+    back = mm.to_tfidf()
+    assert back.df == idx.df
+    assert [c.tf for c in back.chunks] == [c.tf for c in idx.chunks]
+
+
+@pytest.mark.scripts
+def test_rag_indexer_incremental_run(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    from scripts import rag_indexer
+
+    d = _tree(tmp_path)
+    out = tmp_path / "rag" / "index.json"
+    assert rag_indexer.main(["--input", str(d), "--out", str(out), "--jobs", "1"]) == 0
+    assert (tmp_path / "rag" / "index.json.manifest.json").exists()
+    assert "voll" in capsys.readouterr().out
+    assert rag_indexer.main(["--input", str(d), "--out", str(out), "--jobs", "1"]) == 0
+    out2 = capsys.readouterr().out
+    assert "inkrementell" in out2 and "geändert: 0" in out2
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import pytest
+
+from scripts.bench_rag_retrieval import make_corpus, make_queries, retrieve_bruteforce
+from utils.rag import retrieve
+
+
+@pytest.mark.unit
+def test_inverted_search_matches_bruteforce() -> None:
+    idx, vocab = make_corpus(n_docs=300, vocab_size=500, doc_len=30, seed=7)
+    for q in make_queries(vocab, 40, seed=7):
+        expected = retrieve_bruteforce(idx, q, top_k=5)
+        got = idx.inverted().search(q, top_k=5)
+        assert [pos for _, pos in got] == [pos for _, pos in expected]
+        for (s1, _), (s2, _) in zip(got, expected):
+            assert s1 == pytest.approx(s2)
+
+
+@pytest.mark.unit
+def test_retrieve_unknown_terms_and_idf_precomputed() -> None:
+    idx, _ = make_corpus(n_docs=20, vocab_size=50, doc_len=10, seed=1)
+    assert retrieve(idx, "völlig unbekannt", top_k=3) == []
+    inv = idx.inverted()
+    # Postings/Normen werden nur einmal aufgebaut
+    assert idx.inverted() is inv
+    assert len(inv.norms) == len(idx.chunks)
+    assert len(inv.idf) == len(idx.df)
+
+
+@pytest.mark.scripts
+def test_bench_rag_retrieval_smoke(capsys: pytest.CaptureFixture[str]) -> None:
+    from scripts import bench_rag_retrieval as bench
+
+    rc = bench.main(["--sizes", "50", "--queries", "5", "--vocab", "100", "--doc-len", "10", "--baseline"])
+    assert rc == 0
+    out = capsys.readouterr().out
+    assert "n=" in out and "bruteforce" in out
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from utils.rag import CachedIndex, build_index, load_index, retrieve, save_index
+from utils.rag_mmap import MAGIC, MmapIndex
+
+
+def _docs(tmp_path: Path) -> Path:
+    d = tmp_path / "docs"
+    d.mkdir()
+    (d / "a.md").write_text("alpha beta beta Größe", encoding="utf-8")
+    (d / "b.md").write_text("gamma delta alpha", encoding="utf-8")
+    (d / "c.txt").write_text("delta epsilon zeta", encoding="utf-8")
+    return d
+
+
+@pytest.mark.unit
+def test_binary_roundtrip_matches_json(tmp_path: Path) -> None:
+    idx = build_index([str(_docs(tmp_path))])
+    out = tmp_path / "index.bin"
+    save_index(idx, str(out), fmt="binary")
+    assert out.read_bytes()[: len(MAGIC)] == MAGIC
+
+    mm = load_index(str(out))
+    assert isinstance(mm, MmapIndex)
+    assert mm.n_docs == idx.n_docs
+    assert mm.df("alpha") == idx.df["alpha"]
+    assert mm.term_id("unbekannt") == -1
+
+    for q in ["alpha", "beta", "größe", "delta zeta", "nichts"]:
+        a = retrieve(idx, q, top_k=3)
+        b = retrieve(mm, q, top_k=3)
+        assert [h["source"] for h in a] == [h["source"] for h in b]
+        assert [h["content"] for h in a] == [h["content"] for h in b]
+        for ha, hb in zip(a, b):
+            assert float(ha["score"]) == pytest.approx(float(hb["score"]), abs=1e-3)
+
+
+@pytest.mark.unit
+def test_json_still_loads_and_cached_index_handles_binary(tmp_path: Path) -> None:
+    idx = build_index([str(_docs(tmp_path))])
+    out_json = tmp_path / "index.json"
+    save_index(idx, str(out_json))
+    assert type(load_index(str(out_json))).__name__ == "TfIdfIndex"
+
+    out_bin = tmp_path / "index.bin"
+    save_index(idx, str(out_bin), fmt="binary")
+    holder = CachedIndex(str(out_bin), check_interval=0.0)
+    got = holder.get()
+    assert isinstance(got, MmapIndex)
+    assert retrieve(got, "epsilon", top_k=1)[0]["source"].endswith("c.txt")
+
+
+@pytest.mark.scripts
+def test_rag_indexer_emits_binary(tmp_path: Path) -> None:
+    from scripts import rag_indexer
+
+    out = tmp_path / "rag" / "index.bin"
+    rc = rag_indexer.main(["--input", str(_docs(tmp_path)), "--out", str(out)])
+    assert rc == 0
+    assert isinstance(load_index(str(out)), MmapIndex)
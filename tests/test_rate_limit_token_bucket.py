@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import pytest
+
+from app.services.rate_limit import TokenBucketLimiter, retry_after_header
+
+
+@pytest.mark.unit
+def test_bucket_allows_limit_then_refills() -> None:
+    lim = TokenBucketLimiter(3, rate_per_sec=1.0)
+    decisions = [lim.acquire("a", now=0.0) for _ in range(4)]
+    assert [d.allowed for d in decisions] == [True, True, True, False]
+    assert [d.remaining for d in decisions[:3]] == [2, 1, 0]
+    assert decisions[3].retry_after == pytest.approx(1.0)
+    assert retry_after_header(decisions[3].retry_after) == "1"
+
+    # nach 1.5 s ist ein Token nachgefüllt, der Bruchteil bleibt erhalten
+    assert lim.acquire("a", now=1.5).allowed
+    assert not lim.acquire("a", now=1.6).allowed
+    assert lim.acquire("a", now=2.0).allowed
+    # Auffüllung ist auf das Limit gedeckelt
+    assert lim.acquire("a", now=100.0).remaining == 2
+
+
+@pytest.mark.unit
+def test_idle_buckets_are_evicted_after_full_refill() -> None:
+    evicted: list[str] = []
+    lim = TokenBucketLimiter(2, rate_per_sec=1.0, on_evict=evicted.append)
+    assert lim.idle_ttl == pytest.approx(2.0)
+    lim.acquire("a", now=0.0)
+    lim.acquire("b", now=1.0)
+    # neuer Schlüssel nach Ablauf von "a" räumt dessen Bucket weg, "b" bleibt
+    lim.acquire("c", now=2.5)
+    assert "a" not in lim and "b" in lim and "c" in lim
+    assert evicted == ["idle"]
+    assert lim.stats()["evicted_idle"] == 1.0
+
+
+@pytest.mark.unit
+def test_key_cap_bounds_memory_under_scan() -> None:
+    lim = TokenBucketLimiter(5, rate_per_sec=0.001, max_keys=100, idle_ttl=3600)
+    lim.acquire("keep", now=0.0)
+    for i in range(10_000):
+        lim.acquire(f"10.0.{i // 256}.{i % 256}", now=1.0 + i * 1e-4)
+        if i % 50 == 0:
+            lim.acquire("keep", now=1.0 + i * 1e-4)  # aktiv genutzt -> bleibt (LRU)
+    assert len(lim) <= 100
+    assert "keep" in lim
+    assert lim.evicted_capacity >= 10_000 - 100
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+import pytest
+
+import app.api.chat as chat_module
+import app.services.response_cache as rc
+from app.api.models import ChatRequest
+from app.services.response_cache import ResponseCache, cache_key, is_deterministic
+
+
+@pytest.fixture(autouse=True)
+def _cache_settings(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(chat_module.settings, "RESPONSE_CACHE_ENABLED", True, raising=False)
+    monkeypatch.setattr(chat_module.settings, "RESPONSE_CACHE_DIR", None, raising=False)
+    monkeypatch.setattr(chat_module.settings, "MEMORY_ENABLED", False, raising=False)
+    monkeypatch.setattr(chat_module, "load_context_notes", lambda paths, max_chars=4000: None)
+    monkeypatch.setattr(rc, "_CACHE", None)
+
+
+@pytest.mark.unit
+def test_eligibility_and_key_is_canonical() -> None:
+    assert is_deterministic({"temperature": 0.0})
+    assert is_deterministic({"temperature": 0.7, "seed": 42})
+    assert not is_deterministic({"temperature": 0.7})
+    msgs = [{"role": "user", "content": "hi"}]
+    assert cache_key("m", msgs, {"temperature": 0.0, "top_p": 0.9}) == cache_key("m", msgs, {"top_p": 0.9, "temperature": 0.0})
+    assert cache_key("m", msgs, {"temperature": 0.0}) != cache_key("m", msgs, {"temperature": 0.0, "num_predict": 5})
+    assert cache_key("m", msgs, {"temperature": 0.0}) != cache_key("n", msgs, {"temperature": 0.0})
+    assert cache_key("m", msgs, {"temperature": 0.0}, "http://a:11434") != cache_key("m", msgs, {"temperature": 0.0}, "http://b:11434")
+
+
+@pytest.mark.unit
+def test_lru_byte_budget_and_ttl() -> None:
+    now = [1000.0]
+    cache = ResponseCache(max_bytes=10, ttl_sec=60, clock=lambda: now[0])
+
+    async def _run() -> List[Optional[List[str]]]:
+        await cache.put("a", ["aaaa"])
+        await cache.put("b", ["bbbb"])
+        assert await cache.get("a") == ["aaaa"]  # a zuletzt genutzt
+        await cache.put("c", ["cccc"])  # 12 Bytes > 10: b fällt
+        await cache.put("big", ["x" * 11])  # größer als das Budget: nicht gespeichert
+        out = [await cache.get("b"), await cache.get("c"), await cache.get("big")]
+        now[0] += 61
+        out.append(await cache.get("a"))
+        return out
+
+    assert asyncio.run(_run()) == [None, ["cccc"], None, None]
+    st = cache.stats()
+    assert st["evictions"] == 1 and st["entries"] == 1 and st["hits"] == 2
+
+
+@pytest.mark.unit
+def test_disk_tier_survives_restart(tmp_path: Path) -> None:
+    async def _write() -> None:
+        await ResponseCache(1024, 0, tmp_path).put("k" * 64, ["Hallo ", "Welt"])
+
+    async def _read() -> Dict[str, Any]:
+        cache = ResponseCache(1024, 0, tmp_path)
+        return {"first": await cache.get("k" * 64), "second": await cache.get("k" * 64), "stats": cache.stats()}
+
+    asyncio.run(_write())
+    out = asyncio.run(_read())
+    assert out["first"] == out["second"] == ["Hallo ", "Welt"]
+    assert out["stats"]["disk_hits"] == 1 and out["stats"]["hits"] == 2
+
+
+def _post_client(calls: List[Dict[str, Any]]) -> httpx.AsyncClient:
+    async def _handler(request: httpx.Request) -> httpx.Response:
+        calls.append(json.loads(request.content))
+        return httpx.Response(200, json={"message": {"content": f"antwort {len(calls)}"}, "done": True})
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(_handler))
+
+
+@pytest.mark.api
+@pytest.mark.parametrize(
+    "options,session_id,upstream_calls",
+    [
+        ({"temperature": 0}, None, 1),
+        ({"temperature": 0.7, "seed": 7}, None, 1),
+        ({"temperature": 0.7}, None, 2),
+        ({"temperature": 0}, "s1", 2),
+    ],
+)
+def test_non_stream_hits_skip_upstream(options: Dict[str, Any], session_id: Optional[str], upstream_calls: int) -> None:
+    calls: List[Dict[str, Any]] = []
+
+    async def _run() -> List[str]:
+        client = _post_client(calls)
+        out = []
+        for _ in range(2):
+            req = ChatRequest(messages=[{"role": "user", "content": "hi"}], options=options, session_id=session_id)
+            out.append((await chat_module.process_chat_request(req, client=client)).content)
+        await client.aclose()
+        return out
+
+    contents = asyncio.run(_run())
+    assert len(calls) == upstream_calls
+    if upstream_calls == 1:
+        assert contents == ["antwort 1", "antwort 1"]
+
+
+@pytest.mark.api
+def test_entries_are_not_shared_across_upstream_hosts() -> None:
+    hosts: List[str] = []
+
+    async def _handler(request: httpx.Request) -> httpx.Response:
+        hosts.append(request.url.host)
+        return httpx.Response(200, json={"message": {"content": f"von {request.url.host}"}, "done": True})
+
+    async def _run() -> List[str]:
+        client = httpx.AsyncClient(transport=httpx.MockTransport(_handler))
+        out = []
+        for host in ("http://ollama-a:11434", "http://ollama-b:11434", "http://ollama-a:11434"):
+            req = ChatRequest(messages=[{"role": "user", "content": "hi"}], options={"temperature": 0, "host": host})
+            out.append((await chat_module.process_chat_request(req, client=client)).content)
+        await client.aclose()
+        return out
+
+    assert asyncio.run(_run()) == ["von ollama-a", "von ollama-b", "von ollama-a"]
+    assert hosts == ["ollama-a", "ollama-b"]
+
+
+@pytest.mark.streaming
+@pytest.mark.api
+def test_stream_replays_cached_chunks_and_shares_entries() -> None:
+    calls: List[Dict[str, Any]] = []
+
+    async def _handler(request: httpx.Request) -> httpx.Response:
+        calls.append(json.loads(request.content))
+        lines = [{"message": {"content": "Hal"}}, {"message": {"content": "lo"}}, {"done": True}]
+        return httpx.Response(200, content="\n".join(json.dumps(x) for x in lines).encode())
+
+    async def _run() -> Dict[str, Any]:
+        client = httpx.AsyncClient(transport=httpx.MockTransport(_handler))
+        req = ChatRequest(messages=[{"role": "user", "content": "hi"}], options={"temperature": 0})
+        runs = []
+        for _ in range(2):
+            agen = await chat_module.stream_chat_request(req, client=client)
+            runs.append([ev async for ev in agen])
+        non_stream = await chat_module.process_chat_request(req, client=client)
+        await client.aclose()
+        return {"runs": runs, "non_stream": non_stream.content}
+
+    out = asyncio.run(_run())
+    assert len(calls) == 1
+    first, second = out["runs"]
+    data = lambda evs: [e for e in evs if e.startswith("data: ")]  # noqa: E731
+    assert data(first) == data(second) == ["data: Hal\n\n", "data: lo\n\n"]
+    assert not any('"cache"' in e for e in first)
+    assert any(e.startswith("event: meta") and '"cache": "hit"' in e for e in second)
+    assert second[-1].startswith("event: done")
+    # /chat nutzt denselben Eintrag
+    assert out["non_stream"] == "Hallo"
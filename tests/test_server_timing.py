@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import json
+import time
+from typing import Any
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import app.api.chat as chat_module
+from app.main import app
+from app.services import trace as trace_module
+
+RealAsyncClient = httpx.AsyncClient
+
+
+def _mock_client(*args: Any, **kwargs: Any) -> httpx.AsyncClient:
+    async def _handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/api/chat"):
+            body = json.loads(request.content.decode("utf-8"))
+            if body.get("stream"):
+                lines = [
+                    json.dumps({"message": {"content": "a"}}),
+                    json.dumps({"message": {"content": "b"}}),
+                    json.dumps({"done": True}),
+                ]
+                return httpx.Response(200, content="\n".join(lines).encode("utf-8"))
+            return httpx.Response(200, json={"message": {"content": "ok"}, "eval_duration": 1_000})
+        return httpx.Response(404)
+
+    return RealAsyncClient(transport=httpx.MockTransport(_handler))
+
+
+def _phases(header: str) -> dict:
+    out = {}
+    for part in header.split(","):
+        name, _, dur = part.strip().partition(";dur=")
+        out[name] = float(dur)
+    return out
+
+
+@pytest.mark.api
+def test_chat_sets_server_timing_header(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(chat_module.httpx, "AsyncClient", _mock_client)
+    resp = TestClient(app).post("/chat", json={"messages": [{"role": "user", "content": "hi"}]})
+    assert resp.status_code == 200
+    phases = _phases(resp.headers["Server-Timing"])
+    for name in ("parse", "prompt", "notes", "upstream_wait", "upstream_gen", "policy_post", "total"):
+        assert name in phases, name
+    assert phases["total"] >= phases["prompt"]
+    assert resp.headers.get("X-Request-ID")
+
+
+@pytest.mark.api
+@pytest.mark.streaming
+def test_stream_sends_timing_meta_before_done(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(chat_module.httpx, "AsyncClient", _mock_client)
+    with TestClient(app).stream("POST", "/chat/stream", json={"messages": [{"role": "user", "content": "hi"}]}) as resp:
+        assert "prompt;dur=" in resp.headers["Server-Timing"]
+        body = "".join(resp.iter_text())
+    events = [e for e in body.split("\n\n") if e]
+    assert events[-1].startswith("event: done")
+    timing_ev = events[-2]
+    assert timing_ev.startswith("event: meta")
+    timing = json.loads(timing_ev.split("data: ", 1)[1])["timing"]
+    assert {"parse", "prompt", "upstream_wait", "upstream_gen"} <= set(timing["phases_ms"])
+    assert timing["request_id"]
+
+
+@pytest.mark.unit
+def test_sampled_trace_is_written(monkeypatch: pytest.MonkeyPatch, tmp_path):
+    path = tmp_path / "traces" / "trace.jsonl"
+    monkeypatch.setattr(trace_module.settings, "TRACE_LOG_PATH", str(path), raising=False)
+    monkeypatch.setattr(trace_module.settings, "TRACE_SAMPLE_RATE", 0.0, raising=False)
+    monkeypatch.setattr(trace_module.settings, "TRACE_SLOW_MS", 0.0, raising=False)
+
+    t = trace_module.RequestTrace("rid-x", route="/chat")
+    t.add("rag", 1.5)
+    assert trace_module.write_trace(t) is False
+
+    monkeypatch.setattr(trace_module.settings, "TRACE_SAMPLE_RATE", 1.0, raising=False)
+    assert trace_module.write_trace(t, mode="default") is True
+    deadline = time.time() + 2.0
+    while not (path.exists() and path.read_text(encoding="utf-8").endswith("\n")) and time.time() < deadline:
+        time.sleep(0.01)
+    rec = json.loads(path.read_text(encoding="utf-8").splitlines()[0])
+    assert rec["request_id"] == "rid-x" and rec["phases_ms"]["rag"] == 1.5 and rec["mode"] == "default"
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+from pathlib import Path
+from typing import Any, List, Tuple
+
+import pytest
+
+from app.services import shared_state as ss
+from app.services.rate_limit import SharedTokenBucket
+
+
+@pytest.fixture(params=["local", "sqlite"])
+def state(request: pytest.FixtureRequest, tmp_path: Path) -> Any:
+    st: ss.SharedState = ss.LocalState() if request.param == "local" else ss.SqliteState(tmp_path / "state.sqlite3")
+    yield st
+    st.close()
+
+
+@pytest.mark.unit
+def test_get_set_delete_and_ttl(state: ss.SharedState, monkeypatch: pytest.MonkeyPatch) -> None:
+    state.set("a", {"x": [1, 2]})
+    state.mset({"b": 1, "c": "zwei"}, ttl=10)
+    assert state.get("a") == {"x": [1, 2]}
+    assert state.mget(["b", "c", "fehlt"]) == [1, "zwei", None]
+
+    now = ss.time.time()
+    monkeypatch.setattr(ss.time, "time", lambda: now + 11)
+    assert state.get("b") is None and state.get("a") == {"x": [1, 2]}
+
+    state.delete("a", "c")
+    assert state.mget(["a", "c"]) == [None, None]
+
+
+@pytest.mark.unit
+def test_update_and_pipeline_are_atomic(state: ss.SharedState) -> None:
+    def incr(cur: Any) -> Tuple[int, int]:
+        val = int(cur or 0) + 1
+        return val, val
+
+    assert [state.update("n", incr) for _ in range(3)] == [1, 2, 3]
+
+    with state.pipeline() as pipe:
+        pipe.set("p", [1]).update("n", incr).delete("fehlt")
+    assert state.mget(["p", "n"]) == [[1], 4]
+
+    def boom(cur: Any) -> Tuple[Any, Any]:
+        raise RuntimeError("x")
+
+    pipe = state.pipeline().set("p", [2]).update("n", boom)
+    with pytest.raises(RuntimeError):
+        pipe.execute()
+    # nichts aus der fehlgeschlagenen Transaktion wurde geschrieben
+    assert state.mget(["p", "n"]) == [[1], 4]
+
+
+@pytest.mark.unit
+def test_incomplete_backend_fails_at_construction() -> None:
+    class _NoApply(ss.SharedState):
+        def get(self, key: str) -> Any:
+            return None
+
+        def mget(self, keys: Any) -> List[Any]:
+            return []
+
+    with pytest.raises(TypeError):
+        _NoApply()  # type: ignore[abstract]
+
+
+def _worker_acquire(path: str, n: int) -> int:
+    st = ss.SqliteState(Path(path))
+    bucket = SharedTokenBucket(st, limit=60, rate_per_sec=1e-6)
+    allowed = sum(1 for _ in range(n) if bucket.acquire("10.0.0.1").allowed)
+    st.close()
+    return allowed
+
+
+@pytest.mark.unit
+def test_sqlite_limit_is_shared_across_processes(tmp_path: Path) -> None:
+    path = str(tmp_path / "rl.sqlite3")
+    ss.SqliteState(Path(path)).close()
+    ctx = multiprocessing.get_context("fork")
+    with ctx.Pool(4) as pool:
+        results: List[int] = pool.starmap(_worker_acquire, [(path, 40)] * 4)
+    # 4 Worker x 40 Versuche, gemeinsames Limit 60
+    assert sum(results) == 60
+
+
+@pytest.mark.unit
+def test_components_use_shared_state() -> None:
+    from app.core.memory import SharedMemoryStore
+    from app.core.mode import SessionModeStore
+    from app.utils.session_memory import SessionMemory
+
+    st = ss.LocalState()
+    # zwei "Worker" mit getrennten Objekten, gleicher Zustand
+    SessionModeStore(120, 1000, state=st).set("s1", "rpg")
+    assert SessionModeStore(120, 1000, state=st).get("s1") == "rpg"
+
+    SessionMemory(state=st).put_and_trim("s1", [{"role": "user", "content": "hallo"}], 10, 100)
+    hist = SessionMemory(state=st).put_and_trim("s1", [{"role": "assistant", "content": "x" * 98}], 10, 100)
+    assert [m["role"] for m in hist] == ["assistant"]
+    assert SessionMemory(state=st).get("s1") == hist
+
+    async def _mem() -> List[Any]:
+        a, b = SharedMemoryStore(st), SharedMemoryStore(st)
+        await a.append("s2", "user", "frage")
+        await b.append("s2", "assistant", "antwort")
+        win = await b.get_window("s2", max_chars=1000, max_turns=10)
+        await a.clear("s2")
+        return [win, await b.get_window("s2", max_chars=1000, max_turns=10)]
+
+    win, after = asyncio.run(_mem())
+    assert win == [{"role": "user", "content": "frage"}, {"role": "assistant", "content": "antwort"}]
+    assert after == []
+
+
+@pytest.mark.unit
+def test_get_shared_state_follows_settings(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    monkeypatch.setattr(ss.settings, "SHARED_STATE_BACKEND", "none", raising=False)
+    assert ss.get_shared_state() is None
+    monkeypatch.setattr(ss.settings, "SHARED_STATE_BACKEND", "sqlite", raising=False)
+    monkeypatch.setattr(ss.settings, "SHARED_STATE_PATH", tmp_path / "s.sqlite3", raising=False)
+    try:
+        st = ss.get_shared_state()
+        assert isinstance(st, ss.SqliteState) and ss.get_shared_state() is st
+    finally:
+        ss.reset_shared_state()
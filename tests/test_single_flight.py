@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+import pytest
+
+import app.api.chat as chat_module
+import app.services.response_cache as rc
+from app.api.models import ChatRequest
+from app.services.single_flight import SingleFlight
+
+
+@pytest.fixture(autouse=True)
+def _flight_settings(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(chat_module.settings, "SINGLE_FLIGHT_ENABLED", True, raising=False)
+    monkeypatch.setattr(chat_module.settings, "SINGLE_FLIGHT_DETERMINISTIC_ONLY", True, raising=False)
+    monkeypatch.setattr(chat_module.settings, "RESPONSE_CACHE_ENABLED", False, raising=False)
+    monkeypatch.setattr(chat_module.settings, "MEMORY_ENABLED", False, raising=False)
+    monkeypatch.setattr(chat_module, "load_context_notes", lambda paths, max_chars=4000: None)
+    monkeypatch.setattr(rc, "_CACHE", None)
+    monkeypatch.setattr(chat_module, "single_flight", SingleFlight())
+
+
+@pytest.mark.unit
+def test_late_joiner_gets_replay_then_live_items() -> None:
+    flights = SingleFlight()
+    starts: List[int] = []
+
+    async def _run() -> List[List[str]]:
+        release = asyncio.Event()
+
+        async def _gen() -> AsyncIterator[str]:
+            starts.append(1)
+            yield "a"
+            yield "b"
+            await release.wait()
+            yield "c"
+
+        async def _read() -> List[str]:
+            return [x async for x in flights.stream("k", _gen)]
+
+        first = asyncio.create_task(_read())
+        await asyncio.sleep(0.01)  # "a", "b" sind gepuffert
+        late = asyncio.create_task(_read())
+        await asyncio.sleep(0.01)
+        release.set()
+        return [await first, await late]
+
+    assert asyncio.run(_run()) == [["a", "b", "c"], ["a", "b", "c"]]
+    assert starts == [1] and flights.joined == 1 and len(flights) == 0
+
+
+@pytest.mark.unit
+def test_cancellation_is_reference_counted() -> None:
+    flights = SingleFlight()
+    state: Dict[str, Any] = {"cancelled": False}
+
+    async def _run() -> None:
+        async def _gen() -> AsyncIterator[int]:
+            try:
+                i = 0
+                while True:
+                    yield i
+                    i += 1
+                    await asyncio.sleep(0.005)
+            except asyncio.CancelledError:
+                state["cancelled"] = True
+                raise
+
+        a = flights.stream("k", _gen)
+        b = flights.stream("k", _gen)
+        assert await a.__anext__() == 0 and await b.__anext__() == 0
+        await a.aclose()
+        await asyncio.sleep(0.02)
+        # b liest noch: Generierung läuft weiter
+        assert not state["cancelled"] and await b.__anext__() == 1
+        await b.aclose()
+        await asyncio.sleep(0.01)
+
+    asyncio.run(_run())
+    assert state["cancelled"] and flights.cancelled == 1 and len(flights) == 0
+
+
+@pytest.mark.unit
+def test_errors_reach_every_participant() -> None:
+    flights = SingleFlight()
+
+    async def _run() -> List[str]:
+        async def _boom() -> str:
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream down")
+
+        results = await asyncio.gather(*(flights.call("k", _boom) for _ in range(3)), return_exceptions=True)
+        return [str(r) for r in results]
+
+    assert asyncio.run(_run()) == ["upstream down"] * 3
+
+
+def _slow_post_client(calls: List[Dict[str, Any]]) -> httpx.AsyncClient:
+    async def _handler(request: httpx.Request) -> httpx.Response:
+        calls.append(json.loads(request.content))
+        await asyncio.sleep(0.02)
+        return httpx.Response(200, json={"message": {"content": f"antwort {len(calls)}"}, "done": True})
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(_handler))
+
+
+@pytest.mark.api
+@pytest.mark.parametrize(
+    "options,session_id,upstream_calls",
+    [
+        ({"temperature": 0}, None, 1),
+        ({"temperature": 0.7}, None, 3),
+        ({"temperature": 0}, "s1", 3),
+    ],
+)
+def test_concurrent_non_stream_requests_coalesce(
+    options: Dict[str, Any], session_id: Optional[str], upstream_calls: int
+) -> None:
+    calls: List[Dict[str, Any]] = []
+
+    async def _run() -> List[str]:
+        client = _slow_post_client(calls)
+        req = ChatRequest(messages=[{"role": "user", "content": "hi"}], options=options, session_id=session_id)
+        out = await asyncio.gather(*(chat_module.process_chat_request(req, client=client) for _ in range(3)))
+        await client.aclose()
+        return [r.content for r in out]
+
+    contents = asyncio.run(_run())
+    assert len(calls) == upstream_calls
+    if upstream_calls == 1:
+        assert contents == ["antwort 1"] * 3
+
+
+@pytest.mark.api
+def test_requests_to_different_hosts_do_not_coalesce() -> None:
+    hosts: List[str] = []
+
+    async def _handler(request: httpx.Request) -> httpx.Response:
+        hosts.append(request.url.host)
+        await asyncio.sleep(0.02)
+        return httpx.Response(200, json={"message": {"content": f"von {request.url.host}"}, "done": True})
+
+    async def _run() -> List[str]:
+        client = httpx.AsyncClient(transport=httpx.MockTransport(_handler))
+        reqs = [
+            ChatRequest(messages=[{"role": "user", "content": "hi"}], options={"temperature": 0, "host": host})
+            for host in ("http://ollama-a:11434", "http://ollama-b:11434")
+        ]
+        out = await asyncio.gather(*(chat_module.process_chat_request(r, client=client) for r in reqs))
+        await client.aclose()
+        return [r.content for r in out]
+
+    assert asyncio.run(_run()) == ["von ollama-a", "von ollama-b"]
+    assert sorted(hosts) == ["ollama-a", "ollama-b"]
+
+
+@pytest.mark.streaming
+@pytest.mark.api
+def test_concurrent_streams_share_one_generation() -> None:
+    calls: List[Dict[str, Any]] = []
+
+    class _Lines(httpx.AsyncByteStream):
+        async def __aiter__(self) -> AsyncIterator[bytes]:
+            for part in ("Hal", "lo"):
+                yield (json.dumps({"message": {"content": part}}) + "\n").encode()
+                await asyncio.sleep(0.04)
+            yield json.dumps({"done": True}).encode()
+
+    async def _handler(request: httpx.Request) -> httpx.Response:
+        calls.append(json.loads(request.content))
+        return httpx.Response(200, stream=_Lines())
+
+    async def _run() -> List[List[str]]:
+        client = httpx.AsyncClient(transport=httpx.MockTransport(_handler))
+        req = ChatRequest(messages=[{"role": "user", "content": "hi"}], options={"seed": 1})
+
+        async def _one(delay: float) -> List[str]:
+            await asyncio.sleep(delay)
+            agen = await chat_module.stream_chat_request(req, client=client)
+            return [ev async for ev in agen if ev.startswith("data: ")]
+
+        out = await asyncio.gather(_one(0), _one(0.02))
+        await client.aclose()
+        return list(out)
+
+    first, late = asyncio.run(_run())
+    assert len(calls) == 1
+    assert first == late == ["data: Hal\n\n", "data: lo\n\n"]
@@ -1,6 +1,10 @@
 import json
+import os
+import re
+import threading
+import time
 from pathlib import Path
-from typing import List, Optional, Iterable, Dict
+from typing import List, Optional, Iterable, Dict, Set, Tuple
 
 def _read_text(path: str) -> str:
     with open(path, "r", encoding="utf-8") as f:
@@ -36,16 +40,20 @@ def _read_jsonl(path: str) -> str:
 ALLOWED_EXTS = {".md", ".txt", ".json", ".jsonl", ".ref"}
 
 
-def _iter_paths(paths: List[str]) -> Iterable[Path]:
+def _iter_paths(paths: List[str], watch: Optional[List[Path]] = None) -> Iterable[Path]:
     """Erweitert gemischte Eingaben (Dateien/Verzeichnisse) in eine geordnete Dateiliste.
 
     - Unterstützt Verzeichnisse: nimmt Dateien mit ALLOWED_EXTS (nicht rekursiv) auf
     - .ref Dateien: werden im Loader speziell behandelt (verweisen auf andere Dateien)
     - Reihenfolge: wie angegeben; für Verzeichnisse alphabetisch nach Dateiname
       bzw. explizit über eine ORDER-Datei steuerbar
+    - `watch`: sammelt alle Pfade, deren Änderung das Ergebnis beeinflusst (für den Cache)
     """
     for p in paths:
         pp = Path(p)
+        if watch is not None:
+            # auch nicht existierende Eingaben beobachten (späteres Anlegen)
+            watch.append(pp)
         if not pp.exists():
             continue
         if pp.is_dir():
@@ -58,6 +66,8 @@ def _iter_paths(paths: List[str]) -> Iterable[Path]:
             order: Optional[List[str]] = None
             for of in order_files:
                 if of.exists() and of.is_file():
+                    if watch is not None:
+                        watch.append(of)
                     try:
                         lines = of.read_text(encoding="utf-8").splitlines()
                         # Filtern: Kommentare/Leerzeilen
@@ -98,6 +108,9 @@ def _iter_paths(paths: List[str]) -> Iterable[Path]:
             yield pp
 
 
+_MULTI_NL_RE = re.compile(r"\n{3,}")
+
+
 def _normalize_text(txt: str) -> str:
     """Reduziert übermäßige Leerzeilen und trimmt Whitespace am Rand.
 
@@ -106,22 +119,11 @@ def _normalize_text(txt: str) -> str:
     """
     # Vereinheitliche Zeilenumbrüche (bewahrt CRLF beim Lesen durch Python, aber normalisiert intern)
     s = txt.replace("\r\n", "\n").replace("\r", "\n")
-    out_chars: List[str] = []
-    nl_count = 0
-    for ch in s:
-        if ch == "\n":
-            nl_count += 1
-            # Maximal zwei Newlines hintereinander behalten
-            if nl_count <= 2:
-                out_chars.append("\n")
-        else:
-            nl_count = 0
-            out_chars.append(ch)
-    res = "".join(out_chars)
-    return res.strip()
-
-
-def _resolve_ref(path: Path) -> Optional[Path]:
+    # Maximal zwei Newlines hintereinander behalten
+    return _MULTI_NL_RE.sub("\n\n", s).strip()
+
+
+def _resolve_ref(path: Path, watch: Optional[List[Path]] = None) -> Optional[Path]:
     """Liest eine .ref Datei: erste nicht-leere Zeile ist ein (relativer oder absoluter) Dateipfad."""
     try:
         content = path.read_text(encoding="utf-8")
@@ -133,30 +135,24 @@ def _resolve_ref(path: Path) -> Optional[Path]:
             if not target.is_absolute():
                 # Relativ zum Repo-Root (aktuelles Arbeitsverzeichnis)
                 target = Path.cwd() / target
+            if watch is not None:
+                watch.append(target)
             return target if target.exists() and target.is_file() else None
     except Exception:
         return None
     return None
 
 
-def load_context_notes(paths: List[str], max_chars: int = 4000) -> Optional[str]:
-    """
-    Lädt lokale Kontext-Notizen aus Dateien und/oder Verzeichnissen.
-    Unterstützte Formate: .md/.txt (Text), .json, .jsonl; zusätzlich .ref als Verweisdatei.
-
-    Verhalten:
-    - Jeder Eintrag in `paths` kann Datei oder Verzeichnis sein.
-    - Verzeichnisse: Es werden alle Dateien mit erlaubten Endungen (nicht rekursiv) geladen.
-    - .ref-Datei: enthält Pfad zu einer Zieldatei (erste nicht-leere Zeile), die geladen wird.
-    - Rückgabe: zusammengeführter Text (mit \n\n separiert), auf max_chars gekürzt.
-    """
+def _build_notes(paths: List[str], max_chars: int, watch: Optional[List[Path]] = None) -> Optional[str]:
     chunks: List[str] = []
-    for path_obj in _iter_paths(paths):
+    for path_obj in _iter_paths(paths, watch):
         try:
             lower = path_obj.suffix.lower()
             target = path_obj
+            if watch is not None:
+                watch.append(path_obj)
             if lower == ".ref":
-                ref = _resolve_ref(path_obj)
+                ref = _resolve_ref(path_obj, watch)
                 if ref is None:
                     continue
                 target = ref
@@ -182,3 +178,128 @@ def load_context_notes(paths: List[str], max_chars: int = 4000) -> Optional[str]
     if len(merged) > max_chars:
         return merged[: max_chars - 3] + "..."
     return merged
+
+
+# (Pfad, mtime_ns, size) je beobachtetem Pfad; None-Werte = Pfad existiert nicht
+_Signature = Tuple[Tuple[str, Optional[int], Optional[int]], ...]
+
+
+def _stat_entry(key: str) -> Tuple[str, Optional[int], Optional[int]]:
+    try:
+        st = os.stat(key)
+        # Verzeichnisse: mtime ändert sich beim Anlegen/Löschen/Umbenennen von Einträgen
+        return (key, st.st_mtime_ns, st.st_size)
+    except OSError:
+        return (key, None, None)
+
+
+def _signature(watch: List[Path]) -> _Signature:
+    out: List[Tuple[str, Optional[int], Optional[int]]] = []
+    seen: Set[str] = set()
+    for p in watch:
+        key = str(p)
+        if key in seen:
+            continue
+        seen.add(key)
+        out.append(_stat_entry(key))
+    return tuple(out)
+
+
+class _Watch(List[Path]):
+    """Beobachtete Pfade; stat() direkt beim Hinzufügen, also bevor der Pfad gelesen wird.
+
+    Ändert sich eine Datei während des Einlesens, passt die gespeicherte Signatur nicht mehr
+    zum nächsten stat() und der Eintrag wird neu geladen (statt alten Inhalt unter neuer
+    mtime/size zu cachen).
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._stats: Dict[str, Tuple[str, Optional[int], Optional[int]]] = {}
+
+    def append(self, p: Path) -> None:
+        super().append(p)
+        key = str(p)
+        if key not in self._stats:
+            self._stats[key] = _stat_entry(key)
+
+    def signature(self) -> _Signature:
+        return tuple(self._stats.values())
+
+
+class _NotesCacheEntry:
+    __slots__ = ("signature", "watch", "result", "checked_at")
+
+    def __init__(self, signature: _Signature, watch: List[Path], result: Optional[str], checked_at: float) -> None:
+        self.signature = signature
+        self.watch = watch
+        self.result = result
+        self.checked_at = checked_at
+
+
+_CACHE: Dict[Tuple[Tuple[str, ...], int], _NotesCacheEntry] = {}
+_CACHE_LOCK = threading.Lock()
+_STATS: Dict[str, int] = {"hits": 0, "misses": 0, "revalidations": 0}
+_DEFAULT_CHECK_INTERVAL = 0.0
+
+
+def set_default_check_interval(seconds: float) -> None:
+    """Prüfintervall für Aufrufe ohne explizites `check_interval` (App setzt es beim Start)."""
+    global _DEFAULT_CHECK_INTERVAL
+    _DEFAULT_CHECK_INTERVAL = max(0.0, float(seconds))
+
+
+def load_context_notes(
+    paths: List[str], max_chars: int = 4000, check_interval: Optional[float] = None
+) -> Optional[str]:
+    """
+    Lädt lokale Kontext-Notizen aus Dateien und/oder Verzeichnissen.
+    Unterstützte Formate: .md/.txt (Text), .json, .jsonl; zusätzlich .ref als Verweisdatei.
+
+    Verhalten:
+    - Jeder Eintrag in `paths` kann Datei oder Verzeichnis sein.
+    - Verzeichnisse: Es werden alle Dateien mit erlaubten Endungen (nicht rekursiv) geladen.
+    - .ref-Datei: enthält Pfad zu einer Zieldatei (erste nicht-leere Zeile), die geladen wird.
+    - Rückgabe: zusammengeführter Text (mit \n\n separiert), auf max_chars gekürzt.
+
+    Cache: Das Ergebnis wird je (paths, max_chars) zusammen mit mtime/size aller beteiligten
+    Pfade (Eingaben, Verzeichnisse, ORDER-Dateien, .ref-Dateien und -Ziele, Notizdateien)
+    gehalten. Innerhalb von `check_interval` Sekunden wird ohne Prüfung geliefert, danach
+    genügt ein stat() pro Pfad; nur bei Änderungen wird neu gelesen.
+    Ohne `check_interval` gilt set_default_check_interval() (Standard 0 = jedes Mal prüfen).
+    """
+    if check_interval is None:
+        check_interval = _DEFAULT_CHECK_INTERVAL
+    key = (tuple(str(p) for p in paths), int(max_chars))
+    now = time.monotonic()
+    entry = _CACHE.get(key)
+    if entry is not None:
+        if now - entry.checked_at < check_interval:
+            with _CACHE_LOCK:
+                _STATS["hits"] += 1
+            return entry.result
+        if _signature(entry.watch) == entry.signature:
+            entry.checked_at = now
+            with _CACHE_LOCK:
+                _STATS["hits"] += 1
+                _STATS["revalidations"] += 1
+            return entry.result
+
+    watch = _Watch()
+    result = _build_notes(list(paths), max_chars, watch)
+    with _CACHE_LOCK:
+        _STATS["misses"] += 1
+        # Signatur vor dem Lesen (siehe _Watch), nicht danach
+        _CACHE[key] = _NotesCacheEntry(watch.signature(), list(watch), result, time.monotonic())
+    return result
+
+
+def context_notes_cache_stats() -> Dict[str, int]:
+    """Hit/Miss-Zähler des Notiz-Caches (revalidations = Treffer nach stat()-Prüfung)."""
+    with _CACHE_LOCK:
+        return {**_STATS, "entries": len(_CACHE)}
+
+
+def clear_context_notes_cache() -> None:
+    with _CACHE_LOCK:
+        _CACHE.clear()
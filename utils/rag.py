@@ -3,10 +3,18 @@ from __future__ import annotations
 import json
 import math
 import os
+import heapq
 import re
-from dataclasses import dataclass
+import threading
+from array import array
+from bisect import bisect_left
+import time
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List, Tuple, Iterable, Optional
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Tuple, Iterable, Optional, Sequence, Union, Literal
+
+if TYPE_CHECKING:
+    from .rag_mmap import MmapIndex
 
 
 TOKEN_RE = re.compile(r"[A-Za-zÄÖÜäöü0-9_]+", re.UNICODE)
@@ -23,6 +31,8 @@ class Chunk:
     source: str
     content: str
     tf: Dict[str, int]
+    # Überschrift des Abschnitts (leer bei Datei-Chunks ohne Gliederung)
+    heading: str = ""
 
 
 @dataclass
@@ -30,13 +40,37 @@ class TfIdfIndex:
     chunks: List[Chunk]
     df: Dict[str, int]
     n_docs: int
+    # Lazily aufgebaute Suchstruktur (nicht Teil des Dateiformats)
+    _inverted: Optional["InvertedIndex"] = field(default=None, init=False, repr=False, compare=False)
+
+    def inverted(self) -> "InvertedIndex":
+        """Liefert die (einmalig aufgebaute) invertierte Suchstruktur."""
+        inv = self._inverted
+        if inv is None:
+            inv = InvertedIndex(self)
+            self._inverted = inv
+        return inv
+
+    def search(
+        self,
+        query: str,
+        top_k: int,
+        scorer: "Scorer" = "tfidf",
+        bm25: Optional["Bm25Params"] = None,
+    ) -> List[Tuple[float, int]]:
+        return self.inverted().search(query, top_k, scorer=scorer, bm25=bm25)
+
+    def hit(self, pos: int) -> Tuple[str, str]:
+        """(source, content) eines Chunks anhand seiner Position."""
+        ch = self.chunks[pos]
+        return ch.source, ch.content
 
     def to_dict(self) -> Dict[str, object]:
         return {
             "n_docs": self.n_docs,
             "df": self.df,
             "chunks": [
-                {"id": c.id, "source": c.source, "content": c.content, "tf": c.tf}
+                {"id": c.id, "source": c.source, "content": c.content, "tf": c.tf, **({"heading": c.heading} if c.heading else {})}
                 for c in self.chunks
             ],
         }
@@ -86,7 +120,8 @@ class TfIdfIndex:
                     except Exception:
                         continue
                     tf[k_s] = v_i
-            chunks.append(Chunk(id=cid, source=src, content=content, tf=tf))
+            heading = str(cd.get("heading", "") or "")
+            chunks.append(Chunk(id=cid, source=src, content=content, tf=tf, heading=heading))
 
         df_any: object = d.get("df", {})
         df: Dict[str, int] = {}
@@ -108,51 +143,164 @@ class TfIdfIndex:
         return TfIdfIndex(chunks=chunks, df=df, n_docs=n_docs)
 
 
-def _iter_files(paths: Iterable[str], exts: Tuple[str, ...] = (".md", ".txt")) -> Iterable[Path]:
+# Beide Indexformate bieten search()/hit()/n_docs und sind für retrieve() austauschbar
+RagIndex = Union[TfIdfIndex, "MmapIndex"]
+
+
+def _iter_files(
+    paths: Iterable[str],
+    exts: Tuple[str, ...] = (".md", ".txt"),
+    recursive: bool = False,
+) -> Iterable[Path]:
     for p in paths:
         pp = Path(p)
         if pp.is_file() and pp.suffix.lower() in exts:
             yield pp
         elif pp.is_dir():
-            for child in pp.iterdir():
+            children = sorted(pp.rglob("*")) if recursive else pp.iterdir()
+            for child in children:
                 if child.is_file() and child.suffix.lower() in exts:
                     yield child
 
 
-def build_index(paths: List[str]) -> TfIdfIndex:
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+
+
+def chunk_text(text: str, max_chars: int = 1200, overlap: int = 150) -> List[Tuple[str, str]]:
+    """Zerlegt Markdown/Text in Abschnitte entlang von Überschriften und Absätzen.
+
+    - Jede Überschrift (#..######) beginnt einen neuen Abschnitt
+    - Absätze (Leerzeilen-getrennt) werden bis max_chars zu Chunks gepackt
+    - Überlange Absätze werden hart geteilt
+    - Folge-Chunks beginnen mit bis zu `overlap` Zeichen vom Ende des Vorgängers
+
+    Rückgabe: Liste von (heading, content)
+    """
+    max_chars = max(1, int(max_chars))
+    overlap = max(0, min(int(overlap), max_chars // 2))
+    sections: List[Tuple[str, List[str]]] = []
+    heading = ""
+    paras: List[str] = []
+    buf: List[str] = []
+
+    def _flush_para() -> None:
+        if buf:
+            para = "\n".join(buf).strip()
+            if para:
+                paras.append(para)
+            buf.clear()
+
+    for line in text.replace("\r\n", "\n").replace("\r", "\n").split("\n"):
+        m = HEADING_RE.match(line)
+        if m:
+            _flush_para()
+            if paras:
+                sections.append((heading, list(paras)))
+                paras.clear()
+            heading = m.group(2).strip()
+            paras.append(line.strip())
+        elif not line.strip():
+            _flush_para()
+        else:
+            buf.append(line)
+    _flush_para()
+    if paras:
+        sections.append((heading, list(paras)))
+
+    out: List[Tuple[str, str]] = []
+    for sec_heading, sec_paras in sections:
+        pieces: List[str] = []
+        for para in sec_paras:
+            while len(para) > max_chars:
+                pieces.append(para[:max_chars])
+                para = para[max_chars:]
+            if para:
+                pieces.append(para)
+        cur = ""
+        for piece in pieces:
+            if cur and len(cur) + 2 + len(piece) > max_chars:
+                out.append((sec_heading, cur))
+                tail = cur[-overlap:] if overlap else ""
+                # Überlappung an Wortgrenze beginnen lassen
+                if tail and " " in tail:
+                    tail = tail[tail.index(" ") + 1:]
+                cur = f"{tail}\n\n{piece}" if tail else piece
+            else:
+                cur = f"{cur}\n\n{piece}" if cur else piece
+        if cur.strip():
+            out.append((sec_heading, cur))
+    return out
+
+
+def make_chunk_tf(text: str, df: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+    """Termfrequenzen eines Textes; zählt optional die Dokumentfrequenz in `df` hoch."""
+    tf: Dict[str, int] = {}
+    for t in tokenize(text):
+        tf[t] = tf.get(t, 0) + 1
+    if df is not None:
+        for t in tf:
+            df[t] = df.get(t, 0) + 1
+    return tf
+
+
+def build_index(
+    paths: List[str],
+    *,
+    recursive: bool = False,
+    chunk_chars: Optional[int] = None,
+    overlap: int = 150,
+) -> TfIdfIndex:
+    """Baut einen TF-IDF-Index.
+
+    Standard: eine Datei = ein Chunk (nicht rekursiv). Mit `chunk_chars` werden Dateien
+    per chunk_text() in Abschnitte zerlegt; `recursive` durchläuft Unterordner.
+    n_docs entspricht der Anzahl Chunks (IDF-Basis).
+    """
     chunks: List[Chunk] = []
     df: Dict[str, int] = {}
-    n_docs = 0
 
-    for file in _iter_files(paths):
+    for file in _iter_files(paths, recursive=recursive):
         try:
             text = file.read_text(encoding="utf-8", errors="ignore")
         except Exception:
             continue
-        n_docs += 1
-        # Baseline: eine Datei = ein Chunk (später: feiner chunking nach Abschnitten)
-        toks = tokenize(text)
-        tf: Dict[str, int] = {}
-        seen: set[str] = set()
-        for t in toks:
-            tf[t] = tf.get(t, 0) + 1
-            if t not in seen:
-                df[t] = df.get(t, 0) + 1
-                seen.add(t)
-        chunks.append(Chunk(id=len(chunks), source=str(file), content=text[:4000], tf=tf))
-
-    return TfIdfIndex(chunks=chunks, df=df, n_docs=n_docs)
-
-
-def save_index(index: TfIdfIndex, out_path: str) -> None:
-    Path(os.path.dirname(out_path) or ".").mkdir(parents=True, exist_ok=True)
-    with open(out_path, "w", encoding="utf-8") as f:
-        payload: Dict[str, object] = index.to_dict()
-        json.dump(payload, f, ensure_ascii=False)
+        if chunk_chars:
+            for heading, content in chunk_text(text, max_chars=chunk_chars, overlap=overlap):
+                tf = make_chunk_tf(content, df)
+                chunks.append(Chunk(id=len(chunks), source=str(file), content=content[:4000], tf=tf, heading=heading))
+        else:
+            tf = make_chunk_tf(text, df)
+            chunks.append(Chunk(id=len(chunks), source=str(file), content=text[:4000], tf=tf))
+
+    return TfIdfIndex(chunks=chunks, df=df, n_docs=len(chunks))
 
 
-def load_index(path: str) -> Optional[TfIdfIndex]:
+def save_index(index: TfIdfIndex, out_path: str, fmt: str = "json") -> None:
+    """Speichert den Index als JSON (Default) oder im mmap-Binärformat (fmt="binary").
+
+    Geschrieben wird in eine temporäre Datei mit anschließendem os.replace(), damit laufende
+    Leser (insb. per mmap) nie eine halb geschriebene Datei sehen.
+    """
+    Path(os.path.dirname(out_path) or ".").mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{out_path}.tmp"
+    if fmt == "binary":
+        from .rag_mmap import write_binary_index
+        write_binary_index(index, tmp_path)
+    else:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            payload: Dict[str, object] = index.to_dict()
+            json.dump(payload, f, ensure_ascii=False)
+    os.replace(tmp_path, out_path)
+
+
+def load_index(path: str) -> Optional["RagIndex"]:
+    """Lädt einen Index; erkennt das Binärformat am Magic-Header, sonst JSON."""
     try:
+        from .rag_mmap import MAGIC, MmapIndex
+        with open(path, "rb") as fb:
+            head = fb.read(len(MAGIC))
+        if head == MAGIC:
+            return MmapIndex.open(path)
         with open(path, "r", encoding="utf-8") as f:
             raw: Dict[str, object] = json.load(f)
             return TfIdfIndex.from_dict(raw)
@@ -160,45 +308,416 @@ def load_index(path: str) -> Optional[TfIdfIndex]:
         return None
 
 
-def _cosine_sim(qw: Dict[str, float], dw: Dict[str, float]) -> float:
-    dot = 0.0
+class CachedIndex:
+    """Prozessweiter Halter für einen geladenen Index mit Hot-Reload.
+
+    - Lädt die Indexdatei einmalig und prüft danach (höchstens alle
+      `check_interval` Sekunden) per stat() auf geänderte mtime/size.
+    - Bei Änderung wird neu geladen und der Zustand atomar (ein Tupel) getauscht;
+      Leser sehen immer entweder den alten oder den neuen Index.
+    - Fehlt die Datei, liefert get() None.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        check_interval: float = 1.0,
+        loader: Optional[Callable[[str], Optional[Any]]] = None,
+    ) -> None:
+        self.path = path
+        self.check_interval = max(0.0, float(check_interval))
+        # Standard: load_index; z. B. utils.rag_dense.DenseIndex.open für Vektordateien
+        self._loader: Callable[[str], Optional[Any]] = loader or load_index
+        # (Signatur, Index) als ein Objekt -> atomarer Tausch
+        self._state: Tuple[Optional[Tuple[int, int]], Optional[Any]] = (None, None)
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self.reloads = 0
+        self.load_errors = 0
+        self.last_load_ms: Optional[float] = None
+        self.last_loaded_at: Optional[float] = None
+
+    def _signature(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def get(self) -> Optional[Any]:
+        now = time.monotonic()
+        sig_cur, idx_cur = self._state
+        if idx_cur is not None and now - self._last_check < self.check_interval:
+            return idx_cur
+        self._last_check = now
+        sig = self._signature()
+        if sig is None:
+            self._state = (None, None)
+            return None
+        if sig == sig_cur and idx_cur is not None:
+            return idx_cur
+        with self._lock:
+            # Doppelprüfung: evtl. hat ein anderer Thread bereits geladen
+            sig_cur, idx_cur = self._state
+            if sig == sig_cur and idx_cur is not None:
+                return idx_cur
+            t0 = time.perf_counter()
+            idx = self._loader(self.path)
+            if isinstance(idx, TfIdfIndex):
+                idx.inverted()
+            self.last_load_ms = (time.perf_counter() - t0) * 1000.0
+            if idx is None:
+                self.load_errors += 1
+                return idx_cur
+            self._state = (sig, idx)
+            self.reloads += 1
+            self.last_loaded_at = time.time()
+            return idx
+
+    def stats(self) -> Dict[str, object]:
+        _, idx = self._state
+        return {
+            "path": self.path,
+            "loaded": idx is not None,
+            "reloads": self.reloads,
+            "load_errors": self.load_errors,
+            "last_load_ms": self.last_load_ms,
+            "last_loaded_at": self.last_loaded_at,
+            "n_docs": getattr(idx, "n_docs", getattr(idx, "n_rows", 0)) if idx is not None else 0,
+        }
+
+
+_CACHED_INDEXES: Dict[str, CachedIndex] = {}
+_CACHED_INDEXES_LOCK = threading.Lock()
+
+
+def get_cached_index(
+    path: str,
+    check_interval: float = 1.0,
+    loader: Optional[Callable[[str], Optional[Any]]] = None,
+) -> Optional[Any]:
+    """Liefert den prozessweit gecachten Index für `path` (lädt bei Bedarf neu)."""
+    holder = _CACHED_INDEXES.get(path)
+    if holder is None:
+        with _CACHED_INDEXES_LOCK:
+            holder = _CACHED_INDEXES.get(path)
+            if holder is None:
+                holder = CachedIndex(path, check_interval=check_interval, loader=loader)
+                _CACHED_INDEXES[path] = holder
+    return holder.get()
+
+
+def cached_index_stats() -> List[Dict[str, object]]:
+    """Reload-Zähler und Ladezeiten aller gecachten Indizes."""
+    return [h.stats() for h in list(_CACHED_INDEXES.values())]
+
+
+def _idf(n_docs: int, df_val: int) -> float:
+    # idf = log(1 + n/(df+1)) konservativ, robust bei n=0
+    return math.log(1.0 + (max(1, n_docs) / float(df_val + 1)))
+
+
+Scorer = Literal["tfidf", "bm25"]
+
+# Bit-Flags für Feld-Postings (Term kommt in Überschrift bzw. Quellpfad vor)
+FIELD_HEADING = 1
+FIELD_PATH = 2
+
+_PATH_SPLIT_RE = re.compile(r"[\\/]+")
+
+
+@dataclass(frozen=True)
+class Bm25Params:
+    """Parameter für BM25 (BM25F-artige Feldgewichte für Überschrift und Quellpfad)."""
+
+    k1: float = 1.2
+    b: float = 0.75
+    heading_boost: float = 2.0
+    path_boost: float = 1.0
+
+
+def _bm25_idf(n_docs: int, df_val: int) -> float:
+    # Robertson/Sparck-Jones mit +1 (nie negativ)
+    n = max(1, n_docs)
+    return math.log(1.0 + (n - df_val + 0.5) / (df_val + 0.5))
+
+
+def field_terms(source: str, heading: str) -> Dict[str, int]:
+    """Terme aus Überschrift und Dateiname/Elternordner eines Chunks -> FIELD_*-Flags."""
+    out: Dict[str, int] = {}
+    for t in tokenize(heading):
+        out[t] = out.get(t, 0) | FIELD_HEADING
+    parts = [p for p in _PATH_SPLIT_RE.split(source) if p]
+    if parts:
+        name = parts[-1].rsplit(".", 1)[0]
+        parent = parts[-2] if len(parts) > 1 else ""
+        for t in tokenize(f"{parent} {name}"):
+            out[t] = out.get(t, 0) | FIELD_PATH
+    return out
+
+
+class Bm25Cache:
+    """Lazy berechnete BM25-Impact-Postings pro Parametersatz.
+
+    - Längennormierung k1*(1-b+b*dl/avgdl) je Chunk wird einmal pro Parametersatz berechnet
+    - Pro Term: (Chunk-Positionen, Impact-Scores, Maximum) beim ersten Zugriff
+    Feldtreffer erhöhen die Pseudo-Termfrequenz vor der Sättigung (BM25F-Stil).
+    """
+
+    def __init__(
+        self,
+        params: Bm25Params,
+        chunk_len: Sequence[int],
+        n_docs: int,
+        df: Callable[[int], int],
+        postings_tf: Callable[[int], Tuple[Sequence[int], Sequence[int]]],
+        field_postings: Callable[[int], Tuple[Sequence[int], Sequence[int]]],
+    ) -> None:
+        self.params = params
+        self.n_docs = n_docs
+        self._df = df
+        self._postings_tf = postings_tf
+        self._field_postings = field_postings
+        total = 0
+        for dl in chunk_len:
+            total += dl
+        avgdl = (total / float(len(chunk_len))) if len(chunk_len) else 1.0
+        avgdl = avgdl or 1.0
+        k1, b = params.k1, params.b
+        self.knorm = array("d", (k1 * (1.0 - b + b * dl / avgdl) for dl in chunk_len))
+        self._terms: Dict[int, Tuple[array[int], array[float], float]] = {}
+
+    def term(self, tid: int) -> Tuple[array[int], array[float], float]:
+        got = self._terms.get(tid)
+        if got is not None:
+            return got
+        p = self.params
+        docs, tfs = self._postings_tf(tid)
+        fdocs, fflags = self._field_postings(tid)
+        if len(fdocs):
+            tf_by: Dict[int, float] = {d: float(tf) for d, tf in zip(docs, tfs)}
+            for d, flags in zip(fdocs, fflags):
+                extra = (p.heading_boost if flags & FIELD_HEADING else 0.0) + (p.path_boost if flags & FIELD_PATH else 0.0)
+                if extra > 0.0:
+                    tf_by[d] = tf_by.get(d, 0.0) + extra
+            pairs = sorted(tf_by.items())
+            docs_out = array("i", (d for d, _ in pairs))
+            tf_iter: Iterable[float] = (tf for _, tf in pairs)
+        else:
+            docs_out = array("i", docs)
+            tf_iter = (float(tf) for tf in tfs)
+        idf = _bm25_idf(self.n_docs, self._df(tid))
+        k1p1 = p.k1 + 1.0
+        knorm = self.knorm
+        imps = array("d", (idf * tf * k1p1 / (tf + knorm[d]) for d, tf in zip(docs_out, tf_iter)))
+        entry = (docs_out, imps, max(imps) if len(imps) else 0.0)
+        self._terms[tid] = entry
+        return entry
+
+
+def bm25_topk(
+    terms: Sequence[Tuple[Sequence[int], Sequence[float], float, int]],
+    top_k: int,
+    prune: bool = True,
+) -> List[Tuple[float, int]]:
+    """Summiert BM25-Impacts (term-at-a-time) mit MaxScore-artiger Frühterminierung.
+
+    `terms`: (Positionen aufsteigend, Impacts, Max-Impact, Query-TF) je Query-Term.
+    Terme werden nach Max-Impact absteigend verarbeitet. Sobald die Summe der Maxima der
+    restlichen Terme unter dem aktuell k-besten Score liegt, kann kein neuer Chunk mehr in
+    die Top-K gelangen: es werden nur noch vorhandene Kandidaten (per Binärsuche in den
+    restlichen, typischerweise langen Postings) ergänzt, aussichtslose verworfen.
+    Das Ergebnis ist identisch zur erschöpfenden Auswertung.
+    """
+    k = max(1, top_k)
+    order = sorted(terms, key=lambda t: t[2] * t[3], reverse=True)
+    rest = sum(ub * q for _, _, ub, q in order)
+    acc: Dict[int, float] = {}
+    for docs, imps, ub, q in order:
+        if prune and len(acc) >= k:
+            theta = heapq.nlargest(k, acc.values())[-1]
+            if rest < theta:
+                acc = {d: sc for d, sc in acc.items() if sc + rest >= theta}
+                n = len(docs)
+                if len(acc) * max(1, n.bit_length()) < n:
+                    for d in list(acc):
+                        i = bisect_left(docs, d)
+                        if i < n and docs[i] == d:
+                            acc[d] += q * imps[i]
+                else:
+                    for d, w in zip(docs, imps):
+                        if d in acc:
+                            acc[d] += q * w
+                rest -= ub * q
+                continue
+        get = acc.get
+        for d, w in zip(docs, imps):
+            acc[d] = get(d, 0.0) + q * w
+        rest -= ub * q
+    scored = ((sc, d) for d, sc in acc.items() if sc > 0.0)
+    return heapq.nlargest(k, scored, key=lambda x: (x[0], -x[1]))
+
+
+def _bm25_search(
+    qtf: Dict[int, int],
+    caches: Dict[Bm25Params, Bm25Cache],
+    make_cache: Callable[[Bm25Params], Bm25Cache],
+    params: Optional[Bm25Params],
+    top_k: int,
+    prune: bool = True,
+) -> List[Tuple[float, int]]:
+    p = params or Bm25Params()
+    cache = caches.get(p)
+    if cache is None:
+        cache = caches.setdefault(p, make_cache(p))
+    terms = [(*cache.term(tid), q) for tid, q in qtf.items()]
+    return bm25_topk(terms, top_k, prune=prune)
+
+
+class InvertedIndex:
+    """Vorberechnete Suchstruktur über einem TfIdfIndex.
+
+    - term -> Term-ID, IDF pro Term-ID
+    - Postings pro Term-ID: Chunk-Positionen (array 'i'), Termfrequenzen (array 'i') und
+      Gewichte tf*idf (array 'd')
+    - L2-Norm und Länge (Anzahl Tokens) pro Chunk
+    - Feld-Postings (Überschrift/Quellpfad) für BM25-Boosts
+
+    Eine Query berührt damit nur die Postings ihrer eigenen Terme.
+    """
+
+    def __init__(self, index: "TfIdfIndex") -> None:
+        self.n_docs = index.n_docs
+        self.term_ids: Dict[str, int] = {}
+        self.idf = array("d")
+        self.df = array("i")
+        for t, df_val in index.df.items():
+            self.term_ids[t] = len(self.term_ids)
+            self.idf.append(_idf(index.n_docs, df_val))
+            self.df.append(df_val)
+        n_terms = len(self.term_ids)
+        post_docs: List[List[int]] = [[] for _ in range(n_terms)]
+        post_tf: List[List[int]] = [[] for _ in range(n_terms)]
+        post_w: List[List[float]] = [[] for _ in range(n_terms)]
+        field_docs: Dict[int, List[int]] = {}
+        field_flags: Dict[int, List[int]] = {}
+        self.norms = array("d")
+        self.chunk_len = array("i")
+        idf = self.idf
+        term_ids = self.term_ids
+        for pos, ch in enumerate(index.chunks):
+            sq = 0.0
+            dl = 0
+            for t, tf in ch.tf.items():
+                tid = term_ids.get(t)
+                if tid is None:
+                    continue
+                dl += tf
+                w = float(tf) * idf[tid]
+                if w == 0.0:
+                    continue
+                post_docs[tid].append(pos)
+                post_tf[tid].append(tf)
+                post_w[tid].append(w)
+                sq += w * w
+            self.norms.append(math.sqrt(sq))
+            self.chunk_len.append(dl)
+            for t, flags in field_terms(ch.source, ch.heading).items():
+                tid = term_ids.get(t)
+                if tid is not None:
+                    field_docs.setdefault(tid, []).append(pos)
+                    field_flags.setdefault(tid, []).append(flags)
+        self.post_docs: List[array[int]] = [array("i", d) for d in post_docs]
+        self.post_tf: List[array[int]] = [array("i", f) for f in post_tf]
+        self.post_w: List[array[float]] = [array("d", w) for w in post_w]
+        self.field_docs: Dict[int, array[int]] = {tid: array("i", d) for tid, d in field_docs.items()}
+        self.field_flags: Dict[int, array[int]] = {tid: array("B", f) for tid, f in field_flags.items()}
+        self._bm25: Dict[Bm25Params, Bm25Cache] = {}
+
+    def _field_postings(self, tid: int) -> Tuple[Sequence[int], Sequence[int]]:
+        return self.field_docs.get(tid, ()), self.field_flags.get(tid, ())
+
+    def _make_bm25(self, params: Bm25Params) -> Bm25Cache:
+        return Bm25Cache(
+            params,
+            self.chunk_len,
+            self.n_docs,
+            lambda tid: self.df[tid],
+            lambda tid: (self.post_docs[tid], self.post_tf[tid]),
+            self._field_postings,
+        )
+
+    def query_tf(self, query: str) -> Dict[int, int]:
+        qtf: Dict[int, int] = {}
+        for t in tokenize(query):
+            tid = self.term_ids.get(t)
+            if tid is not None:
+                qtf[tid] = qtf.get(tid, 0) + 1
+        return qtf
+
+    def search(
+        self,
+        query: str,
+        top_k: int,
+        scorer: Scorer = "tfidf",
+        bm25: Optional[Bm25Params] = None,
+        prune: bool = True,
+    ) -> List[Tuple[float, int]]:
+        """Liefert (score, chunk_pos) absteigend nach Score (nur Score > 0).
+
+        scorer="tfidf": Cosine über tf*idf; scorer="bm25": BM25 mit Feld-Boosts.
+        """
+        qtf = self.query_tf(query)
+        if scorer == "bm25":
+            return _bm25_search(qtf, self._bm25, self._make_bm25, bm25, top_k, prune=prune)
+        return cosine_topk(qtf, self.idf, lambda tid: (self.post_docs[tid], self.post_w[tid]), self.norms, top_k)
+
+
+def cosine_topk(
+    qtf: Dict[int, int],
+    idf: Sequence[float],
+    postings: Callable[[int], Tuple[Iterable[int], Iterable[float]]],
+    norms: Sequence[float],
+    top_k: int,
+) -> List[Tuple[float, int]]:
+    """Akkumuliert Cosine-Scores über die Postings der Query-Terme und wählt Top-K per Heap.
+
+    Gemeinsam genutzt vom In-Memory-Index und vom mmap-Binärformat (utils.rag_mmap).
+    """
+    acc: Dict[int, float] = {}
     qn = 0.0
-    dn = 0.0
-    for k, v in qw.items():
-        qn += v * v
-        if k in dw:
-            dot += v * dw[k]
-    for v in dw.values():
-        dn += v * v
-    if qn == 0 or dn == 0:
-        return 0.0
-    return dot / (math.sqrt(qn) * math.sqrt(dn))
-
-
-def retrieve(index: TfIdfIndex, query: str, top_k: int = 3) -> List[Dict[str, str]]:
+    for tid, tf in qtf.items():
+        qw = float(tf) * idf[tid]
+        if qw == 0.0:
+            continue
+        qn += qw * qw
+        get = acc.get
+        docs, weights = postings(tid)
+        for pos, w in zip(docs, weights):
+            acc[pos] = get(pos, 0.0) + qw * w
+    if qn == 0.0 or not acc:
+        return []
+    qnorm = math.sqrt(qn)
+    scored = ((dot / (qnorm * norms[pos]), pos) for pos, dot in acc.items() if dot > 0.0)
+    # Bei Gleichstand gewinnt der frühere Chunk (wie zuvor bei stabiler Sortierung)
+    return heapq.nlargest(max(1, top_k), scored, key=lambda x: (x[0], -x[1]))
+
+
+def retrieve(
+    index: "RagIndex",
+    query: str,
+    top_k: int = 3,
+    scorer: Scorer = "tfidf",
+    bm25: Optional[Bm25Params] = None,
+) -> List[Dict[str, str]]:
     """Gibt die Top-K Chunks als Liste von {source, content, score} zurück."""
-    toks = tokenize(query)
-    # baue TF für Query
-    qtf: Dict[str, int] = {}
-    for t in toks:
-        qtf[t] = qtf.get(t, 0) + 1
-    # Gewichte berechnen (idf = log(1 + n/(df+1))) konservativ, robust bei n=0
-    n = max(1, index.n_docs)
-    idf: Dict[str, float] = {}
-    for t, df_val in index.df.items():
-        idf[t] = math.log(1.0 + (n / float(df_val + 1)))
-
-    qw: Dict[str, float] = {t: float(tf) * idf.get(t, 0.0) for t, tf in qtf.items()}
-
-    scored: List[Tuple[float, Chunk]] = []
-    for ch in index.chunks:
-        dw = {t: float(tf) * idf.get(t, 0.0) for t, tf in ch.tf.items()}
-        s = _cosine_sim(qw, dw)
-        if s > 0:
-            scored.append((s, ch))
-
-    scored.sort(key=lambda x: x[0], reverse=True)
+    return hits_for(index, index.search(query, top_k, scorer=scorer, bm25=bm25))
+
+
+def hits_for(index: "RagIndex", scored: Iterable[Tuple[float, int]]) -> List[Dict[str, str]]:
+    """(score, pos)-Paare -> {source, content, score}; Text wird erst hier (nur für Top-K) dekodiert."""
     out: List[Dict[str, str]] = []
-    for s, ch in scored[: max(1, top_k)]:
-        out.append({"source": ch.source, "content": ch.content, "score": f"{s:.4f}"})
+    for s, pos in scored:
+        source, content = index.hit(pos)
+        out.append({"source": source, "content": content, "score": f"{s:.4f}"})
     return out
@@ -0,0 +1,203 @@
+"""
+Inkrementeller, abschnittsweiser Aufbau des RAG-Index (für scripts/rag_indexer.py).
+
+- Rekursive Dateisuche (.md/.txt), Chunking entlang Überschriften/Absätzen mit Überlappung
+- Manifest (JSON) mit mtime/size/sha256 pro Datei und den Chunking-Parametern
+- Erneuter Lauf: nur geänderte/neue Dateien werden tokenisiert; DF wird für entfernte
+  bzw. geänderte Chunks dekrementiert und für neue inkrementiert
+- Viele geänderte Dateien werden über einen Prozess-Pool verteilt
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple, cast
+
+from .rag import Chunk, TfIdfIndex, _iter_files, chunk_text, load_index, make_chunk_tf
+
+MANIFEST_VERSION = 1
+
+# (heading, content, tf) pro Chunk
+_ChunkRec = Tuple[str, str, Dict[str, int]]
+
+
+@dataclass
+class UpdateStats:
+    files_total: int = 0
+    files_changed: int = 0
+    files_removed: int = 0
+    chunks_total: int = 0
+    chunks_added: int = 0
+    chunks_removed: int = 0
+    full_rebuild: bool = False
+    changed: List[str] = field(default_factory=list[str])
+
+
+def manifest_path_for(index_path: str) -> str:
+    return f"{index_path}.manifest.json"
+
+
+def load_manifest(path: str) -> Dict[str, Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+        data: Dict[str, Any] = cast(Dict[str, Any], raw) if isinstance(raw, dict) else {}
+        if int(data.get("version", 0)) == MANIFEST_VERSION:
+            return data
+    except Exception:
+        pass
+    return {}
+
+
+def save_manifest(manifest: Dict[str, Any], path: str) -> None:
+    Path(os.path.dirname(path) or ".").mkdir(parents=True, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def chunk_file(path: str, chunk_chars: int, overlap: int) -> Tuple[str, List[_ChunkRec]]:
+    """Liest, zerlegt und tokenisiert eine Datei (Top-Level, damit per Prozess-Pool nutzbar)."""
+    try:
+        text = Path(path).read_text(encoding="utf-8", errors="ignore")
+    except Exception:
+        return path, []
+    recs: List[_ChunkRec] = []
+    for heading, content in chunk_text(text, max_chars=chunk_chars, overlap=overlap):
+        recs.append((heading, content[:4000], make_chunk_tf(content)))
+    return path, recs
+
+
+def _chunk_files(files: List[str], chunk_chars: int, overlap: int, jobs: int) -> Dict[str, List[_ChunkRec]]:
+    out: Dict[str, List[_ChunkRec]] = {}
+    if jobs > 1 and len(files) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as ex:
+            futs = [ex.submit(chunk_file, f, chunk_chars, overlap) for f in files]
+            for fut in futs:
+                path, recs = fut.result()
+                out[path] = recs
+    else:
+        for f in files:
+            path, recs = chunk_file(f, chunk_chars, overlap)
+            out[path] = recs
+    return out
+
+
+def update_index(
+    paths: List[str],
+    previous: Optional[TfIdfIndex],
+    manifest: Dict[str, Any],
+    *,
+    chunk_chars: int = 1200,
+    overlap: int = 150,
+    recursive: bool = True,
+    jobs: int = 1,
+) -> Tuple[TfIdfIndex, Dict[str, Any], UpdateStats]:
+    """Aktualisiert `previous` anhand des Manifests; liefert (Index, neues Manifest, Statistik).
+
+    Ohne vorherigen Index bzw. bei geänderten Chunking-Parametern wird alles neu aufgebaut.
+    """
+    stats = UpdateStats()
+    params = {"chunk_chars": int(chunk_chars), "overlap": int(overlap)}
+    old_files: Dict[str, Dict[str, Any]] = dict(manifest.get("files", {})) if manifest else {}
+    full = previous is None or not manifest or manifest.get("params") != params
+    if full:
+        old_files = {}
+    stats.full_rebuild = full
+
+    current: Dict[str, Path] = {}
+    for p in _iter_files(paths, recursive=recursive):
+        current.setdefault(str(p), p)
+    stats.files_total = len(current)
+
+    new_files: Dict[str, Dict[str, Any]] = {}
+    changed: List[str] = []
+    for key, p in current.items():
+        try:
+            st = p.stat()
+        except OSError:
+            continue
+        entry = old_files.get(key)
+        if entry and entry.get("mtime_ns") == st.st_mtime_ns and entry.get("size") == st.st_size:
+            new_files[key] = entry
+            continue
+        digest = _sha256(p)
+        new_files[key] = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha256": digest}
+        if entry and entry.get("sha256") == digest:
+            continue
+        changed.append(key)
+    removed: Set[str] = set(old_files) - set(new_files)
+    stats.files_changed = len(changed)
+    stats.files_removed = len(removed)
+    stats.changed = sorted(changed)
+
+    dirty: Set[str] = set(changed) | removed
+    base_chunks: List[Chunk] = [] if full or previous is None else previous.chunks
+    df: Dict[str, int] = {} if full or previous is None else dict(previous.df)
+
+    kept: List[Chunk] = []
+    for ch in base_chunks:
+        if ch.source in dirty:
+            # DF für entfernte/ersetzte Chunks zurücknehmen
+            for t in ch.tf:
+                n = df.get(t, 0) - 1
+                if n > 0:
+                    df[t] = n
+                else:
+                    df.pop(t, None)
+            stats.chunks_removed += 1
+        else:
+            kept.append(ch)
+
+    fresh = _chunk_files(sorted(changed), chunk_chars, overlap, jobs)
+    added: List[Chunk] = []
+    for key in sorted(fresh):
+        for heading, content, tf in fresh[key]:
+            for t in tf:
+                df[t] = df.get(t, 0) + 1
+            added.append(Chunk(id=0, source=key, content=content, tf=tf, heading=heading))
+    stats.chunks_added = len(added)
+
+    chunks = kept + added
+    for i, ch in enumerate(chunks):
+        ch.id = i
+    stats.chunks_total = len(chunks)
+    index = TfIdfIndex(chunks=chunks, df=df, n_docs=len(chunks))
+    new_manifest: Dict[str, Any] = {"version": MANIFEST_VERSION, "params": params, "files": new_files}
+    return index, new_manifest, stats
+
+
+def load_previous_index(path: str) -> Optional[TfIdfIndex]:
+    """Lädt einen bestehenden Index (JSON oder Binär) als TfIdfIndex für Updates."""
+    if not os.path.exists(path):
+        return None
+    idx = load_index(path)
+    if idx is None:
+        return None
+    if isinstance(idx, TfIdfIndex):
+        return idx
+    return idx.to_tfidf()
+
+
+__all__ = [
+    "UpdateStats",
+    "manifest_path_for",
+    "load_manifest",
+    "save_manifest",
+    "chunk_file",
+    "update_index",
+    "load_previous_index",
+]
@@ -0,0 +1,299 @@
+"""
+Optionaler dichter Retriever (Embeddings) neben dem TF-IDF/BM25-Index.
+
+- Chunks werden über Ollamas Embeddings-Endpoint (/api/embed) eingebettet; in Tests kann
+  eine beliebige `embed`-Funktion (List[str] -> List[List[float]]) übergeben werden
+- Vektoren liegen L2-normiert als float16/float32-Matrix in einer .npy-Datei (per mmap
+  geöffnet); Zeile i gehört zu Chunk-Position i des Sparse-Index
+- Sidecar `<datei>.json`: Modell, Dimension, dtype, Anzahl Zeilen und ein Hash je Zeile
+  (Inhalt), damit unveränderte Chunks beim Neuaufbau nicht erneut eingebettet werden und
+  eine veraltete Matrix nach einem Re-Index erkannt wird (index_signature)
+- Suche: ein Matrix-Vektor-Produkt + argpartition für Top-K
+- Hybrid: Reciprocal-Rank-Fusion (RRF) aus Sparse- und Dense-Rangfolge
+- Query-Embeddings werden prozessweit per Text-Hash (LRU) gecacht
+
+NumPy ist optional; ohne NumPy ist dieses Modul nicht nutzbar (Aufrufer fallen auf Sparse zurück).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, cast
+
+import httpx
+import numpy as np
+
+from .rag import TfIdfIndex
+
+EmbedFn = Callable[[List[str]], List[List[float]]]
+
+DENSE_VERSION = 1
+# Zeilen pro Block beim Scoren von float16-Matrizen
+_BLOCK_ROWS = 8192
+
+
+def meta_path_for(path: str) -> str:
+    return f"{path}.json"
+
+
+def dense_path_for(index_path: str) -> str:
+    """Standardpfad der Vektordatei neben dem Sparse-Index."""
+    return f"{index_path}.dense.npy"
+
+
+def _row_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def rows_signature(row_hashes: Sequence[str]) -> str:
+    """Signatur über alle Zeilen-Hashes (Reihenfolge zählt)."""
+    h = hashlib.sha1()
+    for rh in row_hashes:
+        h.update(str(rh).encode("ascii"))
+        h.update(b"\n")
+    return h.hexdigest()
+
+
+def index_signature(index: Any) -> str:
+    """Signatur des Sparse-Index im Format der Vektordatei (Inhalts-Hash je Chunk-Position).
+
+    Dekodiert jeden Chunk einmal; Aufrufer cachen das Ergebnis je Index-Objekt.
+    """
+    n = getattr(index, "n_chunks", None)
+    n = int(n) if n is not None else len(getattr(index, "chunks", []))
+    return rows_signature([_row_hash(index.hit(i)[1]) for i in range(n)])
+
+
+def text_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+
+def _normalize(mat: "np.ndarray") -> "np.ndarray":
+    mat = np.asarray(mat, dtype=np.float32)
+    if mat.ndim == 1:
+        n = float(np.linalg.norm(mat))
+        return mat / n if n > 0.0 else mat
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0.0] = 1.0
+    return mat / norms
+
+
+class OllamaEmbedder:
+    """Minimaler Client für Ollamas /api/embed (Batch-Eingabe)."""
+
+    def __init__(self, host: str, model: str, timeout: float = 60.0) -> None:
+        self.url = f"{host.rstrip('/')}/api/embed"
+        self.model = model
+        self.timeout = timeout
+
+    def payload(self, texts: List[str]) -> Dict[str, Any]:
+        return {"model": self.model, "input": texts}
+
+    @staticmethod
+    def parse(data: Any) -> List[List[float]]:
+        payload: Dict[str, Any] = cast(Dict[str, Any], data) if isinstance(data, dict) else {}
+        embs = payload.get("embeddings")
+        if not isinstance(embs, list):
+            raise ValueError("Ungültige Embeddings-Antwort (Feld 'embeddings' fehlt)")
+        return [[float(x) for x in e] for e in cast(List[List[float]], embs)]
+
+    def __call__(self, texts: List[str]) -> List[List[float]]:
+        """Synchroner Aufruf (Indexer)."""
+        with httpx.Client(timeout=self.timeout) as client:
+            r = client.post(self.url, json=self.payload(texts))
+            r.raise_for_status()
+            return self.parse(r.json())
+
+    async def aembed(self, texts: List[str], client: Optional[httpx.AsyncClient] = None) -> List[List[float]]:
+        """Asynchroner Aufruf (Server); nutzt bevorzugt den übergebenen, gepoolten Client."""
+        if client is not None:
+            r = await client.post(self.url, json=self.payload(texts), timeout=self.timeout)
+        else:
+            async with httpx.AsyncClient(timeout=self.timeout) as tmp:
+                r = await tmp.post(self.url, json=self.payload(texts))
+        r.raise_for_status()
+        return self.parse(r.json())
+
+
+def build_dense(
+    index: TfIdfIndex,
+    embed: EmbedFn,
+    out_path: str,
+    *,
+    model: str,
+    dtype: str = "float32",
+    batch_size: int = 32,
+) -> Dict[str, int]:
+    """Bettet alle Chunks ein und schreibt Matrix (.npy) + Sidecar atomar.
+
+    Vorhandene Zeilen mit gleichem Inhalts-Hash und gleichem Modell werden übernommen.
+    Rückgabe: {"rows", "embedded", "reused"}
+    """
+    texts = [c.content for c in index.chunks]
+    hashes = [_row_hash(t) for t in texts]
+    previous: Dict[str, "np.ndarray"] = {}
+    old = DenseIndex.open(out_path)
+    if old is not None and old.model == model:
+        for i, h in enumerate(old.row_hashes):
+            previous.setdefault(h, old.matrix[i])
+
+    todo = [i for i, h in enumerate(hashes) if h not in previous]
+    vecs: Dict[int, "np.ndarray"] = {}
+    for start in range(0, len(todo), max(1, batch_size)):
+        batch = todo[start: start + max(1, batch_size)]
+        got = embed([texts[i] for i in batch])
+        if len(got) != len(batch):
+            raise ValueError("Embeddings-Anzahl passt nicht zur Eingabe")
+        for i, v in zip(batch, got):
+            vecs[i] = _normalize(np.asarray(v, dtype=np.float32))
+
+    dim = 0
+    for v in list(vecs.values())[:1] + list(previous.values())[:1]:
+        dim = int(v.shape[0])
+    mat = np.zeros((len(texts), dim), dtype=np.dtype(dtype))
+    for i, h in enumerate(hashes):
+        mat[i] = vecs[i] if i in vecs else previous[h]
+    if old is not None:
+        old.close()
+
+    Path(os.path.dirname(out_path) or ".").mkdir(parents=True, exist_ok=True)
+    tmp = f"{out_path}.tmp.npy"
+    np.save(tmp, mat)
+    meta: Dict[str, Any] = {
+        "version": DENSE_VERSION,
+        "model": model,
+        "dim": dim,
+        "dtype": str(mat.dtype),
+        "rows": len(texts),
+        "row_hashes": hashes,
+    }
+    tmp_meta = f"{meta_path_for(out_path)}.tmp"
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, out_path)
+    os.replace(tmp_meta, meta_path_for(out_path))
+    return {"rows": len(texts), "embedded": len(vecs), "reused": len(texts) - len(vecs)}
+
+
+class DenseIndex:
+    """Normierte Vektormatrix (mmap) mit Top-K-Suche per Skalarprodukt."""
+
+    def __init__(self, matrix: "np.ndarray", meta: Dict[str, Any]) -> None:
+        self.matrix = matrix
+        self.meta = meta
+        self.model = str(meta.get("model", ""))
+        self.row_hashes: List[str] = [str(h) for h in meta.get("row_hashes", [])]
+        self.n_rows = int(matrix.shape[0])
+        # Vergleich mit index_signature(): passt die Matrix noch zu den Chunk-Texten?
+        self.signature = rows_signature(self.row_hashes)
+
+    @classmethod
+    def open(cls, path: str) -> Optional["DenseIndex"]:
+        try:
+            with open(meta_path_for(path), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if int(meta.get("version", 0)) != DENSE_VERSION:
+                return None
+            mat = np.load(path, mmap_mode="r")
+        except Exception:
+            return None
+        if mat.ndim != 2 or int(mat.shape[0]) != int(meta.get("rows", -1)):
+            return None
+        return cls(mat, meta)
+
+    def close(self) -> None:
+        mm = getattr(self.matrix, "_mmap", None)
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        if mm is not None:
+            try:
+                mm.close()
+            except Exception:
+                pass
+
+    def search(self, qvec: Sequence[float], top_k: int) -> List[Tuple[float, int]]:
+        """(Cosine, Zeile) absteigend; ein Matrix-Vektor-Produkt + argpartition."""
+        if self.n_rows == 0:
+            return []
+        q = _normalize(np.asarray(qvec, dtype=np.float32))
+        if q.shape[0] != self.matrix.shape[1]:
+            return []
+        mat = self.matrix
+        if mat.dtype == np.float32:
+            scores = mat @ q
+        else:
+            # float16 hat kein BLAS: blockweise nach float32 wandeln (begrenzter Zusatzspeicher)
+            scores = np.empty(self.n_rows, dtype=np.float32)
+            for a in range(0, self.n_rows, _BLOCK_ROWS):
+                b = min(self.n_rows, a + _BLOCK_ROWS)
+                scores[a:b] = mat[a:b].astype(np.float32) @ q
+        k = min(max(1, top_k), self.n_rows)
+        if k < self.n_rows:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(self.n_rows)
+        # stabil: Score absteigend, bei Gleichstand frühere Zeile
+        order = sorted(top.tolist(), key=lambda i: (-float(scores[i]), i))
+        return [(float(scores[i]), int(i)) for i in order]
+
+
+def rrf_fuse(rankings: Sequence[Sequence[int]], top_k: int, k: int = 60) -> List[Tuple[float, int]]:
+    """Reciprocal-Rank-Fusion: score(d) = Σ 1/(k + rang); Rang 1-basiert."""
+    acc: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, pos in enumerate(ranking, start=1):
+            acc[pos] = acc.get(pos, 0.0) + 1.0 / (k + rank)
+    ordered = sorted(acc.items(), key=lambda x: (-x[1], x[0]))
+    return [(s, pos) for pos, s in ordered[: max(1, top_k)]]
+
+
+class QueryEmbeddingCache:
+    """Thread-sicherer LRU-Cache für Query-Embeddings (Schlüssel: sha256(Modell, Text))."""
+
+    def __init__(self, max_items: int = 512) -> None:
+        self.max_items = max(0, int(max_items))
+        self._data: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        key = text_key(model, text)
+        with self._lock:
+            vec = self._data.get(key)
+            if vec is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return vec
+
+    def put(self, model: str, text: str, vec: List[float]) -> None:
+        if self.max_items == 0:
+            return
+        key = text_key(model, text)
+        with self._lock:
+            self._data[key] = vec
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+__all__ = [
+    "DENSE_VERSION",
+    "EmbedFn",
+    "OllamaEmbedder",
+    "DenseIndex",
+    "QueryEmbeddingCache",
+    "build_dense",
+    "dense_path_for",
+    "index_signature",
+    "rows_signature",
+    "rrf_fuse",
+]
@@ -0,0 +1,383 @@
+"""
+Kompaktes, versioniertes Binärformat für den RAG-Index (per mmap geöffnet).
+
+Layout (alle Sektionen 8-Byte-aligned, Byte-Reihenfolge im Header vermerkt):
+
+    MAGIC (8 Bytes) | Header-Länge (uint32) | Header (JSON, utf-8) | Sektionen ...
+
+Sektionen (Name -> Typcode):
+    term_offsets  Q  (n_terms + 1)  Offsets in terms (sortierte Terme, utf-8)
+    terms         B  Term-Wörterbuch (konkateniert, lexikografisch nach Bytes sortiert)
+    df            I  (n_terms)
+    idf           d  (n_terms)
+    post_offsets  Q  (n_terms + 1)  CSR-Offsets in post_docs/post_tf/post_w
+    post_docs     I  (nnz)          Chunk-Positionen
+    post_tf       I  (nnz)          Termfrequenzen
+    post_w        f  (nnz)          Gewichte tf*idf
+    norms         d  (n_chunks)     L2-Norm je Chunk (aus post_w)
+    chunk_ids     q  (n_chunks)
+    src_offsets   Q  (n_chunks + 1)
+    sources       B  Quellpfade (utf-8)
+    text_offsets  Q  (n_chunks + 1)
+    texts         B  Chunk-Inhalte (utf-8)
+    head_offsets  Q  (n_chunks + 1)  ab Version 2
+    headings      B  Abschnittsüberschriften (utf-8), ab Version 2
+    chunk_len     I  (n_chunks)     Tokens je Chunk (BM25-Längennormierung), ab Version 3
+    fpost_offsets Q  (n_terms + 1)  CSR-Offsets der Feld-Postings, ab Version 3
+    fpost_docs    I  Chunk-Positionen mit Term in Überschrift/Quellpfad, ab Version 3
+    fpost_flags   B  FIELD_HEADING | FIELD_PATH, ab Version 3
+
+Beim Öffnen wird nichts materialisiert: Arrays sind memoryviews auf das mmap, Terme werden
+per Binärsuche gefunden und Chunk-Texte erst für Top-K-Treffer dekodiert. Mehrere Worker
+teilen sich die Seiten über den Page-Cache.
+"""
+from __future__ import annotations
+
+import json
+import mmap
+import sys
+from array import array
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from .rag import (
+    Bm25Cache,
+    Bm25Params,
+    Chunk,
+    Scorer,
+    TfIdfIndex,
+    _bm25_search,
+    _idf,
+    cosine_topk,
+    field_terms,
+    tokenize,
+)
+
+MAGIC = b"CVNRAG\x00\x01"
+FORMAT_VERSION = 3
+# Lesbare Versionen (v1: ohne headings, v1/v2: ohne BM25-Sektionen)
+SUPPORTED_VERSIONS = (1, 2, 3)
+
+_SECTIONS: List[Tuple[str, str]] = [
+    ("term_offsets", "Q"),
+    ("terms", "B"),
+    ("df", "I"),
+    ("idf", "d"),
+    ("post_offsets", "Q"),
+    ("post_docs", "I"),
+    ("post_tf", "I"),
+    ("post_w", "f"),
+    ("norms", "d"),
+    ("chunk_ids", "q"),
+    ("src_offsets", "Q"),
+    ("sources", "B"),
+    ("text_offsets", "Q"),
+    ("texts", "B"),
+    ("head_offsets", "Q"),
+    ("headings", "B"),
+    ("chunk_len", "I"),
+    ("fpost_offsets", "Q"),
+    ("fpost_docs", "I"),
+    ("fpost_flags", "B"),
+]
+
+
+def _blob(parts: Sequence[bytes]) -> Tuple[array[int], bytes]:
+    offsets = array("Q", [0])
+    for p in parts:
+        offsets.append(offsets[-1] + len(p))
+    return offsets, b"".join(parts)
+
+
+def write_binary_index(index: TfIdfIndex, out_path: str) -> None:
+    """Schreibt `index` im Binärformat nach `out_path`."""
+    terms = sorted(index.df.keys(), key=lambda t: t.encode("utf-8"))
+    term_ids = {t: i for i, t in enumerate(terms)}
+    idf = array("d", (_idf(index.n_docs, index.df[t]) for t in terms))
+
+    n_terms = len(terms)
+    docs_by_term: List[List[int]] = [[] for _ in range(n_terms)]
+    tf_by_term: List[List[int]] = [[] for _ in range(n_terms)]
+    fdocs_by_term: List[List[int]] = [[] for _ in range(n_terms)]
+    fflags_by_term: List[List[int]] = [[] for _ in range(n_terms)]
+    chunk_len = array("I")
+    for pos, ch in enumerate(index.chunks):
+        dl = 0
+        for t, tf in ch.tf.items():
+            tid = term_ids.get(t)
+            if tid is None or tf <= 0:
+                continue
+            docs_by_term[tid].append(pos)
+            tf_by_term[tid].append(int(tf))
+            dl += int(tf)
+        chunk_len.append(dl)
+        for t, flags in field_terms(ch.source, ch.heading).items():
+            tid = term_ids.get(t)
+            if tid is not None:
+                fdocs_by_term[tid].append(pos)
+                fflags_by_term[tid].append(flags)
+
+    post_offsets = array("Q", [0])
+    post_docs = array("I")
+    post_tf = array("I")
+    post_w = array("f")
+    for tid in range(n_terms):
+        post_docs.extend(docs_by_term[tid])
+        post_tf.extend(tf_by_term[tid])
+        post_w.extend(float(tf) * idf[tid] for tf in tf_by_term[tid])
+        post_offsets.append(len(post_docs))
+
+    fpost_offsets = array("Q", [0])
+    fpost_docs = array("I")
+    fpost_flags = array("B")
+    for tid in range(n_terms):
+        fpost_docs.extend(fdocs_by_term[tid])
+        fpost_flags.extend(fflags_by_term[tid])
+        fpost_offsets.append(len(fpost_docs))
+
+    # Normen aus den gespeicherten (float32) Gewichten, damit Scores konsistent sind
+    sq = [0.0] * len(index.chunks)
+    for pos, w in zip(post_docs, post_w):
+        sq[pos] += w * w
+    norms = array("d", (v ** 0.5 for v in sq))
+
+    term_offsets, terms_blob = _blob([t.encode("utf-8") for t in terms])
+    src_offsets, sources_blob = _blob([c.source.encode("utf-8") for c in index.chunks])
+    text_offsets, texts_blob = _blob([c.content.encode("utf-8") for c in index.chunks])
+    head_offsets, headings_blob = _blob([c.heading.encode("utf-8") for c in index.chunks])
+
+    data: Dict[str, Union[array[int], array[float], bytes]] = {
+        "term_offsets": term_offsets,
+        "terms": terms_blob,
+        "df": array("I", (index.df[t] for t in terms)),
+        "idf": idf,
+        "post_offsets": post_offsets,
+        "post_docs": post_docs,
+        "post_tf": post_tf,
+        "post_w": post_w,
+        "norms": norms,
+        "chunk_ids": array("q", (c.id for c in index.chunks)),
+        "src_offsets": src_offsets,
+        "sources": sources_blob,
+        "text_offsets": text_offsets,
+        "texts": texts_blob,
+        "head_offsets": head_offsets,
+        "headings": headings_blob,
+        "chunk_len": chunk_len,
+        "fpost_offsets": fpost_offsets,
+        "fpost_docs": fpost_docs,
+        "fpost_flags": fpost_flags.tobytes(),
+    }
+
+    payloads: List[bytes] = []
+    for name, _code in _SECTIONS:
+        val = data[name]
+        payloads.append(val.tobytes() if isinstance(val, array) else bytes(val))
+
+    # Offsets relativ zum Datenbeginn (direkt nach dem 8-Byte-aligned Header)
+    sections: Dict[str, List[Any]] = {}
+    off = 0
+    for (name, code), payload in zip(_SECTIONS, payloads):
+        sections[name] = [off, len(payload), code]
+        off = _align(off + len(payload))
+    header: Dict[str, Any] = {
+        "version": FORMAT_VERSION,
+        "byteorder": sys.byteorder,
+        "n_docs": int(index.n_docs),
+        "n_chunks": len(index.chunks),
+        "n_terms": n_terms,
+        "nnz": len(post_docs),
+        "sections": sections,
+    }
+    raw_header = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    base = _align(len(MAGIC) + 4 + len(raw_header))
+
+    with open(out_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(len(raw_header).to_bytes(4, "little"))
+        f.write(raw_header)
+        pos = len(MAGIC) + 4 + len(raw_header)
+        for (name, _code), payload in zip(_SECTIONS, payloads):
+            start = base + int(sections[name][0])
+            f.write(b"\x00" * (start - pos))
+            f.write(payload)
+            pos = start + len(payload)
+
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
+
+
+class MmapIndex:
+    """Read-only Index auf einer per mmap geöffneten Binärdatei."""
+
+    def __init__(self, mm: mmap.mmap, header: Dict[str, Any], base: int) -> None:
+        self._mm = mm
+        self.header = header
+        self.n_docs = int(header.get("n_docs", 0))
+        self.n_chunks = int(header.get("n_chunks", 0))
+        self.n_terms = int(header.get("n_terms", 0))
+        swap = header.get("byteorder", sys.byteorder) != sys.byteorder
+        buf = memoryview(mm)
+        views: Dict[str, Any] = {}
+        for name, (off, length, code) in header["sections"].items():
+            raw = buf[base + int(off): base + int(off) + int(length)]
+            if code == "B":
+                views[name] = raw
+            elif swap:
+                # Fremde Byte-Reihenfolge: einmalig kopieren und drehen
+                arr: array[Any] = array(str(code))
+                arr.frombytes(raw.tobytes())
+                arr.byteswap()
+                views[name] = arr
+            else:
+                views[name] = raw.cast(code)
+        self._term_offsets = views["term_offsets"]
+        self._terms = views["terms"]
+        self.idf = views["idf"]
+        self._post_offsets = views["post_offsets"]
+        self._post_docs = views["post_docs"]
+        self._post_tf = views["post_tf"]
+        self._post_w = views["post_w"]
+        self.norms = views["norms"]
+        self._chunk_ids = views["chunk_ids"]
+        self._src_offsets = views["src_offsets"]
+        self._sources = views["sources"]
+        self._text_offsets = views["text_offsets"]
+        self._texts = views["texts"]
+        self._df = views["df"]
+        self._head_offsets = views.get("head_offsets")
+        self._headings = views.get("headings")
+        self._chunk_len: Optional[Sequence[int]] = views.get("chunk_len")
+        self._fpost_offsets = views.get("fpost_offsets")
+        self._fpost_docs = views.get("fpost_docs")
+        self._fpost_flags = views.get("fpost_flags")
+        self._bm25: Dict[Bm25Params, Bm25Cache] = {}
+
+    @classmethod
+    def open(cls, path: str) -> "MmapIndex":
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if mm[: len(MAGIC)] != MAGIC:
+            mm.close()
+            raise ValueError("Kein CVN-RAG-Binärindex")
+        hlen = int.from_bytes(mm[len(MAGIC): len(MAGIC) + 4], "little")
+        start = len(MAGIC) + 4
+        header: Dict[str, Any] = json.loads(bytes(mm[start: start + hlen]).decode("utf-8"))
+        if int(header.get("version", 0)) not in SUPPORTED_VERSIONS:
+            mm.close()
+            raise ValueError(f"Nicht unterstützte Indexversion: {header.get('version')}")
+        return cls(mm, header, _align(start + hlen))
+
+    def term_id(self, term: str) -> int:
+        """Binärsuche im sortierten Term-Wörterbuch; -1 wenn unbekannt."""
+        key = term.encode("utf-8")
+        offs = self._term_offsets
+        terms = self._terms
+        lo, hi = 0, self.n_terms - 1
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            cur = terms[offs[mid]: offs[mid + 1]].tobytes()
+            if cur == key:
+                return mid
+            if cur < key:
+                lo = mid + 1
+            else:
+                hi = mid - 1
+        return -1
+
+    def df(self, term: str) -> int:
+        tid = self.term_id(term)
+        return int(self._df[tid]) if tid >= 0 else 0
+
+    def postings(self, tid: int) -> Tuple[Sequence[int], Sequence[float]]:
+        a, b = self._post_offsets[tid], self._post_offsets[tid + 1]
+        return self._post_docs[a:b], self._post_w[a:b]
+
+    def postings_tf(self, tid: int) -> Tuple[Sequence[int], Sequence[int]]:
+        a, b = self._post_offsets[tid], self._post_offsets[tid + 1]
+        return self._post_docs[a:b], self._post_tf[a:b]
+
+    def field_postings(self, tid: int) -> Tuple[Sequence[int], Sequence[int]]:
+        if self._fpost_offsets is None or self._fpost_docs is None or self._fpost_flags is None:
+            return (), ()
+        a, b = self._fpost_offsets[tid], self._fpost_offsets[tid + 1]
+        return self._fpost_docs[a:b], self._fpost_flags[a:b]
+
+    def chunk_len(self) -> Sequence[int]:
+        """Tokens je Chunk; bei v1/v2-Dateien einmalig aus post_tf berechnet."""
+        lens = self._chunk_len
+        if lens is None:
+            acc = [0] * self.n_chunks
+            for pos, tf in zip(self._post_docs, self._post_tf):
+                acc[pos] += tf
+            lens = array("I", acc)
+            self._chunk_len = lens
+        return lens
+
+    def _make_bm25(self, params: Bm25Params) -> Bm25Cache:
+        return Bm25Cache(
+            params,
+            self.chunk_len(),
+            self.n_docs,
+            lambda tid: int(self._df[tid]),
+            self.postings_tf,
+            self.field_postings,
+        )
+
+    def search(
+        self,
+        query: str,
+        top_k: int,
+        scorer: Scorer = "tfidf",
+        bm25: Optional[Bm25Params] = None,
+        prune: bool = True,
+    ) -> List[Tuple[float, int]]:
+        qtf: Dict[int, int] = {}
+        for t in tokenize(query):
+            tid = self.term_id(t)
+            if tid >= 0:
+                qtf[tid] = qtf.get(tid, 0) + 1
+        if scorer == "bm25":
+            # Impact-Postings werden je Term beim ersten Zugriff berechnet und gecacht
+            return _bm25_search(qtf, self._bm25, self._make_bm25, bm25, top_k, prune=prune)
+        return cosine_topk(qtf, self.idf, self.postings, self.norms, top_k)
+
+    def hit(self, pos: int) -> Tuple[str, str]:
+        """(source, content) – dekodiert nur diesen einen Chunk."""
+        so, to = self._src_offsets, self._text_offsets
+        source = self._sources[so[pos]: so[pos + 1]].tobytes().decode("utf-8", errors="replace")
+        content = self._texts[to[pos]: to[pos + 1]].tobytes().decode("utf-8", errors="replace")
+        return source, content
+
+    def chunk_id(self, pos: int) -> int:
+        return int(self._chunk_ids[pos])
+
+    def heading(self, pos: int) -> str:
+        if self._head_offsets is None or self._headings is None:
+            return ""
+        ho = self._head_offsets
+        return self._headings[ho[pos]: ho[pos + 1]].tobytes().decode("utf-8", errors="replace")
+
+    def to_tfidf(self) -> TfIdfIndex:
+        """Materialisiert den Index wieder als TfIdfIndex (z. B. für inkrementelle Updates).
+
+        Die Termfrequenzen je Chunk werden aus den CSR-Postings zurückgewonnen; es wird nichts
+        neu tokenisiert.
+        """
+        tfs: List[Dict[str, int]] = [{} for _ in range(self.n_chunks)]
+        df: Dict[str, int] = {}
+        offs = self._term_offsets
+        for tid in range(self.n_terms):
+            term = self._terms[offs[tid]: offs[tid + 1]].tobytes().decode("utf-8")
+            df[term] = int(self._df[tid])
+            docs, tf_vals = self.postings_tf(tid)
+            for pos, tf in zip(docs, tf_vals):
+                tfs[pos][term] = int(tf)
+        chunks: List[Chunk] = []
+        for pos in range(self.n_chunks):
+            source, content = self.hit(pos)
+            chunks.append(Chunk(id=self.chunk_id(pos), source=source, content=content, tf=tfs[pos], heading=self.heading(pos)))
+        return TfIdfIndex(chunks=chunks, df=df, n_docs=self.n_docs)
+
+
+__all__ = ["MAGIC", "FORMAT_VERSION", "SUPPORTED_VERSIONS", "MmapIndex", "write_binary_index"]
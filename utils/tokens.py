@@ -0,0 +1,41 @@
+"""Token-Zählung ohne App-Abhängigkeiten (für Prompt-Budget und scripts/estimate_tokens.py).
+
+- tiktoken `cl100k_base`, falls installiert
+- sonst Heuristik ~4 Zeichen/Token
+"""
+from __future__ import annotations
+
+import importlib
+from typing import Callable, Optional
+
+TokenCounter = Callable[[str], int]
+
+
+def heuristic_tokens(text: str) -> int:
+    """Fallback-Heuristik: ~4 Zeichen je Token."""
+    return max(1, int(len(text) / 4)) if text else 0
+
+
+def load_cl100k() -> Optional[TokenCounter]:
+    """Zähler über tiktoken `cl100k_base` oder None, wenn tiktoken fehlt."""
+    try:
+        enc = importlib.import_module("tiktoken").get_encoding("cl100k_base")
+    except Exception:
+        return None
+    return lambda text: len(enc.encode(text))
+
+
+def default_counter() -> TokenCounter:
+    """cl100k, falls verfügbar, sonst die Heuristik."""
+    return load_cl100k() or heuristic_tokens
+
+
+def count_tokens(text: str, counter: Optional[TokenCounter] = None) -> int:
+    """Tokens von `text` mit `counter` (Standard: default_counter); bei Fehlern die Heuristik."""
+    try:
+        return int((counter or default_counter())(text))
+    except Exception:
+        return heuristic_tokens(text)
+
+
+__all__ = ["TokenCounter", "count_tokens", "default_counter", "heuristic_tokens", "load_cl100k"]